@@ -0,0 +1,209 @@
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+import tiktoken
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Section prefixes written by RecipeLLM._prepare_recipe_content.
+# Everything that is neither optional nor steps (title, ingredients, serving size) is kept first.
+OPTIONAL_SECTIONS = ("Description:", "Tags:")
+STEPS_SECTION = "Steps:"
+
+NO_RESULTS_CONTEXT = "No relevant recipes found."
+
+
+# Seconds before loading a tokenizer that failed to load is attempted again
+TOKENIZER_RETRY_SECONDS = 300.0
+
+_tokenizer = None
+_tokenizer_retry_at = 0.0
+_tokenizer_lock = threading.Lock()
+
+
+def load_tokenizer():
+    """
+    Load the tokenizer used for prompt budgeting.
+
+    Called at startup, because tiktoken downloads the encoding on first use unless it is
+    already in TIKTOKEN_CACHE_DIR (the Docker image bakes it in). The encoding, cl100k_base by
+    default, only approximates the tokenizer of the deployed model, so token budgets need
+    some headroom below the model's limits.
+
+    Returns:
+        The tokenizer, or None if it could not be loaded. The failure is not kept for the life
+        of the process: `get_tokenizer` tries again after TOKENIZER_RETRY_SECONDS and tokens
+        are estimated from the text length until then.
+    """
+    global _tokenizer, _tokenizer_retry_at
+    with _tokenizer_lock:
+        if _tokenizer is not None:
+            return _tokenizer
+        encoding_name = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+        try:
+            _tokenizer = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            _tokenizer_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            logger.warning(
+                f"Failed to load tokenizer {encoding_name}, token counts are estimated from the text length "
+                f"(4 characters per token) until it loads, retrying in {TOKENIZER_RETRY_SECONDS:.0f}s: {e}"
+            )
+            return None
+        logger.info(f"Loaded tokenizer {encoding_name} for prompt budgeting")
+    # Drop the counts estimated while the tokenizer was missing
+    count_tokens.cache_clear()
+    return _tokenizer
+
+
+def get_tokenizer():
+    """The tokenizer for prompt budgeting, None while it cannot be loaded (see `load_tokenizer`)"""
+    if _tokenizer is None and time.monotonic() >= _tokenizer_retry_at:
+        return load_tokenizer()
+    return _tokenizer
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text with the tokenizer, or estimate them while it is not loaded"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return math.ceil(len(text) / 4)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+@dataclass
+class _RecipeSections:
+    """A retrieved recipe split into the sections of its page content"""
+    header: List[str] = field(default_factory=list)
+    optional: List[str] = field(default_factory=list)
+    steps: List[str] = field(default_factory=list)
+
+
+@dataclass
+class BuiltContext:
+    """Prompt context fitted to a token budget"""
+    text: str
+    tokens: int
+    full_tokens: int
+    documents_included: int
+    documents_total: int
+    steps_omitted: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.full_tokens - self.tokens, 0)
+
+
+class ContextBuilder:
+    """
+    Builds the retrieval context for RAG prompts within a token budget.
+
+    Retrieved recipes are kept in rank order. When the full context exceeds the budget,
+    title, ingredients and serving size of each recipe are added first, then descriptions
+    and tags, and finally steps until the budget is used up.
+    """
+
+    def __init__(self, token_budget: int = 1500, token_counter: Callable[[str], int] = count_tokens):
+        """Initialize the context builder"""
+        self.token_budget = token_budget
+        self.token_counter = token_counter
+
+    def build(self, documents: List[Document]) -> BuiltContext:
+        """Build the prompt context for ranked search results"""
+        if not documents:
+            tokens = self.token_counter(NO_RESULTS_CONTEXT)
+            return BuiltContext(NO_RESULTS_CONTEXT, tokens, tokens, 0, 0, 0)
+
+        full_text = "\n\n".join(f"Recipe {i}:\n{doc.page_content}" for i, doc in enumerate(documents, 1))
+        full_tokens = self.token_counter(full_text)
+        if self.token_budget <= 0 or full_tokens <= self.token_budget:
+            return BuiltContext(full_text, full_tokens, full_tokens, len(documents), len(documents), 0)
+
+        sections = [self._split_sections(doc.page_content) for doc in documents]
+        remaining = self.token_budget
+
+        # Title and ingredients of each recipe, in rank order
+        included: List[_RecipeSections] = []
+        for recipe in sections:
+            cost = self._cost(recipe.header)
+            if cost > remaining:
+                break
+            included.append(_RecipeSections(header=list(recipe.header)))
+            remaining -= cost
+
+        if not included:
+            # Not even the best match fits, so truncate its header to the budget
+            text = self._truncate("Recipe 1:\n" + "\n\n".join(sections[0].header), self.token_budget)
+            return BuiltContext(text, self.token_counter(text), full_tokens, 1, len(documents), len(sections[0].steps))
+
+        # Descriptions and tags
+        for recipe, target in zip(sections, included):
+            for section in recipe.optional:
+                cost = self._cost([section])
+                if cost <= remaining:
+                    target.optional.append(section)
+                    remaining -= cost
+
+        # Steps, best match first
+        for recipe, target in zip(sections, included):
+            for step in recipe.steps:
+                cost = self._cost([step])
+                if cost > remaining:
+                    break
+                target.steps.append(step)
+                remaining -= cost
+
+        steps_omitted = sum(len(recipe.steps) for recipe in sections) - sum(len(recipe.steps) for recipe in included)
+        text = "\n\n".join(
+            f"Recipe {i}:\n{self._render(recipe, original.steps)}"
+            for i, (recipe, original) in enumerate(zip(included, sections), 1)
+        )
+
+        return BuiltContext(text, self.token_counter(text), full_tokens, len(included), len(documents), steps_omitted)
+
+    def _cost(self, parts: List[str]) -> int:
+        """Token cost of sections including their separators"""
+        return sum(self.token_counter(part) + 1 for part in parts)
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """Cut a text down to roughly the given number of tokens"""
+        while text and self.token_counter(text) > budget:
+            text = text[:int(len(text) * 0.9)]
+        return text
+
+    @staticmethod
+    def _split_sections(page_content: str) -> _RecipeSections:
+        """Split recipe page content into header, optional and step sections"""
+        recipe = _RecipeSections()
+        for section in page_content.split("\n\n"):
+            section = section.strip()
+            if not section:
+                continue
+            if section.startswith(STEPS_SECTION):
+                recipe.steps = [line.strip() for line in section.splitlines()[1:] if line.strip()]
+            elif section.startswith(OPTIONAL_SECTIONS):
+                recipe.optional.append(section)
+            else:
+                # Title, ingredients, serving size and any unstructured text
+                recipe.header.append(section)
+        return recipe
+
+    @staticmethod
+    def _render(recipe: _RecipeSections, all_steps: Optional[List[str]]) -> str:
+        """Render the kept sections of a recipe in page content order"""
+        parts = list(recipe.header[:1]) + [s for s in recipe.optional if s.startswith("Description:")] + list(recipe.header[1:])
+        if recipe.steps:
+            omitted = len(all_steps or []) - len(recipe.steps)
+            steps = "\n".join(recipe.steps)
+            if omitted:
+                steps += f"\n({omitted} more steps omitted)"
+            parts.append(f"{STEPS_SECTION}\n{steps}")
+        parts += [s for s in recipe.optional if s.startswith("Tags:")]
+        return "\n\n".join(parts)
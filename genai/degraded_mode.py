@@ -0,0 +1,140 @@
+import copy
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from llm_router import LatencyTracker
+from resilience import CircuitBreaker
+
+# Serving size of retrieved recipes indexed without one
+DEFAULT_SERVING_SIZE = 4
+
+# Ingredient line of the indexed recipe content, see RecipeLLM._prepare_recipe_content
+INGREDIENTS_LINE = re.compile(r"^Ingredients: (.*)$", re.MULTILINE)
+
+
+def parse_ingredients(document: Document) -> List[Dict[str, Any]]:
+    """
+    Ingredients of a retrieved recipe with their amounts and units.
+
+    The names come from the document metadata; amounts and units are only stored in the
+    indexed content ("2.0 cup flour, 1.0 egg, salt"). If the content cannot be matched to
+    the names, the ingredients are returned without amounts.
+    """
+    names = [name for name in document.metadata.get("ingredients") or [] if name]
+    match = INGREDIENTS_LINE.search(document.page_content or "")
+    parts = match.group(1).split(", ") if match else []
+    if len(parts) != len(names):
+        return [{"name": name, "unit": None, "amount": None} for name in names]
+
+    ingredients = []
+    for name, part in zip(names, parts):
+        amount, unit = None, None
+        if part.endswith(name):
+            quantity, _, unit = part[:-len(name)].strip().partition(" ")
+            try:
+                amount = float(quantity)
+            except ValueError:
+                unit = None
+        ingredients.append({"name": name, "unit": unit or None, "amount": amount})
+    return ingredients
+
+
+def scale_recipe(recipe_data: Dict[str, Any], servings: Optional[int]) -> Dict[str, Any]:
+    """
+    Copy of a recipe with its ingredient amounts scaled to `servings`.
+
+    The recipe is returned unchanged without requested servings or if its own serving size
+    is unknown.
+    """
+    base = recipe_data.get("servingSize")
+    if not servings or not base or servings == base:
+        return recipe_data
+
+    factor = servings / base
+    scaled = copy.deepcopy(recipe_data)
+    scaled["servingSize"] = servings
+    for ingredient in scaled.get("recipeIngredients", []):
+        if isinstance(ingredient.get("amount"), (int, float)):
+            ingredient["amount"] = round(ingredient["amount"] * factor, 2)
+    return scaled
+
+
+class DegradedMode:
+    """
+    Decides when recipe suggestions skip the LLM and are assembled from retrieved recipes.
+
+    Suggestions degrade when the client asks for it, when every LLM circuit breaker is open,
+    when the recent LLM latency exceeds `latency_budget` or when it exceeds the time left
+    until the request's deadline. Callers also degrade when the LLM call fails or is shed.
+    Only requested degradation works with `enabled` off.
+
+    Args:
+        breakers: Returns the circuit breakers of the LLM backends.
+        llm_latency: Latency of recent successful LLM calls.
+        latency_budget: Seconds an LLM call may be expected to take, 0 for no budget.
+        enabled: Degrade automatically.
+    """
+
+    def __init__(
+        self,
+        breakers: Callable[[], List[CircuitBreaker]],
+        llm_latency: LatencyTracker,
+        latency_budget: float = 0.0,
+        enabled: bool = True
+    ):
+        self.breakers = breakers
+        self.llm_latency = llm_latency
+        self.latency_budget = latency_budget
+        self.enabled = enabled
+
+    def reason(self, requested: bool = False, remaining: Optional[float] = None) -> Optional[str]:
+        """
+        Why a suggestion should skip the LLM, None if it should not.
+
+        Args:
+            requested: The client asked for a degraded response.
+            remaining: Seconds left until the request's deadline, None without a deadline.
+        """
+        if requested:
+            return "requested"
+        if not self.enabled:
+            return None
+
+        breakers = self.breakers()
+        if breakers and all(breaker.state == CircuitBreaker.OPEN for breaker in breakers):
+            return "circuit_open"
+
+        expected = self.llm_latency.ewma
+        if expected is not None:
+            if self.latency_budget > 0 and expected > self.latency_budget:
+                return "latency_budget"
+            if remaining is not None and expected > remaining:
+                return "deadline"
+        return None
+
+    @staticmethod
+    def nearest_recipe(documents: List[Document]) -> Optional[Document]:
+        """Nearest retrieved recipe that has a title and steps"""
+        for document in documents:
+            metadata = document.metadata or {}
+            if metadata.get("title") and any(metadata.get("steps") or []):
+                return document
+        return None
+
+    @staticmethod
+    def build_recipe(document: Document, servings: Optional[int] = None) -> Dict[str, Any]:
+        """Recipe data of a retrieved recipe in the format of generated recipes, scaled to `servings`"""
+        metadata = document.metadata
+        serving_size = metadata.get("serving_size")
+        recipe_data = {
+            "title": metadata["title"],
+            "description": metadata.get("description") or "",
+            "servingSize": int(serving_size or DEFAULT_SERVING_SIZE),
+            "recipeIngredients": parse_ingredients(document),
+            "recipeSteps": [{"order": i + 1, "details": step} for i, step in enumerate(step for step in metadata["steps"] if step)],
+            "tags": list(metadata.get("tags") or [])
+        }
+        # Amounts are only scaled if the recipe's own serving size is known
+        return scale_recipe(recipe_data, servings) if serving_size else recipe_data
@@ -0,0 +1,217 @@
+import asyncio
+import importlib.util
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from tracing import ainject_trace_headers, inject_trace_headers
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+# Live client sets, read by the pool collector on every scrape
+_live_clients: "weakref.WeakSet[LLMHttpClients]" = weakref.WeakSet()
+
+
+class _PoolCollector:
+    """Prometheus collector reporting LLM connection pool utilization at scrape time"""
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "genai_llm_http_pool_connections",
+            "Open connections to the LLM backend by client (sync, async) and state (active, idle)",
+            labels=["client", "state"]
+        )
+        max_connections = GaugeMetricFamily(
+            "genai_llm_http_pool_max_connections",
+            "Configured connection limit of the LLM backend pool",
+            labels=["client"]
+        )
+
+        totals = {client: {"active": 0, "idle": 0} for client in ("sync", "async")}
+        limit = 0
+        for clients in list(_live_clients):
+            limit += clients.max_connections
+            for client, counts in clients.pool_stats().items():
+                for state, count in counts.items():
+                    totals[client][state] += count
+
+        for client, counts in totals.items():
+            max_connections.add_metric([client], limit)
+            for state, count in counts.items():
+                connections.add_metric([client, state], count)
+
+        yield connections
+        yield max_connections
+
+
+REGISTRY.register(_PoolCollector())
+
+
+class LLMHttpClients:
+    """
+    Shared sync and async httpx clients for the LLM backend.
+
+    Both clients use explicit pool limits, keep-alive and timeouts, and HTTP/2 if the
+    `h2` package is installed. Pool utilization is exported on every metrics scrape.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        http2: bool = True
+    ):
+        """Initialize the pooled clients"""
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+
+        if http2 and not self.http2:
+            logger.warning("HTTP/2 requested for the LLM backend but the h2 package is not installed, using HTTP/1.1")
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        # Propagate the trace context to the LLM backends
+        self.sync_client = httpx.Client(
+            limits=limits,
+            timeout=timeout,
+            http2=self.http2,
+            event_hooks={"request": [inject_trace_headers]}
+        )
+        self.async_client = httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=self.http2,
+            event_hooks={"request": [ainject_trace_headers]}
+        )
+
+        _live_clients.add(self)
+
+    def prewarm(self, connections: int = 2, base_urls: Optional[List[str]] = None) -> int:
+        """
+        Open connections to the LLM backends so that the first requests skip the TCP and TLS handshake.
+
+        Args:
+            connections: Number of concurrent requests used to open connections per backend.
+            base_urls: Backends to connect to, defaults to the client's base URL.
+
+        Returns:
+            Number of connections that were opened successfully.
+        """
+        targets = self._prewarm_targets(connections, base_urls)
+        if not targets:
+            return 0
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            opened = sum(executor.map(lambda url: self._open_connection(self.sync_client.get, url), targets))
+
+        self._log_prewarm("sync", targets, opened, start_time)
+        return opened
+
+    async def aprewarm(self, connections: int = 2, base_urls: Optional[List[str]] = None) -> int:
+        """Open connections of the async client, on the event loop that will use them"""
+        targets = self._prewarm_targets(connections, base_urls)
+        if not targets:
+            return 0
+
+        start_time = time.time()
+
+        async def open_connection(url):
+            try:
+                await self.async_client.get(f"{url.rstrip('/')}/models", headers=self._auth_headers())
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to pre-warm LLM connection to {url}: {e}")
+                return False
+
+        opened = sum(await asyncio.gather(*(open_connection(url) for url in targets)))
+
+        self._log_prewarm("async", targets, opened, start_time)
+        return opened
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get active and idle connection counts of both pools"""
+        return {
+            "sync": self._connection_counts(self.sync_client),
+            "async": self._connection_counts(self.async_client)
+        }
+
+    def close(self) -> None:
+        """Close the sync client"""
+        self.sync_client.close()
+
+    async def aclose(self) -> None:
+        """Close the async client and stop reporting the pools"""
+        await self.async_client.aclose()
+        _live_clients.discard(self)
+
+    def _prewarm_targets(self, connections: int, base_urls: Optional[List[str]]) -> List[str]:
+        """One URL per connection to open"""
+        urls = [url for url in (base_urls or [self.base_url]) if url.startswith(("http://", "https://"))]
+        return [url for url in urls for _ in range(max(connections, 0))]
+
+    def _auth_headers(self) -> Dict[str, str]:
+        """Authorization header for the LLM backends"""
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def _open_connection(self, get, url: str) -> bool:
+        """Send a request to the models endpoint, any HTTP response leaves a pooled connection"""
+        try:
+            get(f"{url.rstrip('/')}/models", headers=self._auth_headers())
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to pre-warm LLM connection to {url}: {e}")
+            return False
+
+    def _log_prewarm(self, client: str, targets: List[str], opened: int, start_time: float) -> None:
+        """Log the result of pre-warming a client"""
+        duration_ms = round((time.time() - start_time) * 1000, 2)
+        structured_logger.info(
+            f"Pre-warmed {opened}/{len(targets)} LLM connections",
+            extra={
+                'duration_ms': duration_ms,
+                'extra_context': {
+                    'operation': 'llm_connection_prewarm',
+                    'client': client,
+                    'requested': len(targets),
+                    'backends': len(set(targets)),
+                    'opened': opened,
+                    'http2': self.http2,
+                    'pool': self.pool_stats()[client]
+                }
+            }
+        )
+
+    @staticmethod
+    def _connection_counts(client) -> Dict[str, int]:
+        """Count active and idle connections of a client's connection pool"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        counts = {"active": 0, "idle": 0}
+        for connection in getattr(pool, "connections", []):
+            try:
+                if connection.is_closed():
+                    continue
+                counts["idle" if connection.is_idle() else "active"] += 1
+            except Exception:
+                continue
+        return counts
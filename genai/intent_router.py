@@ -0,0 +1,256 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from llm_router import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Phrases that make a chat message a recipe creation request
+CREATION_KEYWORDS = [
+    "create", "make", "generate", "new recipe", "recipe for",
+    "how to make", "how to cook", "recipe idea", "suggest recipe"
+]
+
+# Phrases that make a chat message a search in the recipe collection
+SEARCH_KEYWORDS = [
+    "find", "search", "show me", "looking for", "recipes with", "recipes that",
+    "do you have", "any recipes", "which recipes", "what can i cook"
+]
+
+# Messages that are only a greeting, thanks or goodbye
+CHITCHAT_PATTERN = re.compile(
+    r"^(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|thx|cheers|"
+    r"bye|goodbye|see you|how are you|who are you|ok|okay|cool|great)"
+    r"( there| again| a lot| so much| very much| today)?[\s!.?,:)]*$",
+    re.IGNORECASE
+)
+
+# Example messages per intent, embedded in one batch at startup to form the nearest-centroid classifier
+INTENT_EXAMPLES = {
+    "creation": [
+        "I'd love a new dish using leftover rice",
+        "Invent a dessert with mango and coconut",
+        "Can you come up with a spicy vegan dinner",
+        "Give me an idea for a quick lunch with eggs",
+        "Write me a recipe that uses zucchini and feta",
+        "Something new I could cook with salmon tonight",
+    ],
+    "search": [
+        "Which recipes use chickpeas",
+        "Show me vegetarian pasta dishes",
+        "Do you have any soup recipes",
+        "Find a gluten free chocolate cake",
+        "Recipes with spinach and ricotta",
+        "What can I cook with potatoes and leeks",
+    ],
+    "chitchat": [
+        "Hi there, nice to meet you",
+        "Thanks a lot, that was helpful",
+        "How are you doing today",
+        "What can you do for me",
+        "Good morning!",
+        "Okay bye, see you later",
+    ],
+}
+
+
+@dataclass(frozen=True)
+class RetrievalPlan:
+    """How much to retrieve for an intent"""
+    top_k: int
+    # Full recipe text for prompt context, or only recipe ids and titles
+    full_text: bool
+
+
+# Retrieval for every message before intent routing, used when routing is disabled
+UNROUTED_PLAN = RetrievalPlan(top_k=5, full_text=True)
+
+
+@dataclass
+class IntentDecision:
+    """Routed intent of a chat message"""
+    intent: str
+    # keyword, centroid, default or disabled
+    method: str
+    plan: RetrievalPlan
+    query_vector: Optional[List[float]] = None
+    similarity: Optional[float] = None
+
+
+class IntentRouter:
+    """
+    Classifies chat messages before retrieval so that each intent retrieves only what it needs.
+
+    Keyword rules run first; messages without a keyword match are assigned to the nearest
+    intent centroid of their query embedding (the one that is reused for the semantic cache
+    and retrieval), if it is similar enough and clearly closer than the runner-up. Anything
+    else is treated as a search, like before routing. Chit-chat matched by keywords is
+    answered without embedding the message.
+
+    The centroids are built at startup with `build_centroids`. Until they are available,
+    messages without a keyword match are treated as searches; a failed build is retried in
+    the background with exponential backoff, never on a request's time.
+
+    With routing disabled every message is retrieved for with UNROUTED_PLAN and is either a
+    creation request (by keywords) or a search.
+
+    Args:
+        embed_batch: Embeds a list of texts, used to build the intent centroids in one batch.
+        plans: Retrieval plan per intent (search, creation, chitchat; chitchat does not retrieve).
+        min_similarity: Minimum cosine similarity to the nearest centroid.
+        min_margin: Minimum similarity lead of the nearest centroid over the runner-up.
+        enabled: Route by intent; otherwise keep the retrieval of the unrouted pipeline.
+        retry_backoff: Seconds before the first retry of a failed centroid build, doubled per failure.
+        max_retry_backoff: Upper bound of the retry backoff.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        plans: Dict[str, RetrievalPlan],
+        min_similarity: float = 0.35,
+        min_margin: float = 0.05,
+        enabled: bool = True,
+        retry_backoff: float = 5.0,
+        max_retry_backoff: float = 300.0
+    ):
+        self.embed_batch = embed_batch
+        self.plans = plans
+        self.enabled = enabled
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self._centroids: Optional[Dict[str, np.ndarray]] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._retry_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Latency of the stages routing can skip, for the savings estimate
+        self.retrieval_latency = LatencyTracker()
+        self.context_latency = LatencyTracker()
+
+    def build_centroids(self) -> bool:
+        """
+        Embed the intent examples in one batch and build the centroids.
+
+        Returns:
+            True if the centroids are available. On failure the next build is scheduled
+            after the backoff and messages are routed by keywords until then.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._centroids is not None:
+                return True
+            intents = list(INTENT_EXAMPLES)
+            examples = [example for intent in intents for example in INTENT_EXAMPLES[intent]]
+            try:
+                vectors = np.asarray(self.embed_batch(examples), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                centroids, offset = {}, 0
+                for intent in intents:
+                    count = len(INTENT_EXAMPLES[intent])
+                    centroid = vectors[offset:offset + count].mean(axis=0)
+                    centroids[intent] = centroid / np.linalg.norm(centroid)
+                    offset += count
+            except Exception as e:
+                backoff = min(self.retry_backoff * 2 ** self._failures, self.max_retry_backoff)
+                self._failures += 1
+                self._retry_at = time.monotonic() + backoff
+                logger.warning(f"Failed to build intent centroids, routing by keywords only, retrying in {backoff:.0f}s: {e}")
+                return False
+            self._centroids = centroids
+            if self._failures:
+                logger.info(f"Built intent centroids after {self._failures} failed attempts")
+            return True
+
+    def classify(self, message: str, embed_query: Callable[[], Optional[List[float]]]) -> IntentDecision:
+        """
+        Route a chat message.
+
+        Args:
+            message: The chat message.
+            embed_query: Returns the message's query embedding (or None), only called if needed.
+
+        Returns:
+            The intent with its retrieval plan and the query embedding, if it was computed.
+        """
+        if not self.enabled:
+            intent = "creation" if self._keyword_intent(message) == "creation" else "search"
+            return IntentDecision(intent, "disabled", UNROUTED_PLAN, embed_query())
+
+        keyword_intent = self._keyword_intent(message)
+        if keyword_intent == "chitchat":
+            return IntentDecision("chitchat", "keyword", self.plans["chitchat"])
+
+        query_vector = embed_query()
+        if keyword_intent:
+            return IntentDecision(keyword_intent, "keyword", self.plans[keyword_intent], query_vector)
+
+        intent, similarity = self._nearest_centroid(query_vector)
+        if intent:
+            return IntentDecision(intent, "centroid", self.plans[intent], query_vector, similarity)
+        return IntentDecision("search", "default", self.plans["search"], query_vector, similarity)
+
+    def estimated_savings(self, intent: str) -> float:
+        """
+        Seconds of pipeline work an intent skips compared to retrieving and building prompt
+        context for every message: retrieval and context for chit-chat, context for search.
+        """
+        context = self.context_latency.ewma or 0.0
+        if intent == "chitchat":
+            return (self.retrieval_latency.ewma or 0.0) + context
+        if intent == "search":
+            return context
+        return 0.0
+
+    @staticmethod
+    def _keyword_intent(message: str) -> Optional[str]:
+        message_lower = message.lower().strip()
+        if any(keyword in message_lower for keyword in CREATION_KEYWORDS):
+            return "creation"
+        if CHITCHAT_PATTERN.match(message_lower):
+            return "chitchat"
+        if any(keyword in message_lower for keyword in SEARCH_KEYWORDS):
+            return "search"
+        return None
+
+    def _nearest_centroid(self, query_vector: Optional[List[float]]):
+        """Nearest intent centroid as (intent, similarity), intent is None if not confident"""
+        centroids = self._get_centroids()
+        if not centroids or query_vector is None:
+            return None, None
+        try:
+            query = np.asarray(query_vector, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None, None
+        norm = float(np.linalg.norm(query))
+        if query.ndim != 1 or norm == 0.0:
+            return None, None
+
+        query = query / norm
+        ranked = sorted(((float(centroid @ query), intent) for intent, centroid in centroids.items()), reverse=True)
+        (best, intent), (runner_up, _) = ranked[0], ranked[1]
+        if best < self.min_similarity or best - runner_up < self.min_margin:
+            return None, round(best, 4)
+        return intent, round(best, 4)
+
+    def _get_centroids(self) -> Optional[Dict[str, np.ndarray]]:
+        """The centroids, None while unavailable; starts a background retry once the backoff passed"""
+        if self._centroids is None and self._failures and time.monotonic() >= self._retry_at:
+            with self._lock:
+                if self._retry_thread is None or not self._retry_thread.is_alive():
+                    # Push the retry time out so that concurrent requests do not start another thread
+                    self._retry_at = float("inf")
+                    self._retry_thread = threading.Thread(target=self.build_centroids, name="intent-centroids", daemon=True)
+                    self._retry_thread.start()
+        return self._centroids
@@ -1,16 +1,55 @@
+import asyncio
+import contextvars
 import logging
 import time
 import json
-from typing import List, Dict, Any
+import re
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Callable, List, Dict, Any, Optional, Tuple, Type, Union
+from pydantic import BaseModel, ValidationError
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, get_buffer_string
 from dotenv import load_dotenv
+from opentelemetry import trace
 import os
 
 from request_models import RecipeData
-from response_models import ChatResponse, RecipeSuggestionResponse
+from response_models import ChatResponse, RecipeSuggestionResponse, GeneratedRecipe, GeneratedRecipeVariants
 from rag import RAGHelper
+from semantic_cache import SemanticCache
+from context_builder import ContextBuilder, count_tokens
+from http_clients import LLMHttpClients
+from llm_router import LLMRouter, LLMBackend, LatencyTracker, _EventLoopThread, backend_name
+from rate_limit import RateLimitExceededError
+from resilience import AdaptiveLimiter, CircuitBreaker, LimiterPermit, LimitExceededError, StageTimeoutError, future_outcome
+from request_context import CancelScope, RequestCancelled, current_cancel_scope, current_request_stats
+from metrics import (
+    observe_stage,
+    RECIPE_PARSE_RESULTS,
+    RECIPE_REPAIR_DURATION,
+    PROMPT_CONTEXT_TOKENS,
+    PROMPT_CONTEXT_TOKENS_SAVED,
+    PROMPT_TOKENS,
+    LLM_TOKENS,
+    LLM_COMPLETION_TOKENS,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_OUTPUT_TOKENS_PER_SECOND,
+    INTENT_REQUESTS,
+    INTENT_LATENCY_SAVED,
+    SPECULATIVE_GENERATIONS,
+    SPECULATION_SAVED,
+    SPECULATION_WASTED,
+    DEGRADED_RESPONSES,
+    STAGE_TIMEOUTS,
+    BATCH_SUGGESTIONS
+)
+from intent_router import IntentRouter, RetrievalPlan, CREATION_KEYWORDS
+from degraded_mode import DegradedMode, scale_recipe
 
 load_dotenv()
 
@@ -18,6 +57,130 @@ logger = logging.getLogger(__name__)
 # Create structured logger for detailed logging
 structured_logger = logging.getLogger("structured")
 
+# Title of the fallback recipe returned when an LLM response cannot be parsed
+DEFAULT_RECIPE_TITLE = "Chef's Special Creation"
+
+# Reply to greetings and thanks, which are answered without retrieval or an LLM call
+CHITCHAT_REPLY = "Hi! I can find recipes from the collection or create a new one for you. Tell me a dish, an ingredient or a diet you have in mind."
+
+# Replies when a chat stage exceeds its time budget
+SEARCH_TIMEOUT_REPLY = "Searching the recipe collection is taking longer than usual right now. Please try again in a moment."
+CREATION_TIMEOUT_SOURCES_REPLY = "Creating a new recipe is taking longer than usual right now, so here are similar recipes from the collection instead."
+CREATION_TIMEOUT_REPLY = "Creating a new recipe is taking longer than usual right now. Please try again in a moment."
+
+# Prompt used to ask the LLM to fix a recipe that failed schema validation
+REPAIR_PROMPT = ChatPromptTemplate.from_template("""
+You previously returned a recipe that could not be used because it is not valid.
+
+Validation error: {error}
+
+Previous output:
+{response}
+
+Return only the corrected recipe as a single JSON object with the fields "title", "description", "servingSize",
+"recipeIngredients" (objects with "name", "unit", "amount") and "recipeSteps" (objects with "order", "details").
+Do not add any text before or after the JSON.
+""")
+
+# Prompt used to ask the LLM to fix a list of recipe variants in which no recipe was valid
+VARIANTS_REPAIR_PROMPT = ChatPromptTemplate.from_template("""
+You previously returned a list of {variants} recipes that could not be used because none of them is valid.
+
+Validation error: {error}
+
+Previous output:
+{response}
+
+Return only the {variants} corrected, clearly different recipes as one JSON object with a "recipes" list. Each entry
+has the fields "title", "description", "servingSize", "recipeIngredients" (objects with "name", "unit", "amount")
+and "recipeSteps" (objects with "order", "details"). Do not add any text before or after the JSON.
+""")
+
+# Appended to a suggestion prompt to generate several distinct recipes in one completion
+VARIANTS_PROMPT_SUFFIX = """
+                Instead of a single recipe, create {variants} clearly different recipes for this request. Vary the main
+                ingredients, the cooking technique and the cuisine, so that each one is a real alternative to the others.
+                
+                Return them as one JSON object with a "recipes" list, each entry in the recipe JSON format above:
+                {{"recipes": [{{"title": "...", "description": "...", "servingSize": 4, "recipeIngredients": [...], "recipeSteps": [...]}}]}}
+                """
+
+# Recipe creation prompt when the retrieved recipes are meaningful context
+CREATION_CONTEXT_PROMPT = ChatPromptTemplate.from_template("""
+You are a creative and experienced chef assistant. The user wants to create a new recipe based on their request.
+
+User Request: {query}
+Available Recipe Context: {context}
+
+Create an innovative recipe that:
+1. Directly addresses the user's request
+2. Takes inspiration from the available recipes but adds your own creative twist
+3. Uses modern cooking techniques and flavor combinations
+4. Is practical and achievable for home cooks
+5. Has clear, detailed instructions
+
+Be creative! Don't just copy the existing recipes - use them as inspiration to create something new and exciting.
+
+Return a complete recipe in this JSON format:
+{{
+    "title": "Creative and descriptive recipe title",
+    "description": "Appetizing description explaining what makes this recipe special",
+    "servingSize": 4,
+    "recipeIngredients": [
+        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}},
+        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}}
+    ],
+    "recipeSteps": [
+        {{"order": 1, "details": "Detailed step with cooking tips and techniques"}},
+        {{"order": 2, "details": "Detailed step with cooking tips and techniques"}}
+    ]
+}}
+
+Make the recipe unique and creative while being practical. Use specific ingredients and detailed steps.
+""")
+
+# Recipe creation prompt when retrieval found no meaningful context
+CREATION_STANDALONE_PROMPT = ChatPromptTemplate.from_template("""
+You are a master chef with decades of culinary experience. The user wants to create a new recipe, but we don't have many relevant examples to work with. This is your chance to be truly creative!
+
+User Request: {query}
+
+Create an innovative, delicious recipe that:
+1. Directly fulfills the user's request
+2. Uses your culinary expertise to create something unique
+3. Incorporates modern cooking techniques and flavor profiles
+4. Is practical for home cooking
+5. Has clear, detailed instructions that any cook can follow
+
+Be bold and creative! Think outside the box and create something that will impress. Use interesting ingredient combinations, cooking methods, and presentation ideas.
+
+Return a complete recipe in this JSON format:
+{{
+    "title": "Creative and descriptive recipe title",
+    "description": "Appetizing description explaining what makes this recipe special and unique",
+    "servingSize": 4,
+    "recipeIngredients": [
+        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}},
+        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}}
+    ],
+    "recipeSteps": [
+        {{"order": 1, "details": "Detailed step with cooking tips, techniques, and timing"}},
+        {{"order": 2, "details": "Detailed step with cooking tips, techniques, and timing"}}
+    ]
+}}
+
+Make this recipe memorable and delicious. Use specific measurements, cooking times, and helpful tips.
+""")
+
+
+@dataclass
+class SpeculativeGeneration:
+    """Standalone recipe creation running on the speculation event loop"""
+    future: Future
+    # perf_counter time the generation was started
+    started: float
+
+
 class RecipeLLM:
     """LLM service for recipe search and suggestion"""
     
@@ -37,24 +200,55 @@ class RecipeLLM:
             temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
             base_url = os.getenv("LLM_BASE_URL", "unknown")
             
+            # Optional list of OpenAI-compatible backends, the first one replaces LLM_BASE_URL
+            self.backend_urls = [url.strip() for url in os.getenv("LLM_BACKENDS", "").split(",") if url.strip()] or [base_url]
+            base_url = self.backend_urls[0]
+            
             structured_logger.info(
                 f"Initializing LLM with model: {model_name}, temperature: {temperature}",
                 extra={'extra_context': {
                     'model_name': model_name,
                     'temperature': temperature,
                     'base_url': base_url,
+                    'backends': [backend_name(url) for url in self.backend_urls],
                     'component': 'llm_config'
                 }}
             )
             
+            # Shared connection pool for the LLM backend
+            self.http_clients = LLMHttpClients(
+                base_url=base_url,
+                api_key=os.getenv("OPEN_WEBUI_API_KEY"),
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10")),
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+                connect_timeout=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5")),
+                read_timeout=float(os.getenv("LLM_HTTP_READ_TIMEOUT", "120")),
+                http2=os.getenv("LLM_HTTP2", "true").lower() == "true"
+            )
+            
+            # Stream recipe generations to measure time to first token and throughput.
+            # Routed calls over several backends are not streamed.
+            self.streaming = os.getenv("LLM_STREAMING", "false").lower() == "true" and len(self.backend_urls) == 1
+            llm_options = {"stream_usage": True} if self.streaming else {}
+            
             # Initialize LLM with environment variables (no defaults)
             self.llm = ChatOpenAI(
                 model=model_name,
                 temperature=temperature,
                 api_key=os.getenv("OPEN_WEBUI_API_KEY"),
-                base_url=base_url
+                base_url=base_url,
+                http_client=self.http_clients.sync_client,
+                http_async_client=self.http_clients.async_client,
+                **llm_options
             )
             
+            # Route across several backends with failover and optional hedging
+            self.llm_router = None
+            if len(self.backend_urls) > 1:
+                self.llm_router = self._build_llm_router(model_name, temperature)
+                self.llm = self.llm_router
+            
             # Initialize RAG helper with weaviate configuration
             logger.info("Initializing RAG helper...")
             structured_logger.info(
@@ -64,6 +258,103 @@ class RecipeLLM:
             
             self.rag_helper = RAGHelper()
             
+            # Classify chat messages before retrieval so each intent only retrieves what it needs
+            self.intent_router = IntentRouter(
+                embed_batch=self.rag_helper.embed_queries,
+                plans={
+                    "search": RetrievalPlan(top_k=int(os.getenv("INTENT_SEARCH_TOP_K", "10")), full_text=False),
+                    "creation": RetrievalPlan(top_k=int(os.getenv("INTENT_CREATION_TOP_K", "3")), full_text=True),
+                    "chitchat": RetrievalPlan(top_k=0, full_text=False)
+                },
+                min_similarity=float(os.getenv("INTENT_MIN_SIMILARITY", "0.35")),
+                enabled=os.getenv("INTENT_ROUTING_ENABLED", "true").lower() == "true"
+            )
+            
+            # Constrain recipe generations to the recipe JSON schema
+            self.structured_output_mode = os.getenv("LLM_STRUCTURED_OUTPUT", "json_schema").lower()
+            self.max_repair_attempts = int(os.getenv("LLM_REPAIR_ATTEMPTS", "1"))
+            self.recipe_llm = self._bind_recipe_schema(self.llm)
+            self.variants_llm = self._bind_recipe_schema(self.llm, GeneratedRecipeVariants, "recipe_variants")
+            
+            # Start a standalone creation alongside retrieval and keep it unless good context arrives in time
+            self.speculative_generation = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"
+            self.speculation_max_wait = float(os.getenv("SPECULATIVE_MAX_CONTEXT_WAIT_MS", "1500")) / 1000
+            
+            # Event loop for LLM calls that can be cancelled (speculation, request deadlines), started on first use
+            self.llm_runtime: Optional[_EventLoopThread] = None
+            self._llm_runtime_lock = threading.Lock()
+            
+            # Time budgets of the pipeline stages in seconds, 0 for none; stages that exceed them fall back
+            self.stage_timeouts = {
+                "embedding": float(os.getenv("STAGE_TIMEOUT_EMBED_MS", "2000")) / 1000,
+                "weaviate_query": float(os.getenv("STAGE_TIMEOUT_SEARCH_MS", "5000")) / 1000,
+                "llm_call": float(os.getenv("STAGE_TIMEOUT_LLM_MS", "0")) / 1000
+            }
+            # Embedding and Weaviate calls cannot be interrupted, they run here so that callers can stop waiting
+            self.stage_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("STAGE_WORKERS", "16")), thread_name_prefix="genai-stage"
+            )
+            # Suggestions of batch requests run concurrently here; their LLM calls still queue under llm_limiter
+            self.batch_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("BATCH_SUGGEST_WORKERS", "8")), thread_name_prefix="genai-batch"
+            )
+            
+            # Adapt the number of concurrent LLM calls to the upstream's latency and errors, queue or shed the rest
+            self.llm_limiter = None
+            if os.getenv("LLM_LIMITER_ENABLED", "true").lower() == "true":
+                self.llm_limiter = AdaptiveLimiter(
+                    "llm",
+                    initial_limit=int(os.getenv("LLM_LIMITER_INITIAL", "8")),
+                    min_limit=int(os.getenv("LLM_LIMITER_MIN", "1")),
+                    max_limit=int(os.getenv("LLM_LIMITER_MAX", os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))),
+                    backoff=float(os.getenv("LLM_LIMITER_BACKOFF", "0.75")),
+                    latency_tolerance=float(os.getenv("LLM_LIMITER_LATENCY_TOLERANCE", "2.0")),
+                    max_queue=int(os.getenv("LLM_LIMITER_MAX_QUEUE", "50")),
+                    queue_timeout=float(os.getenv("LLM_LIMITER_QUEUE_TIMEOUT_MS", "10000")) / 1000
+                )
+            
+            # Outcomes and latency of LLM calls; routed backends have their own circuit breakers
+            self.llm_breaker = None
+            if self.llm_router is None:
+                self.llm_breaker = CircuitBreaker(
+                    name=f"llm:{backend_name(base_url)}",
+                    failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3")),
+                    reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+                )
+            self.llm_latency = LatencyTracker()
+            
+            # Assemble suggestions from retrieved recipes without the LLM while it is down or too slow
+            self.degraded_mode = DegradedMode(
+                breakers=self._llm_breakers,
+                llm_latency=self.llm_latency,
+                latency_budget=float(os.getenv("DEGRADED_LATENCY_BUDGET_MS", "0")) / 1000,
+                enabled=os.getenv("DEGRADED_MODE_ENABLED", "true").lower() == "true"
+            )
+            
+            # Fit retrieved recipes into a token budget before they go into prompts
+            self.context_builder = ContextBuilder(
+                token_budget=int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+            )
+            
+            # Initialize semantic cache for parsed LLM responses
+            self.semantic_cache = SemanticCache(
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+                enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+            )
+            
+            structured_logger.info(
+                "Semantic cache configured",
+                extra={'extra_context': {
+                    'component': 'semantic_cache',
+                    'enabled': self.semantic_cache.enabled,
+                    'threshold': self.semantic_cache.threshold,
+                    'ttl_seconds': self.semantic_cache.ttl_seconds,
+                    'max_entries': self.semantic_cache.max_entries
+                }}
+            )
+            
             duration_ms = round((time.time() - start_time) * 1000, 2)
             logger.info(f"Recipe LLM service initialized successfully in {duration_ms}ms")
             structured_logger.info(
@@ -273,9 +564,19 @@ class RecipeLLM:
             )
             return False
     
-    def chat(self, message: str) -> ChatResponse:
-        """Process chat message and return response"""
+    def chat(self, message: str, bypass_cache: bool = False, charge: Optional[Callable[[str], None]] = None) -> ChatResponse:
+        """
+        Process chat message and return response.
+        
+        Args:
+            message: The chat message.
+            bypass_cache: Skip the semantic cache lookup.
+            charge: Called with the request kind ("creation" or "search") of the routed intent
+                before any retrieval or generation, e.g. to take the caller's rate limit tokens.
+                RateLimitExceededError raised by it is passed on.
+        """
         start_time = time.time()
+        speculation = None
         
         try:
             logger.info(f"Processing chat message: {message[:100]}...")
@@ -288,10 +589,59 @@ class RecipeLLM:
                 }}
             )
             
-            # Search for relevant recipes
+            # Route by intent first; chit-chat is answered without embedding or retrieval
+            decision = self.intent_router.classify(message, lambda: self._embed_query(message))
+            is_creation_request = decision.intent == "creation"
+            query_vector = decision.query_vector
+            saved_seconds = self.intent_router.estimated_savings(decision.intent)
+            INTENT_REQUESTS.labels(intent=decision.intent, method=decision.method).inc()
+            if charge is not None:
+                charge("creation" if is_creation_request else "search")
+            if decision.method != "disabled":
+                INTENT_LATENCY_SAVED.labels(intent=decision.intent).inc(saved_seconds)
+            
+            structured_logger.info(
+                f"Chat intent routed: {decision.intent}",
+                extra={'extra_context': {
+                    'operation': 'intent_routing',
+                    'intent': decision.intent,
+                    'method': decision.method,
+                    'similarity': decision.similarity,
+                    'top_k': decision.plan.top_k,
+                    'full_text': decision.plan.full_text,
+                    'estimated_saved_ms': round(saved_seconds * 1000, 2)
+                }}
+            )
+            
+            if decision.intent == "chitchat":
+                return ChatResponse(reply=CHITCHAT_REPLY, sources=None, recipe_suggestion=None)
+            
+            # Serve near-identical creation requests from the semantic cache
+            if is_creation_request:
+                cached_recipe = self.semantic_cache.lookup("recipe_creation", query_vector, bypass=bypass_cache)
+                if cached_recipe:
+                    logger.info(f"Recipe creation served from semantic cache in {round((time.time() - start_time) * 1000, 2)}ms")
+                    return self._build_creation_response(message, cached_recipe)
+            
+            # Speculatively generate without context while retrieval runs
+            speculation = self._start_speculation(message) if is_creation_request and self.speculative_generation else None
+            
+            # Search for relevant recipes, searches only need their ids
             search_start = time.time()
-            search_results = self.rag_helper.retrieve(message, top_k=5)
+            try:
+                search_results = self._run_stage(
+                    "weaviate_query", self.rag_helper.retrieve,
+                    message, top_k=decision.plan.top_k, query_vector=query_vector, metadata_only=not decision.plan.full_text
+                )
+            except StageTimeoutError:
+                if not is_creation_request:
+                    self._record_fallback("weaviate_query", "retry_reply")
+                    return ChatResponse(reply=SEARCH_TIMEOUT_REPLY, sources=None, recipe_suggestion=None)
+                # Creation requests go on with the standalone prompt
+                self._record_fallback("weaviate_query", "standalone_prompt")
+                search_results = []
             search_duration = round((time.time() - search_start) * 1000, 2)
+            self.intent_router.retrieval_latency.observe(search_duration / 1000)
             
             structured_logger.info(
                 f"RAG search completed - found {len(search_results)} results",
@@ -301,18 +651,19 @@ class RecipeLLM:
                         'operation': 'rag_search',
                         'query': message[:100],
                         'results_count': len(search_results),
-                        'search_duration_ms': search_duration
+                        'search_duration_ms': search_duration,
+                        'top_k': decision.plan.top_k,
+                        'metadata_only': not decision.plan.full_text
                     }
                 }
             )
             
-            # Prepare context from search results
+            # Prepare context from search results, only creation prompts use it
             context_start = time.time()
-            context = self._prepare_search_context(search_results)
+            context = self._prepare_search_context(search_results, operation="chat") if decision.plan.full_text else ""
             context_duration = round((time.time() - context_start) * 1000, 2)
-            
-            # Determine if user wants to create a recipe
-            is_creation_request = self._is_recipe_creation_request(message)
+            if decision.plan.full_text:
+                self.intent_router.context_latency.observe(context_duration / 1000)
             
             structured_logger.info(
                 f"Chat analysis completed - creation request: {is_creation_request}",
@@ -329,7 +680,13 @@ class RecipeLLM:
             
             # Handle request based on type
             if is_creation_request:
-                response = self._handle_recipe_creation(message, context)
+                creation_start = time.time()
+                response = self._handle_recipe_creation(message, context, speculation, search_results)
+                if self._is_cacheable(response.recipe_suggestion):
+                    self.semantic_cache.store(
+                        "recipe_creation", query_vector, response.recipe_suggestion,
+                        generation_seconds=time.time() - creation_start
+                    )
             else:
                 response = self._handle_recipe_search(message, context, search_results)
             
@@ -344,6 +701,7 @@ class RecipeLLM:
                         'operation': 'chat',
                         'message_length': len(message),
                         'is_creation_request': is_creation_request,
+                        'intent': decision.intent,
                         'search_duration_ms': search_duration,
                         'context_duration_ms': context_duration,
                         'response_length': len(response.reply) if response.reply else 0,
@@ -354,8 +712,16 @@ class RecipeLLM:
             )
             
             return response
+        
+        except (LimitExceededError, RateLimitExceededError):
+            # Shed LLM calls and rate limited callers are answered with 503 and 429 by the endpoint, so that clients back off
+            if speculation is not None:
+                speculation.future.cancel()
+            raise
                 
         except Exception as e:
+            if speculation is not None:
+                speculation.future.cancel()
             total_duration = round((time.time() - start_time) * 1000, 2)
             logger.error(f"Error in chat processing: {e}", exc_info=True)
             structured_logger.error(
@@ -377,8 +743,27 @@ class RecipeLLM:
                 recipe_suggestion=None
             )
     
-    def suggest_recipe(self, query: str) -> RecipeSuggestionResponse:
-        """Generate a recipe suggestion based on query and similar recipes with improved creativity"""
+    def suggest_recipe(
+        self,
+        query: str,
+        bypass_cache: bool = False,
+        servings: Optional[int] = None,
+        degraded: bool = False,
+        query_vector: Optional[List[float]] = None,
+        variants: int = 1
+    ) -> RecipeSuggestionResponse:
+        """
+        Generate a recipe suggestion based on query and similar recipes with improved creativity.
+        
+        Args:
+            query: What the user wants to cook.
+            bypass_cache: Skip the semantic cache lookup.
+            servings: Scale the suggested recipe to this many servings.
+            degraded: Skip the LLM and suggest the nearest retrieved recipe, see `DegradedMode`.
+            query_vector: Embedding of the query, e.g. from a batch; the query is embedded without it.
+            variants: Number of distinct recipes to generate in one LLM call. The cache holds single
+                recipes, so it is only looked up for one variant.
+        """
         start_time = time.time()
         
         try:
@@ -388,13 +773,27 @@ class RecipeLLM:
                 extra={'extra_context': {
                     'operation': 'suggest_recipe',
                     'query_length': len(query),
-                    'query_preview': query[:100]
+                    'query_preview': query[:100],
+                    'variants': variants
                 }}
             )
             
+            # Serve near-identical suggestion requests from the semantic cache
+            if query_vector is None:
+                query_vector = self._embed_query(query)
+            cached_recipe = self.semantic_cache.lookup("suggestion", query_vector, bypass=bypass_cache or variants > 1)
+            if cached_recipe:
+                logger.info(f"Recipe suggestion served from semantic cache in {round((time.time() - start_time) * 1000, 2)}ms")
+                return self._build_suggestion_response(query, scale_recipe(cached_recipe, servings))
+            
             # Search for similar recipes
             search_start = time.time()
-            search_results = self.rag_helper.retrieve(query, top_k=3)
+            try:
+                search_results = self._run_stage("weaviate_query", self.rag_helper.retrieve, query, top_k=3, query_vector=query_vector)
+            except StageTimeoutError:
+                # Without context the suggestion is generated with the standalone prompt
+                self._record_fallback("weaviate_query", "standalone_prompt")
+                search_results = []
             search_duration = round((time.time() - search_start) * 1000, 2)
             
             structured_logger.info(
@@ -410,9 +809,23 @@ class RecipeLLM:
                 }
             )
             
+            # Skip the LLM on request, while its circuit is open or when it is too slow for the budget or deadline
+            cancel_scope = current_cancel_scope.get()
+            degraded_reason = self.degraded_mode.reason(degraded, cancel_scope.remaining() if cancel_scope else None)
+            if degraded_reason:
+                response = self._build_degraded_suggestion(query, search_results, servings, degraded_reason, start_time)
+                if response is not None:
+                    return response
+                if degraded:
+                    return RecipeSuggestionResponse(
+                        suggestion="I couldn't find a similar recipe to suggest right now. Please try again later.",
+                        recipe_data={},
+                        degraded={"reason": degraded_reason}
+                    )
+            
             # Prepare context from search results
             context_start = time.time()
-            context = self._prepare_search_context(search_results)
+            context = self._prepare_search_context(search_results, operation="suggestion")
             context_duration = round((time.time() - context_start) * 1000, 2)
             
             # Determine if we have meaningful context
@@ -434,7 +847,7 @@ class RecipeLLM:
             # Prepare prompt based on context quality
             if has_good_context:
                 prompt_type = "context_aware"
-                prompt = ChatPromptTemplate.from_template("""
+                template = """
                 You are a creative and experienced chef assistant. The user wants a recipe suggestion based on their request.
                 
                 User Request: {query}
@@ -465,10 +878,10 @@ class RecipeLLM:
                 }}
                 
                 Make the recipe unique and creative while being practical. Use specific ingredients and detailed steps.
-                """)
+                """
             else:
                 prompt_type = "standalone"
-                prompt = ChatPromptTemplate.from_template("""
+                template = """
                 You are a master chef with decades of culinary experience. The user wants a recipe suggestion, but we don't have many relevant examples to work with. This is your chance to be truly creative!
                 
                 User Request: {query}
@@ -498,34 +911,39 @@ class RecipeLLM:
                 }}
                 
                 Make this recipe memorable and delicious. Use specific measurements, cooking times, and helpful tips.
-                """)
-            
-            # Generate LLM response
-            llm_start = time.time()
-            chain = prompt | self.llm
-            response = chain.invoke({
-                "query": query,
-                "context": context
-            })
-            llm_duration = round((time.time() - llm_start) * 1000, 2)
-            
-            structured_logger.info(
-                f"LLM generation completed using {prompt_type} prompt",
-                extra={
-                    'duration_ms': llm_duration,
-                    'extra_context': {
-                        'operation': 'llm_generation',
-                        'prompt_type': prompt_type,
-                        'llm_duration_ms': llm_duration,
-                        'response_length': len(response.content) if response.content else 0
-                    }
-                }
-            )
-            
-            # Parse the response to extract recipe data
-            parse_start = time.time()
-            recipe_data = self._parse_recipe_response(response.content)
-            parse_duration = round((time.time() - parse_start) * 1000, 2)
+                """
+            
+            # Several variants share one completion, so the prompt and context are only sent once
+            if variants > 1:
+                template += VARIANTS_PROMPT_SUFFIX
+            prompt = ChatPromptTemplate.from_template(template)
+            
+            # Generate and parse the recipe, or fall back to the nearest retrieved recipe if the LLM fails or is overloaded
+            try:
+                if variants > 1:
+                    recipes, llm_duration, parse_duration = self._generate_recipe_variants(
+                        prompt, {"query": query, "context": context, "variants": variants}, "suggestion", prompt_type, variants
+                    )
+                    recipe_data = recipes[0]
+                else:
+                    recipe_data, llm_duration, parse_duration = self._generate_recipe_data(
+                        prompt, {"query": query, "context": context}, "suggestion", prompt_type
+                    )
+                    recipes = [recipe_data]
+            except Exception as e:
+                if isinstance(e, LimitExceededError):
+                    fallback_reason = "overload"
+                elif isinstance(e, StageTimeoutError):
+                    fallback_reason = "llm_timeout"
+                else:
+                    fallback_reason = "llm_error"
+                response = self._build_degraded_suggestion(query, search_results, servings, fallback_reason, start_time) if self.degraded_mode.enabled else None
+                if response is None:
+                    raise
+                if isinstance(e, StageTimeoutError):
+                    self._record_fallback(e.stage, "degraded")
+                logger.warning(f"Recipe suggestion degraded after LLM failure: {e}")
+                return response
             
             total_duration = round((time.time() - start_time) * 1000, 2)
             
@@ -542,16 +960,23 @@ class RecipeLLM:
                         'llm_duration_ms': llm_duration,
                         'parse_duration_ms': parse_duration,
                         'prompt_type': prompt_type,
+                        'variants_requested': variants,
+                        'variants_generated': len(recipes),
                         'has_recipe_data': bool(recipe_data),
                         'recipe_title': recipe_data.get('title', 'unknown') if recipe_data else 'none'
                     }
                 }
             )
             
-            return RecipeSuggestionResponse(
-                suggestion=f"I've created a unique recipe suggestion for you based on your request: '{query}'. This recipe combines creativity with practicality!",
-                recipe_data=recipe_data
-            )
+            if self._is_cacheable(recipe_data):
+                self.semantic_cache.store("suggestion", query_vector, recipe_data, generation_seconds=time.time() - start_time)
+            
+            if variants > 1:
+                return self._build_suggestion_response(query, [scale_recipe(recipe, servings) for recipe in recipes], variants)
+            return self._build_suggestion_response(query, scale_recipe(recipe_data, servings))
+        
+        except LimitExceededError:
+            raise
             
         except Exception as e:
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -574,6 +999,786 @@ class RecipeLLM:
                 recipe_data={}
             )
     
+    def suggest_recipes(
+        self,
+        queries: List[str],
+        bypass_cache: bool = False,
+        servings: Optional[int] = None,
+        degraded: bool = False,
+        on_result: Optional[Callable[[int, Optional[RecipeSuggestionResponse], Optional[BaseException]], None]] = None
+    ) -> List[Optional[RecipeSuggestionResponse]]:
+        """
+        Generate recipe suggestions for several queries at once.
+        
+        All queries are embedded in one batch. Each suggestion then runs like `suggest_recipe`
+        in the batch pool, so retrievals overlap and LLM calls queue under the shared
+        concurrency limit. A failing suggestion does not affect the others.
+        
+        Args:
+            queries: What the user wants to cook, one suggestion per query.
+            bypass_cache: Skip the semantic cache lookup.
+            servings: Scale every suggested recipe to this many servings.
+            degraded: Skip the LLM and suggest the nearest retrieved recipes, see `DegradedMode`.
+            on_result: Called with the index, the suggestion and the error of each query as soon as it completes.
+        
+        Returns:
+            The suggestions in query order, None for queries that raised.
+        
+        Raises:
+            RequestCancelled: If the request was cancelled; running suggestions stop before their next stage.
+        """
+        start_time = time.time()
+        query_vectors = self._embed_queries(queries)
+        futures = {
+            self.batch_executor.submit(
+                contextvars.copy_context().run,
+                self.suggest_recipe,
+                query,
+                bypass_cache=bypass_cache,
+                servings=servings,
+                degraded=degraded,
+                query_vector=query_vector
+            ): index
+            for index, (query, query_vector) in enumerate(zip(queries, query_vectors))
+        }
+        
+        suggestions: List[Optional[RecipeSuggestionResponse]] = [None] * len(queries)
+        failed = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            error = future.exception()
+            if error is None:
+                suggestions[index] = future.result()
+            succeeded = error is None and bool(suggestions[index].recipe_data)
+            failed += not succeeded
+            BATCH_SUGGESTIONS.labels(outcome="succeeded" if succeeded else "failed").inc()
+            if on_result is not None:
+                on_result(index, suggestions[index], error)
+        
+        total_duration = round((time.time() - start_time) * 1000, 2)
+        logger.info(f"Batch of {len(queries)} recipe suggestions completed in {total_duration}ms, {failed} failed")
+        structured_logger.info(
+            "Batch recipe suggestion completed",
+            extra={
+                'duration_ms': total_duration,
+                'extra_context': {
+                    'operation': 'suggest_recipes',
+                    'queries': len(queries),
+                    'failed': failed,
+                    'embedded': sum(vector is not None for vector in query_vectors)
+                }
+            }
+        )
+        
+        cancel_scope = current_cancel_scope.get()
+        if cancel_scope is not None:
+            cancel_scope.check()
+        return suggestions
+    
+    def _build_llm_router(self, model_name: str, temperature: float) -> LLMRouter:
+        """Create a router over one chat model per backend in LLM_BACKENDS"""
+        backends = []
+        for url in self.backend_urls:
+            name = backend_name(url)
+            backends.append(LLMBackend(
+                name=name,
+                # Fail over to the next backend instead of retrying a failing one
+                runnable=ChatOpenAI(
+                    model=model_name,
+                    temperature=temperature,
+                    api_key=os.getenv("OPEN_WEBUI_API_KEY"),
+                    base_url=url,
+                    max_retries=0,
+                    http_client=self.http_clients.sync_client,
+                    http_async_client=self.http_clients.async_client
+                ),
+                breaker=CircuitBreaker(
+                    name=f"llm:{name}",
+                    failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3")),
+                    reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+                ),
+                latency=LatencyTracker(alpha=float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.3")))
+            ))
+        
+        router = LLMRouter(
+            backends,
+            hedging=os.getenv("LLM_HEDGING", "false").lower() == "true",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "2000")) / 1000
+        )
+        
+        structured_logger.info(
+            f"LLM router configured with {len(backends)} backends",
+            extra={'extra_context': {
+                'component': 'llm_router',
+                'backends': [backend.name for backend in backends],
+                'hedging': router.hedging,
+                'hedge_min_delay_ms': router.hedge_min_delay * 1000
+            }}
+        )
+        return router
+    
+    def _bind_recipe_schema(self, llm, schema: Type[BaseModel] = GeneratedRecipe, name: str = "recipe"):
+        """Bind the OpenAI-compatible response format for recipe generations"""
+        if self.structured_output_mode == "json_schema":
+            return llm.bind(response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": name,
+                    "schema": schema.model_json_schema()
+                }
+            })
+        if self.structured_output_mode == "json_object":
+            return llm.bind(response_format={"type": "json_object"})
+        return llm
+    
+    def _generate_recipe_data(self, prompt: ChatPromptTemplate, variables: Dict[str, Any], operation: str, prompt_type: str) -> Tuple[Dict[str, Any], float, float]:
+        """
+        Generate a recipe with the LLM and validate it against the recipe schema.
+        
+        An invalid generation triggers at most `max_repair_attempts` repair round trips
+        before falling back to the default recipe.
+        
+        Returns:
+            Tuple of (recipe_data, llm_duration_ms, parse_duration_ms).
+        """
+        messages = self._format_prompt(prompt, variables, operation, prompt_type)
+        
+        llm_start = time.time()
+        response, usage = self._call_llm(messages, operation, prompt_type)
+        llm_duration = round((time.time() - llm_start) * 1000, 2)
+        
+        return self._parse_generated_recipe(response, usage, llm_duration, operation, prompt_type)
+    
+    def _generate_recipe_variants(
+        self,
+        prompt: ChatPromptTemplate,
+        variables: Dict[str, Any],
+        operation: str,
+        prompt_type: str,
+        count: int
+    ) -> Tuple[List[Dict[str, Any]], float, float]:
+        """
+        Generate several distinct recipes in one LLM call.
+        
+        The prompt and its context are sent once and the recipes come back as one list. If no
+        recipe in the list is valid, the list is repaired with the variants schema, and the
+        default recipe is used if that fails too. Fewer recipes than requested are logged;
+        callers can tell from the length of the list.
+        
+        Returns:
+            Tuple of (at most `count` recipes, llm_duration_ms including repairs, parse_duration_ms).
+        """
+        messages = self._format_prompt(prompt, variables, operation, prompt_type)
+        latency_class = f"{operation}:{prompt_type}:variants:{count}"
+        
+        llm_start = time.time()
+        response, usage = self._call_llm(messages, operation, prompt_type, self.variants_llm, latency_class)
+        llm_duration = round((time.time() - llm_start) * 1000, 2)
+        
+        parse_start = time.time()
+        with observe_stage("parse", prompt_type):
+            recipes, error = self._try_parse_recipe_variants(response.content)
+        parse_duration = round((time.time() - parse_start) * 1000, 2)
+        RECIPE_PARSE_RESULTS.labels(operation=operation, attempt="initial", outcome="success" if error is None else "failure").inc()
+        
+        previous_output = response.content
+        attempt = 0
+        while error is not None and attempt < self.max_repair_attempts:
+            attempt += 1
+            repair_start = time.time()
+            repair_messages = VARIANTS_REPAIR_PROMPT.format_messages(variants=count, error=error, response=previous_output[:8000])
+            repair_response, repair_usage = self._call_llm(repair_messages, operation, prompt_type, self.variants_llm, latency_class)
+            repair_duration = time.time() - repair_start
+            RECIPE_REPAIR_DURATION.labels(operation=operation).observe(repair_duration)
+            
+            previous_output = repair_response.content
+            with observe_stage("parse", prompt_type):
+                recipes, error = self._try_parse_recipe_variants(previous_output)
+            RECIPE_PARSE_RESULTS.labels(operation=operation, attempt="repair", outcome="success" if error is None else "failure").inc()
+            
+            structured_logger.info(
+                f"Recipe variants repair attempt {attempt} {'succeeded' if error is None else 'failed'}",
+                extra={
+                    'duration_ms': round(repair_duration * 1000, 2),
+                    'extra_context': {
+                        'operation': 'recipe_repair',
+                        'generation_operation': operation,
+                        'prompt_type': prompt_type,
+                        'attempt': attempt,
+                        'variants_requested': count,
+                        'status': 'success' if error is None else 'failed',
+                        'error': error,
+                        **repair_usage
+                    }
+                }
+            )
+            llm_duration = round(llm_duration + repair_duration * 1000, 2)
+        
+        recipes = recipes[:count] if error is None else [self._get_default_recipe_data()]
+        if len(recipes) < count:
+            logger.warning(f"Generated {len(recipes)} of {count} requested recipe variants")
+        
+        structured_logger.info(
+            f"LLM generation of {len(recipes)} recipe variants completed using {prompt_type} prompt",
+            extra={
+                'duration_ms': llm_duration,
+                'extra_context': {
+                    'operation': f'llm_{operation}',
+                    'prompt_type': prompt_type,
+                    'llm_duration_ms': llm_duration,
+                    'variants_requested': count,
+                    'variants_generated': len(recipes),
+                    'repair_attempts': attempt,
+                    'response_length': len(response.content) if response.content else 0,
+                    **usage
+                }
+            }
+        )
+        return recipes, llm_duration, parse_duration
+    
+    def _format_prompt(self, prompt: ChatPromptTemplate, variables: Dict[str, Any], operation: str, prompt_type: str) -> List[BaseMessage]:
+        """Format a prompt into chat messages and record its size"""
+        with observe_stage("prompt_build", prompt_type):
+            messages = prompt.format_messages(**variables)
+            PROMPT_TOKENS.labels(operation=operation, prompt_type=prompt_type).observe(
+                count_tokens(get_buffer_string(messages))
+            )
+        return messages
+    
+    def _parse_generated_recipe(self, response: Any, usage: Dict[str, Any], llm_duration: float, operation: str, prompt_type: str) -> Tuple[Dict[str, Any], float, float]:
+        """
+        Validate a generated recipe against the recipe schema, repairing it if needed.
+        
+        Returns:
+            Tuple of (recipe_data, llm_duration_ms including repairs, parse_duration_ms).
+        """
+        structured_logger.info(
+            f"LLM generation completed using {prompt_type} prompt",
+            extra={
+                'duration_ms': llm_duration,
+                'extra_context': {
+                    'operation': f'llm_{operation}',
+                    'prompt_type': prompt_type,
+                    'llm_duration_ms': llm_duration,
+                    'response_length': len(response.content) if response.content else 0,
+                    **usage
+                }
+            }
+        )
+        
+        # Parse the response to extract recipe data
+        parse_start = time.time()
+        with observe_stage("parse", prompt_type):
+            recipe_data, error = self._try_parse_recipe_response(response.content)
+        parse_duration = round((time.time() - parse_start) * 1000, 2)
+        RECIPE_PARSE_RESULTS.labels(operation=operation, attempt="initial", outcome="success" if error is None else "failure").inc()
+        
+        previous_output = response.content
+        attempt = 0
+        while error is not None and attempt < self.max_repair_attempts:
+            attempt += 1
+            repair_start = time.time()
+            repair_messages = REPAIR_PROMPT.format_messages(error=error, response=previous_output[:4000])
+            repair_response, repair_usage = self._call_llm(repair_messages, operation, prompt_type)
+            repair_duration = time.time() - repair_start
+            RECIPE_REPAIR_DURATION.labels(operation=operation).observe(repair_duration)
+            
+            previous_output = repair_response.content
+            with observe_stage("parse", prompt_type):
+                recipe_data, error = self._try_parse_recipe_response(previous_output)
+            RECIPE_PARSE_RESULTS.labels(operation=operation, attempt="repair", outcome="success" if error is None else "failure").inc()
+            
+            structured_logger.info(
+                f"Recipe repair attempt {attempt} {'succeeded' if error is None else 'failed'}",
+                extra={
+                    'duration_ms': round(repair_duration * 1000, 2),
+                    'extra_context': {
+                        'operation': 'recipe_repair',
+                        'generation_operation': operation,
+                        'prompt_type': prompt_type,
+                        'attempt': attempt,
+                        'status': 'success' if error is None else 'failed',
+                        'error': error,
+                        **repair_usage
+                    }
+                }
+            )
+            llm_duration = round(llm_duration + repair_duration * 1000, 2)
+        
+        if recipe_data is None:
+            recipe_data = self._get_default_recipe_data()
+        
+        return recipe_data, llm_duration, parse_duration
+    
+    def _call_llm(
+        self,
+        messages: List[BaseMessage],
+        operation: str,
+        prompt_type: str,
+        recipe_llm: Any = None,
+        latency_class: Optional[str] = None
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Call the recipe LLM and account for its token usage.
+        
+        Token counts come from the response usage metadata, or are counted locally if the
+        backend does not report them. With LLM_STREAMING enabled, time to first token and
+        output tokens per second are measured as well.
+        
+        Args:
+            messages: Prompt messages.
+            operation: Operation name for metrics and logs.
+            prompt_type: Prompt type for metrics and logs.
+            recipe_llm: Model bound to the expected output schema, `recipe_llm` by default.
+            latency_class: Limiter latency class of calls with comparable output, "operation:prompt_type" by default.
+        
+        Returns:
+            Tuple of (response message, usage fields for the structured log).
+        """
+        recipe_llm = recipe_llm or self.recipe_llm
+        latency_class = latency_class or f"{operation}:{prompt_type}"
+        # Requests always have a cancel scope, so their calls run on the LLM event loop with the
+        # async client. The blocking call below only serves callers outside a request (scripts,
+        # benchmarks, tests) without an LLM budget, which have nothing to cancel.
+        cancel_scope = current_cancel_scope.get()
+        if cancel_scope is not None or self.stage_timeouts["llm_call"]:
+            return self._call_llm_cancellable(messages, operation, prompt_type, cancel_scope, recipe_llm, latency_class)
+        
+        permit = self._acquire_llm_permit(prompt_type, None, latency_class)
+        start_time = time.perf_counter()
+        first_token_time = None
+        
+        try:
+            with observe_stage("llm_call", prompt_type):
+                trace.get_current_span().set_attributes({"genai.operation": operation, "genai.streaming": self.streaming})
+                if self.streaming:
+                    response = None
+                    for chunk in recipe_llm.stream(messages):
+                        if first_token_time is None and chunk.content:
+                            first_token_time = time.perf_counter()
+                        response = chunk if response is None else response + chunk
+                    if response is None:
+                        response = AIMessage(content="")
+                else:
+                    response = recipe_llm.invoke(messages)
+        except Exception:
+            self._finish_llm_call(permit, "error")
+            raise
+        except BaseException:
+            self._finish_llm_call(permit, "cancelled")
+            raise
+        self._finish_llm_call(permit, "success")
+        end_time = time.perf_counter()
+        
+        return response, self._record_llm_usage(messages, response, operation, prompt_type, start_time, first_token_time, end_time)
+    
+    def _call_llm_cancellable(
+        self,
+        messages: List[BaseMessage],
+        operation: str,
+        prompt_type: str,
+        cancel_scope: Optional[CancelScope],
+        recipe_llm: Any = None,
+        latency_class: str = "default"
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Run `_acall_llm` on the LLM event loop, so that the call can be cancelled with its request or at its budget"""
+        if cancel_scope is not None:
+            cancel_scope.check()
+        permit = self._acquire_llm_permit(prompt_type, cancel_scope, latency_class)
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._acall_llm(messages, operation, prompt_type, recipe_llm), self._get_llm_runtime().loop)
+        except BaseException:
+            self._finish_llm_call(permit, "cancelled")
+            raise
+        future.add_done_callback(lambda done: self._finish_llm_call(permit, future_outcome(done)))
+        return self._wait_for_llm(future, cancel_scope, self.stage_timeouts["llm_call"] or None)
+    
+    def _acquire_llm_permit(
+        self,
+        prompt_type: str,
+        cancel_scope: Optional[CancelScope],
+        latency_class: str = "default"
+    ) -> Optional[LimiterPermit]:
+        """
+        Wait in the LLM limiter's queue for a concurrency permit, at most until the request's deadline.
+        
+        Returns:
+            The permit, None if the limiter is disabled.
+        
+        Raises:
+            LimitExceededError: If the call was shed.
+            RequestCancelled: If the request was cancelled while queued.
+        """
+        if self.llm_limiter is None:
+            return None
+        
+        with observe_stage("llm_queue", prompt_type):
+            if cancel_scope is None:
+                return self.llm_limiter.acquire(latency_class=latency_class)
+            
+            remaining = cancel_scope.remaining()
+            timeout = self.llm_limiter.queue_timeout if remaining is None else min(remaining, self.llm_limiter.queue_timeout)
+            remove_callback = cancel_scope.on_cancel(self.llm_limiter.wake)
+            try:
+                return self.llm_limiter.acquire(timeout, aborted=lambda: cancel_scope.reason is not None, latency_class=latency_class)
+            except LimitExceededError:
+                # A request whose deadline passed in the queue is cancelled rather than shed
+                cancel_scope.check()
+                raise
+            finally:
+                remove_callback()
+    
+    def _finish_llm_call(self, permit: Optional[LimiterPermit], outcome: str) -> None:
+        """Release an LLM call's concurrency permit and record its outcome (success, error or cancelled)"""
+        if permit is not None:
+            permit.release(outcome)
+        if self.llm_breaker is not None:
+            if outcome == "success":
+                self.llm_breaker.record_success()
+            elif outcome == "error":
+                self.llm_breaker.record_failure()
+    
+    def _llm_breakers(self) -> List[CircuitBreaker]:
+        """Circuit breakers of the LLM backends"""
+        if self.llm_router is not None:
+            return [backend.breaker for backend in self.llm_router.backends]
+        return [self.llm_breaker] if self.llm_breaker is not None else []
+    
+    def _wait_for_llm(self, future: Future, cancel_scope: Optional[CancelScope], budget: Optional[float] = None) -> Any:
+        """
+        Wait for an LLM call running on the LLM event loop, at most until the request's deadline
+        or for `budget` seconds.
+        
+        The call is cancelled, and its connection released, when the deadline passes, the
+        budget is exhausted or the request is cancelled otherwise (e.g. the client disconnected).
+        
+        Raises:
+            RequestCancelled: If the request was cancelled before the call finished.
+            StageTimeoutError: If the call did not finish within its budget.
+        """
+        if cancel_scope is None and budget is None:
+            return future.result()
+        
+        remaining = cancel_scope.remaining() if cancel_scope is not None else None
+        deadline_first = remaining is not None and (budget is None or remaining <= budget)
+        if deadline_first:
+            timeout = remaining
+        else:
+            timeout = max(budget, 0.0) if budget is not None else None
+        
+        remove_callback = cancel_scope.on_cancel(future.cancel) if cancel_scope is not None else None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if deadline_first:
+                # Cancel the scope first, so that it records the stage that was running
+                cancel_scope.cancel("deadline")
+                future.cancel()
+                raise RequestCancelled(cancel_scope.reason, cancel_scope.stage)
+            future.cancel()
+            raise StageTimeoutError("llm_call", budget)
+        except FutureCancelledError:
+            if cancel_scope is None:
+                raise
+            raise RequestCancelled(cancel_scope.reason or "cancelled", cancel_scope.stage)
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+    
+    def _run_stage(self, stage: str, func, *args, **kwargs):
+        """
+        Run a blocking pipeline stage, waiting at most for its budget in `stage_timeouts`.
+        
+        The call runs in the stage pool in a copy of the request's context. A call that
+        exceeds its budget keeps running in the background, but its result is not used.
+        
+        Raises:
+            StageTimeoutError: If the stage did not finish within its budget.
+            RequestCancelled: If the request's deadline passed first.
+        """
+        budget = self.stage_timeouts.get(stage)
+        if not budget:
+            return func(*args, **kwargs)
+        
+        cancel_scope = current_cancel_scope.get()
+        remaining = cancel_scope.remaining() if cancel_scope is not None else None
+        future = self.stage_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        try:
+            return future.result(timeout=budget if remaining is None else min(budget, remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            if cancel_scope is not None:
+                cancel_scope.check()
+            raise StageTimeoutError(stage, budget)
+    
+    def _record_fallback(self, stage: str, fallback: str) -> None:
+        """Count and log the fallback used for a stage that exceeded its budget"""
+        STAGE_TIMEOUTS.labels(stage=stage, fallback=fallback).inc()
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.record_fallback(stage, fallback)
+        logger.warning(f"Stage {stage} exceeded its budget, falling back to {fallback}")
+        structured_logger.warning(
+            f"Stage {stage} timed out, fallback: {fallback}",
+            extra={'extra_context': {
+                'operation': 'stage_timeout',
+                'stage': stage,
+                'fallback': fallback,
+                'budget_ms': round(self.stage_timeouts.get(stage, 0.0) * 1000, 2)
+            }}
+        )
+    
+    def _get_llm_runtime(self) -> _EventLoopThread:
+        """Event loop for cancellable LLM calls, started on first use"""
+        if self.llm_runtime is None:
+            with self._llm_runtime_lock:
+                if self.llm_runtime is None:
+                    self.llm_runtime = _EventLoopThread()
+        return self.llm_runtime
+    
+    async def _acall_llm(self, messages: List[BaseMessage], operation: str, prompt_type: str, recipe_llm: Any = None) -> Tuple[Any, Dict[str, Any]]:
+        """Async variant of `_call_llm`, which can be cancelled while the request is in flight"""
+        recipe_llm = recipe_llm or self.recipe_llm
+        start_time = time.perf_counter()
+        first_token_time = None
+        
+        with observe_stage("llm_call", prompt_type):
+            trace.get_current_span().set_attributes({"genai.operation": operation, "genai.streaming": self.streaming})
+            if self.streaming:
+                response = None
+                async for chunk in recipe_llm.astream(messages):
+                    if first_token_time is None and chunk.content:
+                        first_token_time = time.perf_counter()
+                    response = chunk if response is None else response + chunk
+                if response is None:
+                    response = AIMessage(content="")
+            else:
+                response = await recipe_llm.ainvoke(messages)
+        end_time = time.perf_counter()
+        
+        return response, self._record_llm_usage(messages, response, operation, prompt_type, start_time, first_token_time, end_time)
+    
+    def _record_llm_usage(
+        self,
+        messages: List[BaseMessage],
+        response: Any,
+        operation: str,
+        prompt_type: str,
+        start_time: float,
+        first_token_time: Optional[float],
+        end_time: float
+    ) -> Dict[str, Any]:
+        """Account for the token usage and speed of a finished LLM call, returns the usage log fields"""
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if isinstance(usage_metadata, dict) and usage_metadata.get("output_tokens") is not None:
+            prompt_tokens = usage_metadata.get("input_tokens", 0)
+            completion_tokens = usage_metadata["output_tokens"]
+            token_source = "usage"
+        else:
+            prompt_tokens = count_tokens(get_buffer_string(messages))
+            completion_tokens = count_tokens(response.content) if isinstance(response.content, str) else 0
+            token_source = "estimate"
+        
+        LLM_TOKENS.labels(operation=operation, prompt_type=prompt_type, kind="prompt", source=token_source).inc(prompt_tokens)
+        LLM_TOKENS.labels(operation=operation, prompt_type=prompt_type, kind="completion", source=token_source).inc(completion_tokens)
+        LLM_COMPLETION_TOKENS.labels(operation=operation, prompt_type=prompt_type).observe(completion_tokens)
+        
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'token_source': token_source
+        }
+        
+        if first_token_time is not None:
+            ttft = first_token_time - start_time
+            generation_seconds = end_time - first_token_time
+            LLM_TIME_TO_FIRST_TOKEN.labels(operation=operation, prompt_type=prompt_type).observe(ttft)
+            usage['ttft_ms'] = round(ttft * 1000, 2)
+            if generation_seconds > 0 and completion_tokens:
+                tokens_per_second = completion_tokens / generation_seconds
+                LLM_OUTPUT_TOKENS_PER_SECOND.labels(operation=operation, prompt_type=prompt_type).observe(tokens_per_second)
+                usage['tokens_per_second'] = round(tokens_per_second, 2)
+        
+        self.llm_latency.observe(end_time - start_time)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.record_llm_call(prompt_tokens, completion_tokens)
+        
+        return usage
+    
+    def _start_speculation(self, message: str) -> Optional["SpeculativeGeneration"]:
+        """Start a standalone creation on the speculation event loop while retrieval runs"""
+        # Speculation never queues for the LLM: it only runs when a concurrency permit is free
+        permit = None
+        if self.llm_limiter is not None:
+            permit = self.llm_limiter.try_acquire("recipe_creation:standalone")
+            if permit is None:
+                logger.info("Skipping speculative generation, LLM concurrency limit reached")
+                return None
+        
+        try:
+            messages = self._format_prompt(CREATION_STANDALONE_PROMPT, {"query": message}, "recipe_creation", "standalone")
+            # The call runs in a copy of this request's context, so its stage, span and tokens count for the request
+            future = asyncio.run_coroutine_threadsafe(
+                self._acall_llm(messages, "recipe_creation", "standalone"), self._get_llm_runtime().loop
+            )
+        except Exception as e:
+            logger.warning(f"Failed to start speculative generation: {e}")
+            if permit is not None:
+                permit.release("cancelled")
+            return None
+        
+        future.add_done_callback(lambda done: self._finish_llm_call(permit, future_outcome(done)))
+        # A cancelled request also cancels its speculative generation
+        cancel_scope = current_cancel_scope.get()
+        if cancel_scope is not None:
+            cancel_scope.on_cancel(future.cancel)
+        return SpeculativeGeneration(future=future, started=time.perf_counter())
+    
+    def _resolve_speculation(self, speculation: "SpeculativeGeneration", has_good_context: bool) -> Optional[Tuple[Dict[str, Any], float, float]]:
+        """
+        Use or cancel a speculative standalone generation once retrieval is done.
+        
+        Good context that arrived within `speculation_max_wait` seconds wins: the standalone
+        call is cancelled and the caller generates with the context-aware prompt. Otherwise
+        the standalone result is used.
+        
+        Returns:
+            Tuple of (recipe_data, llm_duration_ms, parse_duration_ms), or None if the caller should generate.
+        """
+        retrieval_seconds = time.perf_counter() - speculation.started
+        
+        if has_good_context and retrieval_seconds <= self.speculation_max_wait:
+            speculation.future.cancel()
+            SPECULATIVE_GENERATIONS.labels(outcome="restarted").inc()
+            SPECULATION_WASTED.inc(retrieval_seconds)
+            outcome = "restarted"
+            result = None
+        else:
+            # The speculative call's budget started with the call
+            budget = self.stage_timeouts["llm_call"]
+            budget = budget - (time.perf_counter() - speculation.started) if budget else None
+            try:
+                response, usage = self._wait_for_llm(speculation.future, current_cancel_scope.get(), budget)
+            except StageTimeoutError:
+                SPECULATIVE_GENERATIONS.labels(outcome="failed").inc()
+                raise
+            except Exception as e:
+                logger.warning(f"Speculative generation failed, generating again: {e}")
+                SPECULATIVE_GENERATIONS.labels(outcome="failed").inc()
+                outcome = "failed"
+                result = None
+            else:
+                outcome = "used_late_context" if has_good_context else "used"
+                SPECULATIVE_GENERATIONS.labels(outcome=outcome).inc()
+                SPECULATION_SAVED.inc(retrieval_seconds)
+                llm_duration = round((time.perf_counter() - speculation.started) * 1000, 2)
+                result = self._parse_generated_recipe(response, usage, llm_duration, "recipe_creation", "standalone")
+        
+        structured_logger.info(
+            f"Speculative generation {outcome}",
+            extra={
+                'duration_ms': round(retrieval_seconds * 1000, 2),
+                'extra_context': {
+                    'operation': 'speculative_generation',
+                    'outcome': outcome,
+                    'has_good_context': has_good_context,
+                    'retrieval_ms': round(retrieval_seconds * 1000, 2),
+                    'max_wait_ms': round(self.speculation_max_wait * 1000, 2)
+                }
+            }
+        )
+        return result
+    
+    def _build_suggestion_response(self, query: str, recipe_data: Any, variants_requested: Optional[int] = None) -> RecipeSuggestionResponse:
+        """Wrap suggested recipe data, or a list of recipe variants, in a suggestion response"""
+        if isinstance(recipe_data, list):
+            response = self._build_suggestion_response(query, recipe_data[0])
+            response.variants = recipe_data
+            response.variants_requested = variants_requested
+            if variants_requested is not None and len(recipe_data) < variants_requested:
+                response.suggestion = f"I could only create {len(recipe_data)} of the {variants_requested} different recipe suggestions you asked for based on your request: '{query}'."
+            elif len(recipe_data) > 1:
+                response.suggestion = f"I've created {len(recipe_data)} different recipe suggestions for you based on your request: '{query}'. Pick the one you like best!"
+            return response
+        return RecipeSuggestionResponse(
+            suggestion=f"I've created a unique recipe suggestion for you based on your request: '{query}'. This recipe combines creativity with practicality!",
+            recipe_data=recipe_data
+        )
+    
+    def _build_degraded_suggestion(
+        self,
+        query: str,
+        search_results: List[Document],
+        servings: Optional[int],
+        reason: str,
+        start_time: float
+    ) -> Optional[RecipeSuggestionResponse]:
+        """Suggest the nearest retrieved recipe without the LLM, None if no retrieved recipe is usable"""
+        document = self.degraded_mode.nearest_recipe(search_results)
+        if document is None:
+            return None
+        
+        recipe_data = self.degraded_mode.build_recipe(document, servings)
+        source_recipe_id = document.metadata.get("recipe_id")
+        DEGRADED_RESPONSES.labels(reason=reason).inc()
+        
+        total_duration = round((time.time() - start_time) * 1000, 2)
+        structured_logger.info(
+            f"Recipe suggestion degraded ({reason})",
+            extra={
+                'duration_ms': total_duration,
+                'extra_context': {
+                    'operation': 'suggest_recipe',
+                    'degraded_reason': reason,
+                    'source_recipe_id': source_recipe_id,
+                    'recipe_title': recipe_data['title'],
+                    'servings': recipe_data['servingSize']
+                }
+            }
+        )
+        
+        return RecipeSuggestionResponse(
+            suggestion=f"Our recipe assistant is busy right now, so here is a similar recipe from our collection for '{query}': {recipe_data['title']}.",
+            recipe_data=recipe_data,
+            degraded={"reason": reason, "source_recipe_id": source_recipe_id}
+        )
+    
+    def _build_creation_response(self, message: str, recipe_data: Dict[str, Any]) -> ChatResponse:
+        """Wrap created recipe data in a chat response"""
+        return ChatResponse(
+            reply=f"I've created a unique recipe for you based on your request: '{message}'. This recipe combines creativity with practicality - you can now create it using the 'Create Recipe' button!",
+            sources=None,
+            recipe_suggestion=recipe_data
+        )
+    
+    def _embed_query(self, text: str):
+        """Embed a query once for the semantic cache and retrieval, or return None if embedding fails"""
+        try:
+            return self._run_stage("embedding", self.rag_helper.embed_query, text)
+        except StageTimeoutError:
+            # The semantic cache is skipped and the search embeds the query under its own budget
+            self._record_fallback("embedding", "skip_cache")
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to embed query, retrieval will embed it again: {e}")
+            return None
+    
+    def _embed_queries(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """Embed several queries in one forward pass; without embeddings each suggestion embeds its own query"""
+        try:
+            return self._run_stage("embedding", self.rag_helper.embed_queries, queries)
+        except StageTimeoutError:
+            self._record_fallback("embedding", "per_query")
+        except Exception as e:
+            logger.warning(f"Failed to embed batch queries, embedding them one by one: {e}")
+        return [None] * len(queries)
+    
+    def _is_cacheable(self, recipe_data: Dict[str, Any]) -> bool:
+        """Only successfully parsed recipes are cached, never the fallback recipe"""
+        return bool(recipe_data) and recipe_data.get("title") != DEFAULT_RECIPE_TITLE
+    
     def _prepare_recipe_content(self, recipe: RecipeData) -> str:
         """Prepare recipe content for vectorization"""
         content_parts = [
@@ -608,26 +1813,36 @@ class RecipeLLM:
         
         return "\n\n".join(content_parts)
     
-    def _prepare_search_context(self, search_results: List[Document]) -> str:
-        """Prepare context from search results for LLM"""
-        if not search_results:
-            return "No relevant recipes found."
+    def _prepare_search_context(self, search_results: List[Document], operation: str = "chat") -> str:
+        """Prepare context from search results for LLM, fitted to the context token budget"""
+        with observe_stage("prompt_build"):
+            built = self.context_builder.build(search_results)
         
-        context_parts = []
-        for i, doc in enumerate(search_results, 1):
-            context_parts.append(f"Recipe {i}:\n{doc.page_content}")
+        PROMPT_CONTEXT_TOKENS.labels(operation=operation).observe(built.tokens)
+        PROMPT_CONTEXT_TOKENS_SAVED.labels(operation=operation).observe(built.tokens_saved)
         
-        return "\n\n".join(context_parts)
+        if built.tokens_saved:
+            structured_logger.info(
+                f"Search context trimmed to token budget, saved {built.tokens_saved} tokens",
+                extra={'extra_context': {
+                    'operation': 'context_budget',
+                    'context_operation': operation,
+                    'token_budget': self.context_builder.token_budget,
+                    'context_tokens': built.tokens,
+                    'full_context_tokens': built.full_tokens,
+                    'tokens_saved': built.tokens_saved,
+                    'documents_included': built.documents_included,
+                    'documents_total': built.documents_total,
+                    'steps_omitted': built.steps_omitted
+                }}
+            )
+        
+        return built.text
     
     def _is_recipe_creation_request(self, message: str) -> bool:
         """Determine if the user wants to create a recipe"""
-        creation_keywords = [
-            "create", "make", "generate", "new recipe", "recipe for",
-            "how to make", "how to cook", "recipe idea", "suggest recipe"
-        ]
-        
         message_lower = message.lower()
-        is_creation = any(keyword in message_lower for keyword in creation_keywords)
+        is_creation = any(keyword in message_lower for keyword in CREATION_KEYWORDS)
         
         logger.debug(f"Recipe creation request analysis: {is_creation} for message: {message[:50]}...")
         
@@ -683,13 +1898,7 @@ class RecipeLLM:
                 recipe_suggestion=None
             )
         
-        # Extract recipe IDs from search results
-        recipe_ids = []
-        for doc in search_results:
-            combined_id = doc.metadata.get("recipe_id", "")
-            if combined_id:
-                # Ensure it's a string
-                recipe_ids.append(str(combined_id))
+        recipe_ids = self._recipe_ids(search_results)
         
         logger.info(f"Found {len(recipe_ids)} recipe IDs for search request: {recipe_ids}")
         structured_logger.info(
@@ -707,8 +1916,33 @@ class RecipeLLM:
             recipe_suggestion=None
         )
     
-    def _handle_recipe_creation(self, message: str, context: str) -> ChatResponse:
-        """Handle recipe creation requests with improved creativity and context handling"""
+    @staticmethod
+    def _recipe_ids(search_results: List[Document]) -> List[str]:
+        """Recipe IDs of search results, once per recipe in ranking order"""
+        recipe_ids = []
+        for doc in search_results:
+            combined_id = doc.metadata.get("recipe_id", "")
+            if combined_id and str(combined_id) not in recipe_ids:
+                # Ensure it's a string
+                recipe_ids.append(str(combined_id))
+        return recipe_ids
+    
+    def _handle_recipe_creation(
+        self,
+        message: str,
+        context: str,
+        speculation: Optional["SpeculativeGeneration"] = None,
+        search_results: Optional[List[Document]] = None
+    ) -> ChatResponse:
+        """
+        Handle recipe creation requests with improved creativity and context handling.
+        
+        Args:
+            message: The user's creation request.
+            context: Prompt context built from the retrieved recipes.
+            speculation: Standalone generation started before retrieval, if speculative generation is enabled.
+            search_results: Retrieved recipes, returned as sources if generation exceeds its budget.
+        """
         start_time = time.time()
         
         try:
@@ -727,102 +1961,20 @@ class RecipeLLM:
                 }}
             )
             
-            if has_good_context:
-                # Use context-aware prompt when we have good recipes
-                prompt_type = "context_aware"
-                prompt = ChatPromptTemplate.from_template("""
-                You are a creative and experienced chef assistant. The user wants to create a new recipe based on their request.
-                
-                User Request: {query}
-                Available Recipe Context: {context}
-                
-                Create an innovative recipe that:
-                1. Directly addresses the user's request
-                2. Takes inspiration from the available recipes but adds your own creative twist
-                3. Uses modern cooking techniques and flavor combinations
-                4. Is practical and achievable for home cooks
-                5. Has clear, detailed instructions
-                
-                Be creative! Don't just copy the existing recipes - use them as inspiration to create something new and exciting.
-                
-                Return a complete recipe in this JSON format:
-                {{
-                    "title": "Creative and descriptive recipe title",
-                    "description": "Appetizing description explaining what makes this recipe special",
-                    "servingSize": 4,
-                    "recipeIngredients": [
-                        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}},
-                        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}}
-                    ],
-                    "recipeSteps": [
-                        {{"order": 1, "details": "Detailed step with cooking tips and techniques"}},
-                        {{"order": 2, "details": "Detailed step with cooking tips and techniques"}}
-                    ]
-                }}
-                
-                Make the recipe unique and creative while being practical. Use specific ingredients and detailed steps.
-                """)
-            else:
-                # Use creative standalone prompt when no good context is available
-                prompt_type = "standalone"
-                prompt = ChatPromptTemplate.from_template("""
-                You are a master chef with decades of culinary experience. The user wants to create a new recipe, but we don't have many relevant examples to work with. This is your chance to be truly creative!
-                
-                User Request: {query}
-                
-                Create an innovative, delicious recipe that:
-                1. Directly fulfills the user's request
-                2. Uses your culinary expertise to create something unique
-                3. Incorporates modern cooking techniques and flavor profiles
-                4. Is practical for home cooking
-                5. Has clear, detailed instructions that any cook can follow
-                
-                Be bold and creative! Think outside the box and create something that will impress. Use interesting ingredient combinations, cooking methods, and presentation ideas.
-                
-                Return a complete recipe in this JSON format:
-                {{
-                    "title": "Creative and descriptive recipe title",
-                    "description": "Appetizing description explaining what makes this recipe special and unique",
-                    "servingSize": 4,
-                    "recipeIngredients": [
-                        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}},
-                        {{"name": "specific ingredient name", "unit": "measurement unit", "amount": numeric_amount}}
-                    ],
-                    "recipeSteps": [
-                        {{"order": 1, "details": "Detailed step with cooking tips, techniques, and timing"}},
-                        {{"order": 2, "details": "Detailed step with cooking tips, techniques, and timing"}}
-                    ]
-                }}
-                
-                Make this recipe memorable and delicious. Use specific measurements, cooking times, and helpful tips.
-                """)
+            # Use the context-aware prompt when we have good recipes, the creative standalone prompt otherwise
+            prompt_type = "context_aware" if has_good_context else "standalone"
+            prompt = CREATION_CONTEXT_PROMPT if has_good_context else CREATION_STANDALONE_PROMPT
             
-            # Generate LLM response
-            llm_start = time.time()
-            chain = prompt | self.llm
-            response = chain.invoke({
-                "query": message,
-                "context": context
-            })
-            llm_duration = round((time.time() - llm_start) * 1000, 2)
-            
-            structured_logger.info(
-                f"LLM recipe creation completed using {prompt_type} prompt",
-                extra={
-                    'duration_ms': llm_duration,
-                    'extra_context': {
-                        'operation': 'llm_recipe_creation',
-                        'prompt_type': prompt_type,
-                        'llm_duration_ms': llm_duration,
-                        'response_length': len(response.content) if response.content else 0
-                    }
-                }
-            )
-            
-            # Parse the response to extract recipe data
-            parse_start = time.time()
-            recipe_data = self._parse_recipe_response(response.content)
-            parse_duration = round((time.time() - parse_start) * 1000, 2)
+            # Use the speculative standalone generation unless good context arrived in time
+            generated = self._resolve_speculation(speculation, has_good_context) if speculation is not None else None
+            if generated is not None:
+                prompt_type = "standalone"
+                recipe_data, llm_duration, parse_duration = generated
+            else:
+                # Generate and parse the recipe
+                recipe_data, llm_duration, parse_duration = self._generate_recipe_data(
+                    prompt, {"query": message, "context": context}, "recipe_creation", prompt_type
+                )
             
             total_duration = round((time.time() - start_time) * 1000, 2)
             
@@ -842,10 +1994,19 @@ class RecipeLLM:
                 }
             )
             
+            return self._build_creation_response(message, recipe_data)
+        
+        except LimitExceededError:
+            raise
+        
+        except StageTimeoutError as e:
+            # Answer with the recipes found so far instead of an error
+            sources = self._recipe_ids(search_results or [])
+            self._record_fallback(e.stage, "sources" if sources else "retry_reply")
             return ChatResponse(
-                reply=f"I've created a unique recipe for you based on your request: '{message}'. This recipe combines creativity with practicality - you can now create it using the 'Create Recipe' button!",
-                sources=None,
-                recipe_suggestion=recipe_data
+                reply=CREATION_TIMEOUT_SOURCES_REPLY if sources else CREATION_TIMEOUT_REPLY,
+                sources=sources or None,
+                recipe_suggestion=None
             )
             
         except Exception as e:
@@ -871,6 +2032,16 @@ class RecipeLLM:
     
     def _parse_recipe_response(self, response_content: str) -> Dict[str, Any]:
         """Parse LLM response to extract recipe data with improved validation and fallback"""
+        recipe_data, _ = self._try_parse_recipe_response(response_content)
+        return recipe_data if recipe_data is not None else self._get_default_recipe_data()
+    
+    def _try_parse_recipe_response(self, response_content: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Parse LLM output and validate it against the recipe schema.
+        
+        Returns:
+            Tuple of (recipe_data, None) on success or (None, error) on failure.
+        """
         parse_start = time.time()
         
         try:
@@ -879,111 +2050,46 @@ class RecipeLLM:
             # Clean the response - remove any non-JSON text
             response_content = response_content.strip()
             
-            # Try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
-            if json_match:
-                recipe_json = json_match.group()
-                parsed_data = json.loads(recipe_json)
-                
-                # Validate and enhance required fields
-                required_fields = ["title", "description", "servingSize", "recipeIngredients", "recipeSteps", "tags"]
-                for field in required_fields:
-                    if field not in parsed_data:
-                        logger.warning(f"Missing required field: {field}")
-                        if field == "description":
-                            parsed_data[field] = "A delicious recipe created just for you"
-                        elif field in ["recipeIngredients", "recipeSteps", "tags"]:
-                            parsed_data[field] = []
-                        elif field == "servingSize":
-                            parsed_data[field] = 4
-                        elif field == "title":
-                            parsed_data[field] = "Creative Recipe"
-                
-                # Validate and clean up ingredients
-                if "recipeIngredients" in parsed_data:
-                    ingredients = parsed_data["recipeIngredients"]
-                    if not isinstance(ingredients, list):
-                        parsed_data["recipeIngredients"] = []
-                    else:
-                        # Clean up ingredient entries
-                        cleaned_ingredients = []
-                        for ing in ingredients:
-                            if isinstance(ing, dict) and "name" in ing:
-                                cleaned_ing = {
-                                    "name": str(ing.get("name", "")).strip(),
-                                    "unit": str(ing.get("unit", "")).strip(),
-                                    "amount": ing.get("amount", 1)
-                                }
-                                if cleaned_ing["name"]:  # Only add if name is not empty
-                                    cleaned_ingredients.append(cleaned_ing)
-                        parsed_data["recipeIngredients"] = cleaned_ingredients
-                
-                # Validate and clean up steps
-                if "recipeSteps" in parsed_data:
-                    steps = parsed_data["recipeSteps"]
-                    if not isinstance(steps, list):
-                        parsed_data["recipeSteps"] = []
-                    else:
-                        # Clean up step entries
-                        cleaned_steps = []
-                        for i, step in enumerate(steps, 1):
-                            if isinstance(step, dict) and "details" in step:
-                                cleaned_step = {
-                                    "order": i,
-                                    "details": str(step.get("details", "")).strip()
-                                }
-                                if cleaned_step["details"]:  # Only add if details is not empty
-                                    cleaned_steps.append(cleaned_step)
-                        parsed_data["recipeSteps"] = cleaned_steps
-                
-                # Validate and clean up tags
-                if "tags" in parsed_data:
-                    tags = parsed_data["tags"]
-                    if not isinstance(tags, list):
-                        parsed_data["tags"] = []
-                    else:
-                        # Clean up tags
-                        cleaned_tags = [str(tag).strip() for tag in tags if str(tag).strip()]
-                        parsed_data["tags"] = cleaned_tags
-                
-                # Ensure title and description are meaningful
-                if not parsed_data.get("title") or parsed_data["title"] in ["Recipe Title", "Creative Recipe"]:
-                    parsed_data["title"] = "Delicious Homemade Recipe"
-                
-                if not parsed_data.get("description") or parsed_data["description"] in ["Recipe description", "A delicious recipe created just for you"]:
-                    parsed_data["description"] = "A carefully crafted recipe with fresh ingredients and delicious flavors"
-                
-                parse_duration = round((time.time() - parse_start) * 1000, 2)
-                
-                logger.info(f"Successfully parsed recipe response in {parse_duration}ms")
-                structured_logger.info(
-                    "Recipe response parsing completed successfully",
-                    extra={
-                        'duration_ms': parse_duration,
-                        'extra_context': {
+            # Structured output returns a bare JSON object, other completions may wrap it in text
+            try:
+                parsed_data = json.loads(response_content)
+            except json.JSONDecodeError:
+                json_match = re.search(r'\{.*\}', response_content, re.DOTALL)
+                if not json_match:
+                    logger.error("No JSON found in LLM response")
+                    structured_logger.error(
+                        "Recipe response parsing failed - no JSON found",
+                        extra={'extra_context': {
                             'operation': 'parse_recipe_response',
-                            'recipe_title': parsed_data.get('title', 'unknown'),
-                            'ingredient_count': len(parsed_data.get('recipeIngredients', [])),
-                            'step_count': len(parsed_data.get('recipeSteps', [])),
-                            'original_response_length': len(response_content)
-                        }
-                    }
-                )
-                
-                return parsed_data
-            else:
-                logger.error("No JSON found in LLM response")
-                structured_logger.error(
-                    "Recipe response parsing failed - no JSON found",
-                    extra={'extra_context': {
+                            'error': 'no_json_found',
+                            'response_length': len(response_content)
+                        }}
+                    )
+                    return None, "The response did not contain a JSON object"
+                parsed_data = json.loads(json_match.group())
+            
+            # Validate against the schema derived from RecipeDetailsDTO
+            parsed_data = self._clean_generated_recipe(parsed_data)
+            
+            parse_duration = round((time.time() - parse_start) * 1000, 2)
+            
+            logger.info(f"Successfully parsed recipe response in {parse_duration}ms")
+            structured_logger.info(
+                "Recipe response parsing completed successfully",
+                extra={
+                    'duration_ms': parse_duration,
+                    'extra_context': {
                         'operation': 'parse_recipe_response',
-                        'error': 'no_json_found',
-                        'response_length': len(response_content)
-                    }}
-                )
-                return self._get_default_recipe_data()
-                
+                        'recipe_title': parsed_data['title'],
+                        'ingredient_count': len(parsed_data['recipeIngredients']),
+                        'step_count': len(parsed_data['recipeSteps']),
+                        'original_response_length': len(response_content)
+                    }
+                }
+            )
+            
+            return parsed_data, None
+            
         except json.JSONDecodeError as e:
             parse_duration = round((time.time() - parse_start) * 1000, 2)
             logger.error(f"Invalid JSON in LLM response: {e}", exc_info=True)
@@ -999,7 +2105,23 @@ class RecipeLLM:
                     }
                 }
             )
-            return self._get_default_recipe_data()
+            return None, f"Invalid JSON: {str(e)}"
+        except (ValidationError, ValueError) as e:
+            parse_duration = round((time.time() - parse_start) * 1000, 2)
+            logger.error(f"LLM response does not match the recipe schema: {e}")
+            structured_logger.error(
+                "Recipe response parsing failed - schema validation error",
+                extra={
+                    'duration_ms': parse_duration,
+                    'extra_context': {
+                        'operation': 'parse_recipe_response',
+                        'error': 'schema_validation_failed',
+                        'error_details': str(e),
+                        'response_length': len(response_content)
+                    }
+                }
+            )
+            return None, f"Schema validation failed: {str(e)}"
         except Exception as e:
             parse_duration = round((time.time() - parse_start) * 1000, 2)
             logger.error(f"Error parsing recipe response: {e}", exc_info=True)
@@ -1015,13 +2137,147 @@ class RecipeLLM:
                     }
                 }
             )
-            return self._get_default_recipe_data()
+            return None, str(e)
+    
+    def _parse_recipe_variants(self, response_content: str) -> List[Dict[str, Any]]:
+        """Parse an LLM response with several recipes, falling back to the default recipe if none is valid"""
+        recipes, _ = self._try_parse_recipe_variants(response_content)
+        return recipes or [self._get_default_recipe_data()]
+    
+    def _try_parse_recipe_variants(self, response_content: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Parse LLM output with several recipes and validate each against the recipe schema.
+        
+        Accepts a {"recipes": [...]} object, a bare list or a single recipe object. Invalid
+        recipes are dropped, as are recipes with the title of an earlier one.
+        
+        Returns:
+            Tuple of (recipes, None) if at least one recipe is valid, or ([], error) otherwise.
+        """
+        parse_start = time.time()
+        response_content = response_content.strip()
+        
+        try:
+            parsed_data = json.loads(response_content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'[\[{].*[\]}]', response_content, re.DOTALL)
+            if not json_match:
+                return [], "The response did not contain a JSON object"
+            try:
+                parsed_data = json.loads(json_match.group())
+            except json.JSONDecodeError as e:
+                return [], f"Invalid JSON: {str(e)}"
+        
+        if isinstance(parsed_data, dict) and isinstance(parsed_data.get("recipes"), list):
+            candidates = parsed_data["recipes"]
+        elif isinstance(parsed_data, list):
+            candidates = parsed_data
+        else:
+            candidates = [parsed_data]
+        
+        recipes = []
+        titles = set()
+        errors = []
+        for candidate in candidates:
+            try:
+                recipe = self._clean_generated_recipe(candidate)
+            except (ValidationError, ValueError) as e:
+                errors.append(str(e))
+                continue
+            if recipe["title"].lower() in titles:
+                errors.append(f"Duplicate recipe title: {recipe['title']}")
+                continue
+            titles.add(recipe["title"].lower())
+            recipes.append(recipe)
+        
+        parse_duration = round((time.time() - parse_start) * 1000, 2)
+        structured_logger.info(
+            f"Recipe variants parsed: {len(recipes)} of {len(candidates)} valid",
+            extra={
+                'duration_ms': parse_duration,
+                'extra_context': {
+                    'operation': 'parse_recipe_variants',
+                    'candidates': len(candidates),
+                    'valid': len(recipes),
+                    'errors': errors[:5],
+                    'original_response_length': len(response_content)
+                }
+            }
+        )
+        
+        if not recipes:
+            return [], f"Schema validation failed: {errors[0] if errors else 'no recipes in the response'}"
+        return recipes, None
+    
+    def _clean_generated_recipe(self, parsed_data: Any) -> Dict[str, Any]:
+        """
+        Validate parsed LLM output against the recipe schema and clean it up.
+        
+        Raises:
+            ValidationError: If the data does not match the recipe schema.
+            ValueError: If the recipe has no usable ingredients or steps.
+        """
+        recipe = GeneratedRecipe.model_validate(parsed_data)
+        
+        # Clean up ingredients
+        cleaned_ingredients = []
+        for ing in recipe.recipeIngredients:
+            cleaned_ing = {
+                "name": ing.name.strip(),
+                "unit": (ing.unit or "").strip(),
+                "amount": self._normalize_amount(ing.amount)
+            }
+            if cleaned_ing["name"]:  # Only add if name is not empty
+                cleaned_ingredients.append(cleaned_ing)
+        
+        # Clean up steps and renumber them
+        cleaned_steps = []
+        for step in recipe.recipeSteps:
+            details = step.details.strip()
+            if details:  # Only add if details is not empty
+                cleaned_steps.append({"order": len(cleaned_steps) + 1, "details": details})
+        
+        if not cleaned_ingredients or not cleaned_steps:
+            raise ValueError("recipeIngredients and recipeSteps must contain non-empty entries")
+        
+        recipe_data = {
+            "title": recipe.title.strip(),
+            "description": (recipe.description or "").strip(),
+            "servingSize": recipe.servingSize,
+            "recipeIngredients": cleaned_ingredients,
+            "recipeSteps": cleaned_steps,
+            "tags": [tag.strip() for tag in recipe.tags if tag.strip()]
+        }
+        
+        # Ensure title and description are meaningful
+        if not recipe_data["title"] or recipe_data["title"] in ["Recipe Title", "Creative Recipe"]:
+            recipe_data["title"] = "Delicious Homemade Recipe"
+        
+        if not recipe_data["description"] or recipe_data["description"] in ["Recipe description", "A delicious recipe created just for you"]:
+            recipe_data["description"] = "A carefully crafted recipe with fresh ingredients and delicious flavors"
+        
+        return recipe_data
+    
+    @staticmethod
+    def _normalize_amount(amount: Union[float, str, None]) -> Union[float, str]:
+        """Numeric ingredient amount from the LLM output: numbers, decimal commas and fractions like "1 1/2"; other text is kept"""
+        if amount is None:
+            return 1
+        if not isinstance(amount, str):
+            return amount
+        text = amount.strip().replace(",", ".")
+        if not text:
+            return 1
+        try:
+            return float(sum(Fraction(part) for part in text.split()))
+        except (ValueError, ZeroDivisionError):
+            return text
     
     def _get_default_recipe_data(self) -> Dict[str, Any]:
         """Get default recipe data structure with creative fallback"""
         logger.info("Using default recipe data as fallback")
         return {
-            "title": "Chef's Special Creation",
+            "title": DEFAULT_RECIPE_TITLE,
             "description": "A unique recipe crafted with care using fresh, quality ingredients and creative cooking techniques",
             "servingSize": 4,
             "recipeIngredients": [
@@ -1103,6 +2359,21 @@ class RecipeLLM:
                 "error": str(e)
             }
     
+    def prewarm_connections(self) -> int:
+        """Open connections of the async client, which requests use, before the first request"""
+        connections = int(os.getenv("LLM_HTTP_PREWARM_CONNECTIONS", "2"))
+        return self._run_on_client_loop(self.http_clients.aprewarm(connections, self.backend_urls))
+    
+    def _run_on_client_loop(self, coroutine) -> Any:
+        """
+        Run a coroutine on the event loop that owns the async client's connections.
+        
+        Routed calls use the client on the router's event loop, single-backend calls on `llm_runtime`.
+        """
+        if self.llm_router:
+            return self.llm_router.run(coroutine)
+        return self._get_llm_runtime().run(coroutine)
+    
     def cleanup(self):
         """Cleanup resources used by the LLM service"""
         start_time = time.time()
@@ -1115,6 +2386,18 @@ class RecipeLLM:
             )
             
             self.rag_helper.cleanup()
+            # Close the async connections on their own loop before it stops
+            try:
+                self._run_on_client_loop(self.http_clients.aclose())
+            except Exception as e:
+                logger.warning(f"Failed to close the async LLM client: {e}")
+            if self.llm_router:
+                self.llm_router.close()
+            if self.llm_runtime:
+                self.llm_runtime.stop()
+            self.stage_executor.shutdown(wait=False, cancel_futures=True)
+            self.batch_executor.shutdown(wait=False, cancel_futures=True)
+            self.http_clients.close()
             
             duration_ms = round((time.time() - start_time) * 1000, 2)
             logger.info(f"Recipe LLM service cleanup completed in {duration_ms}ms")
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Any, List, Optional
+from urllib.parse import urlparse
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from resilience import CircuitBreaker, CircuitOpenError
+from metrics import LLM_BACKEND_REQUESTS, LLM_BACKEND_LATENCY, LLM_HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+
+def backend_name(base_url: str) -> str:
+    """Short backend label (host and port) for metrics and logs"""
+    return urlparse(base_url).netloc or base_url
+
+
+class LatencyTracker:
+    """EWMA and recent-window percentile of successful call latencies"""
+
+    def __init__(self, alpha: float = 0.3, window: int = 200):
+        """Initialize an empty tracker"""
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a successful call"""
+        with self._lock:
+            self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 10) -> Optional[float]:
+        """Latency percentile of the recent window, or None without enough samples"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+@dataclass
+class LLMBackend:
+    """An OpenAI-compatible backend together with its routing state"""
+    name: str
+    runnable: Runnable
+    breaker: CircuitBreaker
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+
+
+class _EventLoopThread:
+    """Event loop running in a daemon thread, so that sync callers can run cancellable async calls"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-router-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine):
+        """Run a coroutine on the loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self) -> None:
+        """Cancel the calls still running, e.g. abandoned ones, and stop the loop"""
+        async def cancel_pending():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_pending(), self.loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Failed to cancel pending LLM calls: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class LLMRouter(Runnable):
+    """
+    Routes chat model calls across several OpenAI-compatible backends.
+
+    Each call goes to the backend with the lowest latency EWMA whose circuit breaker is not
+    open and fails over to the next backend on errors. With hedging enabled, a second request
+    is sent to the next backend once the first has been running longer than the first
+    backend's recent p95 latency (at least `hedge_min_delay` seconds); the first answer wins
+    and the other request is cancelled.
+
+    Calls run on a private event loop so that losing requests can be cancelled. `bind`
+    returns a router over the bound backends that shares their routing state.
+    """
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        hedging: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 2.0,
+        _runtime: Optional[_EventLoopThread] = None
+    ):
+        """Initialize the router"""
+        if not backends:
+            raise ValueError("LLMRouter requires at least one backend")
+        self.backends = backends
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self._runtime = _runtime or _EventLoopThread()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """Call the LLM on the best available backend"""
+        return self._runtime.run(self._route(input, config, kwargs))
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """Call the LLM on the best available backend from another event loop"""
+        future = asyncio.run_coroutine_threadsafe(self._route(input, config, kwargs), self._runtime.loop)
+        return await asyncio.wrap_future(future)
+
+    def bind(self, **kwargs: Any) -> "LLMRouter":
+        """Bind call arguments (e.g. response_format) on every backend"""
+        return LLMRouter(
+            [replace(backend, runnable=backend.runnable.bind(**kwargs)) for backend in self.backends],
+            hedging=self.hedging,
+            hedge_percentile=self.hedge_percentile,
+            hedge_min_delay=self.hedge_min_delay,
+            _runtime=self._runtime
+        )
+
+    def run(self, coroutine) -> Any:
+        """Run a coroutine on the router event loop, e.g. to pre-warm the async HTTP client"""
+        return self._runtime.run(coroutine)
+
+    def close(self) -> None:
+        """Stop the router event loop"""
+        self._runtime.stop()
+
+    def ordered_backends(self) -> List[LLMBackend]:
+        """Backends whose breaker is not open, fastest first (unmeasured backends first)"""
+        available = [backend for backend in self.backends if backend.breaker.state != CircuitBreaker.OPEN]
+        return sorted(available, key=lambda backend: backend.latency.ewma or 0.0)
+
+    def hedge_delay(self, backend: LLMBackend) -> float:
+        """Time to wait for a backend before hedging"""
+        p95 = backend.latency.percentile(self.hedge_percentile)
+        return max(p95 or 0.0, self.hedge_min_delay)
+
+    async def _route(self, input: Any, config: Optional[RunnableConfig], kwargs: dict) -> Any:
+        """Run the call with failover and hedging"""
+        candidates = self.ordered_backends()
+        tasks = {}
+        last_error: Optional[BaseException] = None
+
+        def start_next(hedge: bool = False) -> bool:
+            while candidates:
+                backend = candidates.pop(0)
+                if backend.breaker.allow_request():
+                    task = asyncio.ensure_future(self._call(backend, input, config, kwargs))
+                    tasks[task] = (backend, hedge)
+                    return True
+            return False
+
+        if not start_next():
+            raise CircuitOpenError("All LLM backends are unavailable")
+
+        hedged = False
+        try:
+            while tasks:
+                timeout = None
+                if self.hedging and candidates and len(tasks) == 1:
+                    (primary, _), = tasks.values()
+                    timeout = self.hedge_delay(primary)
+
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = start_next(hedge=True) or hedged
+                    continue
+
+                for task in done:
+                    backend, is_hedge = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            LLM_HEDGED_REQUESTS.labels(winner="hedge" if is_hedge else "primary").inc()
+                        return task.result()
+                    last_error = task.exception()
+
+                if not tasks:
+                    start_next()
+
+            if hedged:
+                LLM_HEDGED_REQUESTS.labels(winner="none").inc()
+            raise last_error
+        finally:
+            # Cancel the request that lost the race and wait until its connection is released
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _call(self, backend: LLMBackend, input: Any, config: Optional[RunnableConfig], kwargs: dict) -> Any:
+        """Call a single backend and update its routing state"""
+        start_time = time.perf_counter()
+        try:
+            result = await backend.runnable.ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="cancelled").inc()
+            raise
+        except Exception as e:
+            backend.breaker.record_failure()
+            LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="error").inc()
+            logger.warning(f"LLM backend {backend.name} failed: {e}")
+            structured_logger.warning(
+                f"LLM backend {backend.name} failed, failing over",
+                extra={
+                    'duration_ms': round((time.perf_counter() - start_time) * 1000, 2),
+                    'extra_context': {
+                        'operation': 'llm_backend_call',
+                        'backend': backend.name,
+                        'breaker_state': backend.breaker.state,
+                        'error': str(e),
+                        'error_type': type(e).__name__
+                    }
+                }
+            )
+            raise
+
+        duration = time.perf_counter() - start_time
+        backend.latency.observe(duration)
+        backend.breaker.record_success()
+        LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="success").inc()
+        LLM_BACKEND_LATENCY.labels(backend=backend.name).observe(duration)
+        return result
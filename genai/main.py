@@ -1,19 +1,34 @@
+import asyncio
+import math
 import os
 import json
 import time
 import uuid
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 import logging
-from typing import Callable
+from typing import AsyncIterator, Callable, Optional
 
 # Prometheus instrumentator import
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from request_models import ChatRequest, RecipeIndexRequest, RecipeDeleteRequest, RecipeSuggestionRequest
+from request_models import ChatRequest, RecipeIndexRequest, RecipeDeleteRequest, RecipeSuggestionRequest, RecipeSuggestionBatchRequest
 from response_models import ChatResponse, RecipeIndexResponse, RecipeDeleteResponse, RecipeSuggestionResponse, HealthResponse
 from llm import RecipeLLM
+from context_builder import load_tokenizer
+from request_context import (
+    current_cancel_scope, current_endpoint, current_request_stats, deadline_from, CancelScope, RequestCancelled, RequestStats
+)
+from metrics import REQUEST_CANCELLATIONS
+from resilience import LimitExceededError
+from rate_limit import RateLimiter, RateLimitExceededError, RequestCostExceededError, USER_ID_HEADER
+from traffic_capture import TrafficCapture
+from profiling import Profiler, ProfilerBusyError
+from memory_stats import MemoryTracker
+from tracing import configure_tracing, detach_request_span, end_request_span, request_id_from, shutdown_tracing, start_request_span, trace_id_of
 
 # Enhanced logging configuration
 class StructuredFormatter(logging.Formatter):
@@ -63,11 +78,48 @@ structured_logger.setLevel(logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+def _route_template(request: Request) -> str:
+    """Route path of a request (e.g. /genai/vector/recipe/{recipe_id}), keeping metric labels bounded"""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+# Opt-in capture of sampled requests for replay (TRAFFIC_CAPTURE_ENABLED)
+traffic_capture = TrafficCapture()
+
+# On-demand CPU profiling, off unless PROFILING_ENABLED and ADMIN_TOKEN are set
+profiler = Profiler()
+
+# Memory reports and tracemalloc snapshots for the admin endpoints (ADMIN_TOKEN)
+memory_tracker = MemoryTracker()
+
+# Per-caller token buckets for the endpoints that call the LLM (RATE_LIMIT_ENABLED)
+rate_limiter = RateLimiter()
+
+# OpenTelemetry tracing with tail-based sampling, a no-op unless TRACING_ENABLED is set
+configure_tracing()
+
+# Deadline of requests without deadline headers (0 for none) and how often to check for client disconnects
+REQUEST_TIMEOUT_MS = float(os.getenv("REQUEST_TIMEOUT_MS", "0"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("REQUEST_DISCONNECT_POLL_MS", "250")) / 1000
+
+# Status codes of cancelled requests: gateway timeout, and nginx's "client closed request"
+CANCELLATION_STATUS = {"deadline": 504, "disconnect": 499}
+
 # Add request ID tracking middleware
 async def add_request_id_middleware(request: Request, call_next: Callable) -> Response:
-    """Add request ID to all requests for tracing"""
-    request_id = str(uuid.uuid4())
+    """Add request ID to all requests for tracing, reusing the caller's X-Request-ID and traceparent"""
+    request_id = request_id_from(request.headers) or str(uuid.uuid4())
     request.state.request_id = request_id
+    route = _route_template(request)
+    current_endpoint.set(route)
+    request_stats = RequestStats(debug=request.query_params.get("debug", "").lower() in ("1", "true", "yes", "on"))
+    current_request_stats.set(request_stats)
+    cancel_scope = CancelScope(deadline_from(request.headers, REQUEST_TIMEOUT_MS))
+    current_cancel_scope.set(cancel_scope)
+    span, trace_token = start_request_span(request.method, route, request.headers, request_id)
     
     # Log incoming request
     start_time = time.time()
@@ -76,6 +128,7 @@ async def add_request_id_middleware(request: Request, call_next: Callable) -> Re
         extra={
             'request_id': request_id,
             'extra_context': {
+                'trace_id': trace_id_of(span),
                 'method': request.method,
                 'path': request.url.path,
                 'query_params': str(request.query_params),
@@ -85,32 +138,55 @@ async def add_request_id_middleware(request: Request, call_next: Callable) -> Re
         }
     )
     
+    capture = traffic_capture.should_capture(request.method, request.url.path)
+    body = await request.body() if capture else b""
+    
     try:
-        response = await call_next(request)
-        
-        # Calculate request duration
-        duration_ms = round((time.time() - start_time) * 1000, 2)
+        if profiler.enabled and "x-profile" in request.headers and profiler.is_authorized(request.headers.get("x-admin-token")):
+            request.state.profiled = True
+            response = await _call_profiled(request, call_next, request_id)
+        else:
+            response = await call_next(request)
         
-        # Log response
-        structured_logger.info(
-            f"Request completed: {request.method} {request.url.path} - {response.status_code}",
-            extra={
-                'request_id': request_id,
-                'duration_ms': duration_ms,
-                'extra_context': {
-                    'status_code': response.status_code,
-                    'response_time_ms': duration_ms
+        def finish(status_code: int, error: Optional[BaseException] = None) -> float:
+            """Log the completed request, record its capture and end its span; returns its duration"""
+            duration_ms = round((time.time() - start_time) * 1000, 2)
+            
+            if capture:
+                traffic_capture.record(request.method, request.url.path, body, status_code, duration_ms)
+            
+            structured_logger.info(
+                f"Request completed: {request.method} {request.url.path} - {status_code}",
+                extra={
+                    'request_id': request_id,
+                    'duration_ms': duration_ms,
+                    'extra_context': {
+                        'status_code': status_code,
+                        'response_time_ms': duration_ms,
+                        **request_stats.as_log_context()
+                    }
                 }
-            }
-        )
+            )
+            end_request_span(span, None, status_code, error)
+            return duration_ms
         
-        # Add request ID to response headers
         response.headers["X-Request-ID"] = request_id
+        detach_request_span(trace_token)
+        trace_token = None
+        
+        if getattr(request.state, "streamed", False):
+            # The body is generated while it is sent, so the request is accounted for once the stream ends
+            response.body_iterator = _finish_after_stream(response.body_iterator, response.status_code, cancel_scope, finish)
+            return response
         
+        # Add per-stage timings to response headers
+        duration_ms = finish(response.status_code)
+        response.headers["Server-Timing"] = request_stats.server_timing(duration_ms)
         return response
         
     except Exception as e:
         duration_ms = round((time.time() - start_time) * 1000, 2)
+        end_request_span(span, trace_token, 500, e)
         
         structured_logger.error(
             f"Request failed: {request.method} {request.url.path} - {str(e)}",
@@ -125,6 +201,151 @@ async def add_request_id_middleware(request: Request, call_next: Callable) -> Re
         )
         raise
 
+async def _finish_after_stream(
+    body_iterator: AsyncIterator,
+    status_code: int,
+    cancel_scope: CancelScope,
+    finish: Callable[..., float]
+) -> AsyncIterator:
+    """
+    Pass a streamed response body through and finish the request's accounting once it was sent.
+    
+    A stream that ends early, e.g. because the client went away, cancels the request's
+    remaining work and is logged with status 499.
+    """
+    error = None
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if error is not None:
+            cancel_scope.cancel("disconnect")
+            status_code = CANCELLATION_STATUS["disconnect"]
+        finish(status_code, error)
+
+async def _call_profiled(request: Request, call_next: Callable, request_id: str) -> Response:
+    """Handle a request under cProfile and return the hottest functions in X-Profile-Summary"""
+    with profiler.profile_request() as request_profile:
+        response = await call_next(request)
+    
+    if request_profile is None:
+        response.headers["X-Profile-Summary"] = "busy"
+        return response
+    
+    response.headers["X-Profile-Summary"] = request_profile.summary_header()
+    structured_logger.info(
+        f"Request profile: {request.method} {request.url.path}",
+        extra={
+            'request_id': request_id,
+            'duration_ms': request_profile.duration_ms,
+            'extra_context': {
+                'operation': 'request_profile',
+                'top_functions': request_profile.top_functions(20),
+                'stats': request_profile.stats_text()
+            }
+        }
+    )
+    return response
+
+async def _run_cancellable(http_request: Request, func: Callable, *args, **kwargs):
+    """
+    Run a blocking pipeline call in a worker thread and cancel it when the request's deadline
+    passes or the client disconnects.
+    
+    Cancellation aborts in-flight LLM calls and stops the pipeline before its next stage.
+    Profiled requests run on the event loop thread, where cProfile measures them, and are
+    not cancelled.
+    
+    Raises:
+        RequestCancelled: When the request was cancelled, see `_cancellation_error`.
+    """
+    cancel_scope = current_cancel_scope.get()
+    if cancel_scope is None or getattr(http_request.state, "profiled", False):
+        return func(*args, **kwargs)
+    
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    try:
+        while True:
+            remaining = cancel_scope.remaining()
+            timeout = DISCONNECT_POLL_SECONDS if remaining is None else min(remaining, DISCONNECT_POLL_SECONDS)
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if cancel_scope.remaining() == 0:
+                cancel_scope.cancel("deadline")
+            elif await http_request.is_disconnected():
+                cancel_scope.cancel("disconnect")
+            if cancel_scope.reason is not None:
+                # The worker stops at its next stage, its outcome is no longer needed
+                task.add_done_callback(lambda finished: finished.cancelled() or finished.exception())
+                raise RequestCancelled(cancel_scope.reason, cancel_scope.stage)
+    except RequestCancelled as e:
+        REQUEST_CANCELLATIONS.labels(
+            endpoint=current_endpoint.get(),
+            stage=e.stage or "pipeline",
+            reason=e.reason
+        ).inc()
+        structured_logger.warning(
+            f"Request cancelled: {e.reason}",
+            extra={
+                'request_id': getattr(http_request.state, 'request_id', 'unknown'),
+                'extra_context': {
+                    'operation': 'request_cancelled',
+                    'reason': e.reason,
+                    'stage': e.stage
+                }
+            }
+        )
+        raise
+
+def _cancellation_error(error: RequestCancelled) -> HTTPException:
+    """HTTP error returned for a cancelled request"""
+    detail = "Request deadline exceeded" if error.reason == "deadline" else "Client closed request"
+    return HTTPException(status_code=CANCELLATION_STATUS.get(error.reason, 503), detail=detail)
+
+def _overload_error(error: LimitExceededError) -> HTTPException:
+    """HTTP error returned for a request shed by the LLM concurrency limiter"""
+    return HTTPException(
+        status_code=503,
+        detail="Service overloaded, please retry later",
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+def _rate_limit_error(error: RateLimitExceededError) -> HTTPException:
+    """HTTP error returned for a request beyond the caller's rate limit"""
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests, please retry later",
+        headers={"Retry-After": str(max(1, math.ceil(min(error.retry_after, 3600))))}
+    )
+
+def _request_cost_error(error: RequestCostExceededError) -> HTTPException:
+    """HTTP error returned for a request that costs more than a caller's full rate limit bucket"""
+    return HTTPException(status_code=413, detail=str(error))
+
+def _rate_limit_subject(http_request: Request) -> str:
+    """Rate limit bucket key of the caller of a request"""
+    return RateLimiter.subject(
+        http_request.headers.get(USER_ID_HEADER),
+        http_request.client.host if http_request.client else None
+    )
+
+async def _check_rate_limit(http_request: Request, kind: str, endpoint: str, units: int = 1) -> None:
+    """Take the tokens of a request from its caller's bucket, see `RateLimiter`"""
+    subject = _rate_limit_subject(http_request)
+    if rate_limiter.blocking:
+        # The shared store may wait for other workers' transactions, which must not stall the event loop
+        await asyncio.to_thread(rate_limiter.check, subject, kind, endpoint, units)
+    else:
+        rate_limiter.check(subject, kind, endpoint, units)
+
+def _degraded_requested(http_request: Request) -> bool:
+    """Whether the client asked for suggestions without the LLM (X-Degraded-Mode)"""
+    return http_request.headers.get("x-degraded-mode", "").lower() in ("1", "true")
+
 # Global LLM instance
 llm_instance: RecipeLLM = None
 
@@ -136,8 +357,19 @@ async def lifespan(app: FastAPI):
         logger.info("Starting GenAI service initialization...")
         structured_logger.info("GenAI service startup initiated", extra={'extra_context': {'phase': 'startup'}})
         
+        # Trace allocations from the start if configured, so the model and clients are attributed
+        memory_tracker.start()
+        
         llm_instance = RecipeLLM()
         
+        # Load the tokenizer for prompt budgets now, it may have to be downloaded
+        await asyncio.to_thread(load_tokenizer)
+        
+        # Open LLM backend connections so the first request does not pay the handshake
+        await asyncio.to_thread(llm_instance.prewarm_connections)
+        # Build the intent centroids now rather than on the first chat message without a keyword match
+        await asyncio.to_thread(llm_instance.intent_router.build_centroids)
+        
         logger.info("GenAI service started successfully")
         structured_logger.info("GenAI service initialization completed", extra={'extra_context': {'phase': 'startup', 'status': 'success'}})
         
@@ -154,6 +386,10 @@ async def lifespan(app: FastAPI):
     # Shutdown: cleanup
     structured_logger.info("GenAI service shutdown initiated", extra={'extra_context': {'phase': 'shutdown'}})
     
+    traffic_capture.close()
+    rate_limiter.close()
+    shutdown_tracing()
+    
     if llm_instance:
         try:
             llm_instance.cleanup()
@@ -277,7 +513,7 @@ async def health_check(request: Request):
         )
 
 @app.post("/genai/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, http_request: Request):
+async def chat(request: ChatRequest, http_request: Request, debug: bool = False):
     """Chat with the AI assistant for recipe search and creation"""
     request_id = getattr(http_request.state, 'request_id', 'unknown')
     start_time = time.time()
@@ -289,7 +525,8 @@ async def chat(request: ChatRequest, http_request: Request):
             'extra_context': {
                 'endpoint': 'chat',
                 'message_length': len(request.message),
-                'message_preview': request.message[:100]
+                'message_preview': request.message[:100],
+                'bypass_cache': request.bypass_cache
             }
         }
     )
@@ -305,9 +542,20 @@ async def chat(request: ChatRequest, http_request: Request):
             )
             raise HTTPException(status_code=500, detail="LLM service not initialized")
         
-        response = llm_instance.chat(request.message)
+        # Charged by the routed intent, once the pipeline has classified the message (in its worker thread)
+        subject = _rate_limit_subject(http_request)
+        response = await _run_cancellable(
+            http_request,
+            llm_instance.chat,
+            request.message,
+            bypass_cache=request.bypass_cache,
+            charge=lambda kind: rate_limiter.check(subject, kind, "chat")
+        )
         duration_ms = round((time.time() - start_time) * 1000, 2)
         
+        if debug:
+            response.debug = current_request_stats.get().debug_info(duration_ms)
+        
         structured_logger.info(
             "Chat request completed successfully",
             extra={
@@ -324,6 +572,14 @@ async def chat(request: ChatRequest, http_request: Request):
         
         return response
         
+    except RequestCancelled as e:
+        raise _cancellation_error(e)
+    except LimitExceededError as e:
+        raise _overload_error(e)
+    except RateLimitExceededError as e:
+        raise _rate_limit_error(e)
+    except RequestCostExceededError as e:
+        raise _request_cost_error(e)
     except Exception as e:
         duration_ms = round((time.time() - start_time) * 1000, 2)
         
@@ -514,7 +770,7 @@ async def delete_recipe(recipe_id: str, http_request: Request):
         raise HTTPException(status_code=500, detail=f"Error deleting recipe: {str(e)}")
 
 @app.post("/genai/vector/suggest", response_model=RecipeSuggestionResponse)
-async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request):
+async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request, http_response: Response, debug: bool = False):
     """Generate a recipe suggestion based on query and similar recipes"""
     request_id = getattr(http_request.state, 'request_id', 'unknown')
     start_time = time.time()
@@ -526,7 +782,9 @@ async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request
             'extra_context': {
                 'endpoint': 'suggest_recipe',
                 'query_length': len(request.query),
-                'query_preview': request.query[:100]
+                'query_preview': request.query[:100],
+                'bypass_cache': request.bypass_cache,
+                'variants': request.variants
             }
         }
     )
@@ -542,9 +800,26 @@ async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request
             )
             raise HTTPException(status_code=500, detail="LLM service not initialized")
         
-        response = llm_instance.suggest_recipe(request.query)
+        # Every variant is a generated recipe
+        await _check_rate_limit(http_request, "creation", "suggest_recipe", units=request.variants)
+        
+        response = await _run_cancellable(
+            http_request,
+            llm_instance.suggest_recipe,
+            request.query,
+            bypass_cache=request.bypass_cache,
+            servings=request.servings,
+            degraded=_degraded_requested(http_request),
+            variants=request.variants
+        )
         duration_ms = round((time.time() - start_time) * 1000, 2)
         
+        if response.degraded:
+            http_response.headers["X-Degraded-Mode"] = response.degraded["reason"]
+        
+        if debug:
+            response.debug = current_request_stats.get().debug_info(duration_ms)
+        
         structured_logger.info(
             "Recipe suggestion completed successfully",
             extra={
@@ -553,13 +828,22 @@ async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request
                 'extra_context': {
                     'query_length': len(request.query),
                     'has_recipe_data': bool(response.recipe_data),
-                    'suggestion_length': len(response.suggestion) if response.suggestion else 0
+                    'suggestion_length': len(response.suggestion) if response.suggestion else 0,
+                    'degraded_reason': response.degraded["reason"] if response.degraded else None
                 }
             }
         )
         
         return response
         
+    except RequestCancelled as e:
+        raise _cancellation_error(e)
+    except LimitExceededError as e:
+        raise _overload_error(e)
+    except RateLimitExceededError as e:
+        raise _rate_limit_error(e)
+    except RequestCostExceededError as e:
+        raise _request_cost_error(e)
     except Exception as e:
         duration_ms = round((time.time() - start_time) * 1000, 2)
         
@@ -579,6 +863,215 @@ async def suggest_recipe(request: RecipeSuggestionRequest, http_request: Request
         
         raise HTTPException(status_code=500, detail=f"Error in recipe suggestion: {str(e)}")
 
+@app.post("/genai/vector/suggest/batch")
+async def suggest_recipes_batch(request: RecipeSuggestionBatchRequest, http_request: Request):
+    """
+    Generate recipe suggestions for several queries, streamed as NDJSON as they complete.
+    
+    Each line is a result for one query, with its `index` in the request and a `status`:
+    `ok` with the `suggestion`, or `failed` with an `error`. The last line summarizes the
+    batch with `done`, `succeeded` and `failed`.
+    """
+    request_id = getattr(http_request.state, 'request_id', 'unknown')
+    
+    structured_logger.info(
+        f"Batch recipe suggestion request received: {len(request.queries)} queries",
+        extra={
+            'request_id': request_id,
+            'extra_context': {
+                'endpoint': 'suggest_recipes_batch',
+                'queries': len(request.queries),
+                'bypass_cache': request.bypass_cache
+            }
+        }
+    )
+    
+    if not llm_instance:
+        raise HTTPException(status_code=500, detail="LLM service not initialized")
+    try:
+        await _check_rate_limit(http_request, "creation", "suggest_recipes_batch", units=len(request.queries))
+    except RateLimitExceededError as e:
+        raise _rate_limit_error(e)
+    except RequestCostExceededError as e:
+        raise _request_cost_error(e)
+    
+    # Suggestions are generated while the body is streamed; the middleware accounts for the request when it ends
+    http_request.state.streamed = True
+    return StreamingResponse(_stream_batch_suggestions(request, http_request), media_type="application/x-ndjson")
+
+async def _stream_batch_suggestions(request: RecipeSuggestionBatchRequest, http_request: Request) -> AsyncIterator[str]:
+    """NDJSON lines of a batch suggestion request, see `suggest_recipes_batch`"""
+    request_id = getattr(http_request.state, 'request_id', 'unknown')
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    completed: asyncio.Queue = asyncio.Queue()
+    
+    def publish(index, response, error):
+        loop.call_soon_threadsafe(completed.put_nowait, (index, response, error))
+    
+    def batch_result(index, response, error) -> dict:
+        result = {"index": index, "query": request.queries[index]}
+        if error is not None:
+            result.update(status="failed", error=str(error) or type(error).__name__)
+        elif not response.recipe_data:
+            result.update(status="failed", error=response.suggestion)
+        else:
+            result.update(status="ok", suggestion=response.model_dump(mode="json"))
+        reported[index] = result["status"]
+        return result
+    
+    reported = {}
+    batch = asyncio.ensure_future(_run_cancellable(
+        http_request,
+        llm_instance.suggest_recipes,
+        request.queries,
+        bypass_cache=request.bypass_cache,
+        servings=request.servings,
+        degraded=_degraded_requested(http_request),
+        on_result=publish
+    ))
+    try:
+        while True:
+            next_result = asyncio.ensure_future(completed.get())
+            await asyncio.wait({next_result, batch}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_result.done():
+                next_result.cancel()
+                break
+            yield json.dumps(batch_result(*next_result.result())) + "\n"
+        while not completed.empty():
+            yield json.dumps(batch_result(*completed.get_nowait())) + "\n"
+        
+        # Queries without a result when the batch failed or was cancelled are reported as failed
+        batch_error = batch.exception()
+        if batch_error is not None:
+            if isinstance(batch_error, RequestCancelled):
+                batch_error = RuntimeError(_cancellation_error(batch_error).detail)
+            for index in range(len(request.queries)):
+                if index not in reported:
+                    yield json.dumps(batch_result(index, None, batch_error)) + "\n"
+    finally:
+        if not batch.done():
+            # The client went away while the batch was running
+            cancel_scope = current_cancel_scope.get()
+            if cancel_scope is not None:
+                cancel_scope.cancel("disconnect")
+    
+    succeeded = sum(status == "ok" for status in reported.values())
+    duration_ms = round((time.time() - start_time) * 1000, 2)
+    structured_logger.info(
+        "Batch recipe suggestion completed",
+        extra={
+            'request_id': request_id,
+            'duration_ms': duration_ms,
+            'extra_context': {
+                'queries': len(request.queries),
+                'succeeded': succeeded,
+                'failed': len(reported) - succeeded
+            }
+        }
+    )
+    # Headers are sent before the suggestions run, so the stage timings come with the summary instead of Server-Timing
+    request_stats = current_request_stats.get()
+    yield json.dumps({
+        "done": True,
+        "succeeded": succeeded,
+        "failed": len(reported) - succeeded,
+        "duration_ms": duration_ms,
+        "stages_ms": request_stats.stage_ms() if request_stats else {}
+    }) + "\n"
+
+@app.get("/genai/admin/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile_worker(
+    http_request: Request,
+    seconds: float = 10.0,
+    interval_ms: Optional[float] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample the worker's stacks for some seconds and return them as collapsed stacks (flamegraph input)"""
+    request_id = getattr(http_request.state, 'request_id', 'unknown')
+    
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.is_authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not 0 < seconds <= profiler.max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {profiler.max_seconds}")
+    
+    structured_logger.info(
+        f"Sampling profile requested for {seconds}s",
+        extra={
+            'request_id': request_id,
+            'extra_context': {'endpoint': 'profile_worker', 'seconds': seconds, 'interval_ms': interval_ms}
+        }
+    )
+    
+    try:
+        # Sample from a separate thread so the event loop keeps serving (and shows up in the profile)
+        collapsed, rounds = await asyncio.to_thread(
+            profiler.sample, seconds, interval_ms / 1000 if interval_ms else None
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return PlainTextResponse(
+        collapsed,
+        headers={
+            "Content-Disposition": f'attachment; filename="genai-profile-{int(time.time())}.collapsed"',
+            "X-Profile-Rounds": str(rounds)
+        }
+    )
+
+def _check_admin_token(x_admin_token: Optional[str]) -> None:
+    """Reject memory admin requests without a valid admin token"""
+    if not memory_tracker.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not memory_tracker.is_authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/genai/admin/memory", include_in_schema=False)
+async def memory_report(
+    http_request: Request,
+    top: int = 20,
+    group_by: str = "lineno",
+    since: Optional[str] = None,
+    object_types: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Report process, torch, gc and tracemalloc memory figures, optionally diffed against a snapshot"""
+    request_id = getattr(http_request.state, 'request_id', 'unknown')
+    _check_admin_token(x_admin_token)
+    if group_by not in MemoryTracker.GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(MemoryTracker.GROUP_BY)}")
+    if not 0 < top <= 200:
+        raise HTTPException(status_code=400, detail="top must be between 1 and 200")
+    
+    structured_logger.info(
+        "Memory report requested",
+        extra={
+            'request_id': request_id,
+            'extra_context': {'endpoint': 'memory_report', 'group_by': group_by, 'since': since, 'object_types': object_types}
+        }
+    )
+    
+    try:
+        # Snapshots and heap walks take a while on a large heap, keep them off the event loop
+        report = await asyncio.to_thread(memory_tracker.report, top, group_by, since, object_types)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {since}")
+    
+    if llm_instance is not None:
+        report["semantic_cache_entries"] = llm_instance.semantic_cache.stats()
+    return report
+
+@app.post("/genai/admin/memory/snapshots", include_in_schema=False)
+async def take_memory_snapshot(x_admin_token: Optional[str] = Header(None)):
+    """Store a tracemalloc snapshot to diff later reports against (starts tracemalloc if needed)"""
+    _check_admin_token(x_admin_token)
+    
+    snapshot = await asyncio.to_thread(memory_tracker.take_snapshot)
+    snapshot["snapshots"] = memory_tracker.snapshot_ids()
+    return snapshot
+
 if __name__ == "__main__":
     import uvicorn
     
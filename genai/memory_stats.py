@@ -0,0 +1,335 @@
+import gc
+import logging
+import os
+import resource
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+STDLIB_PATH = os.path.abspath(sysconfig.get_path("stdlib"))
+APP_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Leave the bookkeeping of tracemalloc and the import system out of allocation statistics
+TRACEMALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def process_memory() -> Dict[str, int]:
+    """
+    Memory of this process in bytes.
+
+    Returns:
+        rss (resident set), uss (pages only this process maps, i.e. what is freed when it
+        exits), peak_rss and swap. uss and swap are only available on Linux.
+    """
+    memory: Dict[str, int] = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "VmSwap"):
+                    memory[{"VmRSS": "rss", "VmHWM": "peak_rss", "VmSwap": "swap"}[key]] = int(value.split()[0]) * 1024
+        with open("/proc/self/smaps_rollup") as f:
+            private = 0
+            for line in f:
+                if line.startswith(("Private_Clean:", "Private_Dirty:", "Private_Hugetlb:")):
+                    private += int(line.split()[1]) * 1024
+            memory["uss"] = private
+    except OSError:
+        # Not Linux, ru_maxrss is in bytes on macOS
+        memory["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memory
+
+
+def torch_memory() -> Dict[str, Any]:
+    """
+    Allocator statistics of torch, if the embedding model loaded it.
+
+    torch is not imported here, so the report stays cheap for processes that don't use it.
+    Memory of CPU tensors is counted in rss/uss but not seen by tracemalloc.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return {"loaded": False}
+
+    stats: Dict[str, Any] = {"loaded": True, "cuda_available": torch.cuda.is_available(), "devices": {}}
+    if stats["cuda_available"]:
+        for device in range(torch.cuda.device_count()):
+            stats["devices"][f"cuda:{device}"] = {
+                "allocated": torch.cuda.memory_allocated(device),
+                "reserved": torch.cuda.memory_reserved(device),
+                "max_allocated": torch.cuda.max_memory_allocated(device)
+            }
+    return stats
+
+
+def gc_stats() -> Dict[str, Any]:
+    """Collector state per generation: pending allocations, collections, collected and uncollectable objects"""
+    return {
+        "counts": list(gc.get_count()),
+        "thresholds": list(gc.get_threshold()),
+        "generations": gc.get_stats(),
+        "garbage": len(gc.garbage)
+    }
+
+
+def top_object_types(limit: int = 20) -> List[Dict[str, Any]]:
+    """Most common types among the objects tracked by the garbage collector (walks the whole heap)"""
+    counts = Counter(f"{type(obj).__module__}.{type(obj).__qualname__}" for obj in gc.get_objects())
+    return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+def package_of(filename: str) -> str:
+    """Attribute a source file to an installed package, the standard library or the service"""
+    path = os.path.abspath(filename)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in path:
+            return path.split(marker, 1)[1].strip(os.sep).split(os.sep)[0].removesuffix(".py")
+    if path.startswith(APP_PATH):
+        return "genai"
+    if path.startswith(STDLIB_PATH) or filename.startswith("<"):
+        return "stdlib"
+    return "other"
+
+
+def allocation_sites(snapshot: tracemalloc.Snapshot, group_by: str, limit: int) -> List[Dict[str, Any]]:
+    """Allocation sites with the most memory, grouped by lineno, filename or package"""
+    if group_by == "package":
+        sizes: Counter = Counter()
+        counts: Counter = Counter()
+        for stat in snapshot.statistics("filename"):
+            package = package_of(stat.traceback[0].filename)
+            sizes[package] += stat.size
+            counts[package] += stat.count
+        return [{"site": package, "size": size, "count": counts[package]} for package, size in sizes.most_common(limit)]
+
+    return [
+        {"site": str(stat.traceback[0]), "size": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def allocation_diff(old: tracemalloc.Snapshot, new: tracemalloc.Snapshot, group_by: str, limit: int) -> List[Dict[str, Any]]:
+    """Allocation sites whose memory grew the most between two snapshots"""
+    if group_by == "package":
+        before = {entry["site"]: entry for entry in allocation_sites(old, "package", sys.maxsize)}
+        after = {entry["site"]: entry for entry in allocation_sites(new, "package", sys.maxsize)}
+        diff = []
+        for package in set(before) | set(after):
+            size = after.get(package, {}).get("size", 0)
+            count = after.get(package, {}).get("count", 0)
+            diff.append({
+                "site": package,
+                "size": size,
+                "size_diff": size - before.get(package, {}).get("size", 0),
+                "count_diff": count - before.get(package, {}).get("count", 0)
+            })
+        return sorted(diff, key=lambda entry: abs(entry["size_diff"]), reverse=True)[:limit]
+
+    return [
+        {"site": str(stat.traceback[0]), "size": stat.size, "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+        for stat in new.compare_to(old, group_by)[:limit]
+    ]
+
+
+class MemoryTracker:
+    """
+    Memory accounting for finding what a worker's memory is spent on.
+
+    `report` combines process RSS/USS, torch allocator statistics, garbage collector state
+    and, while tracemalloc is tracing, the allocation sites holding the most memory.
+    `take_snapshot` stores a tracemalloc snapshot (starting tracemalloc if needed) that later
+    reports can be diffed against to find what grows. Reports require the ADMIN_TOKEN.
+
+    tracemalloc slows allocations down noticeably, so it only runs from startup with
+    MEMORY_TRACEMALLOC_ENABLED=true, or once the first snapshot was taken.
+    """
+
+    GROUP_BY = ("lineno", "filename", "package")
+
+    def __init__(self):
+        """Initialize the memory tracker from the environment"""
+        self.admin_token = os.getenv("ADMIN_TOKEN", "")
+        self.tracemalloc_enabled = os.getenv("MEMORY_TRACEMALLOC_ENABLED", "false").lower() == "true"
+        self.tracemalloc_frames = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+        self.max_snapshots = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "5"))
+
+        self._snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start tracemalloc at service startup if configured"""
+        if self.tracemalloc_enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            logger.info(f"tracemalloc started with {self.tracemalloc_frames} frame(s) per allocation")
+
+    def is_authorized(self, token: Optional[str]) -> bool:
+        """Check an admin token"""
+        return bool(self.admin_token and token and secrets.compare_digest(token, self.admin_token))
+
+    def take_snapshot(self) -> Dict[str, Any]:
+        """
+        Store a tracemalloc snapshot for later diffs.
+
+        Returns:
+            The snapshot id and the memory traced by tracemalloc at that point.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            logger.info(f"tracemalloc started for a memory snapshot with {self.tracemalloc_frames} frame(s)")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+        snapshot_id = time.strftime("%Y%m%dT%H%M%S") + f"-{secrets.token_hex(2)}"
+        with self._lock:
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+        traced, peak = tracemalloc.get_traced_memory()
+        structured_logger.info(
+            f"Memory snapshot {snapshot_id} taken",
+            extra={'extra_context': {'operation': 'memory_snapshot', 'snapshot_id': snapshot_id, 'traced_bytes': traced}}
+        )
+        return {"snapshot_id": snapshot_id, "traced_bytes": traced, "peak_traced_bytes": peak}
+
+    def snapshot_ids(self) -> List[str]:
+        """Ids of the stored snapshots, oldest first"""
+        with self._lock:
+            return list(self._snapshots)
+
+    def report(self, top: int = 20, group_by: str = "lineno", since: Optional[str] = None, object_types: bool = False) -> Dict[str, Any]:
+        """
+        Build a memory report.
+
+        Args:
+            top: Number of allocation sites (and object types) to include.
+            group_by: Group allocation sites by lineno, filename or package.
+            since: Snapshot id to diff the current allocations against.
+            object_types: Include the most common object types (walks the whole heap).
+
+        Returns:
+            The report as a JSON-serializable dict.
+
+        Raises:
+            KeyError: If the snapshot `since` does not exist (anymore).
+        """
+        start_time = time.perf_counter()
+        report: Dict[str, Any] = {
+            "process": process_memory(),
+            "torch": torch_memory(),
+            "gc": gc_stats(),
+            "tracemalloc": {"tracing": tracemalloc.is_tracing()}
+        }
+
+        if tracemalloc.is_tracing():
+            with self._lock:
+                old = self._snapshots[since] if since else None
+            traced, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+            report["tracemalloc"].update({
+                "traced_bytes": traced,
+                "peak_traced_bytes": peak,
+                "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+                "top_sites": allocation_sites(snapshot, group_by, top)
+            })
+            if old is not None:
+                report["tracemalloc"]["diff"] = {"since": since, "sites": allocation_diff(old, snapshot, group_by, top)}
+        elif since:
+            raise KeyError(since)
+
+        if object_types:
+            report["object_types"] = top_object_types(top)
+
+        structured_logger.info(
+            "Memory report generated",
+            extra={
+                'duration_ms': round((time.perf_counter() - start_time) * 1000, 2),
+                'extra_context': {
+                    'operation': 'memory_report',
+                    'rss_bytes': report["process"].get("rss"),
+                    'uss_bytes': report["process"].get("uss"),
+                    'tracing': report["tracemalloc"]["tracing"],
+                    'since': since
+                }
+            }
+        )
+        return report
+
+
+class _MemoryCollector:
+    """Prometheus collector reporting process memory, torch and garbage collector figures at scrape time"""
+
+    def collect(self):
+        process = GaugeMetricFamily(
+            "genai_process_memory_bytes",
+            "Memory of the worker process by kind (rss, uss, peak_rss, swap)",
+            labels=["kind"]
+        )
+        for kind, value in process_memory().items():
+            process.add_metric([kind], value)
+        yield process
+
+        torch_stats = torch_memory()
+        if torch_stats.get("devices"):
+            torch_gauge = GaugeMetricFamily(
+                "genai_torch_memory_bytes",
+                "torch CUDA allocator memory by device and kind (allocated, reserved, max_allocated)",
+                labels=["device", "kind"]
+            )
+            for device, values in torch_stats["devices"].items():
+                for kind, value in values.items():
+                    torch_gauge.add_metric([device, kind], value)
+            yield torch_gauge
+
+        pending = GaugeMetricFamily(
+            "genai_gc_pending_allocations",
+            "Allocations minus deallocations since the last collection, per garbage collector generation",
+            labels=["generation"]
+        )
+        collections = CounterMetricFamily(
+            "genai_gc_collections",
+            "Garbage collections per generation",
+            labels=["generation"]
+        )
+        uncollectable = CounterMetricFamily(
+            "genai_gc_uncollectable_objects",
+            "Objects the garbage collector found but could not free, per generation",
+            labels=["generation"]
+        )
+        for generation, (count, stats) in enumerate(zip(gc.get_count(), gc.get_stats())):
+            pending.add_metric([str(generation)], count)
+            collections.add_metric([str(generation)], stats["collections"])
+            uncollectable.add_metric([str(generation)], stats["uncollectable"])
+        yield pending
+        yield collections
+        yield uncollectable
+
+        if tracemalloc.is_tracing():
+            traced = GaugeMetricFamily(
+                "genai_tracemalloc_traced_bytes",
+                "Python memory traced by tracemalloc by kind (current, peak)",
+                labels=["kind"]
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            traced.add_metric(["current"], current)
+            traced.add_metric(["peak"], peak)
+            yield traced
+
+
+REGISTRY.register(_MemoryCollector())
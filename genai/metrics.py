@@ -0,0 +1,316 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Tuple
+
+from opentelemetry import trace
+from prometheus_client import Counter, Gauge, Histogram
+
+from request_context import current_cancel_scope, current_endpoint, current_request_stats, current_stage
+
+# Prometheus collectors for the GenAI service.
+# They are registered on the default registry, which the Instrumentator exposes on /metrics.
+
+# Pipeline stages
+STAGE_DURATION = Histogram(
+    "genai_stage_duration_seconds",
+    "Duration of pipeline stages (embedding, weaviate_query, weaviate_write, weaviate_delete, prompt_build, llm_call, parse) "
+    "by endpoint and prompt type (context_aware, standalone, none)",
+    ["stage", "endpoint", "prompt_type"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+# Semantic cache
+SEMANTIC_CACHE_REQUESTS = Counter(
+    "genai_semantic_cache_requests_total",
+    "Semantic cache lookups by namespace and result (hit, miss, bypass)",
+    ["namespace", "result"]
+)
+
+SEMANTIC_CACHE_LATENCY_SAVED = Counter(
+    "genai_semantic_cache_latency_saved_seconds_total",
+    "LLM generation time avoided by serving responses from the semantic cache",
+    ["namespace"]
+)
+
+SEMANTIC_CACHE_EVICTIONS = Counter(
+    "genai_semantic_cache_evictions_total",
+    "Semantic cache evictions by namespace and reason (ttl, size)",
+    ["namespace", "reason"]
+)
+
+SEMANTIC_CACHE_ENTRIES = Gauge(
+    "genai_semantic_cache_entries",
+    "Current number of entries in the semantic cache",
+    ["namespace"]
+)
+
+# Recipe generation parsing
+RECIPE_PARSE_RESULTS = Counter(
+    "genai_recipe_parse_total",
+    "Recipe JSON parse results by operation, attempt (initial, repair) and outcome (success, failure)",
+    ["operation", "attempt", "outcome"]
+)
+
+RECIPE_REPAIR_DURATION = Histogram(
+    "genai_recipe_repair_duration_seconds",
+    "Time spent on LLM repair round trips after a recipe failed schema validation",
+    ["operation"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+# LLM token usage and throughput
+LLM_TOKENS = Counter(
+    "genai_llm_tokens_total",
+    "LLM tokens by operation, prompt type, kind (prompt, completion) and source (usage reported by the backend, local estimate)",
+    ["operation", "prompt_type", "kind", "source"]
+)
+
+LLM_COMPLETION_TOKENS = Histogram(
+    "genai_llm_completion_tokens",
+    "Completion tokens per LLM call",
+    ["operation", "prompt_type"],
+    buckets=(50, 100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 4000)
+)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "genai_llm_time_to_first_token_seconds",
+    "Time from sending a streamed LLM request to the first content token",
+    ["operation", "prompt_type"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+)
+
+LLM_OUTPUT_TOKENS_PER_SECOND = Histogram(
+    "genai_llm_output_tokens_per_second",
+    "Generation speed of streamed LLM calls after the first token",
+    ["operation", "prompt_type"],
+    buckets=(1, 2.5, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200)
+)
+
+# Prompt size
+PROMPT_TOKENS = Histogram(
+    "genai_prompt_tokens",
+    "Tokens in the formatted recipe generation prompt sent to the LLM",
+    ["operation", "prompt_type"],
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+)
+
+PROMPT_CONTEXT_TOKENS = Histogram(
+    "genai_prompt_context_tokens",
+    "Tokens of retrieved recipe context included in prompts",
+    ["operation"],
+    buckets=(0, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000)
+)
+
+PROMPT_CONTEXT_TOKENS_SAVED = Histogram(
+    "genai_prompt_context_tokens_saved",
+    "Tokens of retrieved recipe context dropped to stay within the context token budget",
+    ["operation"],
+    buckets=(0, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+
+# Circuit breakers
+CIRCUIT_BREAKER_STATE = Gauge(
+    "genai_circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["breaker"]
+)
+
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "genai_circuit_breaker_transitions_total",
+    "Circuit breaker state changes by the state entered",
+    ["breaker", "state"]
+)
+
+WEAVIATE_RECONNECTS = Counter(
+    "genai_weaviate_reconnects_total",
+    "Attempts to reconnect to Weaviate by outcome (success, failure)",
+    ["outcome"]
+)
+
+# Adaptive LLM concurrency limit
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "genai_llm_concurrency_limit",
+    "Current adaptive limit of concurrent LLM calls",
+    ["limiter"]
+)
+
+LLM_INFLIGHT = Gauge(
+    "genai_llm_inflight_calls",
+    "LLM calls holding a concurrency permit",
+    ["limiter"]
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "genai_llm_queue_depth",
+    "LLM calls waiting for a concurrency permit",
+    ["limiter"]
+)
+
+LLM_LIMITER_REQUESTS = Counter(
+    "genai_llm_limiter_requests_total",
+    "Concurrency permit requests by outcome (admitted, queued, rejected, timeout, aborted)",
+    ["limiter", "outcome"]
+)
+
+LLM_QUEUE_WAIT = Histogram(
+    "genai_llm_queue_wait_seconds",
+    "Time LLM calls waited for a concurrency permit",
+    ["limiter"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+)
+
+# Per-caller rate limits
+RATE_LIMIT_REQUESTS = Counter(
+    "genai_rate_limit_requests_total",
+    "Rate-limited endpoint requests by outcome (allowed, limited, too_expensive, error)",
+    ["endpoint", "outcome"]
+)
+
+# Stage budgets
+STAGE_TIMEOUTS = Counter(
+    "genai_stage_timeouts_total",
+    "Pipeline stages that exceeded their time budget, by the fallback that was used instead",
+    ["stage", "fallback"]
+)
+
+# Batch suggestions
+BATCH_SUGGESTIONS = Counter(
+    "genai_batch_suggestions_total",
+    "Suggestions of batch requests by outcome (succeeded, failed)",
+    ["outcome"]
+)
+
+# Degraded mode
+DEGRADED_RESPONSES = Counter(
+    "genai_degraded_responses_total",
+    "Recipe suggestions assembled from retrieved recipes without the LLM",
+    ["reason"]
+)
+
+# LLM backend routing
+LLM_BACKEND_REQUESTS = Counter(
+    "genai_llm_backend_requests_total",
+    "LLM calls per backend by outcome (success, error, cancelled)",
+    ["backend", "outcome"]
+)
+
+LLM_BACKEND_LATENCY = Histogram(
+    "genai_llm_backend_latency_seconds",
+    "Latency of successful LLM calls per backend",
+    ["backend"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+LLM_HEDGED_REQUESTS = Counter(
+    "genai_llm_hedged_requests_total",
+    "Hedged LLM calls by the attempt that answered first (primary, hedge, none)",
+    ["winner"]
+)
+
+# Chat intent routing
+INTENT_REQUESTS = Counter(
+    "genai_intent_requests_total",
+    "Chat messages by routed intent (search, creation, chitchat) and classification method (keyword, centroid, default, disabled)",
+    ["intent", "method"]
+)
+
+INTENT_LATENCY_SAVED = Counter(
+    "genai_intent_latency_saved_seconds_total",
+    "Estimated retrieval and prompt context time skipped by intent routing (recent average of the skipped stages)",
+    ["intent"]
+)
+
+# Request cancellation
+REQUEST_CANCELLATIONS = Counter(
+    "genai_request_cancellations_total",
+    "Requests cancelled because their deadline passed or the client disconnected, by the pipeline stage that was running",
+    ["endpoint", "stage", "reason"]
+)
+
+# Speculative standalone generation
+SPECULATIVE_GENERATIONS = Counter(
+    "genai_speculative_generations_total",
+    "Standalone recipe generations started alongside retrieval, by outcome (used, used_late_context, restarted, failed)",
+    ["outcome"]
+)
+
+SPECULATION_SAVED = Counter(
+    "genai_speculation_saved_seconds_total",
+    "Retrieval and context time overlapped with a speculative generation whose result was used"
+)
+
+SPECULATION_WASTED = Counter(
+    "genai_speculation_wasted_seconds_total",
+    "LLM time spent on speculative generations that were cancelled for a context-aware generation"
+)
+
+# Tracing
+TRACES = Counter(
+    "genai_traces_total",
+    "Finished traces by tail sampling decision (slow, error, upstream, random, dropped, incomplete)",
+    ["decision"]
+)
+
+# The LLM connection pool gauges (genai_llm_http_pool_*) are collected at scrape time in http_clients.py
+
+
+class _StageTimer:
+    """Running stage, collecting the time spent in stages nested inside it"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.nested_seconds = 0.0
+
+
+tracer = trace.get_tracer(__name__)
+
+_active_stages: ContextVar[Tuple[_StageTimer, ...]] = ContextVar("active_stages", default=())
+
+
+@contextmanager
+def observe_stage(stage: str, prompt_type: str = "none"):
+    """
+    Record the duration of a pipeline stage in genai_stage_duration_seconds and the current
+    request's stats (Server-Timing), and trace it as a `genai.<stage>` span.
+
+    Stages can be nested (e.g. the embedding done inside a Weaviate query). Time spent in
+    a nested stage is only counted for that stage, not for the enclosing one.
+
+    A stage of a cancelled request (deadline passed or client gone) raises RequestCancelled
+    instead of starting.
+    """
+    cancel_scope = current_cancel_scope.get()
+    stage_token = current_stage.set(stage)
+    if cancel_scope is not None:
+        cancel_scope.enter_stage(stage)
+        try:
+            cancel_scope.check()
+        except BaseException:
+            cancel_scope.exit_stage(stage)
+            current_stage.reset(stage_token)
+            raise
+
+    parents = _active_stages.get()
+    timer = _StageTimer()
+    token = _active_stages.set(parents + (timer,))
+    try:
+        with tracer.start_as_current_span(f"genai.{stage}", attributes={"genai.prompt_type": prompt_type}):
+            yield
+    finally:
+        _active_stages.reset(token)
+        elapsed = time.perf_counter() - timer.start
+        if parents:
+            parents[-1].nested_seconds += elapsed
+        exclusive = max(elapsed - timer.nested_seconds, 0.0)
+        STAGE_DURATION.labels(
+            stage=stage,
+            endpoint=current_endpoint.get(),
+            prompt_type=prompt_type
+        ).observe(exclusive)
+        request_stats = current_request_stats.get()
+        if request_stats is not None:
+            request_stats.record_stage(stage, exclusive)
+        if cancel_scope is not None:
+            cancel_scope.exit_stage(stage)
+        current_stage.reset(stage_token)
@@ -0,0 +1,175 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+# Standard library and installed packages, left out of request summaries
+LIBRARY_PATHS = tuple({os.path.abspath(sysconfig.get_path(name)) for name in ("stdlib", "purelib", "platlib")})
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def frame_label(frame) -> str:
+    """Collapsed-stack label of a frame, e.g. `_try_parse_recipe_response (llm.py:1188)`"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def collapse_stacks(samples: Counter) -> str:
+    """Render stack samples in the collapsed format read by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class RequestProfile:
+    """cProfile results of a single request"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.duration_ms = 0.0
+
+    def top_functions(self, limit: int = 10, app_only: bool = False) -> List[Tuple[str, float, int]]:
+        """Functions with the highest cumulative time as (label, cumulative ms, calls)
+
+        Args:
+            limit: Number of functions to return.
+            app_only: Leave out functions of the standard library and installed packages.
+        """
+        stats = pstats.Stats(self.profile)
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top = []
+        for (filename, line, name), (_, calls, _, cumulative, _) in entries:
+            if name.startswith("<") or filename == __file__:
+                continue
+            if app_only and (filename.startswith("<") or os.path.abspath(filename).startswith(LIBRARY_PATHS)):
+                continue
+            top.append((f"{name} ({os.path.basename(filename)}:{line})", round(cumulative * 1000, 2), calls))
+            if len(top) == limit:
+                break
+        return top
+
+    def summary_header(self, limit: int = 10) -> str:
+        """Compact summary of the service's own functions for the X-Profile-Summary response header"""
+        return "; ".join(f"{label}={ms}ms" for label, ms, _ in self.top_functions(limit, app_only=True))
+
+    def stats_text(self, limit: int = 30) -> str:
+        """pstats report sorted by cumulative time"""
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+
+class Profiler:
+    """
+    On-demand CPU profiling of the service.
+
+    `sample` records the stacks of all threads of the worker at a fixed interval for a
+    number of seconds and returns them as collapsed stacks. `profile_request` runs cProfile
+    around a single request. Both are off unless PROFILING_ENABLED is true and require the
+    ADMIN_TOKEN, and only one profile of each kind runs at a time. When disabled the only
+    cost is checking `enabled` per request.
+
+    cProfile measures the whole event loop thread, so other requests handled concurrently
+    on the same worker show up in a request profile.
+    """
+
+    def __init__(self):
+        """Initialize the profiler from the environment"""
+        self.enabled = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+        self.admin_token = os.getenv("ADMIN_TOKEN", "")
+        self.max_seconds = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+        self.sample_interval = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "10")) / 1000
+
+        if self.enabled and not self.admin_token:
+            logger.warning("PROFILING_ENABLED is set but ADMIN_TOKEN is empty, profiling is unavailable")
+
+        self._sampling_lock = threading.Lock()
+        self._request_lock = threading.Lock()
+
+    def is_authorized(self, token: Optional[str]) -> bool:
+        """Check an admin token"""
+        return bool(self.enabled and self.admin_token and token and secrets.compare_digest(token, self.admin_token))
+
+    def sample(self, seconds: float, interval: Optional[float] = None) -> Tuple[str, int]:
+        """
+        Sample the stacks of all threads.
+
+        Args:
+            seconds: How long to sample, at most PROFILING_MAX_SECONDS.
+            interval: Seconds between samples, PROFILING_SAMPLE_INTERVAL_MS by default.
+
+        Returns:
+            Tuple of (collapsed stacks, number of sampling rounds).
+        """
+        if not self._sampling_lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already being recorded")
+
+        interval = interval or self.sample_interval
+        samples: Counter = Counter()
+        rounds = 0
+        own_thread = threading.get_ident()
+        start_time = time.perf_counter()
+
+        try:
+            deadline = time.monotonic() + min(seconds, self.max_seconds)
+            while time.monotonic() < deadline:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(thread_names.get(thread_id, f"thread-{thread_id}").replace(";", ","))
+                    samples[";".join(reversed(stack))] += 1
+                rounds += 1
+                time.sleep(interval)
+        finally:
+            self._sampling_lock.release()
+
+        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        structured_logger.info(
+            f"Sampling profile recorded: {rounds} rounds",
+            extra={
+                'duration_ms': duration_ms,
+                'extra_context': {
+                    'operation': 'sampling_profile',
+                    'rounds': rounds,
+                    'interval_ms': interval * 1000,
+                    'distinct_stacks': len(samples)
+                }
+            }
+        )
+        return collapse_stacks(samples), rounds
+
+    @contextmanager
+    def profile_request(self) -> Iterator[Optional[RequestProfile]]:
+        """Run cProfile around a request; yields None if another request is being profiled"""
+        if not self._request_lock.acquire(blocking=False):
+            yield None
+            return
+
+        request_profile = RequestProfile()
+        start_time = time.perf_counter()
+        request_profile.profile.enable()
+        try:
+            yield request_profile
+        finally:
+            request_profile.profile.disable()
+            request_profile.duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+            self._request_lock.release()
@@ -5,12 +5,21 @@ import json
 from typing import List, Dict, Any
 import weaviate
 import weaviate.classes.config as wc
-from weaviate.classes.query import Filter
+from weaviate.classes.query import Filter, MetadataQuery
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_weaviate.vectorstores import WeaviateVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from dotenv import load_dotenv
+from opentelemetry import trace
+
+from metrics import observe_stage
+from request_context import current_request_stats
+from resilience import CircuitBreaker
+from weaviate_connection import WeaviateConnection
+
+tracer = trace.get_tracer(__name__)
 
 # Setup shared embeddings model
 load_dotenv()
@@ -23,6 +32,22 @@ logger = logging.getLogger(__name__)
 # Create structured logger for detailed logging
 structured_logger = logging.getLogger("structured")
 
+
+class StageTimedEmbeddings(Embeddings):
+    """Embeddings wrapper that records the embedding stage, also when the vector store embeds internally"""
+    
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with observe_stage("embedding"):
+            return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        with observe_stage("embedding"):
+            return self.embeddings.embed_query(text)
+
+
 class RAGHelper:
     """
     A helper for the retrieval stage of the RAG pipeline for recipe search and generation.
@@ -54,11 +79,18 @@ class RAGHelper:
                 }}
             )
             
-            # Initialize Weaviate client
-            self._initialize_weaviate_client()
-            
-            # Initialize vector store with proper schema
-            self._setup_vector_store()
+            # Initialize Weaviate client and vector store, reconnected lazily if Weaviate goes away
+            self.connection = WeaviateConnection(
+                connect=self._connect,
+                breaker=CircuitBreaker(
+                    "weaviate",
+                    failure_threshold=int(os.getenv("WEAVIATE_CIRCUIT_FAILURE_THRESHOLD", "3")),
+                    reset_timeout=float(os.getenv("WEAVIATE_CIRCUIT_RESET_SECONDS", "15"))
+                ),
+                backoff_initial=int(os.getenv("WEAVIATE_RECONNECT_BACKOFF_MS", "500")) / 1000,
+                backoff_max=int(os.getenv("WEAVIATE_RECONNECT_MAX_BACKOFF_MS", "30000")) / 1000
+            )
+            self.connection.connect()
             
             duration_ms = round((time.time() - start_time) * 1000, 2)
             logger.info(f"RAG helper initialized successfully in {duration_ms}ms")
@@ -92,6 +124,12 @@ class RAGHelper:
             )
             raise
     
+    def _connect(self):
+        """Connect to Weaviate and set up the vector store on the new client"""
+        self._initialize_weaviate_client()
+        self._setup_vector_store()
+        return self.weaviate_client
+    
     def _initialize_weaviate_client(self):
         """Initialize Weaviate client connection"""
         start_time = time.time()
@@ -205,7 +243,7 @@ class RAGHelper:
                 self.db = WeaviateVectorStore(
                     client=self.weaviate_client,
                     index_name="recipes",
-                    embedding=embeddings_model,
+                    embedding=StageTimedEmbeddings(embeddings_model),
                     text_key="text"
                 )
             else:
@@ -322,7 +360,7 @@ class RAGHelper:
             self.db = WeaviateVectorStore(
                 client=self.weaviate_client,
                 index_name="recipes",
-                embedding=embeddings_model,
+                embedding=StageTimedEmbeddings(embeddings_model),
                 text_key="text"
             )
             
@@ -399,7 +437,8 @@ class RAGHelper:
             
             # Add to vector store
             vector_store_start = time.time()
-            self.db.add_documents([doc])
+            with observe_stage("weaviate_write"):
+                self.connection.call("add_recipe", lambda: self.db.add_documents([doc]))
             vector_store_duration = round((time.time() - vector_store_start) * 1000, 2)
             
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -447,13 +486,65 @@ class RAGHelper:
             )
             return False
     
-    def retrieve(self, query: str, top_k: int = 5) -> List[Document]:
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the shared embeddings model.
+        
+        Args:
+            query: The search query.
+        
+        Returns:
+            The query embedding.
+        """
+        with observe_stage("embedding"):
+            return embeddings_model.embed_query(query)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries in one batch with the shared embeddings model.
+        
+        Args:
+            queries: The search queries.
+        
+        Returns:
+            The query embeddings, in query order.
+        """
+        with observe_stage("embedding"):
+            return embeddings_model.embed_documents(queries)
+    
+    def _search_metadata(self, query: str, top_k: int, query_vector: List[float], request_stats) -> List[Document]:
+        """Same hybrid search as the vector store, projected to the recipe id and title"""
+        if query_vector is None:
+            query_vector = self.embed_query(query)
+        response = self.weaviate_client.collections.get("recipes").query.hybrid(
+            query=query,
+            vector=query_vector,
+            limit=top_k,
+            return_properties=["recipe_id", "title"],
+            return_metadata=MetadataQuery(score=True)
+        )
+        results = [Document(page_content="", metadata=dict(obj.properties)) for obj in response.objects]
+        if request_stats is not None and request_stats.debug:
+            request_stats.record_retrieval([
+                {
+                    'recipe_id': obj.properties.get('recipe_id', 'unknown'),
+                    'title': obj.properties.get('title', 'unknown'),
+                    'score': round(float(obj.metadata.score or 0.0), 4)
+                }
+                for obj in response.objects
+            ])
+        return results
+    
+    @tracer.start_as_current_span("rag.retrieve")
+    def retrieve(self, query: str, top_k: int = 5, query_vector: List[float] = None, metadata_only: bool = False) -> List[Document]:
         """
         Retrieve relevant documents from the vector store based on a query.
         
         Args:
             query: The search query.
             top_k: The number of top results to return.
+            query_vector: Precomputed embedding of the query, reused instead of embedding it again.
+            metadata_only: Only fetch the recipe id and title, the documents have no page content.
         
         Returns:
             List of retrieved documents.
@@ -475,8 +566,30 @@ class RAGHelper:
             
             # Perform similarity search
             similarity_start = time.time()
-            results = self.db.similarity_search(query, k=top_k)
+            request_stats = current_request_stats.get()
+            search_kwargs = {"vector": query_vector} if query_vector is not None else {}
+            
+            def search() -> List[Document]:
+                if metadata_only:
+                    return self._search_metadata(query, top_k, query_vector, request_stats)
+                if request_stats is not None and request_stats.debug:
+                    # Scores are only fetched for debug=true requests
+                    scored = self.db.similarity_search_with_score(query, k=top_k, **search_kwargs)
+                    request_stats.record_retrieval([
+                        {
+                            'recipe_id': doc.metadata.get('recipe_id', 'unknown'),
+                            'title': doc.metadata.get('title', 'unknown'),
+                            'score': round(float(score), 4)
+                        }
+                        for doc, score in scored
+                    ])
+                    return [doc for doc, _ in scored]
+                return self.db.similarity_search(query, k=top_k, **search_kwargs)
+            
+            with observe_stage("weaviate_query"):
+                results = self.connection.call("retrieve", search)
             similarity_duration = round((time.time() - similarity_start) * 1000, 2)
+            trace.get_current_span().set_attributes({"genai.top_k": top_k, "genai.documents": len(results)})
             
             total_duration = round((time.time() - start_time) * 1000, 2)
             
@@ -555,9 +668,10 @@ class RAGHelper:
             
             # Delete by exact combined recipe_id
             deletion_start = time.time()
-            self.weaviate_client.collections.get("recipes").data.delete_many(
-                where=Filter.by_property("recipe_id").equal(combined_id)
-            )
+            with observe_stage("weaviate_delete"):
+                self.connection.call("delete_recipe", lambda: self.weaviate_client.collections.get("recipes").data.delete_many(
+                    where=Filter.by_property("recipe_id").equal(combined_id)
+                ))
             deletion_duration = round((time.time() - deletion_start) * 1000, 2)
             
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -626,9 +740,10 @@ class RAGHelper:
             
             # Delete by exact recipe_id match
             deletion_start = time.time()
-            self.weaviate_client.collections.get("recipes").data.delete_many(
-                where=Filter.by_property("recipe_id").equal(recipe_id)
-            )
+            with observe_stage("weaviate_delete"):
+                self.connection.call("delete_recipe_by_recipe_id", lambda: self.weaviate_client.collections.get("recipes").data.delete_many(
+                    where=Filter.by_property("recipe_id").equal(recipe_id)
+                ))
             deletion_duration = round((time.time() - deletion_start) * 1000, 2)
             
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -693,8 +808,10 @@ class RAGHelper:
             
             # Get collection statistics
             stats_start = time.time()
-            collection = self.weaviate_client.collections.get("recipes")
-            stats = collection.aggregate.over_all()
+            stats = self.connection.call(
+                "get_collection_stats",
+                lambda: self.weaviate_client.collections.get("recipes").aggregate.over_all()
+            )
             stats_duration = round((time.time() - stats_start) * 1000, 2)
             
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -702,7 +819,8 @@ class RAGHelper:
             result = {
                 "collection_name": "recipes",
                 "total_objects": len(stats),
-                "status": "healthy"
+                "status": "healthy",
+                "circuit_breaker": self.connection.breaker.state
             }
             
             logger.info(f"Retrieved collection statistics in {total_duration}ms: {len(stats)} objects")
@@ -745,6 +863,7 @@ class RAGHelper:
                 "collection_name": "recipes",
                 "total_objects": 0,
                 "status": "unhealthy",
+                "circuit_breaker": self.connection.breaker.state,
                 "error": str(e)
             }
     
@@ -766,7 +885,7 @@ class RAGHelper:
             
             # Close Weaviate client connection
             cleanup_start = time.time()
-            self.weaviate_client.close()
+            self.connection.close()
             cleanup_duration = round((time.time() - cleanup_start) * 1000, 2)
             
             total_duration = round((time.time() - start_time) * 1000, 2)
@@ -0,0 +1,276 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from metrics import RATE_LIMIT_REQUESTS
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+# Header with the authenticated subject, set by the API gateway from the JWT (UserIdHeaderFilter)
+USER_ID_HEADER = "x-user-id"
+
+
+class RateLimitExceededError(Exception):
+    """Raised when a caller has no tokens left for a request"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestCostExceededError(Exception):
+    """Raised when a request costs more tokens than a full bucket holds, so it could never pass"""
+
+    def __init__(self, message: str, cost: float, capacity: float):
+        super().__init__(message)
+        self.cost = cost
+        self.capacity = capacity
+
+
+@dataclass
+class BucketResult:
+    """Outcome of taking tokens from a bucket"""
+    allowed: bool
+    # Tokens left after the request (or before it, if it was not allowed)
+    remaining: float
+    # Seconds until the bucket holds enough tokens for the request, 0 if it was allowed
+    retry_after: float
+
+
+def refill(tokens: float, updated: float, now: float, capacity: float, refill_rate: float) -> float:
+    """Tokens in a bucket that held `tokens` at `updated`, refilled until `now`"""
+    return min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+
+
+def take_tokens(tokens: float, cost: float, refill_rate: float) -> BucketResult:
+    """Take `cost` tokens from a refilled bucket holding `tokens`"""
+    if tokens >= cost:
+        return BucketResult(allowed=True, remaining=tokens - cost, retry_after=0.0)
+    retry_after = (cost - tokens) / refill_rate if refill_rate > 0 else float("inf")
+    return BucketResult(allowed=False, remaining=tokens, retry_after=retry_after)
+
+
+class MemoryBucketStore:
+    """
+    Token buckets of a single worker process.
+
+    At most `max_keys` buckets are kept; the least recently used bucket is dropped first,
+    which gives its caller a full bucket again.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> BucketResult:
+        """Take `cost` tokens from the bucket of `key`, if it holds enough"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            result = take_tokens(refill(tokens, updated, now, capacity, refill_rate), cost, refill_rate)
+            self._buckets[key] = (result.remaining, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return result
+
+    def reset(self) -> None:
+        """Drop all buckets"""
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, shared by every process that opens the same file.
+
+    Each request reads and updates its bucket in one write transaction, so processes sharing
+    the file never spend the same tokens twice. The file uses SQLite's default rollback
+    journal, which relies on POSIX file locks: processes on one node always share it safely,
+    processes on different nodes only if the volume's filesystem implements those locks
+    correctly, which most network filesystems do not. Timestamps are wall-clock time, which
+    the processes must agree on.
+
+    Buckets that refilled to capacity are deleted every `prune_interval` seconds, since a
+    missing bucket is a full one.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 1.0, prune_interval: float = 60.0):
+        """
+        Open the database and create the bucket table.
+
+        Raises:
+            sqlite3.Error: If the file cannot be opened or written.
+        """
+        self.path = path
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        try:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        except BaseException:
+            self._connection.close()
+            raise
+
+    def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> BucketResult:
+        """Take `cost` tokens from the bucket of `key`, if it holds enough"""
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = connection.execute(
+                    "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row is not None else (capacity, now)
+                result = take_tokens(refill(tokens, updated, now, capacity, refill_rate), cost, refill_rate)
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, result.remaining, now)
+                )
+                if now >= self._next_prune:
+                    self._next_prune = now + self.prune_interval
+                    connection.execute(
+                        "DELETE FROM rate_limit_buckets WHERE tokens + (? - updated) * ? >= ?",
+                        (now, refill_rate, capacity)
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return result
+
+    def reset(self) -> None:
+        """Drop all buckets"""
+        with self._lock:
+            self._connection.execute("DELETE FROM rate_limit_buckets")
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._connection.close()
+
+
+class RateLimiter:
+    """
+    Per-caller token-bucket rate limit for the endpoints that call the LLM.
+
+    Each caller, identified by the subject the API gateway forwards in X-User-Id or else by
+    the client IP, gets a bucket of `capacity` tokens that refills at `refill_rate` tokens
+    per second. Requests take tokens by their kind: recipe creation costs more than a search,
+    and every recipe a request generates (batch queries, variants) is charged.
+    Buckets live in the worker process, or in a SQLite file with RATE_LIMIT_BACKEND=sqlite so
+    that the limit holds across workers and replicas sharing the file. If the file cannot be
+    opened at startup, buckets are kept per worker instead; if the shared store fails later,
+    requests are let through.
+    """
+
+    def __init__(self):
+        """Initialize the rate limiter from the environment"""
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.capacity = float(os.getenv("RATE_LIMIT_CAPACITY", "60"))
+        self.refill_rate = float(os.getenv("RATE_LIMIT_REFILL_PER_SECOND", "1"))
+        self.costs: Dict[str, float] = {
+            "search": float(os.getenv("RATE_LIMIT_COST_SEARCH", "1")),
+            "creation": float(os.getenv("RATE_LIMIT_COST_CREATION", "5"))
+        }
+        self.backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+        self.store = None
+        if self.enabled:
+            if self.backend == "sqlite":
+                path = os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/genai-rate-limit.sqlite3")
+                try:
+                    self.store = SQLiteBucketStore(path)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to open rate limit database {path}, keeping buckets per worker instead: {e}")
+            if self.store is None:
+                self.store = MemoryBucketStore(int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000")))
+
+    @property
+    def blocking(self) -> bool:
+        """Whether `check` can wait for other processes (the shared store's locks)"""
+        return isinstance(self.store, SQLiteBucketStore)
+
+    @staticmethod
+    def subject(user_id: Optional[str], client_ip: Optional[str]) -> str:
+        """Bucket key of a caller: the authenticated subject, or the client IP without one"""
+        if user_id and user_id.strip():
+            return f"user:{user_id.strip()}"
+        return f"ip:{client_ip or 'unknown'}"
+
+    def check(self, subject: str, kind: str, endpoint: str, units: int = 1) -> None:
+        """
+        Take the tokens of a request.
+
+        Args:
+            subject: Bucket key of the caller, see `subject`.
+            kind: Kind of request, "search" or "creation".
+            endpoint: Endpoint name for metrics and logs.
+            units: Number of requests of that kind, e.g. the queries of a batch.
+
+        Raises:
+            RateLimitExceededError: If the caller's bucket does not hold enough tokens.
+            RequestCostExceededError: If the request costs more than a full bucket.
+        """
+        if not self.enabled or self.store is None:
+            return
+
+        cost = self.costs.get(kind, self.costs["creation"]) * units
+        if cost > self.capacity:
+            # Rejected rather than discounted, so that batching is no way around the limit
+            RATE_LIMIT_REQUESTS.labels(endpoint=endpoint, outcome="too_expensive").inc()
+            raise RequestCostExceededError(
+                f"Request costs {cost:g} rate limit tokens, more than the {self.capacity:g} a caller can hold",
+                cost=cost,
+                capacity=self.capacity
+            )
+        try:
+            result = self.store.take(subject, cost, self.capacity, self.refill_rate)
+        except Exception as e:
+            RATE_LIMIT_REQUESTS.labels(endpoint=endpoint, outcome="error").inc()
+            logger.warning(f"Rate limit store failed, allowing request: {e}")
+            return
+
+        if result.allowed:
+            RATE_LIMIT_REQUESTS.labels(endpoint=endpoint, outcome="allowed").inc()
+            return
+
+        RATE_LIMIT_REQUESTS.labels(endpoint=endpoint, outcome="limited").inc()
+        structured_logger.warning(
+            f"Request rate limited: {endpoint}",
+            extra={'extra_context': {
+                'operation': 'rate_limit',
+                'endpoint': endpoint,
+                'subject': subject,
+                'kind': kind,
+                'cost': cost,
+                'tokens': round(result.remaining, 2),
+                'retry_after_s': round(result.retry_after, 2)
+            }}
+        )
+        raise RateLimitExceededError(
+            f"Rate limit exceeded for {subject}, retry in {result.retry_after:.1f}s",
+            retry_after=result.retry_after
+        )
+
+    def reset(self) -> None:
+        """Refill every bucket"""
+        if self.store is not None:
+            self.store.reset()
+
+    def close(self) -> None:
+        """Release the shared store"""
+        if isinstance(self.store, SQLiteBucketStore):
+            self.store.close()
@@ -0,0 +1,237 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+# Per-request values set by the HTTP middleware in main.py and read deeper in the pipeline.
+# Code running outside of a request (startup, background work) sees the defaults.
+
+# Route template of the current request, e.g. "/genai/chat"
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="internal")
+
+# Innermost pipeline stage of the current thread or task, set by metrics.observe_stage
+current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+
+# Server-Timing metric names of the pipeline stages recorded by metrics.observe_stage
+SERVER_TIMING_NAMES = {
+    "embedding": "embed",
+    "weaviate_query": "search",
+    "weaviate_write": "index",
+    "weaviate_delete": "delete",
+    "prompt_build": "prompt",
+    "llm_queue": "queue",
+    "llm_call": "llm",
+    "parse": "parse"
+}
+
+
+class RequestStats:
+    """
+    Counters accumulated while a request is processed, reported in the request log and the
+    Server-Timing header.
+
+    Args:
+        debug: Also collect the retrieved documents and their scores for the debug breakdown.
+    """
+
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Time spent per stage, excluding nested stages, summed over repeated stages
+        self.stage_seconds: Dict[str, float] = {}
+        self.retrieved: List[Dict[str, Any]] = []
+        # Fallbacks used for stages that exceeded their budget, e.g. "weaviate_query:standalone_prompt"
+        self.fallbacks: List[str] = []
+        self._lock = threading.Lock()
+
+    def record_llm_call(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Add the token usage of an LLM call"""
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """Add the duration of a pipeline stage"""
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def record_fallback(self, stage: str, fallback: str) -> None:
+        """Add the fallback used for a stage that exceeded its budget"""
+        with self._lock:
+            self.fallbacks.append(f"{stage}:{fallback}")
+
+    def record_retrieval(self, documents: List[Dict[str, Any]]) -> None:
+        """Add retrieved documents (recipe id, title, score) for the debug breakdown"""
+        with self._lock:
+            self.retrieved.extend(documents)
+
+    def stage_ms(self) -> Dict[str, float]:
+        """Stage durations in milliseconds"""
+        with self._lock:
+            return {stage: round(seconds * 1000, 2) for stage, seconds in self.stage_seconds.items()}
+
+    def server_timing(self, total_ms: float) -> str:
+        """Server-Timing header value, e.g. `embed;dur=12.1, search;dur=40.3, llm;dur=9821.0, total;dur=9902.4`"""
+        metrics = [f"{SERVER_TIMING_NAMES.get(stage, stage)};dur={ms}" for stage, ms in self.stage_ms().items()]
+        return ", ".join(metrics + [f"total;dur={total_ms}"])
+
+    def debug_info(self, elapsed_ms: float) -> Dict[str, Any]:
+        """Timing breakdown, retrieval scores and token counts for debug=true responses"""
+        with self._lock:
+            retrieved = list(self.retrieved)
+        return {
+            'elapsed_ms': elapsed_ms,
+            'stages_ms': self.stage_ms(),
+            'retrieved': retrieved,
+            **self.as_log_context()
+        }
+
+    def as_log_context(self) -> Dict[str, Any]:
+        """Fields for the structured request log"""
+        context = {
+            'llm_calls': self.llm_calls,
+            'llm_prompt_tokens': self.prompt_tokens,
+            'llm_completion_tokens': self.completion_tokens
+        }
+        if self.fallbacks:
+            context['fallbacks'] = list(self.fallbacks)
+        return context
+
+
+# Stats of the current request, None outside of a request
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+class RequestCancelled(BaseException):
+    """
+    Raised in the pipeline once its request was cancelled.
+
+    Like asyncio.CancelledError it derives from BaseException, so the pipeline's catch-all
+    error handlers let it through instead of turning it into a fallback response.
+
+    Args:
+        reason: deadline or disconnect.
+        stage: Pipeline stage that was running or about to start, None between stages.
+    """
+
+    def __init__(self, reason: str, stage: Optional[str] = None):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+        self.stage = stage
+
+
+class CancelScope:
+    """
+    Deadline and cancellation state of a request, shared by all threads working on it.
+
+    The pipeline calls `check` at every stage boundary; in-flight work that can be
+    aborted (e.g. async LLM calls) registers a callback with `on_cancel`. Stages of the
+    request can run concurrently in several threads and tasks, so the scope keeps all
+    running stages rather than a single current one.
+
+    Args:
+        deadline: time.monotonic() value after which the request is cancelled, None for no deadline.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        # Stage running when the request was cancelled
+        self.stage: Optional[str] = None
+        # Stages running in any thread or task of the request, in start order
+        self._running_stages: List[str] = []
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (at least 0), None without a deadline"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def enter_stage(self, stage: str) -> None:
+        """Register a stage that started running for the request"""
+        with self._lock:
+            self._running_stages.append(stage)
+
+    def exit_stage(self, stage: str) -> None:
+        """Unregister a stage registered with `enter_stage`"""
+        with self._lock:
+            self._running_stages.remove(stage)
+
+    def cancel(self, reason: str) -> bool:
+        """
+        Cancel the request and abort registered in-flight work; returns False if it was already cancelled.
+
+        The recorded stage is the cancelling context's own stage (e.g. the one whose deadline
+        check fired), or for cancellations from outside the pipeline (client disconnect) the
+        most recently started stage still running.
+        """
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            self.stage = current_stage.get() or (self._running_stages[-1] if self._running_stages else None)
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def check(self) -> None:
+        """Raise RequestCancelled if the request was cancelled or its deadline has passed"""
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        if self.reason is not None:
+            raise RequestCancelled(self.reason, self.stage)
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Call `callback` when the request is cancelled (right away if it already is); returns a function unregistering it"""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            callback()
+
+        def remove() -> None:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return remove
+
+
+def deadline_from(headers: Mapping[str, str], default_timeout_ms: float = 0) -> Optional[float]:
+    """
+    Request deadline as a time.monotonic() value.
+
+    The earliest of the caller's `X-Request-Deadline` (absolute, Unix epoch milliseconds),
+    `X-Request-Timeout-Ms` (relative) and the service default wins. Unparseable headers are
+    ignored.
+
+    Args:
+        headers: Request headers.
+        default_timeout_ms: Deadline for requests without deadline headers, 0 for none.
+    """
+    now = time.monotonic()
+    candidates = []
+    if default_timeout_ms > 0:
+        candidates.append(now + default_timeout_ms / 1000)
+    try:
+        candidates.append(now + float(headers["x-request-timeout-ms"]) / 1000)
+    except (KeyError, ValueError):
+        pass
+    try:
+        candidates.append(now + float(headers["x-request-deadline"]) / 1000 - time.time())
+    except (KeyError, ValueError):
+        pass
+    return min(candidates) if candidates else None
+
+
+# Cancellation state of the current request, None outside of a request
+current_cancel_scope: ContextVar[Optional[CancelScope]] = ContextVar("current_cancel_scope", default=None)
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, StringConstraints
 from typing import List, Optional
+from typing_extensions import Annotated
 
 # Recipe DTOs matching the recipe microservice
 class RecipeIngredientDTO(BaseModel):
@@ -36,6 +37,7 @@ class RecipeData(BaseModel):
 class ChatRequest(BaseModel):
     """Chat request from user"""
     message: str
+    bypass_cache: bool = False
 
 class RecipeIndexRequest(BaseModel):
     """Request to index a recipe in vector store"""
@@ -47,4 +49,15 @@ class RecipeDeleteRequest(BaseModel):
 
 class RecipeSuggestionRequest(BaseModel):
     """Request for recipe suggestion"""
-    query: str 
+    query: str
+    bypass_cache: bool = False
+    servings: Optional[int] = Field(default=None, ge=1, le=100)
+    # Number of distinct recipes to generate in one LLM call
+    variants: int = Field(default=1, ge=1, le=5)
+
+class RecipeSuggestionBatchRequest(BaseModel):
+    """Request for recipe suggestions for several queries, e.g. a meal plan"""
+    queries: List[Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]] = Field(min_length=1, max_length=20)
+    bypass_cache: bool = False
+    servings: Optional[int] = Field(default=None, ge=1, le=100)
+
@@ -0,0 +1,389 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from metrics import (
+    CIRCUIT_BREAKER_STATE,
+    CIRCUIT_BREAKER_TRANSITIONS,
+    LLM_CONCURRENCY_LIMIT,
+    LLM_INFLIGHT,
+    LLM_QUEUE_DEPTH,
+    LLM_LIMITER_REQUESTS,
+    LLM_QUEUE_WAIT
+)
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open"""
+
+
+class LimitExceededError(Exception):
+    """Raised when a call is shed because the concurrency limit is reached and it could not queue"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StageTimeoutError(Exception):
+    """Raised when a pipeline stage did not finish within its time budget"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Stage {stage} timed out after {round(budget * 1000)}ms")
+        self.stage = stage
+        self.budget = budget
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    The breaker opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. It then becomes half-open and lets `half_open_max_calls` probe
+    calls through: a successful probe closes it again, a failed probe reopens it.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        """Initialize a closed circuit breaker"""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        CIRCUIT_BREAKER_STATE.labels(breaker=name).set(0)
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the reset timeout has passed"""
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may go through.
+
+        A call that was allowed must be followed by record_success, record_failure or release.
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Record a successful call"""
+        with self._lock:
+            self._failures = 0
+            self._release_probe()
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Record a failed call"""
+        with self._lock:
+            self._failures += 1
+            self._release_probe()
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """Release an allowed call that finished without a result, e.g. because it was cancelled"""
+        with self._lock:
+            self._release_probe()
+
+    def _release_probe(self) -> None:
+        """Free a half-open probe slot (caller holds the lock)"""
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _refresh(self) -> None:
+        """Move from open to half-open after the reset timeout (caller holds the lock)"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._half_open_calls = 0
+            self._transition(self.HALF_OPEN)
+
+    def _transition(self, state: str) -> None:
+        """Change state and report it (caller holds the lock)"""
+        previous, self._state = self._state, state
+        CIRCUIT_BREAKER_STATE.labels(breaker=self.name).set(self._STATE_VALUES[state])
+        CIRCUIT_BREAKER_TRANSITIONS.labels(breaker=self.name, state=state).inc()
+
+        log = logger.warning if state == self.OPEN else logger.info
+        log(f"Circuit breaker {self.name} changed from {previous} to {state}")
+        structured_logger.info(
+            f"Circuit breaker {self.name} is {state}",
+            extra={'extra_context': {
+                'component': 'circuit_breaker',
+                'breaker': self.name,
+                'previous_state': previous,
+                'state': state,
+                'consecutive_failures': self._failures
+            }}
+        )
+
+
+def future_outcome(future: Future) -> str:
+    """Outcome of a call that ran in a finished future: success, error or cancelled"""
+    if future.cancelled():
+        return "cancelled"
+    error = future.exception()
+    if error is None:
+        return "success"
+    return "error" if isinstance(error, Exception) else "cancelled"
+
+
+class LimiterPermit:
+    """Concurrency permit of a single call, released exactly once with the call's outcome"""
+
+    def __init__(self, limiter: "AdaptiveLimiter", inflight: int, latency_class: str):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        # Calls of the same class have comparable latency, e.g. the same operation and output size
+        self.latency_class = latency_class
+        # Calls in flight when this one was admitted, including itself
+        self.inflight = inflight
+        self._released = False
+
+    def release(self, outcome: str) -> None:
+        """Release the permit; outcome is success, error or cancelled"""
+        if not self._released:
+            self._released = True
+            self.limiter._release(self, outcome)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for calls to a shared upstream.
+
+    The limit grows by about one per limit's worth of successful calls while the limit is
+    actually used and latency stays below `latency_tolerance` times its baseline. LLM latency
+    scales with output length, so latency is tracked per latency class (calls of one operation
+    with similar output), and a class's recent latency is compared with a low percentile of
+    that class's own window rather than with the fastest call of any kind. Errors and calls
+    slower than that shrink the limit by `backoff`, at most once per round trip: only calls
+    admitted after the last decrease can trigger the next one.
+
+    Calls beyond the limit wait in FIFO order, at most `max_queue` of them and each for at
+    most its timeout; other calls are shed with LimitExceededError.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.75,
+        latency_tolerance: float = 2.0,
+        max_queue: int = 50,
+        queue_timeout: float = 10.0,
+        window: int = 100,
+        min_samples: int = 5,
+        baseline_percentile: float = 0.1
+    ):
+        """Initialize the limiter"""
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.min_samples = min_samples
+        self.window = window
+        self.baseline_percentile = baseline_percentile
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._inflight = 0
+        self._waiters = deque()
+        # Per latency class: recent latencies and their EWMA
+        self._latencies: Dict[str, deque] = {}
+        self._class_ewma: Dict[str, float] = {}
+        # Across classes, only used to suggest a retry delay
+        self._latency_ewma: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+        self._report()
+
+    @property
+    def limit(self) -> int:
+        """Current number of calls allowed to run concurrently"""
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        """Calls holding a permit"""
+        return self._inflight
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a permit"""
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Suggested seconds before a shed call is retried, the recent call latency"""
+        return self._latency_ewma or 1.0
+
+    def acquire(
+        self,
+        timeout: Optional[float] = None,
+        aborted: Optional[Callable[[], bool]] = None,
+        latency_class: str = "default"
+    ) -> LimiterPermit:
+        """
+        Wait for a permit.
+
+        Args:
+            timeout: Seconds to wait in the queue, `queue_timeout` by default.
+            aborted: Checked whenever the queue moves or `wake` is called; waiting stops when it returns True.
+            latency_class: Calls whose latency is comparable with this call's, see the class docstring.
+
+        Raises:
+            LimitExceededError: If the queue is full, the timeout passed or the wait was aborted.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start_time = time.monotonic()
+        with self._condition:
+            if not self._waiters and self._inflight < self.limit:
+                LLM_LIMITER_REQUESTS.labels(limiter=self.name, outcome="admitted").inc()
+                return self._admit(latency_class)
+
+            if len(self._waiters) >= self.max_queue:
+                LLM_LIMITER_REQUESTS.labels(limiter=self.name, outcome="rejected").inc()
+                raise LimitExceededError(f"{self.name} concurrency limit of {self.limit} reached and queue is full", self.retry_after())
+
+            ticket = object()
+            self._waiters.append(ticket)
+            self._report()
+            try:
+                while True:
+                    if aborted is not None and aborted():
+                        outcome = "aborted"
+                        break
+                    if self._waiters[0] is ticket and self._inflight < self.limit:
+                        self._waiters.popleft()
+                        LLM_LIMITER_REQUESTS.labels(limiter=self.name, outcome="queued").inc()
+                        LLM_QUEUE_WAIT.labels(limiter=self.name).observe(time.monotonic() - start_time)
+                        return self._admit(latency_class)
+                    remaining = timeout - (time.monotonic() - start_time)
+                    if remaining <= 0:
+                        outcome = "timeout"
+                        break
+                    self._condition.wait(remaining)
+            finally:
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    # The next waiter may be admissible now that this one left the head of the queue
+                    self._condition.notify_all()
+                self._report()
+
+        LLM_LIMITER_REQUESTS.labels(limiter=self.name, outcome=outcome).inc()
+        LLM_QUEUE_WAIT.labels(limiter=self.name).observe(time.monotonic() - start_time)
+        raise LimitExceededError(f"{self.name} concurrency permit not available ({outcome})", self.retry_after())
+
+    def try_acquire(self, latency_class: str = "default") -> Optional[LimiterPermit]:
+        """A permit if one is free right away and nobody is queued, otherwise None"""
+        with self._condition:
+            if self._waiters or self._inflight >= self.limit:
+                return None
+            LLM_LIMITER_REQUESTS.labels(limiter=self.name, outcome="admitted").inc()
+            return self._admit(latency_class)
+
+    @contextmanager
+    def permit(
+        self,
+        timeout: Optional[float] = None,
+        aborted: Optional[Callable[[], bool]] = None,
+        latency_class: str = "default"
+    ) -> Iterator[LimiterPermit]:
+        """Hold a permit for the duration of a call, released with the call's outcome"""
+        permit = self.acquire(timeout, aborted, latency_class)
+        try:
+            yield permit
+        except Exception:
+            permit.release("error")
+            raise
+        except BaseException:
+            # Cancellations say nothing about the upstream's capacity
+            permit.release("cancelled")
+            raise
+        permit.release("success")
+
+    def wake(self) -> None:
+        """Wake queued calls, e.g. so that they check whether they were aborted"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def _admit(self, latency_class: str) -> LimiterPermit:
+        """Hand out a permit (caller holds the lock)"""
+        self._inflight += 1
+        self._report()
+        return LimiterPermit(self, self._inflight, latency_class)
+
+    def _release(self, permit: LimiterPermit, outcome: str) -> None:
+        """Adapt the limit to a finished call and admit the next queued one"""
+        latency = time.monotonic() - permit.started
+        with self._condition:
+            self._inflight -= 1
+            if outcome == "error":
+                self._decrease(permit)
+            elif outcome == "success":
+                self._latency_ewma = latency if self._latency_ewma is None else 0.3 * latency + 0.7 * self._latency_ewma
+                if self._latency_regressed(permit.latency_class, latency):
+                    self._decrease(permit)
+                elif permit.inflight * 2 >= self._limit:
+                    # Additive increase, only while the limit is actually used
+                    self._limit = min(self._limit + 1 / self._limit, float(self.max_limit))
+            self._report()
+            self._condition.notify_all()
+
+    def _latency_regressed(self, latency_class: str, latency: float) -> bool:
+        """Record a successful call's latency; True if its class is much slower than its baseline (caller holds the lock)"""
+        latencies = self._latencies.setdefault(latency_class, deque(maxlen=self.window))
+        latencies.append(latency)
+        previous = self._class_ewma.get(latency_class)
+        ewma = self._class_ewma[latency_class] = latency if previous is None else 0.3 * latency + 0.7 * previous
+        if len(latencies) < self.min_samples:
+            return False
+        # A low percentile rather than the minimum, so that one unusually fast call does not set the bar
+        baseline = sorted(latencies)[int(self.baseline_percentile * (len(latencies) - 1))]
+        return ewma > self.latency_tolerance * baseline
+
+    def _decrease(self, permit: LimiterPermit) -> None:
+        """Multiplicative decrease, once per round trip (caller holds the lock)"""
+        if permit.started < self._last_decrease:
+            return
+        previous = self.limit
+        self._limit = max(self._limit * self.backoff, float(self.min_limit))
+        self._last_decrease = time.monotonic()
+        if self.limit != previous:
+            logger.info(f"Concurrency limit of {self.name} decreased from {previous} to {self.limit}")
+
+    def _report(self) -> None:
+        """Export the limit, in-flight calls and queue depth (caller holds the lock)"""
+        LLM_CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+        LLM_INFLIGHT.labels(limiter=self.name).set(self._inflight)
+        LLM_QUEUE_DEPTH.labels(limiter=self.name).set(len(self._waiters))
@@ -1,8 +1,60 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, model_serializer
+from typing import List, Optional, Dict, Any, TypeVar, Union
+from typing_extensions import Annotated
 from datetime import datetime
 
-class ChatResponse(BaseModel):
+class GeneratedIngredient(BaseModel):
+    """Ingredient of a generated recipe; amounts like "1/2" or "a pinch" are normalized after parsing"""
+    name: str
+    unit: Optional[str] = None
+    amount: Optional[Union[float, str]] = None
+
+class GeneratedStep(BaseModel):
+    """Step of a generated recipe; steps are renumbered after parsing, so the order is optional"""
+    order: Optional[int] = None
+    details: str
+
+class GeneratedRecipe(BaseModel):
+    """
+    Recipe generated by the LLM, used as the structured output schema.
+
+    Only the fields a recipe cannot do without are required, so that completions missing a
+    serving size or step numbers are completed instead of repaired.
+    """
+    title: str = Field(min_length=1)
+    description: Optional[str] = None
+    servingSize: int = 4
+    recipeIngredients: List[GeneratedIngredient] = Field(min_length=1)
+    recipeSteps: List[GeneratedStep] = Field(min_length=1)
+    tags: List[str] = []
+
+class GeneratedRecipeVariants(BaseModel):
+    """Several distinct recipes generated in one completion, used as the structured output schema"""
+    recipes: List[GeneratedRecipe] = Field(min_length=1)
+
+class _OmitIfNoneMarker:
+    """Field metadata read by DebuggableResponse's serializer"""
+
+_OMIT_IF_NONE = _OmitIfNoneMarker()
+T = TypeVar("T")
+
+# Optional field of a DebuggableResponse that is left out of the response while it is None
+OmitIfNone = Annotated[Optional[T], _OMIT_IF_NONE]
+
+class DebuggableResponse(BaseModel):
+    """Response that carries a timing breakdown when requested with debug=true"""
+    debug: OmitIfNone[Dict[str, Any]] = None
+
+    @model_serializer(mode="wrap")
+    def _omit_empty_fields(self, handler):
+        data = handler(self)
+        if isinstance(data, dict):
+            for name, field in type(self).model_fields.items():
+                if _OMIT_IF_NONE in field.metadata and data.get(name, _OMIT_IF_NONE) is None:
+                    del data[name]
+        return data
+
+class ChatResponse(DebuggableResponse):
     """Chat response from AI"""
     reply: str
     sources: Optional[List[str]] = None
@@ -21,10 +73,16 @@ class RecipeDeleteResponse(BaseModel):
     recipe_id: str
     deleted_at: datetime = Field(default_factory=datetime.now)
 
-class RecipeSuggestionResponse(BaseModel):
+class RecipeSuggestionResponse(DebuggableResponse):
     """Response for recipe suggestion"""
     suggestion: str
     recipe_data: Dict[str, Any]
+    # All generated recipes when several variants were requested, the first one is recipe_data
+    variants: OmitIfNone[List[Dict[str, Any]]] = None
+    # Number of variants requested, more than len(variants) if some could not be generated
+    variants_requested: OmitIfNone[int] = None
+    # Set when the suggestion was assembled without the LLM: reason and source_recipe_id
+    degraded: OmitIfNone[Dict[str, Any]] = None
     timestamp: datetime = Field(default_factory=datetime.now)
 
 class HealthResponse(BaseModel):
@@ -0,0 +1,181 @@
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from metrics import (
+    SEMANTIC_CACHE_REQUESTS,
+    SEMANTIC_CACHE_LATENCY_SAVED,
+    SEMANTIC_CACHE_EVICTIONS,
+    SEMANTIC_CACHE_ENTRIES
+)
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+
+@dataclass
+class _CacheEntry:
+    """A cached LLM result together with its normalized query embedding"""
+    vector: np.ndarray
+    value: Dict[str, Any]
+    created_at: float
+    generation_seconds: float
+
+
+class SemanticCache:
+    """
+    Cache for parsed LLM recipe responses keyed on the query embedding.
+
+    A lookup returns the cached value of the most similar entry in the same namespace
+    if its cosine similarity is at least `threshold`. Entries expire after `ttl_seconds`
+    and each namespace holds at most `max_entries` entries (least recently used first out).
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 512, enabled: bool = True):
+        """Initialize an empty semantic cache"""
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._namespaces: Dict[str, "OrderedDict[str, _CacheEntry]"] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, namespace: str, vector: Optional[List[float]], bypass: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached value for a query embedding.
+
+        Args:
+            namespace: Prompt family the value belongs to (e.g. "suggestion").
+            vector: The query embedding.
+            bypass: Skip the cache for this request.
+
+        Returns:
+            A copy of the cached value, or None on a miss.
+        """
+        if not self.enabled or vector is None:
+            return None
+
+        if bypass:
+            SEMANTIC_CACHE_REQUESTS.labels(namespace=namespace, result="bypass").inc()
+            return None
+
+        query = self._normalize(vector)
+        if query is None:
+            return None
+
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            self._purge_expired(namespace, entries)
+
+            best_key, best_similarity = None, -1.0
+            if entries:
+                keys = list(entries.keys())
+                matrix = np.stack([entries[key].vector for key in keys])
+                similarities = matrix @ query
+                best_index = int(np.argmax(similarities))
+                best_key, best_similarity = keys[best_index], float(similarities[best_index])
+
+            if best_key is None or best_similarity < self.threshold:
+                SEMANTIC_CACHE_REQUESTS.labels(namespace=namespace, result="miss").inc()
+                return None
+
+            entries.move_to_end(best_key)
+            entry = entries[best_key]
+            value = copy.deepcopy(entry.value)
+
+        SEMANTIC_CACHE_REQUESTS.labels(namespace=namespace, result="hit").inc()
+        SEMANTIC_CACHE_LATENCY_SAVED.labels(namespace=namespace).inc(entry.generation_seconds)
+
+        structured_logger.info(
+            f"Semantic cache hit in namespace {namespace}",
+            extra={'extra_context': {
+                'component': 'semantic_cache',
+                'operation': 'lookup',
+                'namespace': namespace,
+                'similarity': round(best_similarity, 4),
+                'entry_age_seconds': round(time.time() - entry.created_at, 2),
+                'latency_saved_ms': round(entry.generation_seconds * 1000, 2)
+            }}
+        )
+
+        return value
+
+    def store(self, namespace: str, vector: Optional[List[float]], value: Dict[str, Any], generation_seconds: float = 0.0) -> None:
+        """
+        Store a value for a query embedding.
+
+        Args:
+            namespace: Prompt family the value belongs to.
+            vector: The query embedding.
+            value: The parsed LLM result to cache.
+            generation_seconds: Time it took to produce the value, reported as saved latency on hits.
+        """
+        if not self.enabled or vector is None or not value:
+            return
+
+        normalized = self._normalize(vector)
+        if normalized is None:
+            return
+
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[uuid.uuid4().hex] = _CacheEntry(
+                vector=normalized,
+                value=copy.deepcopy(value),
+                created_at=time.time(),
+                generation_seconds=generation_seconds
+            )
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                SEMANTIC_CACHE_EVICTIONS.labels(namespace=namespace, reason="size").inc()
+
+            SEMANTIC_CACHE_ENTRIES.labels(namespace=namespace).set(len(entries))
+
+    def clear(self) -> None:
+        """Remove all entries from every namespace"""
+        with self._lock:
+            for namespace in self._namespaces:
+                SEMANTIC_CACHE_ENTRIES.labels(namespace=namespace).set(0)
+            self._namespaces.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of entries per namespace"""
+        with self._lock:
+            return {namespace: len(entries) for namespace, entries in self._namespaces.items()}
+
+    def _purge_expired(self, namespace: str, entries: Optional["OrderedDict[str, _CacheEntry]"]) -> None:
+        """Drop expired entries of a namespace (caller holds the lock)"""
+        if not entries:
+            return
+
+        cutoff = time.time() - self.ttl_seconds
+        expired = [key for key, entry in entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            del entries[key]
+
+        if expired:
+            SEMANTIC_CACHE_EVICTIONS.labels(namespace=namespace, reason="ttl").inc(len(expired))
+            SEMANTIC_CACHE_ENTRIES.labels(namespace=namespace).set(len(entries))
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        """Convert an embedding to a unit-length float array, or None if it is unusable"""
+        try:
+            array = np.asarray(vector, dtype=np.float32)
+        except (TypeError, ValueError):
+            logger.warning("Ignoring non-numeric embedding in semantic cache")
+            return None
+
+        norm = float(np.linalg.norm(array))
+        if array.ndim != 1 or norm == 0.0:
+            return None
+        return array / norm
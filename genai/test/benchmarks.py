@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the GenAI service hot paths.
+
+The benchmarks run without external services: the LLM is a canned chat model and the vector
+store an in-memory fake, so the timings cover the service's own code (content preparation,
+context building, parsing, validation, embedding and request handling). Results are written
+as JSON and compared against a stored baseline.
+
+Usage:
+    python benchmarks.py                    # run and compare with benchmark_baseline.json
+    python benchmarks.py --filter parse     # only benchmarks whose name contains "parse"
+    python benchmarks.py --update-baseline  # store the results as the new baseline
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import main
+from llm import RecipeLLM
+from metrics import observe_stage
+from mock_llm_server import CANNED_RECIPES, MockLLMServer
+from rag import StageTimedEmbeddings, embeddings_model
+from request_context import RequestStats, current_request_stats
+from request_models import RecipeData
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "benchmark_baseline.json"
+DEFAULT_OUTPUT = BENCH_DIR / "benchmark_results.json"
+
+# Median slowdown relative to the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Recipes per operation in the variant benchmarks
+VARIANT_COUNT = 3
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def make_recipe_dict(recipe_id: int, ingredient_count: int = 25, step_count: int = 15) -> Dict[str, Any]:
+    """Recipe payload as sent by the recipe service"""
+    return {
+        "metadata": {
+            "id": recipe_id,
+            "title": f"Slow Roasted Tomato and Chickpea Stew {recipe_id}",
+            "description": "A hearty one-pot stew with roasted tomatoes, smoked paprika and crispy chickpeas",
+            "servingSize": 4,
+            "tags": [{"id": i, "name": name} for i, name in enumerate(["vegan", "stew", "one-pot", "winter", "high-protein"])]
+        },
+        "details": {
+            "servingSize": 4,
+            "recipeIngredients": [
+                {"name": f"Ingredient {i}", "unit": ["g", "ml", "tbsp", "tsp", None][i % 5], "amount": [200, 150, 2, 1, None][i % 5]}
+                for i in range(ingredient_count)
+            ],
+            "recipeSteps": [
+                {"order": i + 1, "details": f"Step {i + 1}: stir the tomatoes and chickpeas over medium heat, season and simmer for {5 + i} minutes until the sauce thickens"}
+                for i in range(step_count)
+            ]
+        }
+    }
+
+
+def make_search_results(count: int = 5) -> List[Document]:
+    """Documents as returned by the vector store for a chat or suggestion query"""
+    documents = []
+    for i in range(count):
+        recipe = make_recipe_dict(100 + i)
+        documents.append(Document(
+            page_content=f"Title: {recipe['metadata']['title']}",
+            metadata={
+                "recipe_id": str(recipe["metadata"]["id"]),
+                "title": recipe["metadata"]["title"],
+                "description": recipe["metadata"]["description"],
+                "ingredients": [ing["name"] for ing in recipe["details"]["recipeIngredients"]],
+                "steps": [step["details"] for step in recipe["details"]["recipeSteps"]],
+                "tags": [tag["name"] for tag in recipe["metadata"]["tags"]],
+                "serving_size": recipe["details"]["servingSize"]
+            }
+        ))
+    return documents
+
+
+RECIPE_COMPLETION = json.dumps({
+    "title": "Smoky Chickpea Stew",
+    "description": "A hearty vegan stew with smoked paprika",
+    "servingSize": 4,
+    "recipeIngredients": [{"name": f"Ingredient {i}", "unit": "g", "amount": 100 + i} for i in range(20)],
+    "recipeSteps": [{"order": i + 1, "details": f"Simmer and stir for {i + 2} minutes, then season to taste"} for i in range(12)],
+    "tags": ["vegan", "stew"]
+})
+
+# Completion wrapped in prose and a markdown fence, as returned without structured output
+FENCED_COMPLETION = f"Here is a recipe you will love!\n\n```json\n{RECIPE_COMPLETION}\n```\n\nEnjoy your meal."
+
+# Completion cut off by the token limit
+TRUNCATED_COMPLETION = RECIPE_COMPLETION[: len(RECIPE_COMPLETION) // 2]
+
+
+class FakeRAGHelper:
+    """In-memory stand-in for RAGHelper with deterministic embeddings"""
+
+    def __init__(self, *args, **kwargs):
+        self.documents = make_search_results()
+
+    @staticmethod
+    def _embed(text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        return [byte / 255.0 for byte in digest]
+
+    def embed_query(self, query: str) -> List[float]:
+        with observe_stage("embedding"):
+            return self._embed(query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        with observe_stage("embedding"):
+            return [self._embed(query) for query in queries]
+
+    def retrieve(self, query: str, top_k: int = 5, query_vector: List[float] = None, metadata_only: bool = False) -> List[Document]:
+        with observe_stage("weaviate_query"):
+            if metadata_only:
+                return [Document(page_content="", metadata=doc.metadata) for doc in self.documents[:top_k]]
+            return self.documents[:top_k]
+
+    def add_recipe(self, recipe_content: str, metadata: Dict[str, Any]) -> bool:
+        return True
+
+    def delete_recipe_by_recipe_id(self, recipe_id: str) -> bool:
+        return True
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        return {"total_documents": len(self.documents)}
+
+    def cleanup(self):
+        pass
+
+
+def create_llm() -> RecipeLLM:
+    """Recipe LLM backed by a canned chat model and the in-memory vector store"""
+    with patch('llm.ChatOpenAI', return_value=FakeListChatModel(responses=[RECIPE_COMPLETION])), \
+         patch('llm.RAGHelper', FakeRAGHelper):
+        llm = RecipeLLM()
+    # Like the service's startup
+    llm.intent_router.build_centroids()
+    return llm
+
+
+# ---------------------------------------------------------------------------
+# Harness
+# ---------------------------------------------------------------------------
+
+@dataclass
+class BenchmarkResult:
+    """Timing statistics of one benchmark, in microseconds per operation"""
+    name: str
+    iterations: int
+    mean_us: float
+    median_us: float
+    p95_us: float
+    min_us: float
+    ops_per_sec: float
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def measure(name: str, func: Callable[[], Any], iterations: int, warmup: int = 10, items_per_call: int = 0) -> BenchmarkResult:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        name: Benchmark name.
+        func: Function to call.
+        iterations: Number of timed calls.
+        warmup: Number of untimed calls before measuring.
+        items_per_call: Items processed per call, reported as items per second if set.
+
+    Returns:
+        Timing statistics of the timed calls.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+
+    samples.sort()
+    mean = statistics.fmean(samples)
+    result = BenchmarkResult(
+        name=name,
+        iterations=iterations,
+        mean_us=round(mean, 3),
+        median_us=round(statistics.median(samples), 3),
+        p95_us=round(samples[min(int(0.95 * len(samples)), len(samples) - 1)], 3),
+        min_us=round(samples[0], 3),
+        ops_per_sec=round(1_000_000 / mean, 2) if mean else 0.0
+    )
+    if items_per_call:
+        result.extra["items_per_sec"] = round(items_per_call * 1_000_000 / mean, 2) if mean else 0.0
+    return result
+
+
+def measure_variants(name: str, separate_calls: bool, iterations: int) -> BenchmarkResult:
+    """
+    Time `VARIANT_COUNT` recipe suggestions generated by the mock LLM server.
+
+    The recipes come from one completion with `variants`, or from one suggestion call per
+    recipe as a client asking for alternatives would make them. The server answers after a
+    fixed time to first token plus a delay per output token, so unlike the other benchmarks
+    the timings include LLM latency. The LLM calls and tokens of one operation are reported
+    in `extra`.
+    """
+    content = None if separate_calls else json.dumps({"recipes": CANNED_RECIPES[:VARIANT_COUNT]})
+    with MockLLMServer(ttft_ms=50, token_delay_ms=0.5, content=content) as server:
+        with patch.dict(os.environ, {"LLM_BASE_URL": server.url, "LLM_MODEL": "mock-model", "OPEN_WEBUI_API_KEY": "mock-key"}), \
+             patch('llm.RAGHelper', FakeRAGHelper):
+            llm = RecipeLLM()
+
+        def suggest():
+            if separate_calls:
+                for _ in range(VARIANT_COUNT):
+                    llm.suggest_recipe("smoky vegan stew", bypass_cache=True)
+            else:
+                llm.suggest_recipe("smoky vegan stew", bypass_cache=True, variants=VARIANT_COUNT)
+
+        try:
+            stats = RequestStats()
+            token = current_request_stats.set(stats)
+            try:
+                suggest()
+            finally:
+                current_request_stats.reset(token)
+            result = measure(name, suggest, iterations, warmup=1, items_per_call=VARIANT_COUNT)
+        finally:
+            llm.cleanup()
+
+    result.extra.update({
+        "llm_calls": stats.llm_calls,
+        "prompt_tokens": stats.prompt_tokens,
+        "completion_tokens": stats.completion_tokens
+    })
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def build_benchmarks(scale: float) -> Dict[str, Callable[[], BenchmarkResult]]:
+    """Benchmarks by name; `scale` multiplies the iteration counts"""
+    llm = create_llm()
+    recipe_dict = make_recipe_dict(1)
+    recipe = RecipeData.model_validate(recipe_dict)
+    large_recipe_dict = make_recipe_dict(2, ingredient_count=200, step_count=100)
+    search_results = make_search_results()
+    context = llm._prepare_search_context(search_results)
+    embed_batch = [llm._prepare_recipe_content(RecipeData.model_validate(make_recipe_dict(i))) for i in range(32)]
+    embeddings = StageTimedEmbeddings(embeddings_model)
+
+    main.llm_instance = llm
+    # Every request comes from the same test client; the endpoints are measured without limits
+    main.rate_limiter.enabled = False
+    client = TestClient(main.app)
+
+    def iterations(count: int) -> int:
+        return max(1, int(count * scale))
+
+    def post(path: str, payload: Dict[str, Any]) -> Callable[[], None]:
+        def call():
+            response = client.post(path, json=payload)
+            assert response.status_code == 200, response.text
+        return call
+
+    return {
+        "prepare_recipe_content": lambda: measure(
+            "prepare_recipe_content", lambda: llm._prepare_recipe_content(recipe), iterations(2000)
+        ),
+        "prepare_search_context": lambda: measure(
+            "prepare_search_context", lambda: llm._prepare_search_context(search_results), iterations(500)
+        ),
+        "parse_recipe_response_valid": lambda: measure(
+            "parse_recipe_response_valid", lambda: llm._parse_recipe_response(RECIPE_COMPLETION), iterations(1000)
+        ),
+        "parse_recipe_response_fenced": lambda: measure(
+            "parse_recipe_response_fenced", lambda: llm._parse_recipe_response(FENCED_COMPLETION), iterations(1000)
+        ),
+        "parse_recipe_response_truncated": lambda: measure(
+            "parse_recipe_response_truncated", lambda: llm._parse_recipe_response(TRUNCATED_COMPLETION), iterations(1000)
+        ),
+        "has_meaningful_context": lambda: measure(
+            "has_meaningful_context", lambda: llm._has_meaningful_context(context), iterations(5000)
+        ),
+        "recipe_data_validation": lambda: measure(
+            "recipe_data_validation", lambda: RecipeData.model_validate(large_recipe_dict), iterations(1000)
+        ),
+        "embedding_throughput": lambda: measure(
+            "embedding_throughput", lambda: embeddings.embed_documents(embed_batch), iterations(20),
+            warmup=2, items_per_call=len(embed_batch)
+        ),
+        "endpoint_chat_search": lambda: measure(
+            "endpoint_chat_search", post("/genai/chat", {"message": "What can I cook with chickpeas?"}), iterations(200)
+        ),
+        "endpoint_chat_chitchat": lambda: measure(
+            "endpoint_chat_chitchat", post("/genai/chat", {"message": "Hi there!"}), iterations(200)
+        ),
+        "endpoint_chat_create": lambda: measure(
+            "endpoint_chat_create",
+            post("/genai/chat", {"message": "Create a recipe for a smoky chickpea stew", "bypass_cache": True}),
+            iterations(200)
+        ),
+        "endpoint_suggest": lambda: measure(
+            "endpoint_suggest", post("/genai/vector/suggest", {"query": "smoky vegan stew", "bypass_cache": True}), iterations(200)
+        ),
+        "index_recipe": lambda: measure(
+            "index_recipe", lambda: llm.index_recipe(recipe), iterations(500)
+        ),
+        "suggest_variants_one_call": lambda: measure_variants(
+            "suggest_variants_one_call", separate_calls=False, iterations=iterations(20)
+        ),
+        "suggest_variants_separate_calls": lambda: measure_variants(
+            "suggest_variants_separate_calls", separate_calls=True, iterations=iterations(20)
+        ),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def environment_info() -> Dict[str, str]:
+    """Machine details stored with the results, as timings are only comparable on the same machine"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or "unknown"
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare median timings with the baseline.
+
+    Returns:
+        One entry per benchmark with the median ratio and a status of
+        "ok", "regression", "improvement" or "new".
+    """
+    comparison = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            comparison.append({"name": name, "ratio": None, "status": "new"})
+            continue
+        ratio = result["median_us"] / reference["median_us"] if reference["median_us"] else 1.0
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 / (1 + tolerance):
+            status = "improvement"
+        else:
+            status = "ok"
+        comparison.append({"name": name, "ratio": round(ratio, 3), "status": status})
+    return comparison
+
+
+def print_report(results: Dict[str, Dict[str, Any]], comparison: List[Dict[str, Any]]) -> None:
+    """Print a table of the results and the baseline comparison"""
+    header = f"{'benchmark':<34}{'median':>12}{'p95':>12}{'ops/s':>12}{'vs base':>10}  status"
+    print(header)
+    print("-" * len(header))
+    for entry in comparison:
+        result = results[entry["name"]]
+        ratio = f"{entry['ratio']:.2f}x" if entry["ratio"] is not None else "-"
+        print(
+            f"{entry['name']:<34}{result['median_us']:>10.1f}us{result['p95_us']:>10.1f}us"
+            f"{result['ops_per_sec']:>12.1f}{ratio:>10}  {entry['status']}"
+        )
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Benchmark results of the baseline file, empty if there is none"""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run GenAI service benchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write the results")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed median slowdown (0.25 = 25%%)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the iteration counts")
+    args = parser.parse_args(argv)
+
+    # Keep the per-request service logs out of the measurements
+    logging.disable(logging.CRITICAL)
+
+    benchmarks = build_benchmarks(args.scale)
+    selected = [name for name in benchmarks if not args.filter or args.filter in name]
+    results = {name: asdict(benchmarks[name]()) for name in selected}
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment_info(),
+        "benchmarks": results
+    }
+
+    baseline = load_baseline(args.baseline)
+    comparison = compare(results, baseline, args.tolerance)
+    print_report(results, comparison)
+
+    if args.update_baseline:
+        # Keep baseline entries of benchmarks that were filtered out
+        baseline.update(results)
+        report["benchmarks"] = dict(sorted(baseline.items()))
+        output = args.baseline
+    else:
+        report["comparison"] = comparison
+        output = args.output
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nResults written to {output}")
+
+    regressions = [entry["name"] for entry in comparison if entry["status"] == "regression"]
+    if regressions and not args.update_baseline:
+        print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
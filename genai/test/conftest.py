@@ -14,6 +14,15 @@ from request_models import (
 from response_models import ChatResponse, RecipeSuggestionResponse
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Start every test with full rate limit buckets, all test clients share one caller key"""
+    main = sys.modules.get("main")
+    if main is not None:
+        main.rate_limiter.reset()
+    yield
+
+
 @pytest.fixture(scope="session")
 def test_environment():
     """Set up test environment variables"""
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Load generator for the GenAI service.
+
+Drives a mix of search chats, recipe creation chats, suggestions, index and delete calls
+against the service and reports throughput, latency percentiles, error rates and the
+server-side stage histograms (genai_stage_duration_seconds) for each load level.
+
+By default the service (main:app) runs in-process against the mock LLM server and an
+in-memory vector store, so the numbers describe the service itself and can be reproduced
+locally and in CI. Use --target to drive a running deployment instead.
+
+Usage:
+    # Closed loop: N clients sending requests back to back
+    python load_test.py --mode closed --concurrency 1,4,8 --duration 30
+
+    # Open loop: Poisson arrivals at the given rates, latency measured from the scheduled send time
+    python load_test.py --mode open --rate 1,2,4 --duration 60 --p95-target-ms 5000
+
+    # Custom mix and LLM latency profile
+    python load_test.py --mix search=60,create=10,suggest=20,index=5,delete=5 --llm-profile fast
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import FakeRAGHelper, make_recipe_dict
+from mock_llm_server import BackgroundServer, MockLLMServer, PROFILES
+
+DEFAULT_MIX = "search=50,create=15,suggest=25,index=5,delete=5"
+
+SEARCH_MESSAGES = [
+    "What can I cook with chickpeas and spinach?",
+    "Show me quick vegetarian dinners",
+    "I want something spicy with chicken",
+    "Any recipes with mushrooms?",
+    "What is a good dessert with apples?",
+    "Find me a pasta dish for four people"
+]
+
+CREATION_MESSAGES = [
+    "Create a recipe for a smoky chickpea stew",
+    "Make me a recipe for lemon garlic chicken",
+    "Generate a recipe for a mushroom risotto",
+    "Create a new recipe for a vegan chocolate cake",
+    "Invent a recipe with sweet potatoes and black beans"
+]
+
+SUGGESTION_QUERIES = [
+    "healthy vegetarian dinner for 2 in under 30 minutes",
+    "something warm and spicy for a cold evening",
+    "gluten-free dessert",
+    "high protein breakfast",
+    "italian pasta with seasonal vegetables"
+]
+
+
+# ---------------------------------------------------------------------------
+# Workloads
+# ---------------------------------------------------------------------------
+
+Request = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def search_request(rng: random.Random, seq: int, bypass_cache: bool) -> Request:
+    return "POST", "/genai/chat", {"message": rng.choice(SEARCH_MESSAGES)}
+
+
+def create_request(rng: random.Random, seq: int, bypass_cache: bool) -> Request:
+    return "POST", "/genai/chat", {"message": rng.choice(CREATION_MESSAGES), "bypass_cache": bypass_cache}
+
+
+def suggest_request(rng: random.Random, seq: int, bypass_cache: bool) -> Request:
+    return "POST", "/genai/vector/suggest", {"query": rng.choice(SUGGESTION_QUERIES), "bypass_cache": bypass_cache}
+
+
+def index_request(rng: random.Random, seq: int, bypass_cache: bool) -> Request:
+    return "POST", "/genai/vector/index", {"recipe": make_recipe_dict(100000 + seq, ingredient_count=10, step_count=6)}
+
+
+def delete_request(rng: random.Random, seq: int, bypass_cache: bool) -> Request:
+    return "DELETE", f"/genai/vector/{100000 + rng.randrange(max(seq, 1))}", None
+
+
+WORKLOADS: Dict[str, Callable[[random.Random, int, bool], Request]] = {
+    "search": search_request,
+    "create": create_request,
+    "suggest": suggest_request,
+    "index": index_request,
+    "delete": delete_request
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse workload weights such as "search=50,create=20" """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload '{name}', expected one of {', '.join(WORKLOADS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("Workload mix has no positive weight")
+    return weights
+
+
+class WorkloadMix:
+    """Draws the next request according to the workload weights"""
+
+    def __init__(self, weights: Dict[str, float], seed: Optional[int] = None, bypass_cache: bool = False):
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.bypass_cache = bypass_cache
+        self._rng = random.Random(seed)
+        self._seq = 0
+
+    def next(self) -> Tuple[str, Request]:
+        self._seq += 1
+        name = self._rng.choices(self.names, weights=self.weights)[0]
+        return name, WORKLOADS[name](self._rng, self._seq, self.bypass_cache)
+
+    def interarrival(self, rate: float) -> float:
+        """Exponential gap between Poisson arrivals"""
+        return self._rng.expovariate(rate)
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RequestRecord:
+    """Outcome of a single request"""
+    workload: str
+    status: int
+    latency: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 300
+
+
+async def send(client: httpx.AsyncClient, workload: str, request: Request, scheduled: float) -> RequestRecord:
+    """Send a request; latency is measured from the scheduled send time"""
+    method, path, body = request
+    try:
+        response = await client.request(method, path, json=body)
+        return RequestRecord(workload, response.status_code, time.perf_counter() - scheduled)
+    except httpx.HTTPError as e:
+        return RequestRecord(workload, 0, time.perf_counter() - scheduled, error=type(e).__name__)
+
+
+async def run_closed_loop(client: httpx.AsyncClient, mix: WorkloadMix, concurrency: int, duration: float) -> List[RequestRecord]:
+    """N clients each sending the next request as soon as the previous one completed"""
+    records: List[RequestRecord] = []
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            workload, request = mix.next()
+            records.append(await send(client, workload, request, time.perf_counter()))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records
+
+
+async def run_open_loop(client: httpx.AsyncClient, mix: WorkloadMix, rate: float, duration: float) -> List[RequestRecord]:
+    """
+    Poisson arrivals at a fixed rate, independent of how fast the service answers.
+
+    Requests are timed from their scheduled send time, so queueing in the client is part of
+    the latency when the service falls behind (no coordinated omission).
+    """
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        workload, request = mix.next()
+        tasks.append(asyncio.create_task(send(client, workload, request, next_arrival)))
+        next_arrival += mix.interarrival(rate)
+    return list(await asyncio.gather(*tasks))
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def summarize(records: List[RequestRecord], elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles (ms) and error rate of a set of requests"""
+    latencies = sorted(record.latency * 1000 for record in records)
+    errors = [record for record in records if not record.ok]
+    statuses: Dict[str, int] = defaultdict(int)
+    for record in records:
+        statuses[record.error or str(record.status)] += 1
+    return {
+        "requests": len(records),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(len(errors) / len(records), 4) if records else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+        "statuses": dict(statuses)
+    }
+
+
+async def scrape_stage_histograms(client: httpx.AsyncClient) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Current genai_stage_duration_seconds series by (stage, endpoint), summed over prompt types"""
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    series: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(lambda: {"count": 0.0, "sum": 0.0, "buckets": defaultdict(float)})
+    for family in text_string_to_metric_families(response.text):
+        if family.name != "genai_stage_duration_seconds":
+            continue
+        for sample in family.samples:
+            entry = series[(sample.labels["stage"], sample.labels["endpoint"])]
+            if sample.name.endswith("_bucket"):
+                entry["buckets"][float(sample.labels["le"])] += sample.value
+            elif sample.name.endswith("_count"):
+                entry["count"] += sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] += sample.value
+    return series
+
+
+def stage_report(before: Dict, after: Dict) -> List[Dict[str, Any]]:
+    """Per-stage count, mean and bucket-interpolated p95 (ms) of the observations made between two scrapes"""
+    report = []
+    for key in sorted(after):
+        previous = before.get(key, {"count": 0.0, "sum": 0.0, "buckets": {}})
+        count = after[key]["count"] - previous["count"]
+        if count <= 0:
+            continue
+        total = after[key]["sum"] - previous["sum"]
+        buckets = sorted((le, value - previous["buckets"].get(le, 0.0)) for le, value in after[key]["buckets"].items())
+
+        # Linear interpolation inside the bucket that holds the 95th percentile
+        p95, rank, lower, below = None, 0.95 * count, 0.0, 0.0
+        for le, cumulative in buckets:
+            if cumulative >= rank:
+                if le == float("inf"):
+                    p95 = lower
+                else:
+                    fraction = (rank - below) / (cumulative - below) if cumulative > below else 1.0
+                    p95 = lower + (le - lower) * fraction
+                break
+            lower, below = le, cumulative
+
+        stage, endpoint = key
+        report.append({
+            "stage": stage,
+            "endpoint": endpoint,
+            "count": int(count),
+            "mean_ms": round(total / count * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None
+        })
+    return report
+
+
+def print_level(level: Dict[str, Any]) -> None:
+    """Print the results of one load level"""
+    overall = level["overall"]
+    print(f"\n=== {level['mode']} loop, {level['load']} ({level['duration_s']}s) ===")
+    header = f"{'workload':<10}{'reqs':>7}{'rps':>9}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, summary in list(level["workloads"].items()) + [("overall", overall)]:
+        print(
+            f"{name:<10}{summary['requests']:>7}{summary['throughput_rps']:>9.2f}{summary['error_rate'] * 100:>7.1f}%"
+            f"{summary['p50_ms']:>8.0f}ms{summary['p95_ms']:>8.0f}ms{summary['p99_ms']:>8.0f}ms{summary['max_ms']:>8.0f}ms"
+        )
+    if level["stages"]:
+        print(f"\n{'stage':<18}{'endpoint':<24}{'count':>8}{'mean':>11}{'p95':>11}")
+        for stage in level["stages"]:
+            p95 = f"{stage['p95_ms']:.1f}ms" if stage["p95_ms"] is not None else "-"
+            print(f"{stage['stage']:<18}{stage['endpoint']:<24}{stage['count']:>8}{stage['mean_ms']:>9.1f}ms{p95:>11}")
+
+
+# ---------------------------------------------------------------------------
+# Local service
+# ---------------------------------------------------------------------------
+
+class LocalService:
+    """The GenAI app served in-process against the mock LLM server and an in-memory vector store"""
+
+    def __init__(self, llm_profile: str = "realistic", seed: Optional[int] = None):
+        self.llm_server = MockLLMServer(profile=llm_profile, seed=seed)
+        self.server: Optional[BackgroundServer] = None
+        self.llm = None
+
+    def __enter__(self) -> "LocalService":
+        self.llm_server.start()
+
+        import main
+        from llm import RecipeLLM
+
+        with patch.dict(os.environ, {
+            "LLM_BASE_URL": self.llm_server.url,
+            "LLM_MODEL": os.getenv("LLM_MODEL", "mock-model"),
+            "OPEN_WEBUI_API_KEY": os.getenv("OPEN_WEBUI_API_KEY", "mock-key")
+        }), patch('llm.RAGHelper', FakeRAGHelper):
+            self.llm = RecipeLLM()
+        self._previous_llm = main.llm_instance
+        main.llm_instance = self.llm
+        # All generated load comes from one client, which the rate limiter would throttle
+        self._previous_rate_limit = main.rate_limiter.enabled
+        main.rate_limiter.enabled = False
+
+        self.server = BackgroundServer(main.app).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return self.server.base_url
+
+    def __exit__(self, *exc_info) -> None:
+        if self.server:
+            self.server.stop()
+        if self.llm:
+            import main
+            main.llm_instance = self._previous_llm
+            main.rate_limiter.enabled = self._previous_rate_limit
+            self.llm.cleanup()
+        self.llm_server.stop()
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def run_levels(args, base_url: str) -> List[Dict[str, Any]]:
+    """Run every load level against the service and collect the reports"""
+    weights = parse_mix(args.mix)
+    levels = [int(value) for value in args.concurrency.split(",")] if args.mode == "closed" else [float(value) for value in args.rate.split(",")]
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    results = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for level in levels:
+            mix = WorkloadMix(weights, seed=args.seed, bypass_cache=args.bypass_cache)
+            stages_before = await scrape_stage_histograms(client)
+
+            start = time.perf_counter()
+            if args.mode == "closed":
+                records = await run_closed_loop(client, mix, level, args.duration)
+                load = f"concurrency {level}"
+            else:
+                records = await run_open_loop(client, mix, level, args.duration)
+                load = f"rate {level}/s"
+            elapsed = time.perf_counter() - start
+
+            by_workload: Dict[str, List[RequestRecord]] = defaultdict(list)
+            for record in records:
+                by_workload[record.workload].append(record)
+
+            result = {
+                "mode": args.mode,
+                "level": level,
+                "load": load,
+                "duration_s": round(elapsed, 2),
+                "overall": summarize(records, elapsed),
+                "workloads": {name: summarize(by_workload[name], elapsed) for name in weights if by_workload[name]},
+                "stages": stage_report(stages_before, await scrape_stage_histograms(client))
+            }
+            print_level(result)
+            results.append(result)
+
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+
+    return results
+
+
+def meets_target(level: Dict[str, Any], p95_target_ms: float, max_error_rate: float) -> bool:
+    overall = level["overall"]
+    return overall["p95_ms"] <= p95_target_ms and overall["error_rate"] <= max_error_rate
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate load against the GenAI service")
+    parser.add_argument("--target", help="Base URL of a running service; an in-process service with stubbed dependencies is used if not set")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed", help="Closed loop (fixed concurrency) or open loop (fixed arrival rate)")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated client counts for closed loop mode")
+    parser.add_argument("--rate", default="1,2,4", help="Comma-separated arrival rates (requests/s) for open loop mode")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per load level")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pause between load levels in seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Workload weights (default {DEFAULT_MIX})")
+    parser.add_argument("--bypass-cache", action="store_true", help="Bypass the semantic cache for creation and suggestion requests")
+    parser.add_argument("--llm-profile", choices=sorted(PROFILES), default="realistic", help="Mock LLM latency profile of the in-process service")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the workload mix and mock LLM latencies")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=512, help="Client connection limit")
+    parser.add_argument("--p95-target-ms", type=float, help="Report the highest load level with p95 latency below this target")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Highest error rate a level may have to meet the target")
+    parser.add_argument("--service-logs", action="store_true", help="Keep the info logs of the in-process service")
+    parser.add_argument("--output", type=Path, help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.target:
+        results = asyncio.run(run_levels(args, args.target))
+    else:
+        if not args.service_logs:
+            logging.disable(logging.INFO)
+        with LocalService(llm_profile=args.llm_profile, seed=args.seed) as service:
+            results = asyncio.run(run_levels(args, service.url))
+
+    report: Dict[str, Any] = {"config": {key: str(value) for key, value in vars(args).items()}, "levels": results}
+    exit_code = 0
+
+    if args.p95_target_ms is not None:
+        passing = [level for level in results if meets_target(level, args.p95_target_ms, args.max_error_rate)]
+        best = max(passing, key=lambda level: level["overall"]["throughput_rps"]) if passing else None
+        report["sustainable"] = {"load": best["load"], "throughput_rps": best["overall"]["throughput_rps"]} if best else None
+        if best:
+            print(f"\nHighest load within p95 < {args.p95_target_ms:.0f}ms and error rate <= {args.max_error_rate:.1%}: "
+                  f"{best['load']} ({best['overall']['throughput_rps']} req/s)")
+        else:
+            print(f"\nNo load level met p95 < {args.p95_target_ms:.0f}ms with error rate <= {args.max_error_rate:.1%}")
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nReport written to {args.output}")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible mock LLM server for performance and resilience tests.
+
+Serves the chat completions API used by ChatOpenAI (streaming and non-streaming) and
+answers with canned recipe JSON. Latency (time to first token, per-token delay, tail
+spikes) and error rates are configurable, so the service can be load-tested and its
+failover behaviour exercised without the remote GPU endpoint.
+
+Run standalone and point the service at it:
+    python mock_llm_server.py --port 8001 --profile realistic
+    LLM_BASE_URL=http://localhost:8001/v1 python ../main.py
+
+Or start it in-process from a test:
+    with MockLLMServer(profile="fast") as server:
+        llm = ChatOpenAI(base_url=server.url, api_key="test", model="mock")
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Dict, List, Optional, Union
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_RECIPES = [
+    {
+        "title": "Smoky Chickpea Stew",
+        "description": "A hearty vegan stew with roasted tomatoes and smoked paprika",
+        "servingSize": 4,
+        "recipeIngredients": [
+            {"name": "Chickpeas", "unit": "g", "amount": 400},
+            {"name": "Canned tomatoes", "unit": "g", "amount": 800},
+            {"name": "Onion", "unit": "pcs", "amount": 1},
+            {"name": "Smoked paprika", "unit": "tsp", "amount": 2},
+            {"name": "Olive oil", "unit": "tbsp", "amount": 2}
+        ],
+        "recipeSteps": [
+            {"order": 1, "details": "Dice the onion and sweat it in olive oil over medium heat for 5 minutes."},
+            {"order": 2, "details": "Stir in the smoked paprika and cook for 30 seconds until fragrant."},
+            {"order": 3, "details": "Add tomatoes and chickpeas, season and simmer for 20 minutes until thick."}
+        ],
+        "tags": ["vegan", "stew", "one-pot"]
+    },
+    {
+        "title": "Lemon Garlic Chicken Traybake",
+        "description": "Chicken thighs roasted with potatoes, lemon and garlic",
+        "servingSize": 2,
+        "recipeIngredients": [
+            {"name": "Chicken thighs", "unit": "pcs", "amount": 4},
+            {"name": "Baby potatoes", "unit": "g", "amount": 500},
+            {"name": "Lemon", "unit": "pcs", "amount": 1},
+            {"name": "Garlic cloves", "unit": "pcs", "amount": 6}
+        ],
+        "recipeSteps": [
+            {"order": 1, "details": "Preheat the oven to 200°C and halve the potatoes."},
+            {"order": 2, "details": "Toss everything with oil, lemon zest and salt on a tray."},
+            {"order": 3, "details": "Roast for 40 minutes until the chicken skin is crisp."}
+        ],
+        "tags": ["chicken", "traybake", "easy"]
+    },
+    {
+        "title": "Mushroom Risotto",
+        "description": "Creamy risotto with mixed mushrooms and parmesan",
+        "servingSize": 3,
+        "recipeIngredients": [
+            {"name": "Arborio rice", "unit": "g", "amount": 300},
+            {"name": "Mixed mushrooms", "unit": "g", "amount": 250},
+            {"name": "Vegetable stock", "unit": "ml", "amount": 1000},
+            {"name": "Parmesan", "unit": "g", "amount": 60}
+        ],
+        "recipeSteps": [
+            {"order": 1, "details": "Fry the mushrooms until golden and set them aside."},
+            {"order": 2, "details": "Toast the rice, then add hot stock a ladle at a time while stirring."},
+            {"order": 3, "details": "After 18 minutes stir in mushrooms and parmesan and rest for 2 minutes."}
+        ],
+        "tags": ["vegetarian", "italian"]
+    }
+]
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Latency and error behaviour of the mock server.
+
+    Attributes:
+        ttft_ms: Mean time to first token.
+        ttft_jitter_ms: Standard deviation of the time to first token.
+        token_delay_ms: Delay between two streamed tokens (also added up for non-streaming responses).
+        tail_probability: Probability of a latency spike on a request.
+        tail_ms: Extra time to first token of a spike.
+        error_rate: Probability of answering with an error instead of a completion.
+        error_status: HTTP status of injected errors.
+    """
+    ttft_ms: float = 0.0
+    ttft_jitter_ms: float = 0.0
+    token_delay_ms: float = 0.0
+    tail_probability: float = 0.0
+    tail_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+
+PROFILES: Dict[str, LatencyProfile] = {
+    # No latency, for functional tests
+    "instant": LatencyProfile(),
+    # Local model on a warm GPU
+    "fast": LatencyProfile(ttft_ms=50, ttft_jitter_ms=10, token_delay_ms=2),
+    # Shared remote GPU endpoint under normal load
+    "realistic": LatencyProfile(ttft_ms=400, ttft_jitter_ms=150, token_delay_ms=25, tail_probability=0.02, tail_ms=3000),
+    # Overloaded endpoint with frequent spikes and errors
+    "degraded": LatencyProfile(
+        ttft_ms=1500, ttft_jitter_ms=500, token_delay_ms=60, tail_probability=0.1, tail_ms=8000,
+        error_rate=0.05, error_status=503
+    ),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a completion into streamed tokens (words with their trailing whitespace)"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class MockLLMState:
+    """Mutable server state, so tests can change the behaviour of a running server"""
+
+    def __init__(self, profile: LatencyProfile, content: Optional[str] = None, seed: Optional[int] = None):
+        self.profile = profile
+        self.content = content
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_call(self) -> Dict[str, Any]:
+        """Count a call and draw its latency and outcome from the profile"""
+        with self._lock:
+            self.calls += 1
+            profile = self.profile
+            ttft = max(0.0, self._rng.gauss(profile.ttft_ms, profile.ttft_jitter_ms)) if profile.ttft_jitter_ms else profile.ttft_ms
+            if profile.tail_probability and self._rng.random() < profile.tail_probability:
+                ttft += profile.tail_ms
+            failed = bool(profile.error_rate) and self._rng.random() < profile.error_rate
+            if failed:
+                self.errors += 1
+            content = self.content if self.content is not None else json.dumps(CANNED_RECIPES[(self.calls - 1) % len(CANNED_RECIPES)])
+        return {
+            "ttft": ttft / 1000,
+            "token_delay": profile.token_delay_ms / 1000,
+            "failed": failed,
+            "error_status": profile.error_status,
+            "content": content
+        }
+
+
+def create_app(state: MockLLMState) -> FastAPI:
+    """Create the mock server app; routes are served with and without the /v1 prefix"""
+    app = FastAPI(title="Mock LLM Server")
+
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        call = state.next_call()
+        model = body.get("model", "mock-model")
+        prompt_tokens = sum(len(tokenize(str(message.get("content", "")))) for message in body.get("messages", []))
+
+        if call["failed"]:
+            # Fail after the time to first token, like an upstream timeout or overload
+            await asyncio.sleep(call["ttft"])
+            return JSONResponse(
+                status_code=call["error_status"],
+                content={"error": {"message": "Injected mock LLM failure", "type": "server_error", "code": call["error_status"]}}
+            )
+
+        tokens = tokenize(call["content"])
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(call["ttft"] + call["token_delay"] * max(len(tokens) - 1, 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": call["content"]}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            await asyncio.sleep(call["ttft"])
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(call["token_delay"])
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def get_profile():
+        return {"profile": asdict(state.profile), "calls": state.calls, "errors": state.errors}
+
+    async def update_profile(request: Request):
+        state.profile = replace(state.profile, **(await request.json()))
+        return await get_profile()
+
+    for prefix in ("", "/v1"):
+        app.add_api_route(f"{prefix}/models", list_models, methods=["GET"])
+        app.add_api_route(f"{prefix}/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/mock/profile", get_profile, methods=["GET"])
+    app.add_api_route("/mock/profile", update_profile, methods=["PUT"])
+
+    return app
+
+
+class BackgroundServer:
+    """
+    ASGI app served by uvicorn in a background thread.
+
+    Args:
+        app: The ASGI app.
+        host: Interface to listen on.
+        port: Port to listen on, 0 for a free port.
+    """
+
+    def __init__(self, app: Any, host: str = "127.0.0.1", port: int = 0):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self.host, self.port = self._socket.getsockname()[:2]
+        self._server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off", ws="none"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Root URL of the server"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Start serving and wait until the server accepts requests"""
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [self._socket]}, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"{type(self).__name__} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        """Stop serving without waiting for in-flight requests"""
+        self._server.should_exit = True
+        self._server.force_exit = True
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class MockLLMServer(BackgroundServer):
+    """
+    Mock LLM server running in a background thread.
+
+    Args:
+        profile: Name of a profile in PROFILES or a LatencyProfile.
+        content: Fixed completion text; canned recipes are rotated if None.
+        seed: Seed for latency and error sampling.
+        host: Interface to listen on.
+        port: Port to listen on, 0 for a free port.
+        **overrides: LatencyProfile fields overriding the profile, e.g. error_rate=1.0.
+    """
+
+    def __init__(
+        self,
+        profile: Union[str, LatencyProfile] = "instant",
+        content: Optional[str] = None,
+        seed: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        **overrides: Any
+    ):
+        base_profile = PROFILES[profile] if isinstance(profile, str) else profile
+        self.state = MockLLMState(replace(base_profile, **overrides), content=content, seed=seed)
+        super().__init__(create_app(self.state), host=host, port=port)
+
+    @property
+    def url(self) -> str:
+        """OpenAI base URL of the server"""
+        return f"{self.base_url}/v1"
+
+    @property
+    def calls(self) -> int:
+        """Number of chat completion requests received"""
+        return self.state.calls
+
+    @property
+    def profile(self) -> LatencyProfile:
+        return self.state.profile
+
+    @profile.setter
+    def profile(self, profile: LatencyProfile) -> None:
+        self.state.profile = profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--seed", type=int, help="Seed for latency and error sampling")
+    for name, default in asdict(LatencyProfile()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), help=f"Override the profile's {name}")
+    args = parser.parse_args()
+
+    overrides = {name: getattr(args, name) for name in asdict(LatencyProfile()) if getattr(args, name) is not None}
+    state = MockLLMState(replace(PROFILES[args.profile], **overrides), seed=args.seed)
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1 with profile {asdict(state.profile)}")
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Replay captured traffic and compare latency distributions between builds.
+
+Captures are written by the service with TRAFFIC_CAPTURE_ENABLED=true (see
+traffic_capture.py). Replaying re-issues the captured requests at their original offsets,
+optionally sped up, and records latency percentiles per endpoint. Two replay results,
+e.g. of the main branch and a change, are then compared.
+
+Usage:
+    # Replay against the in-process service (mock LLM and in-memory vector store)
+    python replay_traffic.py replay capture.jsonl.zst --output main.json
+
+    # Replay at 4x the original rate against a running build
+    python replay_traffic.py replay capture.jsonl.zst --target http://localhost:8080 --speed 4 --output change.json
+
+    # Compare two replays; fails if a p95 got more than 10% slower
+    python replay_traffic.py compare main.json change.json --tolerance 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import LocalService, RequestRecord, send, summarize
+from mock_llm_server import PROFILES
+from traffic_capture import read_capture
+
+
+def endpoint_key(record: Dict[str, Any]) -> str:
+    """Group key of a captured request, with recipe ids collapsed"""
+    path = record["path"]
+    if record["method"] == "DELETE" and path.startswith("/genai/vector/"):
+        path = "/genai/vector/{recipe_id}"
+    return f"{record['method']} {path}"
+
+
+async def replay(base_url: str, records: List[Dict[str, Any]], speed: float, timeout: float) -> Dict[str, Any]:
+    """Re-issue the captured requests at their offsets divided by `speed`"""
+    limits = httpx.Limits(max_connections=512, max_keepalive_connections=512)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        first_offset = records[0]["offset_s"] if records else 0.0
+        start = time.perf_counter()
+        tasks = []
+        for record in records:
+            scheduled = start + (record["offset_s"] - first_offset) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            request = (record["method"], record["path"], record["body"] if isinstance(record["body"], dict) else None)
+            tasks.append(asyncio.create_task(send(client, endpoint_key(record), request, scheduled)))
+        results: List[RequestRecord] = list(await asyncio.gather(*tasks))
+        elapsed = time.perf_counter() - start
+
+    by_endpoint: Dict[str, List[RequestRecord]] = defaultdict(list)
+    for result in results:
+        by_endpoint[result.workload].append(result)
+
+    return {
+        "speed": speed,
+        "duration_s": round(elapsed, 2),
+        "overall": summarize(results, elapsed),
+        "endpoints": {name: summarize(endpoint_results, elapsed) for name, endpoint_results in sorted(by_endpoint.items())}
+    }
+
+
+def compare(base: Dict[str, Any], candidate: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare latency percentiles per endpoint.
+
+    Returns:
+        One entry per endpoint and percentile with both values, the relative change and
+        whether it is a regression (p95/p99 more than `tolerance` slower).
+    """
+    rows = []
+    for name in sorted(set(base["endpoints"]) | set(candidate["endpoints"])) + ["overall"]:
+        before = base["overall"] if name == "overall" else base["endpoints"].get(name)
+        after = candidate["overall"] if name == "overall" else candidate["endpoints"].get(name)
+        if not before or not after:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            if metric == "error_rate":
+                regression = after[metric] > before[metric] + 0.01
+            else:
+                regression = metric != "p50_ms" and change > tolerance
+            rows.append({
+                "endpoint": name,
+                "metric": metric,
+                "base": before[metric],
+                "candidate": after[metric],
+                "change": round(change, 3),
+                "regression": regression
+            })
+    return rows
+
+
+def print_replay(result: Dict[str, Any]) -> None:
+    header = f"{'endpoint':<36}{'reqs':>7}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, summary in list(result["endpoints"].items()) + [("overall", result["overall"])]:
+        print(
+            f"{name:<36}{summary['requests']:>7}{summary['error_rate'] * 100:>7.1f}%"
+            f"{summary['p50_ms']:>8.0f}ms{summary['p95_ms']:>8.0f}ms{summary['p99_ms']:>8.0f}ms"
+        )
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    header = f"{'endpoint':<36}{'metric':<12}{'base':>10}{'candidate':>12}{'change':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['endpoint']:<36}{row['metric']:<12}{row['base']:>10}{row['candidate']:>12}{row['change']:>+10.1%}{flag}")
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured GenAI traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="Replay a capture and record latencies")
+    replay_parser.add_argument("capture", help="Capture file (.jsonl or .jsonl.zst)")
+    replay_parser.add_argument("--output", required=True, help="Where to write the replay result")
+    replay_parser.add_argument("--target", help="Base URL of a running service; an in-process service with stubbed dependencies is used if not set")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Replay rate relative to the original traffic")
+    replay_parser.add_argument("--limit", type=int, help="Only replay the first N requests")
+    replay_parser.add_argument("--llm-profile", choices=sorted(PROFILES), default="realistic", help="Mock LLM latency profile of the in-process service")
+    replay_parser.add_argument("--timeout", type=float, default=120.0, help="Request timeout in seconds")
+
+    compare_parser = commands.add_parser("compare", help="Compare two replay results")
+    compare_parser.add_argument("base", help="Replay result of the reference build")
+    compare_parser.add_argument("candidate", help="Replay result of the build under test")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed p95/p99 slowdown (0.1 = 10%%)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        rows = compare(base, candidate, args.tolerance)
+        print_comparison(rows)
+        return 1 if any(row["regression"] for row in rows) else 0
+
+    records = sorted(read_capture(args.capture), key=lambda record: record["offset_s"])[:args.limit]
+    print(f"Replaying {len(records)} requests at {args.speed}x")
+
+    if args.target:
+        result = asyncio.run(replay(args.target, records, args.speed, args.timeout))
+    else:
+        logging.disable(logging.INFO)
+        with LocalService(llm_profile=args.llm_profile) as service:
+            result = asyncio.run(replay(service.url, records, args.speed, args.timeout))
+
+    result["capture"] = args.capture
+    print_replay(result)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    print(f"\nReplay result written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
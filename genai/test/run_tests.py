@@ -29,6 +29,30 @@ def run_command(cmd, description=""):
         return False
 
 
+def run_benchmarks(args):
+    """Run the benchmark suite in benchmarks.py"""
+    cmd = ["python", "benchmarks.py"]
+    
+    if args.pattern:
+        cmd.extend(["--filter", args.pattern])
+    if args.update_baseline:
+        cmd.append("--update-baseline")
+    
+    original_dir = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    
+    success = run_command(cmd, "Running benchmarks")
+    
+    os.chdir(original_dir)
+    
+    if success:
+        print("\n🎉 No benchmark regressions!")
+        return 0
+    else:
+        print("\n💥 Benchmarks regressed or failed!")
+        return 1
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run GenAI service tests")
     parser.add_argument(
@@ -66,9 +90,22 @@ def main():
         "--pattern", 
         help="Pattern to match test files or test names"
     )
+    parser.add_argument(
+        "--bench", 
+        action="store_true",
+        help="Run the benchmarks instead of the tests and compare them with the baseline"
+    )
+    parser.add_argument(
+        "--update-baseline", 
+        action="store_true",
+        help="With --bench, store the results as the new benchmark baseline"
+    )
     
     args = parser.parse_args()
     
+    if args.bench:
+        return run_benchmarks(args)
+    
     # Build pytest command
     cmd = ["python", "-m", "pytest"]
     
@@ -0,0 +1,144 @@
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context_builder
+from context_builder import ContextBuilder, NO_RESULTS_CONTEXT, count_tokens, get_tokenizer
+from llm import RecipeLLM
+
+
+def word_count(text):
+    """Deterministic token counter for testing"""
+    return len(text.split())
+
+
+def make_recipe_document(title, steps=5):
+    """Create a document with the page content layout used for indexed recipes"""
+    step_lines = "\n".join(f"Step {i}: Stir the sauce gently for a while" for i in range(1, steps + 1))
+    page_content = "\n\n".join([
+        f"Title: {title}",
+        f"Description: A comforting {title.lower()}",
+        "Ingredients:\n- 200 g pasta\n- 1 can tomatoes",
+        f"Steps:\n{step_lines}",
+        "Tags: dinner, pasta",
+        "Serving Size: 2"
+    ])
+    return Document(page_content=page_content, metadata={"recipe_id": title})
+
+
+class TestTokenizer:
+    """Test loading the prompt budgeting tokenizer"""
+
+    def test_failed_load_is_retried(self, monkeypatch):
+        """Test that a tokenizer that failed to load is estimated for, then loaded after the retry interval"""
+        monkeypatch.setattr(context_builder, "_tokenizer", None)
+        monkeypatch.setattr(context_builder, "_tokenizer_retry_at", 0.0)
+        tokenizer = Mock()
+        tokenizer.encode.return_value = [1, 2]
+        get_encoding = Mock(side_effect=[OSError("offline"), tokenizer])
+        count_tokens.cache_clear()
+
+        with patch('context_builder.tiktoken.get_encoding', get_encoding):
+            assert get_tokenizer() is None
+            assert count_tokens("twelve chars") == 3
+            # Within the retry interval the failure is not retried on every call
+            assert get_tokenizer() is None
+            assert get_encoding.call_count == 1
+
+            monkeypatch.setattr(context_builder, "_tokenizer_retry_at", 0.0)
+            assert get_tokenizer() is tokenizer
+            assert count_tokens("twelve chars") == 2
+
+        count_tokens.cache_clear()
+
+
+class TestContextBuilder:
+    """Test the token-budgeted context builder"""
+
+    def test_empty_results(self):
+        """Test the context for no search results"""
+        built = ContextBuilder(token_budget=100, token_counter=word_count).build([])
+
+        assert built.text == NO_RESULTS_CONTEXT
+        assert built.tokens_saved == 0
+
+    def test_context_within_budget_is_unchanged(self):
+        """Test that a context within budget keeps the full page content"""
+        documents = [make_recipe_document("Tomato Pasta")]
+
+        built = ContextBuilder(token_budget=1000, token_counter=word_count).build(documents)
+
+        assert built.text == f"Recipe 1:\n{documents[0].page_content}"
+        assert built.tokens_saved == 0
+        assert built.steps_omitted == 0
+
+    def test_steps_truncated_to_fit_budget(self):
+        """Test that steps are dropped before title and ingredients"""
+        documents = [make_recipe_document("Tomato Pasta", steps=20)]
+
+        built = ContextBuilder(token_budget=60, token_counter=word_count).build(documents)
+
+        assert built.tokens <= 60
+        assert built.tokens_saved > 0
+        assert built.steps_omitted > 0
+        assert "Title: Tomato Pasta" in built.text
+        assert "Ingredients:\n- 200 g pasta" in built.text
+        assert "Step 1: Stir" in built.text
+        assert "Step 20:" not in built.text
+        assert f"({built.steps_omitted} more steps omitted)" in built.text
+
+    def test_headers_of_all_recipes_preferred_over_steps(self):
+        """Test that lower ranked recipes keep their title before the top recipe gets all steps"""
+        documents = [make_recipe_document("Tomato Pasta", steps=10), make_recipe_document("Pesto Pasta", steps=10)]
+
+        built = ContextBuilder(token_budget=70, token_counter=word_count).build(documents)
+
+        assert built.documents_included == 2
+        assert built.text.index("Recipe 1:\nTitle: Tomato Pasta") < built.text.index("Recipe 2:\nTitle: Pesto Pasta")
+        assert "Step 10:" not in built.text
+
+    def test_lower_ranked_recipes_dropped_when_over_budget(self):
+        """Test that recipes that do not fit are dropped in rank order"""
+        documents = [make_recipe_document(f"Pasta {i}") for i in range(1, 4)]
+
+        built = ContextBuilder(token_budget=25, token_counter=word_count).build(documents)
+
+        assert built.documents_included == 1
+        assert built.documents_total == 3
+        assert "Pasta 1" in built.text
+        assert "Pasta 2" not in built.text
+
+    def test_unstructured_content_is_truncated(self):
+        """Test that unstructured content larger than the budget is cut down"""
+        documents = [Document(page_content=" ".join(["word"] * 200), metadata={})]
+
+        built = ContextBuilder(token_budget=50, token_counter=word_count).build(documents)
+
+        assert built.tokens <= 50
+        assert built.text.startswith("Recipe 1:\n")
+
+
+class TestRecipeLLMContextBudget:
+    """Test the context budget in the LLM service"""
+
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_prepare_search_context_applies_budget(self, mock_rag_class, mock_llm_class):
+        """Test that search context is fitted to RAG_CONTEXT_TOKEN_BUDGET"""
+        mock_llm_class.return_value = Mock()
+        mock_rag_class.return_value = Mock()
+
+        with patch.dict(os.environ, {"RAG_CONTEXT_TOKEN_BUDGET": "40"}):
+            llm = RecipeLLM()
+        llm.context_builder.token_counter = word_count
+
+        context = llm._prepare_search_context([make_recipe_document("Tomato Pasta", steps=30)])
+
+        assert word_count(context) <= 40
+        assert "Title: Tomato Pasta" in context
+        assert "more steps omitted" in context
@@ -0,0 +1,126 @@
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+from langchain_core.documents import Document
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from degraded_mode import DegradedMode, parse_ingredients, scale_recipe
+from llm_router import LatencyTracker
+from resilience import CircuitBreaker
+from benchmarks import create_llm
+
+DOCUMENT = Document(
+    page_content="Title: Pancakes\n\nDescription: Fluffy\n\nIngredients: 2.0 cup flour, 1.0 egg, salt\n\nSteps:\nStep 1: Mix\nStep 2: Fry",
+    metadata={
+        "recipe_id": "7",
+        "title": "Pancakes",
+        "description": "Fluffy",
+        "ingredients": ["flour", "egg", "salt"],
+        "steps": ["Mix", "Fry"],
+        "tags": ["breakfast"],
+        "serving_size": 2
+    }
+)
+
+
+def degraded_count(reason):
+    return REGISTRY.get_sample_value("genai_degraded_responses_total", {"reason": reason}) or 0
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("degraded_test", failure_threshold=1, reset_timeout=60)
+
+
+class TestDegradedMode:
+    """Test assembling suggestions from retrieved recipes without the LLM"""
+
+    def test_parse_ingredients(self):
+        """Test that amounts and units are read from the indexed content"""
+        assert parse_ingredients(DOCUMENT) == [
+            {"name": "flour", "unit": "cup", "amount": 2.0},
+            {"name": "egg", "unit": None, "amount": 1.0},
+            {"name": "salt", "unit": None, "amount": None}
+        ]
+
+    def test_parse_ingredients_without_content(self):
+        """Test that ingredients are returned without amounts if the content does not match"""
+        document = Document(page_content="Title: Pancakes", metadata=DOCUMENT.metadata)
+
+        assert parse_ingredients(document)[0] == {"name": "flour", "unit": None, "amount": None}
+
+    def test_build_recipe_scales_servings(self):
+        """Test that the nearest recipe is scaled to the requested servings"""
+        recipe_data = DegradedMode.build_recipe(DOCUMENT, servings=5)
+
+        assert recipe_data["title"] == "Pancakes"
+        assert recipe_data["servingSize"] == 5
+        assert recipe_data["recipeIngredients"][0]["amount"] == 5.0
+        assert recipe_data["recipeSteps"] == [{"order": 1, "details": "Mix"}, {"order": 2, "details": "Fry"}]
+
+    def test_scale_recipe_copies(self):
+        """Test that scaling leaves the original recipe, e.g. a cached one, unchanged"""
+        recipe_data = {"servingSize": 4, "recipeIngredients": [{"name": "rice", "unit": "g", "amount": 300}]}
+
+        scaled = scale_recipe(recipe_data, 2)
+
+        assert scaled["recipeIngredients"][0]["amount"] == 150
+        assert recipe_data["recipeIngredients"][0]["amount"] == 300
+        assert scale_recipe(recipe_data, None) is recipe_data
+
+    def test_nearest_recipe_needs_steps(self):
+        """Test that retrieved recipes without steps are skipped"""
+        empty = Document(page_content="", metadata={"recipe_id": "1", "title": "Ids only"})
+
+        assert DegradedMode.nearest_recipe([empty, DOCUMENT]) is DOCUMENT
+        assert DegradedMode.nearest_recipe([empty]) is None
+
+    def test_reasons(self, breaker):
+        """Test the triggers of degraded mode"""
+        latency = LatencyTracker()
+        mode = DegradedMode(lambda: [breaker], latency, latency_budget=2.0)
+
+        assert mode.reason() is None
+        assert mode.reason(requested=True) == "requested"
+
+        latency.observe(1.0)
+        assert mode.reason(remaining=0.5) == "deadline"
+        latency.observe(10.0)
+        assert mode.reason() == "latency_budget"
+
+        breaker.record_failure()
+        assert mode.reason() == "circuit_open"
+
+        mode.enabled = False
+        assert mode.reason() is None
+        assert mode.reason(requested=True) == "requested"
+
+    def test_llm_error_degrades(self):
+        """Test that a failing LLM call is answered with the nearest retrieved recipe"""
+        llm = create_llm()
+        llm.recipe_llm = Mock()
+        llm.recipe_llm.invoke.side_effect = ConnectionError("backend down")
+        before = degraded_count("llm_error")
+
+        response = llm.suggest_recipe("smoky vegan stew", bypass_cache=True)
+
+        assert response.degraded["reason"] == "llm_error"
+        assert response.recipe_data["title"] == "Slow Roasted Tomato and Chickpea Stew 100"
+        assert degraded_count("llm_error") == before + 1
+
+    def test_open_circuit_skips_llm(self):
+        """Test that suggestions skip the LLM while its circuit breaker is open"""
+        llm = create_llm()
+        llm.recipe_llm = Mock()
+        llm.recipe_llm.invoke.side_effect = ConnectionError("backend down")
+        for _ in range(llm.llm_breaker.failure_threshold):
+            llm.suggest_recipe("smoky vegan stew", bypass_cache=True)
+        llm.recipe_llm.invoke.reset_mock()
+
+        response = llm.suggest_recipe("smoky vegan stew", bypass_cache=True)
+
+        assert response.degraded["reason"] == "circuit_open"
+        llm.recipe_llm.invoke.assert_not_called()
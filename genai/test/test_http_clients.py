@@ -0,0 +1,93 @@
+import pytest
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_clients import LLMHttpClients
+
+
+class _ModelsHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /models endpoint"""
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("Authorization")))
+        body = b'{"data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def llm_server():
+    """Run a local LLM backend stub"""
+    _ModelsHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ModelsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+class TestLLMHttpClients:
+    """Test the pooled LLM HTTP clients"""
+
+    def test_prewarm_opens_pooled_connections(self, llm_server):
+        """Test that pre-warming leaves idle keep-alive connections in the pool"""
+        clients = LLMHttpClients(base_url=llm_server, api_key="test-key", http2=False)
+
+        opened = clients.prewarm(connections=2)
+
+        assert opened == 2
+        assert ("/v1/models", "Bearer test-key") in _ModelsHandler.requests
+        stats = clients.pool_stats()["sync"]
+        assert stats["active"] == 0
+        assert 1 <= stats["idle"] <= 2
+        clients.close()
+
+    def test_prewarm_failure_does_not_raise(self):
+        """Test that an unreachable backend only logs a warning"""
+        clients = LLMHttpClients(base_url="http://127.0.0.1:1", connect_timeout=0.5, http2=False)
+
+        assert clients.prewarm(connections=1) == 0
+        clients.close()
+
+    def test_prewarm_skipped_without_url(self):
+        """Test that pre-warming is skipped for an unconfigured base URL"""
+        clients = LLMHttpClients(base_url="unknown", http2=False)
+
+        assert clients.prewarm(connections=2) == 0
+        clients.close()
+
+    def test_pool_metrics_exported(self, llm_server):
+        """Test that pool utilization is reported on scrape"""
+        clients = LLMHttpClients(base_url=llm_server, max_connections=7, http2=False)
+        clients.prewarm(connections=1)
+
+        idle = REGISTRY.get_sample_value("genai_llm_http_pool_connections", {"client": "sync", "state": "idle"})
+        limit = REGISTRY.get_sample_value("genai_llm_http_pool_max_connections", {"client": "sync"})
+
+        assert idle >= 1
+        assert limit >= 7
+        clients.close()
+
+    def test_timeouts_and_limits_configured(self):
+        """Test that the configured timeouts are set on both clients"""
+        clients = LLMHttpClients(base_url="http://test.com", connect_timeout=2, read_timeout=30, http2=False)
+
+        for client in (clients.sync_client, clients.async_client):
+            assert client.timeout.connect == 2
+            assert client.timeout.read == 30
+        clients.close()
@@ -0,0 +1,127 @@
+import pytest
+import sys
+import os
+import time
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter, RetrievalPlan, UNROUTED_PLAN, INTENT_EXAMPLES
+
+PLANS = {
+    "search": RetrievalPlan(top_k=10, full_text=False),
+    "creation": RetrievalPlan(top_k=3, full_text=True),
+    "chitchat": RetrievalPlan(top_k=0, full_text=False)
+}
+
+AXES = {"creation": [1.0, 0.0, 0.0], "search": [0.0, 1.0, 0.0], "chitchat": [0.0, 0.0, 1.0]}
+
+
+def fake_embed(text):
+    """Embed every intent example onto its own axis, other texts onto the axis named in them"""
+    for intent, examples in INTENT_EXAMPLES.items():
+        if text in examples:
+            return AXES[intent]
+    for intent, axis in AXES.items():
+        if intent in text:
+            return axis
+    return [0.6, 0.6, 0.5]
+
+
+def fake_embed_batch(texts):
+    return [fake_embed(text) for text in texts]
+
+
+@pytest.fixture
+def router():
+    router = IntentRouter(fake_embed_batch, PLANS)
+    router.build_centroids()
+    return router
+
+
+class TestIntentRouter:
+    """Test routing chat messages to a retrieval plan"""
+
+    def test_keyword_routing(self, router):
+        """Test that keyword matches are routed without the centroids"""
+        decision = router.classify("Create a recipe for lemon tart", lambda: [0.0, 1.0, 0.0])
+
+        assert decision.intent == "creation"
+        assert decision.method == "keyword"
+        assert decision.plan == PLANS["creation"]
+        assert decision.query_vector == [0.0, 1.0, 0.0]
+        assert router.classify("Show me soups", lambda: [1.0, 0.0, 0.0]).intent == "search"
+
+    def test_chitchat_skips_embedding(self, router):
+        """Test that greetings are routed without embedding the message"""
+        embed_query = Mock()
+
+        decision = router.classify("Thanks a lot!", embed_query)
+
+        assert decision.intent == "chitchat"
+        assert decision.plan.top_k == 0
+        embed_query.assert_not_called()
+
+    def test_centroid_routing_reuses_query_vector(self, router):
+        """Test nearest-centroid routing with the message's query embedding"""
+        decision = router.classify("Something with mango tonight", lambda: fake_embed("creation"))
+
+        assert decision.intent == "creation"
+        assert decision.method == "centroid"
+        assert decision.similarity == pytest.approx(1.0)
+
+    def test_ambiguous_message_defaults_to_search(self, router):
+        """Test that messages close to several centroids are treated as searches"""
+        decision = router.classify("Mango", lambda: fake_embed("mango"))
+
+        assert decision.intent == "search"
+        assert decision.method == "default"
+
+    def test_centroids_built_in_one_batch(self):
+        """Test that the intent examples are embedded with a single batch call"""
+        embed_batch = Mock(side_effect=fake_embed_batch)
+        router = IntentRouter(embed_batch, PLANS)
+
+        assert router.build_centroids()
+        assert router.build_centroids()
+        embed_batch.assert_called_once()
+        assert len(embed_batch.call_args.args[0]) == sum(len(examples) for examples in INTENT_EXAMPLES.values())
+
+    def test_centroid_failure_retried_with_backoff(self):
+        """Test that a failed build routes by keywords and is retried in the background after the backoff"""
+        embed_batch = Mock(side_effect=[RuntimeError("model not loaded"), RuntimeError("model not loaded")] + [fake_embed_batch(
+            [example for examples in INTENT_EXAMPLES.values() for example in examples]
+        )])
+        router = IntentRouter(embed_batch, PLANS, retry_backoff=60)
+
+        assert not router.build_centroids()
+        # Within the backoff, requests neither wait for nor trigger a rebuild
+        assert router.classify("Mango", lambda: fake_embed("creation")).method == "default"
+        assert embed_batch.call_count == 1
+
+        for expected_calls in (2, 3):
+            router._retry_at = time.monotonic()
+            assert router.classify("Mango", lambda: fake_embed("creation")).method == "default"
+            router._retry_thread.join(timeout=5)
+            assert embed_batch.call_count == expected_calls
+
+        assert router.classify("Mango", lambda: fake_embed("creation")).method == "centroid"
+
+    def test_disabled_routing_keeps_unrouted_retrieval(self):
+        """Test that disabled routing retrieves for every message like before"""
+        router = IntentRouter(fake_embed_batch, PLANS, enabled=False)
+
+        decision = router.classify("Hello", lambda: [0.0, 0.0, 1.0])
+
+        assert decision.intent == "search"
+        assert decision.method == "disabled"
+        assert decision.plan == UNROUTED_PLAN
+
+    def test_estimated_savings(self, router):
+        """Test that savings are the recent latency of the skipped stages"""
+        router.retrieval_latency.observe(0.04)
+        router.context_latency.observe(0.01)
+
+        assert router.estimated_savings("chitchat") == pytest.approx(0.05)
+        assert router.estimated_savings("search") == pytest.approx(0.01)
+        assert router.estimated_savings("creation") == 0.0
@@ -4,12 +4,24 @@ import os
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 import json
+import asyncio
+import threading
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.documents import Document
+from langchain_openai import ChatOpenAI
+from prometheus_client import REGISTRY
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from llm import RecipeLLM
+from llm import RecipeLLM, CHITCHAT_REPLY, CREATION_TIMEOUT_SOURCES_REPLY, SEARCH_TIMEOUT_REPLY
 from request_models import RecipeData, RecipeMetadataDTO, RecipeDetailsDTO, RecipeIngredientDTO, RecipeStepDTO, RecipeTagDTO
 from response_models import ChatResponse, RecipeSuggestionResponse
+from request_context import CancelScope, RequestStats, current_cancel_scope, current_request_stats
+from benchmarks import create_llm, FakeRAGHelper, RECIPE_COMPLETION
+from mock_llm_server import MockLLMServer
 
 
 @pytest.fixture
@@ -82,7 +94,9 @@ class TestRecipeLLMInitialization:
             model='test-model',
             temperature=0.5,
             api_key='test-key',
-            base_url='http://test.com'
+            base_url='http://test.com',
+            http_client=llm.http_clients.sync_client,
+            http_async_client=llm.http_clients.async_client
         )
         
         # Verify RAG helper was initialized
@@ -251,7 +265,7 @@ class TestRecipeLLMChat:
         mock_rag_class.return_value = mock_rag_instance
         
         llm = RecipeLLM()
-        response = llm.chat("Hello")
+        response = llm.chat("Do you have any soup recipes?")
         
         assert isinstance(response, ChatResponse)
         assert "Sorry, I could not find anything" in response.reply
@@ -320,10 +334,49 @@ class TestRecipeLLMChat:
         llm = RecipeLLM()
         
         # Chat method should handle exceptions gracefully and return error response
-        response = llm.chat("Hello")
+        response = llm.chat("Do you have any soup recipes?")
         assert isinstance(response, ChatResponse)
         # The chat method returns a fallback response when LLM fails
         assert "Sorry, I could not find anything" in response.reply
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_chat_chitchat_skips_retrieval(self, mock_rag_class, mock_llm_class):
+        """Test that greetings are answered without embedding, retrieval or an LLM call"""
+        mock_llm_instance = Mock()
+        mock_llm_class.return_value = mock_llm_instance
+        
+        mock_rag_instance = Mock()
+        mock_rag_class.return_value = mock_rag_instance
+        
+        llm = RecipeLLM()
+        response = llm.chat("Hello")
+        
+        assert response.reply == CHITCHAT_REPLY
+        assert response.sources is None
+        mock_rag_instance.embed_query.assert_not_called()
+        mock_rag_instance.retrieve.assert_not_called()
+        mock_llm_instance.invoke.assert_not_called()
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_chat_search_retrieves_ids_only(self, mock_rag_class, mock_llm_class):
+        """Test that searches retrieve a larger projected result set and return each recipe once"""
+        mock_rag_instance = Mock()
+        mock_rag_instance.retrieve.return_value = [
+            Document(page_content="", metadata={"recipe_id": "3"}),
+            Document(page_content="", metadata={"recipe_id": "7"}),
+            Document(page_content="", metadata={"recipe_id": "3"})
+        ]
+        mock_rag_class.return_value = mock_rag_instance
+        
+        llm = RecipeLLM()
+        response = llm.chat("Find vegetarian pasta dishes")
+        
+        assert response.sources == ["3", "7"]
+        _, kwargs = mock_rag_instance.retrieve.call_args
+        assert kwargs["top_k"] == 10
+        assert kwargs["metadata_only"] is True
 
 
 class TestRecipeLLMSuggestRecipe:
@@ -556,4 +609,492 @@ class TestRecipeLLMCleanup:
         llm.cleanup()
         
         # Verify RAG helper cleanup was called
-        mock_rag_instance.cleanup.assert_called_once() 
\ No newline at end of file
+        mock_rag_instance.cleanup.assert_called_once()
+
+    
+    @patch('llm.ChatOpenAI', ChatOpenAI)
+    def test_prewarm_and_close_async_client_on_llm_loop(self):
+        """Test that the async client requests use is pre-warmed and closed on the LLM event loop"""
+        with MockLLMServer() as server:
+            with patch.dict('os.environ', {"LLM_BASE_URL": server.url, "LLM_MODEL": "mock-model", "OPEN_WEBUI_API_KEY": "test-key", "LLM_HTTP2": "false"}), patch('llm.RAGHelper', FakeRAGHelper):
+                llm = RecipeLLM()
+            
+            assert llm.prewarm_connections() == 2
+            assert llm.llm_runtime is not None
+            assert llm.http_clients.pool_stats()["async"]["idle"] >= 1
+            assert llm.http_clients.pool_stats()["sync"]["idle"] == 0
+            
+            scope = CancelScope()
+            token = current_cancel_scope.set(scope)
+            try:
+                response = llm.suggest_recipe("smoky vegan stew", bypass_cache=True)
+            finally:
+                current_cancel_scope.reset(token)
+            assert response.recipe_data["title"] == "Smoky Chickpea Stew"
+            assert llm.http_clients.pool_stats()["sync"]["idle"] == 0
+            
+            llm.cleanup()
+            assert llm.http_clients.async_client.is_closed
+
+
+VALID_RECIPE_JSON = json.dumps({
+    "title": "Mushroom Risotto",
+    "description": "Creamy risotto with porcini",
+    "servingSize": 2,
+    "recipeIngredients": [{"name": "Arborio rice", "unit": "g", "amount": 200}],
+    "recipeSteps": [{"order": 1, "details": "Toast the rice"}, {"order": 5, "details": "Stir in the stock"}]
+})
+
+
+class TestRecipeLLMStructuredOutput:
+    """Test schema-constrained recipe generation"""
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_recipe_schema_bound_to_llm(self, mock_rag_class, mock_llm_class):
+        """Test that the recipe JSON schema is sent as response format"""
+        mock_llm_instance = Mock()
+        mock_llm_class.return_value = mock_llm_instance
+        
+        llm = RecipeLLM()
+        
+        recipe_format, variants_format = [call.kwargs["response_format"] for call in mock_llm_instance.bind.call_args_list]
+        assert recipe_format["type"] == "json_schema"
+        schema = recipe_format["json_schema"]["schema"]
+        assert {"title", "recipeIngredients", "recipeSteps"} <= set(schema["required"])
+        assert llm.recipe_llm == mock_llm_instance.bind.return_value
+        assert variants_format["json_schema"]["name"] == "recipe_variants"
+        assert variants_format["json_schema"]["schema"]["required"] == ["recipes"]
+    
+    @patch.dict('os.environ', {'LLM_STRUCTURED_OUTPUT': 'off'})
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_structured_output_disabled(self, mock_rag_class, mock_llm_class):
+        """Test that structured output can be turned off"""
+        mock_llm_instance = Mock()
+        mock_llm_class.return_value = mock_llm_instance
+        
+        llm = RecipeLLM()
+        
+        mock_llm_instance.bind.assert_not_called()
+        assert llm.recipe_llm == mock_llm_instance
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_parse_bare_json_and_renumber_steps(self, mock_rag_class, mock_llm_class):
+        """Test that bare JSON output is parsed and steps are renumbered"""
+        llm = RecipeLLM()
+        
+        recipe_data, error = llm._try_parse_recipe_response(VALID_RECIPE_JSON)
+        
+        assert error is None
+        assert recipe_data["title"] == "Mushroom Risotto"
+        assert [step["order"] for step in recipe_data["recipeSteps"]] == [1, 2]
+        assert recipe_data["recipeIngredients"][0] == {"name": "Arborio rice", "unit": "g", "amount": 200}
+        assert recipe_data["tags"] == []
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_parse_minimal_completion(self, mock_rag_class, mock_llm_class):
+        """Test that a completion without serving size, step order or numeric amounts is completed, not rejected"""
+        llm = RecipeLLM()
+        
+        recipe_data, error = llm._try_parse_recipe_response(json.dumps({
+            "title": "Pancakes",
+            "recipeIngredients": [
+                {"name": "Flour", "unit": "cups", "amount": "1 1/2"},
+                {"name": "Milk", "unit": "ml", "amount": 250},
+                {"name": "Salt", "amount": "a pinch"}
+            ],
+            "recipeSteps": [{"details": "Whisk everything together"}, {"details": "Fry in a hot pan"}]
+        }))
+        
+        assert error is None
+        assert recipe_data["servingSize"] == 4
+        assert [step["order"] for step in recipe_data["recipeSteps"]] == [1, 2]
+        assert [ing["amount"] for ing in recipe_data["recipeIngredients"]] == [1.5, 250, "a pinch"]
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_parse_rejects_schema_violations(self, mock_rag_class, mock_llm_class):
+        """Test that output violating the recipe schema is reported as an error"""
+        llm = RecipeLLM()
+        
+        recipe_data, error = llm._try_parse_recipe_response('{"title": "No steps", "servingSize": 2, "recipeIngredients": [], "recipeSteps": []}')
+        assert recipe_data is None
+        assert "Schema validation failed" in error
+        
+        recipe_data, error = llm._try_parse_recipe_response('Here you go: {"title": "Broken",')
+        assert recipe_data is None
+        assert error is not None
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_invalid_generation_is_repaired_once(self, mock_rag_class, mock_llm_class):
+        """Test that an invalid generation triggers a single repair round trip"""
+        fake_llm = FakeListChatModel(responses=['{"title": "Missing everything"}', VALID_RECIPE_JSON])
+        mock_llm_class.return_value = fake_llm
+        
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.1, 0.2]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+        
+        llm = RecipeLLM()
+        response = llm.suggest_recipe("risotto")
+        
+        assert response.recipe_data["title"] == "Mushroom Risotto"
+        assert fake_llm.i == 0  # both canned responses were consumed
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_repair_is_bounded(self, mock_rag_class, mock_llm_class):
+        """Test that repeated invalid generations fall back to the default recipe"""
+        mock_llm_class.return_value = FakeListChatModel(responses=["not json", "still not json", VALID_RECIPE_JSON])
+        
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.1, 0.2]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+        
+        llm = RecipeLLM()
+        response = llm.suggest_recipe("risotto")
+        
+        assert response.recipe_data == llm._get_default_recipe_data()
+
+
+def token_count(kind, source, operation="suggestion", prompt_type="standalone"):
+    """Tokens recorded in the LLM token counter"""
+    return REGISTRY.get_sample_value(
+        "genai_llm_tokens_total",
+        {"operation": operation, "prompt_type": prompt_type, "kind": kind, "source": source}
+    ) or 0.0
+
+
+class TestRecipeLLMTokenAccounting:
+    """Test LLM token usage and throughput accounting"""
+    
+    def _mock_rag(self, mock_rag_class):
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = None
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_usage_metadata_reported_by_backend(self, mock_rag_class, mock_llm_class):
+        """Test that token counts reported by the backend are used"""
+        mock_llm_class.return_value = GenericFakeChatModel(messages=iter([
+            AIMessage(content=VALID_RECIPE_JSON, usage_metadata={"input_tokens": 120, "output_tokens": 80, "total_tokens": 200})
+        ]))
+        self._mock_rag(mock_rag_class)
+        before = token_count("completion", "usage")
+        
+        llm = RecipeLLM()
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            llm.suggest_recipe("risotto")
+        finally:
+            current_request_stats.reset(token)
+        
+        assert token_count("completion", "usage") == before + 80
+        assert stats.as_log_context() == {'llm_calls': 1, 'llm_prompt_tokens': 120, 'llm_completion_tokens': 80}
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_usage_estimated_without_metadata(self, mock_rag_class, mock_llm_class):
+        """Test that tokens are counted locally when the backend reports no usage"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[VALID_RECIPE_JSON])
+        self._mock_rag(mock_rag_class)
+        before = token_count("prompt", "estimate")
+        
+        llm = RecipeLLM()
+        llm.suggest_recipe("risotto")
+        
+        assert token_count("prompt", "estimate") > before
+    
+    @patch.dict('os.environ', {'LLM_STREAMING': 'true'})
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_streaming_records_time_to_first_token(self, mock_rag_class, mock_llm_class):
+        """Test that streamed calls record time to first token and tokens per second"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[VALID_RECIPE_JSON])
+        self._mock_rag(mock_rag_class)
+        labels = {"operation": "suggestion", "prompt_type": "standalone"}
+        ttft_before = REGISTRY.get_sample_value("genai_llm_time_to_first_token_seconds_count", labels) or 0.0
+        tps_before = REGISTRY.get_sample_value("genai_llm_output_tokens_per_second_count", labels) or 0.0
+        
+        llm = RecipeLLM()
+        response = llm.suggest_recipe("risotto")
+        
+        assert llm.streaming
+        mock_llm_class.assert_called_once()
+        assert mock_llm_class.call_args.kwargs["stream_usage"] is True
+        assert response.recipe_data["title"] == "Mushroom Risotto"
+        assert REGISTRY.get_sample_value("genai_llm_time_to_first_token_seconds_count", labels) == ttft_before + 1
+        assert REGISTRY.get_sample_value("genai_llm_output_tokens_per_second_count", labels) == tps_before + 1
+
+
+def speculation_count(outcome):
+    """Speculative generations recorded with an outcome"""
+    return REGISTRY.get_sample_value("genai_speculative_generations_total", {"outcome": outcome}) or 0.0
+
+
+@patch.dict('os.environ', {'SPECULATIVE_GENERATION': 'true', 'SPECULATIVE_MAX_CONTEXT_WAIT_MS': '1500'})
+class TestSpeculativeGeneration:
+    """Test standalone generation started alongside retrieval"""
+    
+    def _mock_rag(self, mock_rag_class):
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.1, 0.2]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+        return mock_rag_instance
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_standalone_result_used_without_context(self, mock_rag_class, mock_llm_class):
+        """Test that the speculative generation is used when retrieval finds no good context"""
+        fake_llm = FakeListChatModel(responses=[VALID_RECIPE_JSON])
+        mock_llm_class.return_value = fake_llm
+        self._mock_rag(mock_rag_class)
+        before = speculation_count("used")
+        
+        llm = RecipeLLM()
+        try:
+            response = llm.chat("Create a recipe for risotto", bypass_cache=True)
+        finally:
+            llm.cleanup()
+        
+        assert response.recipe_suggestion["title"] == "Mushroom Risotto"
+        assert speculation_count("used") == before + 1
+    
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_good_context_restarts_with_context_prompt(self, mock_rag_class, mock_llm_class):
+        """Test that good context arriving in time cancels the standalone call"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[VALID_RECIPE_JSON])
+        mock_rag_instance = self._mock_rag(mock_rag_class)
+        started = threading.Event()
+        cancelled = threading.Event()
+        # Retrieval finishes while the standalone call is in flight
+        mock_rag_instance.retrieve.side_effect = lambda *args, **kwargs: started.wait(timeout=2) and []
+        
+        async def slow_standalone(self, messages, operation, prompt_type):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        before = speculation_count("restarted")
+        llm = RecipeLLM()
+        try:
+            with patch.object(RecipeLLM, '_acall_llm', slow_standalone), \
+                 patch.object(llm, '_has_meaningful_context', return_value=True):
+                response = llm.chat("Create a recipe for risotto", bypass_cache=True)
+            assert cancelled.wait(timeout=2)
+        finally:
+            llm.cleanup()
+        
+        assert response.recipe_suggestion["title"] == "Mushroom Risotto"
+        assert speculation_count("restarted") == before + 1
+    
+    @patch.dict('os.environ', {'SPECULATIVE_MAX_CONTEXT_WAIT_MS': '0'})
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_late_context_keeps_standalone_result(self, mock_rag_class, mock_llm_class):
+        """Test that context arriving after the wait limit does not restart the generation"""
+        fake_llm = FakeListChatModel(responses=[VALID_RECIPE_JSON, "not used"])
+        mock_llm_class.return_value = fake_llm
+        self._mock_rag(mock_rag_class)
+        before = speculation_count("used_late_context")
+        
+        llm = RecipeLLM()
+        try:
+            with patch.object(llm, '_has_meaningful_context', return_value=True):
+                response = llm.chat("Create a recipe for risotto", bypass_cache=True)
+        finally:
+            llm.cleanup()
+        
+        assert response.recipe_suggestion["title"] == "Mushroom Risotto"
+        assert fake_llm.i == 1  # only the standalone generation was requested
+        assert speculation_count("used_late_context") == before + 1
+
+
+def stage_timeout_count(stage, fallback):
+    """Stage timeouts recorded with a fallback"""
+    return REGISTRY.get_sample_value("genai_stage_timeouts_total", {"stage": stage, "fallback": fallback}) or 0.0
+
+
+class TestStageTimeouts:
+    """Test per-stage time budgets and their fallbacks"""
+    
+    def _run(self, func, *args, **kwargs):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            return func(*args, **kwargs), stats
+        finally:
+            current_request_stats.reset(token)
+    
+    def _slow_search(self, llm):
+        retrieve = llm.rag_helper.retrieve
+        
+        def slow_retrieve(*args, **kwargs):
+            time.sleep(0.5)
+            return retrieve(*args, **kwargs)
+        llm.rag_helper.retrieve = slow_retrieve
+        llm.stage_timeouts["weaviate_query"] = 0.05
+    
+    def test_search_timeout_falls_back_to_standalone_prompt(self):
+        """Test that a suggestion whose search times out is generated without context"""
+        llm = create_llm()
+        self._slow_search(llm)
+        before = stage_timeout_count("weaviate_query", "standalone_prompt")
+        
+        start = time.perf_counter()
+        response, stats = self._run(llm.suggest_recipe, "smoky vegan stew", bypass_cache=True)
+        
+        assert time.perf_counter() - start < 0.4
+        assert response.recipe_data["title"] == "Smoky Chickpea Stew"
+        assert stats.as_log_context()["fallbacks"] == ["weaviate_query:standalone_prompt"]
+        assert stage_timeout_count("weaviate_query", "standalone_prompt") == before + 1
+    
+    def test_chat_search_timeout_asks_to_retry(self):
+        """Test that a chat search whose search times out is answered right away"""
+        llm = create_llm()
+        self._slow_search(llm)
+        
+        response, stats = self._run(llm.chat, "Do you have any soup recipes?", bypass_cache=True)
+        
+        assert response.reply == SEARCH_TIMEOUT_REPLY
+        assert stats.fallbacks == ["weaviate_query:retry_reply"]
+    
+    def test_llm_timeout_returns_sources(self):
+        """Test that a recipe creation exceeding the LLM budget returns the recipes found"""
+        llm = create_llm()
+        llm.recipe_llm = FakeListChatModel(responses=[RECIPE_COMPLETION], sleep=2)
+        llm.stage_timeouts["llm_call"] = 0.1
+        
+        start = time.perf_counter()
+        try:
+            response, stats = self._run(llm.chat, "Create a recipe for smoky vegan stew", bypass_cache=True)
+        finally:
+            llm.cleanup()
+        
+        assert time.perf_counter() - start < 1.5
+        assert response.reply == CREATION_TIMEOUT_SOURCES_REPLY
+        assert response.sources == ["100", "101", "102"]
+        assert response.recipe_suggestion is None
+        assert stats.fallbacks == ["llm_call:sources"]
+    
+    def test_llm_timeout_degrades_suggestion(self):
+        """Test that a suggestion exceeding the LLM budget is assembled from the nearest recipe"""
+        llm = create_llm()
+        llm.recipe_llm = FakeListChatModel(responses=[RECIPE_COMPLETION], sleep=2)
+        llm.stage_timeouts["llm_call"] = 0.1
+        
+        try:
+            response, stats = self._run(llm.suggest_recipe, "smoky vegan stew", bypass_cache=True)
+        finally:
+            llm.cleanup()
+        
+        assert response.degraded["reason"] == "llm_timeout"
+        assert stats.fallbacks == ["llm_call:degraded"]
+    
+    def test_embedding_timeout_skips_cache(self):
+        """Test that a slow embedding is abandoned and the search embeds the query itself"""
+        llm = create_llm()
+        llm.rag_helper.embed_query = lambda text: time.sleep(0.5)
+        llm.stage_timeouts["embedding"] = 0.05
+        
+        response, stats = self._run(llm.suggest_recipe, "smoky vegan stew")
+        
+        assert response.recipe_data["title"] == "Smoky Chickpea Stew"
+        assert stats.fallbacks == ["embedding:skip_cache"]
+
+
+class TestRecipeVariants:
+    """Test several recipe variants generated in one LLM call"""
+    
+    def _variants_completion(self, *titles):
+        recipe = json.loads(RECIPE_COMPLETION)
+        return json.dumps({"recipes": [{**recipe, "title": title} for title in titles]})
+    
+    def test_parse_variant_shapes(self):
+        """Test that a recipes object, a list wrapped in text and a single recipe are parsed"""
+        llm = create_llm()
+        
+        recipes, error = llm._try_parse_recipe_variants(self._variants_completion("Stew A", "Stew B"))
+        assert error is None
+        assert [recipe["title"] for recipe in recipes] == ["Stew A", "Stew B"]
+        
+        recipes, error = llm._try_parse_recipe_variants(f"Here are two:\n[{RECIPE_COMPLETION}, {VALID_RECIPE_JSON}]\nEnjoy!")
+        assert error is None
+        assert [recipe["title"] for recipe in recipes] == ["Smoky Chickpea Stew", "Mushroom Risotto"]
+        
+        recipes, error = llm._try_parse_recipe_variants(VALID_RECIPE_JSON)
+        assert [recipe["title"] for recipe in recipes] == ["Mushroom Risotto"]
+    
+    def test_parse_drops_invalid_and_duplicate_variants(self):
+        """Test that invalid recipes and repeated titles are dropped"""
+        llm = create_llm()
+        completion = json.loads(self._variants_completion("Stew A", "stew a", "Stew B"))
+        completion["recipes"].insert(1, {"title": "No steps", "servingSize": 2, "recipeIngredients": [], "recipeSteps": []})
+        
+        recipes, error = llm._try_parse_recipe_variants(json.dumps(completion))
+        
+        assert error is None
+        assert [recipe["title"] for recipe in recipes] == ["Stew A", "Stew B"]
+        assert llm._try_parse_recipe_variants('{"recipes": []}')[0] == []
+        assert llm._parse_recipe_variants("not json") == [llm._get_default_recipe_data()]
+    
+    def test_variants_generated_in_one_call(self):
+        """Test that all variants come from a single completion and are scaled"""
+        llm = create_llm()
+        llm.variants_llm = FakeListChatModel(responses=[self._variants_completion("Stew A", "Stew B", "Stew C", "Stew D")])
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            response = llm.suggest_recipe("smoky vegan stew", servings=8, variants=3)
+        finally:
+            current_request_stats.reset(token)
+        
+        assert stats.llm_calls == 1
+        assert [recipe["title"] for recipe in response.variants] == ["Stew A", "Stew B", "Stew C"]
+        assert response.recipe_data == response.variants[0]
+        assert all(recipe["servingSize"] == 8 for recipe in response.variants)
+        assert "3 different recipe suggestions" in response.suggestion
+    
+    def test_invalid_variants_repaired_as_variants(self):
+        """Test that an unusable variants completion is repaired with the variants schema"""
+        llm = create_llm()
+        llm.variants_llm = FakeListChatModel(responses=[
+            '{"recipes": [{"title": "Missing everything"}]}',
+            self._variants_completion("Stew A", "Stew B")
+        ])
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        try:
+            response = llm.suggest_recipe("smoky vegan stew", bypass_cache=True, variants=2)
+        finally:
+            current_request_stats.reset(token)
+        
+        assert stats.llm_calls == 2
+        assert [recipe["title"] for recipe in response.variants] == ["Stew A", "Stew B"]
+        assert response.variants_requested == 2
+    
+    def test_short_variants_list_is_reported(self):
+        """Test that a response with fewer variants than requested says so"""
+        llm = create_llm()
+        llm.variants_llm = FakeListChatModel(responses=[self._variants_completion("Stew A")])
+        
+        response = llm.suggest_recipe("smoky vegan stew", bypass_cache=True, variants=3)
+        data = response.model_dump(mode="json")
+        
+        assert [recipe["title"] for recipe in data["variants"]] == ["Stew A"]
+        assert data["variants_requested"] == 3
+        assert "1 of the 3" in response.suggestion
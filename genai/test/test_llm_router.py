@@ -0,0 +1,174 @@
+import pytest
+import sys
+import os
+import json
+import time
+from unittest.mock import Mock, patch
+
+from langchain_openai import ChatOpenAI
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_router import LLMRouter, LLMBackend, backend_name
+from resilience import CircuitBreaker, CircuitOpenError
+from llm import RecipeLLM
+from mock_llm_server import MockLLMServer
+
+RECIPE_JSON = json.dumps({
+    "title": "Routed Risotto",
+    "description": "Creamy mushroom risotto",
+    "servingSize": 2,
+    "recipeIngredients": [{"name": "Arborio rice", "unit": "g", "amount": 200}],
+    "recipeSteps": [{"order": 1, "details": "Stir the rice with stock until creamy"}],
+    "tags": ["vegetarian"]
+})
+
+
+@pytest.fixture
+def backends():
+    """Start local mock backends and stop them after the test"""
+    started = []
+
+    def start(content="ok", delay=0.0, status=200):
+        backend = MockLLMServer(
+            content=content, ttft_ms=delay * 1000,
+            error_rate=0.0 if status == 200 else 1.0, error_status=status
+        ).start()
+        started.append(backend)
+        return backend
+
+    yield start
+    for backend in started:
+        backend.stop()
+
+
+def make_router(servers, **kwargs):
+    """Create a router over mock backends"""
+    return LLMRouter([
+        LLMBackend(
+            name=backend_name(server.url),
+            runnable=ChatOpenAI(model="test-model", api_key="test-key", base_url=server.url, max_retries=0),
+            breaker=CircuitBreaker(f"llm:{backend_name(server.url)}", failure_threshold=2, reset_timeout=60)
+        )
+        for server in servers
+    ], **kwargs)
+
+
+class TestLLMRouter:
+    """Test routing across LLM backends"""
+
+    def test_fails_over_to_next_backend(self, backends):
+        """Test that an erroring backend is skipped for the next one"""
+        failing, healthy = backends(status=500), backends(content="from healthy")
+        router = make_router([failing, healthy])
+
+        response = router.invoke("Hello")
+
+        assert response.content == "from healthy"
+        assert failing.calls == 1
+        router.close()
+
+    def test_breaker_opens_and_skips_backend(self, backends):
+        """Test that a backend with an open breaker is not called"""
+        failing, healthy = backends(status=500), backends(content="from healthy")
+        router = make_router([failing, healthy])
+
+        for _ in range(3):
+            router.invoke("Hello")
+
+        assert failing.calls == 2
+        assert router.backends[0].breaker.state == CircuitBreaker.OPEN
+        router.close()
+
+    def test_all_backends_unavailable(self, backends):
+        """Test that the router fails fast when every breaker is open"""
+        router = make_router([backends(status=500), backends(status=500)])
+
+        for _ in range(2):
+            with pytest.raises(Exception):
+                router.invoke("Hello")
+
+        with pytest.raises(CircuitOpenError):
+            router.invoke("Hello")
+        router.close()
+
+    def test_routes_to_lowest_ewma(self, backends):
+        """Test that the faster backend becomes the preferred one"""
+        slow, fast = backends(content="slow", delay=0.3), backends(content="fast", delay=0.01)
+        router = make_router([slow, fast])
+        router.backends[0].latency.observe(0.3)
+        router.backends[1].latency.observe(0.01)
+
+        assert router.invoke("Hello").content == "fast"
+        assert slow.calls == 0
+        router.close()
+
+    def test_hedged_request_wins_and_cancels_primary(self, backends):
+        """Test that a slow primary is hedged and the faster answer is used"""
+        slow, fast = backends(content="slow", delay=2.0), backends(content="fast", delay=0.01)
+        router = make_router([slow, fast], hedging=True, hedge_min_delay=0.1)
+        cancelled_before = REGISTRY.get_sample_value(
+            "genai_llm_backend_requests_total", {"backend": backend_name(slow.url), "outcome": "cancelled"}
+        ) or 0
+
+        start = time.perf_counter()
+        response = router.invoke("Hello")
+        elapsed = time.perf_counter() - start
+
+        assert response.content == "fast"
+        assert elapsed < 1.5
+        assert slow.calls == 1 and fast.calls == 1
+        assert REGISTRY.get_sample_value(
+            "genai_llm_backend_requests_total", {"backend": backend_name(slow.url), "outcome": "cancelled"}
+        ) == cancelled_before + 1
+        router.close()
+
+    def test_no_hedge_for_fast_primary(self, backends):
+        """Test that a primary answering within the hedge delay is not hedged"""
+        first, second = backends(content="first"), backends(content="second")
+        router = make_router([first, second], hedging=True, hedge_min_delay=1.0)
+
+        assert router.invoke("Hello").content == "first"
+        assert second.calls == 0
+        router.close()
+
+    def test_hedge_delay_uses_p95(self, backends):
+        """Test that the hedge delay follows the backend's recent p95 latency"""
+        router = make_router([backends(), backends()], hedging=True, hedge_min_delay=0.05)
+        backend = router.backends[0]
+        assert router.hedge_delay(backend) == 0.05
+
+        for latency in [0.1] * 19 + [0.9]:
+            backend.latency.observe(latency)
+
+        assert router.hedge_delay(backend) == 0.9
+        router.close()
+
+
+class TestRecipeLLMRouting:
+    """Test the LLM service with several backends"""
+
+    @patch('llm.ChatOpenAI', ChatOpenAI)
+    @patch('llm.RAGHelper')
+    def test_suggest_recipe_routes_around_failing_backend(self, mock_rag_class, backends):
+        """Test recipe generation when the first configured backend is down"""
+        failing, healthy = backends(status=503), backends(content=RECIPE_JSON)
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = None
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+
+        with patch.dict(os.environ, {
+            "LLM_MODEL": "test-model",
+            "OPEN_WEBUI_API_KEY": "test-key",
+            "LLM_BACKENDS": f"{failing.url},{healthy.url}"
+        }):
+            llm = RecipeLLM()
+
+        assert isinstance(llm.llm, LLMRouter)
+        response = llm.suggest_recipe("mushroom risotto")
+
+        assert response.recipe_data["title"] == "Routed Risotto"
+        assert failing.calls == 1
+        llm.llm_router.close()
@@ -0,0 +1,90 @@
+import pytest
+import sys
+import os
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import (
+    LocalService, RequestRecord, WorkloadMix, parse_mix, summarize, stage_report,
+    scrape_stage_histograms, run_closed_loop, run_open_loop
+)
+
+
+class TestLoadReport:
+    """Test the load generator's workload mix and reports"""
+
+    def test_parse_mix(self):
+        """Test parsing workload weights"""
+        assert parse_mix("search=3,create=1") == {"search": 3.0, "create": 1.0}
+
+        with pytest.raises(ValueError):
+            parse_mix("search=1,unknown=2")
+
+    def test_mix_follows_weights(self):
+        """Test that requests are drawn according to the weights"""
+        mix = WorkloadMix({"search": 3, "suggest": 1}, seed=1)
+
+        names = [mix.next()[0] for _ in range(2000)]
+
+        assert 0.7 < names.count("search") / len(names) < 0.8
+
+    def test_summarize(self):
+        """Test latency percentiles, throughput and error rate"""
+        records = [RequestRecord("search", 200, i / 1000) for i in range(1, 100)] + [RequestRecord("search", 500, 1.0)]
+
+        summary = summarize(records, elapsed=10.0)
+
+        assert summary["requests"] == 100
+        assert summary["throughput_rps"] == 10.0
+        assert summary["error_rate"] == 0.01
+        assert summary["p50_ms"] == 51.0
+        assert summary["max_ms"] == 1000.0
+        assert summary["statuses"] == {"200": 99, "500": 1}
+
+    def test_stage_report_interpolates_p95(self):
+        """Test the stage p95 estimate from histogram buckets between two scrapes"""
+        before = {("llm_call", "/genai/chat"): {"count": 10.0, "sum": 5.0, "buckets": {1.0: 10.0, 2.0: 10.0, float("inf"): 10.0}}}
+        after = {("llm_call", "/genai/chat"): {"count": 110.0, "sum": 155.0, "buckets": {1.0: 10.0, 2.0: 110.0, float("inf"): 110.0}}}
+
+        stage, = stage_report(before, after)
+
+        assert stage["count"] == 100
+        assert stage["mean_ms"] == 1500.0
+        assert stage["p95_ms"] == 1950.0
+
+
+class TestLocalLoad:
+    """Test load generation against the in-process service"""
+
+    @pytest.fixture
+    def service(self):
+        with LocalService(llm_profile="instant", seed=1) as local_service:
+            yield local_service
+
+    def test_closed_loop_with_stage_histograms(self, service):
+        """Test a short closed loop run and the server-side stage histograms it produces"""
+        async def run():
+            async with httpx.AsyncClient(base_url=service.url, timeout=30) as client:
+                before = await scrape_stage_histograms(client)
+                records = await run_closed_loop(client, WorkloadMix({"search": 1, "suggest": 1}, seed=1, bypass_cache=True), 2, 0.5)
+                return records, stage_report(before, await scrape_stage_histograms(client))
+
+        records, stages = asyncio.run(run())
+
+        assert records and all(record.ok for record in records)
+        assert {"search", "suggest"} == {record.workload for record in records}
+        assert ("llm_call", "/genai/vector/suggest") in {(stage["stage"], stage["endpoint"]) for stage in stages}
+
+    def test_open_loop_sends_at_rate(self, service):
+        """Test that the open loop sends about rate x duration requests"""
+        async def run():
+            async with httpx.AsyncClient(base_url=service.url, timeout=30) as client:
+                return await run_open_loop(client, WorkloadMix({"search": 1}, seed=1), 40, 0.5)
+
+        records = asyncio.run(run())
+
+        assert 8 <= len(records) <= 40
+        assert all(record.ok for record in records)
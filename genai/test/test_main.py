@@ -2,15 +2,26 @@ import pytest
 import sys
 import os
 import json
-from unittest.mock import Mock, patch, AsyncMock
+import time
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import ANY, Mock, patch, AsyncMock
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from prometheus_client import REGISTRY
 from fastapi.testclient import TestClient
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from main import app
+from main import app, _run_cancellable
+from resilience import AdaptiveLimiter
+from rate_limit import MemoryBucketStore, SQLiteBucketStore
+from intent_router import IntentDecision
+from metrics import observe_stage
+from request_context import CancelScope, RequestCancelled, current_cancel_scope, current_endpoint, deadline_from
 from request_models import ChatRequest, RecipeIndexRequest, RecipeDeleteRequest, RecipeSuggestionRequest
 from response_models import ChatResponse, RecipeIndexResponse, RecipeDeleteResponse, RecipeSuggestionResponse, HealthResponse
+from benchmarks import create_llm, RECIPE_COMPLETION
 
 
 @pytest.fixture
@@ -140,7 +151,7 @@ class TestChatEndpoint:
         assert "timestamp" in data
         
         # Verify LLM was called with correct message
-        mock_llm.chat.assert_called_once_with("Hello, how are you?")
+        mock_llm.chat.assert_called_once_with("Hello, how are you?", bypass_cache=False, charge=ANY)
     
     @patch('main.llm_instance')
     def test_chat_with_recipe_suggestion(self, mock_llm, client):
@@ -289,7 +300,7 @@ class TestRecipeSuggestionEndpoint:
         assert "timestamp" in data
         
         # Verify LLM was called with correct query
-        mock_llm.suggest_recipe.assert_called_once_with("I want something spicy")
+        mock_llm.suggest_recipe.assert_called_once_with("I want something spicy", bypass_cache=False, servings=None, degraded=False, variants=1)
     
     @patch('main.llm_instance')
     def test_suggest_recipe_llm_exception(self, mock_llm, client):
@@ -311,6 +322,22 @@ class TestRecipeSuggestionEndpoint:
         
         assert response.status_code == 422  # Validation error
 
+    def test_suggest_recipe_variants(self, client):
+        """Test that several variants are returned from one LLM call and omitted by default"""
+        recipe = json.loads(RECIPE_COMPLETION)
+        llm = create_llm()
+        llm.variants_llm = FakeListChatModel(responses=[json.dumps({"recipes": [recipe, {**recipe, "title": "Spicy Lentil Stew"}]})])
+
+        with patch('main.llm_instance', llm):
+            response = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "variants": 2})
+            single = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "bypass_cache": True})
+            too_many = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "variants": 6})
+
+        assert response.status_code == 200
+        assert [variant["title"] for variant in response.json()["variants"]] == ["Smoky Chickpea Stew", "Spicy Lentil Stew"]
+        assert "variants" not in single.json()
+        assert too_many.status_code == 422
+
 
 class TestMiddleware:
     """Test middleware functionality"""
@@ -331,6 +358,332 @@ class TestMiddleware:
         assert response1.headers["X-Request-ID"] != response2.headers["X-Request-ID"]
 
 
+class TestServerTiming:
+    """Test the Server-Timing header and the debug breakdown"""
+    
+    def test_server_timing_header(self, client):
+        """Test that responses carry the per-stage durations"""
+        with patch('main.llm_instance', create_llm()):
+            response = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "bypass_cache": True})
+        
+        assert response.status_code == 200
+        metrics = dict(
+            metric.split(";dur=") for metric in response.headers["Server-Timing"].split(", ")
+        )
+        assert {"embed", "search", "prompt", "llm", "parse", "total"} <= set(metrics)
+        assert all(float(duration) >= 0 for duration in metrics.values())
+        assert "debug" not in response.json()
+    
+    def test_server_timing_without_stages(self, client):
+        """Test that responses without pipeline stages report the total only"""
+        response = client.get("/genai")
+        
+        assert response.headers["Server-Timing"].startswith("total;dur=")
+    
+    def test_debug_breakdown_in_body(self, client):
+        """Test that debug=true adds the timing breakdown and token counts to the body"""
+        with patch('main.llm_instance', create_llm()):
+            response = client.post("/genai/vector/suggest?debug=true", json={"query": "smoky vegan stew", "bypass_cache": True})
+        
+        assert response.status_code == 200
+        debug = response.json()["debug"]
+        assert {"embedding", "weaviate_query", "prompt_build", "llm_call", "parse"} <= set(debug["stages_ms"])
+        assert debug["llm_calls"] == 1
+        assert debug["llm_prompt_tokens"] > 0
+        assert debug["elapsed_ms"] > 0
+        assert "retrieved" in debug
+
+
+def cancellation_count(endpoint, stage, reason):
+    """Cancelled requests recorded for an endpoint, stage and reason"""
+    return REGISTRY.get_sample_value(
+        "genai_request_cancellations_total", {"endpoint": endpoint, "stage": stage, "reason": reason}
+    ) or 0.0
+
+
+class TestRequestCancellation:
+    """Test request deadlines and cancellation on client disconnect"""
+    
+    def test_deadline_from_headers(self):
+        """Test that the earliest of the deadline headers and the default wins"""
+        now = time.monotonic()
+        
+        assert deadline_from({}) is None
+        assert deadline_from({}, default_timeout_ms=5000) == pytest.approx(now + 5, abs=0.5)
+        assert deadline_from({"x-request-timeout-ms": "200"}, default_timeout_ms=5000) == pytest.approx(now + 0.2, abs=0.5)
+        assert deadline_from({"x-request-deadline": str((time.time() + 2) * 1000)}) == pytest.approx(now + 2, abs=0.5)
+        assert deadline_from({"x-request-timeout-ms": "soon"}) is None
+    
+    def test_deadline_cancels_llm_call(self, client):
+        """Test that an LLM call still running at the deadline is cancelled and answered with 504"""
+        llm = create_llm()
+        llm.recipe_llm = FakeListChatModel(responses=[RECIPE_COMPLETION], sleep=2)
+        before = cancellation_count("/genai/vector/suggest", "llm_call", "deadline")
+        
+        start = time.perf_counter()
+        with patch('main.llm_instance', llm):
+            response = client.post(
+                "/genai/vector/suggest",
+                json={"query": "smoky vegan stew", "bypass_cache": True},
+                headers={"X-Request-Timeout-Ms": "300"}
+            )
+        
+        assert response.status_code == 504
+        assert time.perf_counter() - start < 1.5
+        assert cancellation_count("/genai/vector/suggest", "llm_call", "deadline") == before + 1
+    
+    def test_client_disconnect_cancels_pipeline(self):
+        """Test that a pipeline call is cancelled once the client has gone away"""
+        class DisconnectedRequest:
+            state = SimpleNamespace(request_id="test")
+            
+            async def is_disconnected(self):
+                return True
+        
+        def pipeline():
+            for _ in range(50):
+                with observe_stage("embedding"):
+                    time.sleep(0.01)
+        
+        async def run():
+            current_cancel_scope.set(CancelScope())
+            current_endpoint.set("/genai/chat")
+            await _run_cancellable(DisconnectedRequest(), pipeline)
+        
+        before = cancellation_count("/genai/chat", "embedding", "disconnect")
+        with patch('main.DISCONNECT_POLL_SECONDS', 0.05), pytest.raises(RequestCancelled) as error:
+            asyncio.run(run())
+        
+        assert error.value.reason == "disconnect"
+        assert cancellation_count("/genai/chat", "embedding", "disconnect") == before + 1
+
+
+class TestLoadShedding:
+    """Test shedding requests beyond the LLM concurrency limit"""
+    
+    def test_shed_request_returns_503(self, client):
+        """Test that a request that cannot queue for the LLM is answered with 503 and Retry-After"""
+        llm = create_llm()
+        llm.llm_limiter = AdaptiveLimiter("test_shed", initial_limit=1, max_queue=0)
+        llm.llm_limiter.acquire()
+        
+        with patch('main.llm_instance', llm):
+            response = client.post("/genai/chat", json={"message": "Create a recipe for smoky vegan stew", "bypass_cache": True})
+        
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) >= 1
+    
+    def test_shed_suggestion_degrades(self, client):
+        """Test that a shed suggestion is answered with the nearest retrieved recipe"""
+        llm = create_llm()
+        llm.llm_limiter = AdaptiveLimiter("test_shed_suggestion", initial_limit=1, max_queue=0)
+        llm.llm_limiter.acquire()
+        
+        with patch('main.llm_instance', llm):
+            response = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "bypass_cache": True})
+        
+        assert response.status_code == 200
+        assert response.headers["x-degraded-mode"] == "overload"
+        assert response.json()["degraded"]["reason"] == "overload"
+    
+    def test_degraded_mode_header(self, client):
+        """Test that clients can ask for a suggestion without the LLM"""
+        llm = create_llm()
+        llm.recipe_llm = Mock(wraps=llm.recipe_llm)
+        
+        with patch('main.llm_instance', llm):
+            response = client.post(
+                "/genai/vector/suggest",
+                json={"query": "smoky vegan stew", "bypass_cache": True, "servings": 8},
+                headers={"X-Degraded-Mode": "true"}
+            )
+        
+        data = response.json()
+        assert response.status_code == 200
+        assert response.headers["x-degraded-mode"] == "requested"
+        assert data["degraded"]["source_recipe_id"] == "100"
+        assert data["recipe_data"]["servingSize"] == 8
+        llm.recipe_llm.invoke.assert_not_called()
+
+
+def batch_lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestBatchSuggestions:
+    """Test the streamed batch suggestion endpoint"""
+    
+    def test_streams_each_suggestion_and_summary(self, client):
+        """Test that every query gets a result line and the batch ends with a summary"""
+        llm = create_llm()
+        llm.rag_helper.embed_query = Mock(wraps=llm.rag_helper.embed_query)
+        llm.rag_helper.embed_queries = Mock(wraps=llm.rag_helper.embed_queries)
+        queries = ["smoky vegan stew", "quick pasta", "lentil soup"]
+        
+        with patch('main.llm_instance', llm):
+            response = client.post("/genai/vector/suggest/batch", json={"queries": queries, "bypass_cache": True, "servings": 2})
+        
+        results, summary = batch_lines(response)[:-1], batch_lines(response)[-1]
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert sorted(result["index"] for result in results) == [0, 1, 2]
+        assert all(result["status"] == "ok" for result in results)
+        assert results[0]["query"] == queries[results[0]["index"]]
+        assert results[0]["suggestion"]["recipe_data"]["servingSize"] == 2
+        assert summary["done"] and summary["succeeded"] == 3 and summary["failed"] == 0
+        # One batched embedding, reused for the cache lookup and retrieval of each query
+        llm.rag_helper.embed_queries.assert_called_once_with(queries)
+        llm.rag_helper.embed_query.assert_not_called()
+    
+    def test_reports_partial_failures(self, client):
+        """Test that a failing suggestion is reported without failing the rest of the batch"""
+        llm = create_llm()
+        suggest = llm.suggest_recipe
+        
+        def suggest_or_fail(query, **kwargs):
+            if query == "broken":
+                raise RuntimeError("Suggestion failed")
+            return suggest(query, **kwargs)
+        
+        with patch('main.llm_instance', llm), patch.object(llm, 'suggest_recipe', side_effect=suggest_or_fail):
+            response = client.post("/genai/vector/suggest/batch", json={"queries": ["smoky vegan stew", "broken"], "bypass_cache": True})
+        
+        lines = batch_lines(response)
+        by_index = {line["index"]: line for line in lines[:-1]}
+        assert by_index[0]["status"] == "ok"
+        assert by_index[1] == {"index": 1, "query": "broken", "status": "failed", "error": "Suggestion failed"}
+        assert lines[-1]["succeeded"] == 1 and lines[-1]["failed"] == 1
+    
+    def test_cancelled_batch_reports_missing_queries(self, client):
+        """Test that queries that did not finish before the deadline are reported as failed"""
+        llm = create_llm()
+        
+        def slow_suggestion(query, **kwargs):
+            with observe_stage("llm_call"):
+                time.sleep(0.3)
+            with observe_stage("parse"):
+                pass
+        
+        with patch('main.llm_instance', llm), patch.object(llm, 'suggest_recipe', side_effect=slow_suggestion):
+            response = client.post(
+                "/genai/vector/suggest/batch",
+                json={"queries": ["smoky vegan stew", "quick pasta"]},
+                headers={"X-Request-Timeout-Ms": "100"}
+            )
+        
+        lines = batch_lines(response)
+        assert [line["error"] for line in lines[:-1]] == ["Request deadline exceeded"] * 2
+        assert lines[-1]["failed"] == 2
+    
+    def test_rejects_empty_batch(self, client):
+        """Test that a batch needs at least one query and every query needs text"""
+        assert client.post("/genai/vector/suggest/batch", json={"queries": []}).status_code == 422
+        assert client.post("/genai/vector/suggest/batch", json={"queries": ["lentil soup", "  "]}).status_code == 422
+    
+    def test_request_accounted_after_stream(self, client, caplog):
+        """Test that the request is logged with the batch's duration and LLM calls once the stream ends"""
+        queries = ["smoky vegan stew", "quick pasta"]
+        
+        with patch('main.llm_instance', create_llm()), caplog.at_level("INFO", logger="structured"):
+            response = client.post("/genai/vector/suggest/batch", json={"queries": queries, "bypass_cache": True})
+        
+        summary = batch_lines(response)[-1]
+        completed = [record for record in caplog.records if record.getMessage().startswith("Request completed: POST /genai/vector/suggest/batch")]
+        assert len(completed) == 1
+        assert completed[0].duration_ms >= summary["duration_ms"]
+        assert completed[0].extra_context["llm_calls"] == len(queries)
+        assert {"embedding", "llm_call"} <= set(summary["stages_ms"])
+        assert "Server-Timing" not in response.headers
+
+
+class TestRateLimiting:
+    """Test per-caller rate limits of the LLM endpoints"""
+    
+    @pytest.fixture
+    def limiter(self):
+        """Rate limiter with room for a single recipe creation per caller"""
+        with patch.multiple('main.rate_limiter', enabled=True, capacity=5.0, refill_rate=0.01, store=MemoryBucketStore()):
+            yield
+    
+    def test_creation_over_limit_returns_429(self, client, limiter):
+        """Test that a caller without tokens left is answered with 429 and Retry-After"""
+        with patch('main.llm_instance', create_llm()):
+            first = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew"}, headers={"X-User-Id": "alice"})
+            second = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew"}, headers={"X-User-Id": "alice"})
+        
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert int(second.headers["retry-after"]) >= 1
+    
+    def test_limits_are_per_user(self, client, limiter):
+        """Test that one user's requests do not use up another user's tokens"""
+        with patch('main.llm_instance', create_llm()):
+            client.post("/genai/chat", json={"message": "Create a recipe for smoky vegan stew"}, headers={"X-User-Id": "alice"})
+            limited = client.post("/genai/chat", json={"message": "Find stews"}, headers={"X-User-Id": "alice"})
+            other = client.post("/genai/chat", json={"message": "Create a recipe for smoky vegan stew"}, headers={"X-User-Id": "bob"})
+        
+        assert limited.status_code == 429
+        assert other.status_code == 200
+
+    
+    def test_chat_charged_by_routed_intent(self, client, limiter):
+        """Test that a message routed to creation without a creation keyword pays for a creation"""
+        llm = create_llm()
+        message = "Something warming with lentils"
+        decision = IntentDecision("creation", "centroid", llm.intent_router.plans["creation"], llm.rag_helper.embed_query(message))
+        with patch('main.llm_instance', llm), patch.object(llm.intent_router, 'classify', return_value=decision):
+            first = client.post("/genai/chat", json={"message": message}, headers={"X-User-Id": "alice"})
+            second = client.post("/genai/chat", json={"message": message}, headers={"X-User-Id": "alice"})
+        
+        assert first.status_code == 200
+        assert second.status_code == 429
+    
+    def test_variants_charged_per_recipe(self, client):
+        """Test that every requested variant is charged as a recipe creation"""
+        with patch.multiple('main.rate_limiter', enabled=True, capacity=10.0, refill_rate=0.01, store=MemoryBucketStore()), \
+             patch('main.llm_instance', create_llm()):
+            variants = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew", "variants": 2}, headers={"X-User-Id": "alice"})
+            single = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew"}, headers={"X-User-Id": "alice"})
+        
+        assert variants.status_code == 200
+        assert single.status_code == 429
+    
+    def test_batch_costing_more_than_bucket_rejected(self, client, limiter):
+        """Test that a batch is rejected rather than discounted when it costs more than a full bucket"""
+        with patch('main.llm_instance', create_llm()):
+            response = client.post("/genai/vector/suggest/batch", json={"queries": ["lentil soup", "pea soup"]}, headers={"X-User-Id": "alice"})
+            single = client.post("/genai/vector/suggest", json={"query": "lentil soup"}, headers={"X-User-Id": "alice"})
+        
+        assert response.status_code == 413
+        assert "more than" in response.json()["detail"]
+        # The rejected batch took no tokens
+        assert single.status_code == 200
+    
+    def test_shared_store_checked_off_event_loop(self, client, tmp_path):
+        """Test that the SQLite store, which can wait for other workers, is not called on the event loop"""
+        store = SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+        take = store.take
+        loops = []
+        
+        def recording_take(*args):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return take(*args)
+        
+        try:
+            with patch.multiple('main.rate_limiter', enabled=True, capacity=5.0, refill_rate=0.01, store=store), \
+                 patch.object(store, 'take', side_effect=recording_take), \
+                 patch('main.llm_instance', create_llm()):
+                response = client.post("/genai/vector/suggest", json={"query": "smoky vegan stew"}, headers={"X-User-Id": "alice"})
+        finally:
+            store.close()
+        
+        assert response.status_code == 200
+        assert loops == [None]
+
+
 class TestErrorHandling:
     """Test error handling"""
     
@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+import tracemalloc
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_stats import MemoryTracker, package_of, process_memory
+
+
+@pytest.fixture
+def tracker():
+    """Create a memory tracker with an admin token, stopping tracemalloc afterwards"""
+    with patch.dict(os.environ, {"ADMIN_TOKEN": "secret", "MEMORY_MAX_SNAPSHOTS": "2"}):
+        tracker = MemoryTracker()
+    yield tracker
+    tracemalloc.stop()
+
+
+class TestMemoryTracker:
+    """Test memory reports and snapshot diffs"""
+
+    def test_report_without_tracemalloc(self, tracker):
+        """Test that process and gc figures are reported without tracing"""
+        report = tracker.report()
+
+        assert report["process"]["rss"] > 0
+        assert len(report["gc"]["counts"]) == 3
+        assert report["tracemalloc"] == {"tracing": False}
+
+    def test_snapshot_diff_finds_growth(self, tracker):
+        """Test that allocations made after a snapshot show up in the diff"""
+        snapshot_id = tracker.take_snapshot()["snapshot_id"]
+        retained = [bytearray(1024) for _ in range(1000)]
+
+        report = tracker.report(top=5, since=snapshot_id)
+
+        top_site = report["tracemalloc"]["diff"]["sites"][0]
+        assert "test_memory_stats.py" in top_site["site"]
+        assert top_site["size_diff"] >= 1000 * 1024
+        assert len(retained) == 1000
+
+    def test_group_by_package(self, tracker):
+        """Test that allocation sites are attributed to packages"""
+        tracker.take_snapshot()
+        retained = [bytearray(1024) for _ in range(1000)]
+
+        report = tracker.report(group_by="package")
+
+        sites = {entry["site"]: entry["size"] for entry in report["tracemalloc"]["top_sites"]}
+        assert sites["genai"] >= 1000 * 1024
+        assert len(retained) == 1000
+
+    def test_unknown_and_evicted_snapshots(self, tracker):
+        """Test that only the newest snapshots are kept"""
+        first = tracker.take_snapshot()["snapshot_id"]
+        tracker.take_snapshot()
+        tracker.take_snapshot()
+
+        assert first not in tracker.snapshot_ids()
+        with pytest.raises(KeyError):
+            tracker.report(since=first)
+
+    def test_package_of(self):
+        """Test attributing files to packages"""
+        assert package_of("/venv/lib/python3.11/site-packages/torch/nn/modules/module.py") == "torch"
+        assert package_of("/venv/lib/python3.11/site-packages/typing_extensions.py") == "typing_extensions"
+        assert package_of(os.__file__) == "stdlib"
+
+    def test_prometheus_gauges(self):
+        """Test that memory figures are published at scrape time"""
+        assert REGISTRY.get_sample_value("genai_process_memory_bytes", {"kind": "rss"}) == pytest.approx(process_memory()["rss"], rel=0.5)
+        assert REGISTRY.get_sample_value("genai_gc_collections_total", {"generation": "0"}) >= 0
+
+
+class TestMemoryEndpoints:
+    """Test the memory admin endpoints"""
+
+    def test_hidden_without_admin_token(self, client):
+        """Test that the endpoints do not exist unless an admin token is configured"""
+        with patch('main.memory_tracker', MemoryTracker()):
+            response = client.get("/genai/admin/memory", headers={"X-Admin-Token": ""})
+
+        assert response.status_code == 404
+
+    def test_requires_token(self, client, tracker):
+        """Test that reports require the admin token"""
+        with patch('main.memory_tracker', tracker):
+            response = client.get("/genai/admin/memory", headers={"X-Admin-Token": "wrong"})
+
+        assert response.status_code == 403
+
+    def test_snapshot_and_diff(self, client, tracker):
+        """Test taking a snapshot and diffing a report against it"""
+        headers = {"X-Admin-Token": "secret"}
+        with patch('main.memory_tracker', tracker), patch('main.llm_instance') as mock_llm:
+            mock_llm.semantic_cache.stats.return_value = {"suggestion": 2}
+            snapshot = client.post("/genai/admin/memory/snapshots", headers=headers).json()
+            response = client.get(f"/genai/admin/memory?since={snapshot['snapshot_id']}&top=5&object_types=true", headers=headers)
+            missing = client.get("/genai/admin/memory?since=unknown", headers=headers)
+
+        assert response.status_code == 200
+        report = response.json()
+        assert report["tracemalloc"]["tracing"]
+        assert report["tracemalloc"]["diff"]["since"] == snapshot["snapshot_id"]
+        assert len(report["object_types"]) == 5
+        assert report["semantic_cache_entries"] == {"suggestion": 2}
+        assert missing.status_code == 404
+
+    def test_rejects_invalid_grouping(self, client, tracker):
+        """Test the group_by validation"""
+        with patch('main.memory_tracker', tracker):
+            response = client.get("/genai/admin/memory?group_by=module", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 400
@@ -0,0 +1,114 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from contextvars import copy_context
+from unittest.mock import Mock, patch
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import observe_stage
+from request_context import CancelScope, RequestCancelled, current_cancel_scope, current_endpoint
+from response_models import ChatResponse
+from main import app
+
+
+def stage_sum(stage, endpoint="internal", prompt_type="none"):
+    """Total seconds recorded for a stage"""
+    return REGISTRY.get_sample_value(
+        "genai_stage_duration_seconds_sum",
+        {"stage": stage, "endpoint": endpoint, "prompt_type": prompt_type}
+    ) or 0.0
+
+
+def stage_count(stage, endpoint="internal", prompt_type="none"):
+    """Number of observations recorded for a stage"""
+    return REGISTRY.get_sample_value(
+        "genai_stage_duration_seconds_count",
+        {"stage": stage, "endpoint": endpoint, "prompt_type": prompt_type}
+    ) or 0.0
+
+
+class TestObserveStage:
+    """Test the stage duration histogram"""
+
+    def test_records_stage_with_prompt_type(self):
+        """Test that a stage is observed with its labels"""
+        before = stage_count("llm_call", prompt_type="standalone")
+
+        with observe_stage("llm_call", "standalone"):
+            pass
+
+        assert stage_count("llm_call", prompt_type="standalone") == before + 1
+
+    def test_nested_stage_excluded_from_parent(self):
+        """Test that time in a nested stage is only counted for that stage"""
+        query_before, embedding_before = stage_sum("weaviate_query"), stage_sum("embedding")
+
+        with observe_stage("weaviate_query"):
+            with observe_stage("embedding"):
+                time.sleep(0.05)
+
+        assert stage_sum("embedding") - embedding_before >= 0.05
+        assert stage_sum("weaviate_query") - query_before < 0.02
+
+    def test_records_stage_on_error(self):
+        """Test that failed stages are recorded too"""
+        before = stage_count("parse")
+
+        with pytest.raises(ValueError):
+            with observe_stage("parse"):
+                raise ValueError("bad json")
+
+        assert stage_count("parse") == before + 1
+
+    def test_cancelled_stage_with_concurrent_stages(self):
+        """Test that a cancellation records the stage still running when stages of the request overlap in threads"""
+        scope = CancelScope()
+        worker_started, cancelled = threading.Event(), threading.Event()
+        errors = []
+
+        def worker():
+            try:
+                with observe_stage("embedding"):
+                    worker_started.set()
+                    cancelled.wait(5)
+                    scope.check()
+            except RequestCancelled as e:
+                errors.append(e)
+
+        token = current_cancel_scope.set(scope)
+        try:
+            thread = threading.Thread(target=copy_context().run, args=(worker,))
+            with observe_stage("llm_call"):
+                thread.start()
+                assert worker_started.wait(5)
+        finally:
+            current_cancel_scope.reset(token)
+
+        # The embedding started inside llm_call and outlived it
+        scope.cancel("disconnect")
+        cancelled.set()
+        thread.join(5)
+
+        assert scope.stage == "embedding"
+        assert [e.stage for e in errors] == ["embedding"]
+
+    def test_endpoint_label_from_request(self):
+        """Test that stages inside a request are labelled with the route path"""
+        def chat(message, bypass_cache=False, charge=None):
+            with observe_stage("llm_call", "context_aware"):
+                assert current_endpoint.get() == "/genai/chat"
+            return ChatResponse(reply="ok")
+
+        before = stage_count("llm_call", endpoint="/genai/chat", prompt_type="context_aware")
+        with patch('main.llm_instance') as mock_llm:
+            mock_llm.chat.side_effect = chat
+            response = TestClient(app).post("/genai/chat", json={"message": "Hello"})
+
+        assert response.status_code == 200
+        assert stage_count("llm_call", endpoint="/genai/chat", prompt_type="context_aware") == before + 1
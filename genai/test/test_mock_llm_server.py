@@ -0,0 +1,122 @@
+import pytest
+import sys
+import os
+import json
+import time
+from unittest.mock import Mock, patch
+
+import httpx
+from langchain_openai import ChatOpenAI
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import RecipeLLM
+from mock_llm_server import MockLLMServer, LatencyProfile, CANNED_RECIPES
+
+
+@pytest.fixture
+def server():
+    """Start a mock LLM server and stop it after the test"""
+    with MockLLMServer() as mock_server:
+        yield mock_server
+
+
+def make_chat_model(server, **kwargs):
+    """ChatOpenAI client for the mock server"""
+    return ChatOpenAI(model="mock-model", api_key="test-key", base_url=server.url, max_retries=0, **kwargs)
+
+
+class TestMockLLMServer:
+    """Test the OpenAI-compatible mock LLM server"""
+
+    def test_returns_canned_recipes(self, server):
+        """Test that non-streaming completions rotate through the canned recipes"""
+        llm = make_chat_model(server)
+
+        first = llm.invoke("Create a recipe")
+        second = llm.invoke("Create another recipe")
+
+        assert json.loads(first.content) == CANNED_RECIPES[0]
+        assert json.loads(second.content) == CANNED_RECIPES[1]
+        assert first.usage_metadata["output_tokens"] > 0
+        assert server.calls == 2
+
+    def test_streams_tokens_with_usage(self, server):
+        """Test that streamed completions arrive token by token with a usage chunk"""
+        llm = make_chat_model(server, stream_usage=True)
+
+        chunks = list(llm.stream("Create a recipe"))
+        content = "".join(chunk.content for chunk in chunks)
+
+        assert json.loads(content) == CANNED_RECIPES[0]
+        assert len([chunk for chunk in chunks if chunk.content]) > 10
+        assert sum(chunk.usage_metadata["output_tokens"] for chunk in chunks if chunk.usage_metadata) > 0
+
+    def test_time_to_first_token_and_token_delay(self, server):
+        """Test that streaming honours the time to first token and per-token delay"""
+        server.profile = LatencyProfile(ttft_ms=200, token_delay_ms=5)
+        llm = make_chat_model(server, stream_usage=True)
+
+        start = time.perf_counter()
+        first_token_at = None
+        for chunk in llm.stream("Create a recipe"):
+            if chunk.content and first_token_at is None:
+                first_token_at = time.perf_counter()
+        end = time.perf_counter()
+
+        assert 0.2 <= first_token_at - start < 1.0
+        assert end - first_token_at >= 0.1  # about 40 tokens 5ms apart
+
+    def test_injected_errors(self):
+        """Test that the error rate and status are applied"""
+        with MockLLMServer(error_rate=1.0, error_status=503) as failing:
+            response = httpx.post(f"{failing.url}/chat/completions", json={"model": "mock-model", "messages": []})
+
+        assert response.status_code == 503
+        assert failing.state.errors == 1
+
+    def test_tail_spikes_are_sampled(self):
+        """Test that tail spikes are added with the configured probability"""
+        with MockLLMServer(seed=7, tail_probability=0.5, tail_ms=1000) as spiky:
+            ttfts = [spiky.state.next_call()["ttft"] for _ in range(200)]
+
+        spikes = sum(1 for ttft in ttfts if ttft >= 1.0)
+        assert 70 < spikes < 130
+
+    def test_profile_can_be_changed_over_http(self, server):
+        """Test that a running server's profile can be updated for resilience scenarios"""
+        response = httpx.put(f"http://{server.host}:{server.port}/mock/profile", json={"error_rate": 1.0})
+
+        assert response.json()["profile"]["error_rate"] == 1.0
+        assert server.profile.error_rate == 1.0
+
+
+class TestRecipeLLMWithMockServer:
+    """Test the LLM service against the mock server"""
+
+    @patch('llm.ChatOpenAI', ChatOpenAI)
+    @patch('llm.RAGHelper')
+    def test_streamed_suggestion_records_time_to_first_token(self, mock_rag_class):
+        """Test recipe suggestion with streaming against a mock backend with latency"""
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = None
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+        labels = {"operation": "suggestion", "prompt_type": "standalone"}
+        before = REGISTRY.get_sample_value("genai_llm_time_to_first_token_seconds_sum", labels) or 0.0
+
+        with MockLLMServer(ttft_ms=150, token_delay_ms=1) as server:
+            with patch.dict(os.environ, {
+                "LLM_MODEL": "mock-model",
+                "OPEN_WEBUI_API_KEY": "test-key",
+                "LLM_BASE_URL": server.url,
+                "LLM_STREAMING": "true",
+                "LLM_STRUCTURED_OUTPUT": "off"
+            }):
+                llm = RecipeLLM()
+            response = llm.suggest_recipe("chickpea stew")
+            llm.cleanup()
+
+        assert response.recipe_data["title"] == CANNED_RECIPES[0]["title"]
+        assert REGISTRY.get_sample_value("genai_llm_time_to_first_token_seconds_sum", labels) - before >= 0.15
@@ -1,6 +1,7 @@
 import pytest
 from datetime import datetime
 from pydantic import ValidationError
+from typing import Optional
 
 import sys
 import os
@@ -13,7 +14,7 @@ from request_models import (
 )
 from response_models import (
     ChatResponse, RecipeIndexResponse, RecipeDeleteResponse,
-    RecipeSuggestionResponse, HealthResponse
+    RecipeSuggestionResponse, HealthResponse, DebuggableResponse, OmitIfNone
 )
 
 
@@ -453,6 +454,26 @@ class TestRecipeSuggestionResponse:
             RecipeSuggestionResponse(recipe_data={"title": "Test"})
 
 
+    def test_empty_optional_fields_omitted(self):
+        """Test that unset debug, variants and degraded fields are left out of the response"""
+        response = RecipeSuggestionResponse(suggestion="Pasta", recipe_data={}, degraded={"reason": "llm_unavailable"})
+
+        data = response.model_dump(mode="json")
+
+        assert data["degraded"] == {"reason": "llm_unavailable"}
+        assert "debug" not in data
+        assert "variants" not in data
+
+    def test_omit_if_none_is_declared_per_field(self):
+        """Test that fields of any response opt in to omission, other None fields are kept"""
+        class ExtendedResponse(DebuggableResponse):
+            hint: OmitIfNone[str] = None
+            note: Optional[str] = None
+
+        assert ExtendedResponse().model_dump() == {"note": None}
+        assert ExtendedResponse(hint="warm").model_dump() == {"hint": "warm", "note": None}
+
+
 class TestHealthResponse:
     """Test HealthResponse model"""
     
@@ -0,0 +1,126 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import Profiler, ProfilerBusyError
+from response_models import ChatResponse
+
+
+@pytest.fixture
+def profiler():
+    """Create an enabled profiler"""
+    with patch.dict(os.environ, {"PROFILING_ENABLED": "true", "ADMIN_TOKEN": "secret", "PROFILING_MAX_SECONDS": "5"}):
+        return Profiler()
+
+
+def burn_cpu(stop):
+    """Busy loop until stopped"""
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class TestProfiler:
+    """Test the sampling and request profilers"""
+
+    def test_sample_collapsed_stacks(self, profiler):
+        """Test that a busy thread shows up in the collapsed stacks"""
+        stop = threading.Event()
+        worker = threading.Thread(target=burn_cpu, args=(stop,), name="burner")
+        worker.start()
+        try:
+            collapsed, rounds = profiler.sample(0.2, interval=0.005)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert rounds > 5
+        burner_lines = [line for line in collapsed.splitlines() if line.startswith("burner;")]
+        assert any("burn_cpu (test_profiling.py:" in line for line in burner_lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+
+    def test_only_one_sampling_profile(self, profiler):
+        """Test that concurrent sampling profiles are rejected"""
+        profiler._sampling_lock.acquire()
+
+        with pytest.raises(ProfilerBusyError):
+            profiler.sample(0.1)
+
+    def test_authorization(self, profiler):
+        """Test the admin token check"""
+        assert profiler.is_authorized("secret")
+        assert not profiler.is_authorized("wrong")
+        assert not profiler.is_authorized(None)
+
+    def test_disabled_by_default(self):
+        """Test that profiling needs to be enabled"""
+        with patch.dict(os.environ, {"ADMIN_TOKEN": "secret"}):
+            os.environ.pop("PROFILING_ENABLED", None)
+            profiler = Profiler()
+
+        assert not profiler.is_authorized("secret")
+
+
+class TestProfilingEndpoints:
+    """Test the profiling endpoint and header"""
+
+    def test_endpoint_hidden_when_disabled(self, client):
+        """Test that the admin endpoint does not exist unless profiling is enabled"""
+        response = client.get("/genai/admin/profile", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 404
+
+    def test_endpoint_requires_token(self, client, profiler):
+        """Test that the admin endpoint requires the admin token"""
+        with patch('main.profiler', profiler):
+            response = client.get("/genai/admin/profile?seconds=0.1", headers={"X-Admin-Token": "wrong"})
+
+        assert response.status_code == 403
+
+    def test_endpoint_returns_collapsed_stacks(self, client, profiler):
+        """Test sampling the worker through the admin endpoint"""
+        with patch('main.profiler', profiler):
+            response = client.get("/genai/admin/profile?seconds=0.2&interval_ms=5", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 200
+        assert response.headers["content-disposition"].startswith("attachment;")
+        assert int(response.headers["x-profile-rounds"]) > 5
+        assert response.text.strip()
+
+    def test_endpoint_rejects_long_profiles(self, client, profiler):
+        """Test the profile duration limit"""
+        with patch('main.profiler', profiler):
+            response = client.get("/genai/admin/profile?seconds=600", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 400
+
+    def test_profile_header_returns_summary(self, client, profiler):
+        """Test that a single request can be profiled with the X-Profile header"""
+        def chat(message, bypass_cache=False, charge=None):
+            time.sleep(0.01)
+            return ChatResponse(reply="ok")
+
+        with patch('main.profiler', profiler), patch('main.llm_instance') as mock_llm:
+            mock_llm.chat.side_effect = chat
+            response = client.post(
+                "/genai/chat", json={"message": "Hello"},
+                headers={"X-Profile": "1", "X-Admin-Token": "secret"}
+            )
+
+        assert response.status_code == 200
+        summary = response.headers["x-profile-summary"]
+        assert summary.startswith("chat (main.py:")
+        assert "chat (test_profiling.py:" in summary
+
+    def test_profile_header_ignored_without_token(self, client, profiler):
+        """Test that requests are not profiled without the admin token"""
+        with patch('main.profiler', profiler), patch('main.llm_instance') as mock_llm:
+            mock_llm.chat.return_value = ChatResponse(reply="ok")
+            response = client.post("/genai/chat", json={"message": "Hello"}, headers={"X-Profile": "1"})
+
+        assert response.status_code == 200
+        assert "x-profile-summary" not in response.headers
@@ -10,7 +10,9 @@ from weaviate.classes.query import Filter
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from rag import RAGHelper
+from request_context import RequestStats, current_request_stats
 from langchain_core.documents import Document
+from prometheus_client import REGISTRY
 
 
 @pytest.fixture
@@ -345,6 +347,62 @@ class TestRAGHelperRetrieve:
         # Verify similarity search was called with correct parameters
         mock_store.similarity_search.assert_called_once_with("pasta recipe", k=3)
     
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_retrieve_records_scores_in_debug_mode(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect):
+        """Test that debug requests retrieve with scores and record them in the request stats"""
+        mock_client = Mock()
+        mock_client.collections.list_all.return_value = ["recipes"]
+        mock_weaviate_connect.return_value = mock_client
+        
+        mock_doc = Document(page_content="Recipe 1 content", metadata={"recipe_id": "7", "title": "Recipe 1"})
+        mock_store = Mock()
+        mock_store.similarity_search_with_score.return_value = [(mock_doc, 0.87654)]
+        mock_vector_store_class.return_value = mock_store
+        
+        request_stats = RequestStats(debug=True)
+        token = current_request_stats.set(request_stats)
+        try:
+            rag = RAGHelper()
+            results = rag.retrieve("pasta recipe", top_k=3, query_vector=[0.1, 0.2])
+        finally:
+            current_request_stats.reset(token)
+        
+        assert results == [mock_doc]
+        mock_store.similarity_search_with_score.assert_called_once_with("pasta recipe", k=3, vector=[0.1, 0.2])
+        mock_store.similarity_search.assert_not_called()
+        assert request_stats.retrieved == [{"recipe_id": "7", "title": "Recipe 1", "score": 0.8765}]
+        assert request_stats.stage_seconds["weaviate_query"] >= 0
+    
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_retrieve_metadata_only(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect):
+        """Test that metadata-only retrieval projects the hybrid search to recipe ids and titles"""
+        mock_client = Mock()
+        mock_client.collections.list_all.return_value = ["recipes"]
+        mock_weaviate_connect.return_value = mock_client
+        
+        mock_object = Mock()
+        mock_object.properties = {"recipe_id": "7", "title": "Recipe 1"}
+        mock_collection = Mock()
+        mock_collection.query.hybrid.return_value.objects = [mock_object]
+        mock_client.collections.get.return_value = mock_collection
+        
+        mock_store = Mock()
+        mock_vector_store_class.return_value = mock_store
+        
+        rag = RAGHelper()
+        results = rag.retrieve("pasta recipe", top_k=10, query_vector=[0.1, 0.2], metadata_only=True)
+        
+        assert results == [Document(page_content="", metadata={"recipe_id": "7", "title": "Recipe 1"})]
+        _, kwargs = mock_collection.query.hybrid.call_args
+        assert kwargs["vector"] == [0.1, 0.2]
+        assert kwargs["limit"] == 10
+        assert kwargs["return_properties"] == ["recipe_id", "title"]
+        mock_store.similarity_search.assert_not_called()
+    
     @patch('rag.weaviate.connect_to_local')
     @patch('rag.WeaviateVectorStore')
     @patch('rag.HuggingFaceEmbeddings')
@@ -599,4 +657,104 @@ class TestRAGHelperIntegration:
         
         # 3. Delete recipe
         delete_result = rag.delete_recipe_by_recipe_id("123")
-        assert delete_result is True 
\ No newline at end of file
+        assert delete_result is True 
+
+class TestWeaviateReconnect:
+    """Test reconnecting to Weaviate and failing fast while it is down"""
+    
+    @pytest.fixture
+    def clients(self):
+        """Two Weaviate clients, the second one is used after a reconnect"""
+        first, second = Mock(), Mock()
+        for client in (first, second):
+            client.collections.list_all.return_value = ["recipes"]
+        first.is_ready.return_value = False
+        return first, second
+    
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_reconnects_after_failure(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect, clients):
+        """Test that a failed call is followed by a reconnect if Weaviate is not ready"""
+        mock_weaviate_connect.side_effect = list(clients)
+        stale_store, fresh_store = Mock(), Mock()
+        stale_store.similarity_search.side_effect = Exception("Connection refused")
+        fresh_store.similarity_search.return_value = [Document(page_content="Stew", metadata={"recipe_id": "1"})]
+        mock_vector_store_class.side_effect = [stale_store, fresh_store]
+        
+        rag = RAGHelper()
+        assert rag.retrieve("stew") == []
+        results = rag.retrieve("stew")
+        
+        assert len(results) == 1
+        assert mock_weaviate_connect.call_count == 2
+        assert rag.weaviate_client is clients[1]
+        clients[0].close.assert_called_once()
+    
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_keeps_connection_if_ready(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect, clients):
+        """Test that a failed call does not reconnect while Weaviate is ready"""
+        mock_weaviate_connect.return_value = clients[0]
+        clients[0].is_ready.return_value = True
+        mock_store = Mock()
+        mock_store.similarity_search.side_effect = [Exception("Bad query"), []]
+        mock_vector_store_class.return_value = mock_store
+        
+        rag = RAGHelper()
+        rag.retrieve("stew")
+        rag.retrieve("stew")
+        
+        assert mock_weaviate_connect.call_count == 1
+        assert mock_store.similarity_search.call_count == 2
+    
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_failed_reconnect_backs_off(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect, clients):
+        """Test that calls fail fast without reconnecting while the reconnect backs off"""
+        mock_weaviate_connect.side_effect = [clients[0], Exception("Connection refused")]
+        mock_store = Mock()
+        mock_store.similarity_search.side_effect = Exception("Connection refused")
+        mock_vector_store_class.return_value = mock_store
+        
+        rag = RAGHelper()
+        rag.connection.breaker.failure_threshold = 10
+        rag.retrieve("stew")
+        rag.retrieve("stew")
+        
+        assert rag.add_recipe("Title: Stew", {"recipe_id": "1"}) is False
+        assert rag.delete_recipe("1+1") is False
+        assert mock_weaviate_connect.call_count == 2
+        assert mock_store.add_documents.call_count == 0
+    
+    @patch('rag.weaviate.connect_to_local')
+    @patch('rag.WeaviateVectorStore')
+    @patch('rag.HuggingFaceEmbeddings')
+    def test_open_circuit_fails_fast(self, mock_embeddings, mock_vector_store_class, mock_weaviate_connect, clients):
+        """Test that the open circuit rejects calls, exports its state and lets a probe through later"""
+        clients[0].is_ready.return_value = True
+        mock_weaviate_connect.return_value = clients[0]
+        mock_store = Mock()
+        mock_store.similarity_search.side_effect = Exception("Timed out")
+        mock_vector_store_class.return_value = mock_store
+        
+        rag = RAGHelper()
+        breaker = rag.connection.breaker
+        for _ in range(breaker.failure_threshold):
+            rag.retrieve("stew")
+        mock_store.similarity_search.reset_mock()
+        
+        assert rag.retrieve("stew") == []
+        mock_store.similarity_search.assert_not_called()
+        assert REGISTRY.get_sample_value("genai_circuit_breaker_state", {"breaker": "weaviate"}) == 2
+        assert rag.get_collection_stats()["circuit_breaker"] == "open"
+        
+        breaker.reset_timeout = 0
+        mock_store.similarity_search.side_effect = None
+        mock_store.similarity_search.return_value = []
+        rag.retrieve("stew")
+        
+        mock_store.similarity_search.assert_called_once()
+        assert breaker.state == "closed"
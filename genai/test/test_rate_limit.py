@@ -0,0 +1,141 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import MemoryBucketStore, RateLimiter, RateLimitExceededError, RequestCostExceededError, SQLiteBucketStore
+
+
+@pytest.fixture
+def limiter():
+    """Enabled in-memory rate limiter with 10 tokens, refilling 1 per second"""
+    with patch.dict(os.environ, {
+        "RATE_LIMIT_ENABLED": "true",
+        "RATE_LIMIT_CAPACITY": "10",
+        "RATE_LIMIT_REFILL_PER_SECOND": "1",
+        "RATE_LIMIT_COST_SEARCH": "1",
+        "RATE_LIMIT_COST_CREATION": "5",
+        "RATE_LIMIT_BACKEND": "memory"
+    }):
+        return RateLimiter()
+
+
+class TestTokenBuckets:
+    """Test the token bucket stores"""
+    
+    def test_memory_bucket_refills(self):
+        """Test that a drained bucket refills over time"""
+        store = MemoryBucketStore()
+        with patch('rate_limit.time.monotonic', return_value=100.0):
+            assert store.take("user:a", 10, capacity=10, refill_rate=2).allowed
+            result = store.take("user:a", 1, capacity=10, refill_rate=2)
+        
+        assert not result.allowed
+        assert result.retry_after == pytest.approx(0.5)
+        
+        with patch('rate_limit.time.monotonic', return_value=101.0):
+            result = store.take("user:a", 1, capacity=10, refill_rate=2)
+        
+        assert result.allowed
+        assert result.remaining == pytest.approx(1)
+    
+    def test_memory_store_evicts_least_recently_used(self):
+        """Test that the store keeps at most max_keys buckets"""
+        store = MemoryBucketStore(max_keys=2)
+        for key in ("a", "b", "a", "c"):
+            store.take(key, 1, capacity=10, refill_rate=0)
+        
+        assert list(store._buckets) == ["a", "c"]
+    
+    def test_sqlite_store_is_shared(self, tmp_path):
+        """Test that two stores on the same file spend from the same buckets"""
+        path = str(tmp_path / "buckets.sqlite3")
+        first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+        try:
+            assert first.take("user:a", 6, capacity=10, refill_rate=0).allowed
+            result = second.take("user:a", 6, capacity=10, refill_rate=0)
+            
+            assert not result.allowed
+            assert result.remaining == pytest.approx(4)
+            assert second.take("user:b", 6, capacity=10, refill_rate=0).allowed
+        finally:
+            first.close()
+            second.close()
+
+    
+    def test_sqlite_store_prunes_full_buckets(self, tmp_path):
+        """Test that buckets that refilled to capacity are deleted from the file"""
+        store = SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"), prune_interval=0)
+        try:
+            with patch('rate_limit.time.time', return_value=100.0):
+                store.take("user:a", 5, capacity=10, refill_rate=1)
+                store.take("user:b", 1, capacity=10, refill_rate=1)
+            with patch('rate_limit.time.time', return_value=102.0):
+                store.take("user:c", 1, capacity=10, refill_rate=1)
+            
+            keys = {row[0] for row in store._connection.execute("SELECT key FROM rate_limit_buckets")}
+        finally:
+            store.close()
+        
+        assert keys == {"user:a", "user:c"}
+
+
+class TestRateLimiter:
+    """Test the per-caller rate limiter"""
+    
+    def test_subject(self):
+        """Test that callers are keyed by the forwarded subject, else by IP"""
+        assert RateLimiter.subject("alice", "10.0.0.1") == "user:alice"
+        assert RateLimiter.subject(" ", "10.0.0.1") == "ip:10.0.0.1"
+        assert RateLimiter.subject(None, None) == "ip:unknown"
+    
+    def test_creation_costs_more_than_search(self, limiter):
+        """Test that the same bucket allows more searches than creations"""
+        limiter.check("user:a", "creation", "suggest_recipe")
+        limiter.check("user:a", "creation", "suggest_recipe")
+        with pytest.raises(RateLimitExceededError) as error:
+            limiter.check("user:a", "creation", "suggest_recipe")
+        assert error.value.retry_after > 0
+        
+        for _ in range(10):
+            limiter.check("user:b", "search", "chat")
+    
+    def test_requests_charged_per_unit_up_to_capacity(self, limiter):
+        """Test that batches pay for every unit and are rejected if they cost more than a full bucket"""
+        limiter.check("user:a", "creation", "suggest_recipes_batch", units=2)
+        with pytest.raises(RateLimitExceededError):
+            limiter.check("user:a", "search", "chat")
+        
+        with pytest.raises(RequestCostExceededError) as error:
+            limiter.check("user:b", "creation", "suggest_recipes_batch", units=3)
+        assert error.value.cost == 15
+        # Nothing was taken from the bucket
+        limiter.check("user:b", "creation", "suggest_recipes_batch", units=2)
+    
+    def test_disabled(self):
+        """Test that a disabled limiter lets every request through"""
+        with patch.dict(os.environ, {"RATE_LIMIT_ENABLED": "false"}):
+            limiter = RateLimiter()
+        
+        for _ in range(100):
+            limiter.check("user:a", "creation", "chat")
+        assert limiter.store is None
+    
+    def test_unusable_sqlite_path_falls_back_to_memory(self, tmp_path):
+        """Test that a database file that cannot be opened does not stop the service from starting"""
+        with patch.dict(os.environ, {
+            "RATE_LIMIT_ENABLED": "true",
+            "RATE_LIMIT_BACKEND": "sqlite",
+            "RATE_LIMIT_SQLITE_PATH": str(tmp_path / "missing" / "buckets.sqlite3")
+        }):
+            limiter = RateLimiter()
+        
+        assert isinstance(limiter.store, MemoryBucketStore)
+        limiter.check("user:a", "creation", "chat")
+    
+    def test_store_failure_allows_request(self, limiter):
+        """Test that requests are let through if the store fails"""
+        with patch.object(limiter.store, 'take', side_effect=RuntimeError("database is locked")):
+            limiter.check("user:a", "creation", "chat")
@@ -0,0 +1,229 @@
+import pytest
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import AdaptiveLimiter, CircuitBreaker, LimitExceededError
+from prometheus_client import REGISTRY
+
+
+@pytest.fixture
+def breaker():
+    """Create a circuit breaker for testing"""
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+
+
+class TestCircuitBreaker:
+    """Test the circuit breaker"""
+
+    def test_opens_after_consecutive_failures(self, breaker):
+        """Test that the breaker opens after the failure threshold"""
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+        assert REGISTRY.get_sample_value("genai_circuit_breaker_state", {"breaker": "test"}) == 2
+
+    def test_success_resets_failure_count(self, breaker):
+        """Test that only consecutive failures open the breaker"""
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_after_reset_timeout(self, breaker):
+        """Test that a single probe is allowed after the reset timeout"""
+        with patch('resilience.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch('resilience.time.monotonic', return_value=111.0):
+            assert breaker.state == CircuitBreaker.HALF_OPEN
+            assert breaker.allow_request()
+            assert not breaker.allow_request()
+
+    def test_successful_probe_closes(self, breaker):
+        """Test that a successful probe closes the breaker"""
+        with patch('resilience.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch('resilience.time.monotonic', return_value=111.0):
+            assert breaker.allow_request()
+            breaker.record_success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert REGISTRY.get_sample_value("genai_circuit_breaker_state", {"breaker": "test"}) == 0
+
+    def test_failed_probe_reopens(self, breaker):
+        """Test that a failed probe opens the breaker for another reset timeout"""
+        with patch('resilience.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch('resilience.time.monotonic', return_value=111.0):
+            assert breaker.allow_request()
+            breaker.record_failure()
+            assert breaker.state == CircuitBreaker.OPEN
+
+    def test_released_probe_frees_slot(self, breaker):
+        """Test that a cancelled probe lets the next probe through"""
+        with patch('resilience.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+            breaker.record_failure()
+
+        with patch('resilience.time.monotonic', return_value=111.0):
+            assert breaker.allow_request()
+            breaker.release()
+            assert breaker.allow_request()
+
+
+def limiter_count(name, outcome):
+    return REGISTRY.get_sample_value("genai_llm_limiter_requests_total", {"limiter": name, "outcome": outcome}) or 0
+
+
+class TestAdaptiveLimiter:
+    """Test the adaptive concurrency limiter"""
+
+    def test_limit_grows_while_used(self):
+        """Test the additive increase of the limit while calls use it"""
+        # Without enough samples for the latency check, sub-millisecond jitter cannot shrink the limit
+        limiter = AdaptiveLimiter("grow", initial_limit=2, max_limit=3, min_samples=100)
+
+        for _ in range(4):
+            permits = [limiter.acquire(), limiter.acquire()]
+            for permit in permits:
+                permit.release("success")
+
+        assert limiter.limit == 3
+        assert REGISTRY.get_sample_value("genai_llm_concurrency_limit", {"limiter": "grow"}) == 3
+
+    def test_errors_decrease_once_per_round_trip(self):
+        """Test that concurrent failures shrink the limit only once"""
+        limiter = AdaptiveLimiter("errors", initial_limit=8)
+
+        permits = [limiter.acquire() for _ in range(3)]
+        for permit in permits:
+            permit.release("error")
+        assert limiter.limit == 6
+
+        limiter.acquire().release("error")
+        assert limiter.limit == 4
+
+    def test_latency_increase_decreases_limit(self):
+        """Test that calls much slower than the recent best shrink the limit"""
+        limiter = AdaptiveLimiter("latency", initial_limit=4, max_limit=4, min_samples=2)
+
+        for _ in range(3):
+            permit = limiter.acquire()
+            permit.started -= 0.1
+            permit.release("success")
+        assert limiter.limit == 4
+
+        permit = limiter.acquire()
+        permit.started -= 1.0
+        permit.release("success")
+        assert limiter.limit == 3
+
+    def test_mixed_latency_classes_keep_limit(self):
+        """Test that short and long calls sharing the limiter do not shrink a healthy limit"""
+        limiter = AdaptiveLimiter("mixed", initial_limit=8, max_limit=8, min_samples=2)
+
+        for latency, latency_class in [(0.1, "repair"), (1.0, "generation"), (0.2, "chat"), (1.2, "generation")] * 10:
+            permit = limiter.acquire(latency_class=latency_class)
+            permit.started -= latency
+            permit.release("success")
+
+        assert limiter.limit == 8
+
+        # A slowdown within one class still shrinks the limit
+        permit = limiter.acquire(latency_class="repair")
+        permit.started -= 1.0
+        permit.release("success")
+        assert limiter.limit == 6
+
+    def test_cancelled_calls_do_not_adapt(self):
+        """Test that cancelled calls free their permit without changing the limit"""
+        limiter = AdaptiveLimiter("cancelled", initial_limit=1)
+
+        with pytest.raises(KeyboardInterrupt):
+            with limiter.permit():
+                raise KeyboardInterrupt()
+
+        assert limiter.limit == 1
+        assert limiter.inflight == 0
+
+    def test_full_queue_is_shed(self):
+        """Test that calls beyond the limit and the queue are rejected right away"""
+        limiter = AdaptiveLimiter("shed", initial_limit=1, max_queue=0)
+        before = limiter_count("shed", "rejected")
+        limiter.acquire()
+
+        with pytest.raises(LimitExceededError) as error:
+            limiter.acquire()
+
+        assert error.value.retry_after > 0
+        assert limiter_count("shed", "rejected") == before + 1
+        assert limiter.try_acquire() is None
+
+    def test_queue_timeout(self):
+        """Test that queued calls give up after their timeout"""
+        limiter = AdaptiveLimiter("timeout", initial_limit=1)
+        limiter.acquire()
+
+        start = time.monotonic()
+        with pytest.raises(LimitExceededError):
+            limiter.acquire(timeout=0.05)
+
+        assert time.monotonic() - start < 1
+        assert limiter.queue_depth == 0
+        assert limiter_count("timeout", "timeout") == 1
+
+    def test_queued_call_admitted_on_release(self):
+        """Test that a released permit goes to the queued call"""
+        limiter = AdaptiveLimiter("handoff", initial_limit=1)
+        permit = limiter.acquire()
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(limiter.acquire(timeout=5)))
+        waiter.start()
+        while limiter.queue_depth == 0:
+            time.sleep(0.005)
+        assert REGISTRY.get_sample_value("genai_llm_queue_depth", {"limiter": "handoff"}) == 1
+
+        permit.release("success")
+        waiter.join(timeout=5)
+
+        assert len(admitted) == 1
+        assert limiter.inflight == 1
+        assert limiter_count("handoff", "queued") == 1
+
+    def test_aborted_wait(self):
+        """Test that a queued call stops waiting once it is aborted"""
+        limiter = AdaptiveLimiter("abort", initial_limit=1)
+        limiter.acquire()
+        aborted = threading.Event()
+        errors = []
+
+        def wait():
+            try:
+                limiter.acquire(timeout=5, aborted=aborted.is_set)
+            except LimitExceededError as e:
+                errors.append(e)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        while limiter.queue_depth == 0:
+            time.sleep(0.005)
+        aborted.set()
+        limiter.wake()
+        waiter.join(timeout=1)
+
+        assert len(errors) == 1
+        assert limiter_count("abort", "aborted") == 1
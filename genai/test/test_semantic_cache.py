@@ -0,0 +1,195 @@
+import pytest
+import sys
+import os
+import json
+from unittest.mock import Mock, patch
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache
+from llm import RecipeLLM
+
+
+@pytest.fixture
+def cache():
+    """Create an enabled semantic cache for testing"""
+    return SemanticCache(threshold=0.95, ttl_seconds=60, max_entries=3)
+
+
+@pytest.fixture
+def recipe_json():
+    """Valid recipe JSON as returned by the LLM"""
+    return json.dumps({
+        "title": "Easy Vegan Lasagna",
+        "description": "Layered pasta with lentil ragout",
+        "servingSize": 4,
+        "recipeIngredients": [{"name": "Lasagna sheets", "unit": "g", "amount": 250}],
+        "recipeSteps": [{"order": 1, "details": "Layer and bake for 40 minutes"}],
+        "tags": ["vegan"]
+    })
+
+
+class TestSemanticCache:
+    """Test the semantic cache"""
+
+    def test_lookup_hit_for_similar_vector(self, cache):
+        """Test that a near-identical query embedding hits the cache"""
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"}, generation_seconds=2.5)
+
+        result = cache.lookup("suggestion", [0.99, 0.05, 0.0])
+
+        assert result == {"title": "Lasagna"}
+
+    def test_lookup_miss_below_threshold(self, cache):
+        """Test that a dissimilar query embedding misses the cache"""
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"})
+
+        assert cache.lookup("suggestion", [0.0, 1.0, 0.0]) is None
+
+    def test_namespaces_are_isolated(self, cache):
+        """Test that entries are only visible in their own namespace"""
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"})
+
+        assert cache.lookup("recipe_creation", [1.0, 0.0, 0.0]) is None
+
+    def test_bypass_skips_lookup(self, cache):
+        """Test that the bypass flag ignores cached entries"""
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"})
+
+        assert cache.lookup("suggestion", [1.0, 0.0, 0.0], bypass=True) is None
+
+    def test_entries_expire_after_ttl(self, cache):
+        """Test that expired entries are not returned"""
+        with patch('semantic_cache.time.time', return_value=1000.0):
+            cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"})
+
+        with patch('semantic_cache.time.time', return_value=1061.0):
+            assert cache.lookup("suggestion", [1.0, 0.0, 0.0]) is None
+
+        assert cache.stats() == {"suggestion": 0}
+
+    def test_size_bound_evicts_least_recently_used(self, cache):
+        """Test that the oldest unused entry is evicted when the namespace is full"""
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "A"})
+        cache.store("suggestion", [0.0, 1.0, 0.0], {"title": "B"})
+        cache.store("suggestion", [0.0, 0.0, 1.0], {"title": "C"})
+
+        # Touch A so that B becomes the least recently used entry
+        assert cache.lookup("suggestion", [1.0, 0.0, 0.0]) == {"title": "A"}
+        cache.store("suggestion", [1.0, 1.0, 0.0], {"title": "D"})
+
+        assert cache.stats() == {"suggestion": 3}
+        assert cache.lookup("suggestion", [0.0, 1.0, 0.0]) is None
+        assert cache.lookup("suggestion", [1.0, 0.0, 0.0]) == {"title": "A"}
+
+    def test_cached_values_are_copies(self, cache):
+        """Test that callers cannot mutate cached values"""
+        value = {"title": "Lasagna", "tags": ["vegan"]}
+        cache.store("suggestion", [1.0, 0.0, 0.0], value)
+        value["tags"].append("changed")
+
+        result = cache.lookup("suggestion", [1.0, 0.0, 0.0])
+        result["title"] = "Changed"
+
+        assert cache.lookup("suggestion", [1.0, 0.0, 0.0]) == {"title": "Lasagna", "tags": ["vegan"]}
+
+    def test_disabled_cache_never_stores(self):
+        """Test that a disabled cache is a no-op"""
+        cache = SemanticCache(enabled=False)
+        cache.store("suggestion", [1.0, 0.0, 0.0], {"title": "Lasagna"})
+
+        assert cache.lookup("suggestion", [1.0, 0.0, 0.0]) is None
+        assert cache.stats() == {}
+
+    def test_invalid_vectors_are_ignored(self, cache):
+        """Test that unusable embeddings neither store nor match"""
+        cache.store("suggestion", [0.0, 0.0, 0.0], {"title": "Lasagna"})
+        cache.store("suggestion", Mock(), {"title": "Lasagna"})
+
+        assert cache.stats() == {}
+        assert cache.lookup("suggestion", Mock()) is None
+
+
+class TestRecipeLLMSemanticCache:
+    """Test semantic caching in the LLM service"""
+
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_suggest_recipe_served_from_cache(self, mock_rag_class, mock_llm_class, recipe_json):
+        """Test that a repeated suggestion does not call the LLM again"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[recipe_json])
+
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.3, 0.4, 0.5]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+
+        llm = RecipeLLM()
+        first = llm.suggest_recipe("easy vegan lasagna")
+
+        with patch.object(llm, '_parse_recipe_response') as mock_parse:
+            second = llm.suggest_recipe("easy vegan lasagna")
+            mock_parse.assert_not_called()
+
+        assert first.recipe_data["title"] == "Easy Vegan Lasagna"
+        assert second.recipe_data == first.recipe_data
+        mock_rag_instance.retrieve.assert_called_once()
+
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_suggest_recipe_bypass_cache(self, mock_rag_class, mock_llm_class, recipe_json):
+        """Test that bypass_cache forces a fresh generation"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[recipe_json])
+
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.3, 0.4, 0.5]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+
+        llm = RecipeLLM()
+        llm.suggest_recipe("easy vegan lasagna")
+        llm.suggest_recipe("easy vegan lasagna", bypass_cache=True)
+
+        assert mock_rag_instance.retrieve.call_count == 2
+
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_fallback_recipe_is_not_cached(self, mock_rag_class, mock_llm_class):
+        """Test that unparseable LLM output is not cached"""
+        mock_llm_class.return_value = FakeListChatModel(responses=["no json here"])
+
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.3, 0.4, 0.5]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+
+        llm = RecipeLLM()
+        llm.suggest_recipe("easy vegan lasagna")
+        llm.suggest_recipe("easy vegan lasagna")
+
+        assert mock_rag_instance.retrieve.call_count == 2
+        assert llm.semantic_cache.stats() == {}
+
+    @patch('llm.ChatOpenAI')
+    @patch('llm.RAGHelper')
+    def test_chat_creation_served_from_cache(self, mock_rag_class, mock_llm_class, recipe_json):
+        """Test that repeated creation requests in chat are cached and skip retrieval"""
+        mock_llm_class.return_value = FakeListChatModel(responses=[recipe_json])
+
+        mock_rag_instance = Mock()
+        mock_rag_instance.embed_query.return_value = [0.3, 0.4, 0.5]
+        mock_rag_instance.retrieve.return_value = []
+        mock_rag_class.return_value = mock_rag_instance
+
+        llm = RecipeLLM()
+        first = llm.chat("Create an easy vegan lasagna")
+        second = llm.chat("Create an easy vegan lasagna")
+
+        assert first.recipe_suggestion["title"] == "Easy Vegan Lasagna"
+        assert second.recipe_suggestion == first.recipe_suggestion
+        mock_rag_instance.retrieve.assert_called_once()
+
+        # The retrieval reused the embedding computed for the cache
+        assert mock_rag_instance.retrieve.call_args.kwargs["query_vector"] == [0.3, 0.4, 0.5]
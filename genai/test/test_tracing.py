@@ -0,0 +1,198 @@
+import pytest
+import sys
+import os
+import time
+from unittest.mock import patch
+
+import httpx
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing import (
+    FileSpanExporter, HttpJsonSpanExporter, TailSamplingProcessor, configure_tracing,
+    inject_trace_headers, request_id_from
+)
+from benchmarks import create_llm
+from trace_collector import TraceCollector
+
+UPSTREAM_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def traceparent(sampled: bool) -> str:
+    return f"00-{UPSTREAM_TRACE_ID}-00f067aa0ba902b7-{'01' if sampled else '00'}"
+
+
+def local_tracer(slow_ms: float = 1000, sample_rate: float = 0.0):
+    """Tracer with tail sampling into an in-memory exporter, independent of the global provider"""
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(TailSamplingProcessor(SimpleSpanProcessor(exporter), slow_ms=slow_ms, sample_rate=sample_rate))
+    return provider.get_tracer("test"), exporter
+
+
+_global_exporter = None
+
+
+@pytest.fixture
+def global_exporter():
+    """Enable tracing for the service once per test session and return the exporter"""
+    global _global_exporter
+    if _global_exporter is None:
+        _global_exporter = InMemorySpanExporter()
+        with patch.dict(os.environ, {"TRACING_ENABLED": "true", "TRACING_SLOW_MS": "60000", "TRACING_SAMPLE_RATE": "0"}):
+            assert configure_tracing(_global_exporter)
+    trace.get_tracer_provider().force_flush()
+    _global_exporter.clear()
+    return _global_exporter
+
+
+class TestTailSampling:
+    """Test the tail-based sampling decisions"""
+
+    def test_fast_trace_dropped(self):
+        """Test that a fast, successful, unsampled trace is not exported"""
+        tracer, exporter = local_tracer()
+
+        with tracer.start_as_current_span("request"):
+            with tracer.start_as_current_span("genai.embedding"):
+                pass
+
+        assert exporter.get_finished_spans() == ()
+
+    def test_slow_trace_kept(self):
+        """Test that a whole trace is exported when its root span is slow"""
+        tracer, exporter = local_tracer(slow_ms=1000)
+        start = time.time_ns()
+
+        root = tracer.start_span("request", start_time=start)
+        with trace.use_span(root):
+            with tracer.start_as_current_span("genai.llm_call"):
+                pass
+        root.end(end_time=start + 1_500_000_000)
+
+        assert [span.name for span in exporter.get_finished_spans()] == ["genai.llm_call", "request"]
+
+    def test_error_trace_kept(self):
+        """Test that traces with a failed span are exported"""
+        tracer, exporter = local_tracer()
+
+        with tracer.start_as_current_span("request"):
+            with pytest.raises(ValueError):
+                with tracer.start_as_current_span("genai.weaviate_query"):
+                    raise ValueError("weaviate down")
+
+        failed, root = exporter.get_finished_spans()
+        assert failed.status.status_code == StatusCode.ERROR
+        assert root.name == "request"
+
+    def test_upstream_sampled_trace_kept(self):
+        """Test that traces the caller sampled are exported, continuing the caller's trace"""
+        tracer, exporter = local_tracer()
+
+        for sampled in (True, False):
+            context = propagate.extract({"traceparent": traceparent(sampled)})
+            with tracer.start_as_current_span("request", context=context):
+                pass
+
+        span, = exporter.get_finished_spans()
+        assert format(span.context.trace_id, "032x") == UPSTREAM_TRACE_ID
+
+    def test_pending_traces_bounded(self):
+        """Test that spans of traces whose root never ends are not kept forever"""
+        exporter = InMemorySpanExporter()
+        processor = TailSamplingProcessor(SimpleSpanProcessor(exporter), slow_ms=0, sample_rate=1.0, max_pending_traces=2)
+        provider = TracerProvider()
+        provider.add_span_processor(processor)
+        tracer = provider.get_tracer("test")
+
+        for _ in range(5):
+            root = tracer.start_span("request")
+            with trace.use_span(root):
+                tracer.start_span("child").end()
+
+        assert len(processor._pending) == 2
+
+
+class TestExporters:
+    """Test the span exporters and trace propagation helpers"""
+
+    def test_file_exporter(self, tmp_path):
+        """Test writing spans as JSON lines"""
+        path = tmp_path / "traces.jsonl"
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(FileSpanExporter(str(path))))
+
+        with provider.get_tracer("test").start_as_current_span("request"):
+            pass
+
+        assert '"name":"request"' in path.read_text()
+
+    def test_http_exporter_to_collector(self):
+        """Test exporting spans to the collector stand-in and reading the span tree"""
+        with TraceCollector() as collector:
+            provider = TracerProvider()
+            provider.add_span_processor(SimpleSpanProcessor(HttpJsonSpanExporter(collector.url)))
+            tracer = provider.get_tracer("test")
+            with tracer.start_as_current_span("request") as root:
+                with tracer.start_as_current_span("genai.prompt_build"):
+                    pass
+
+            summary, = httpx.get(f"{collector.base_url}/traces").json()
+            tree = httpx.get(f"{collector.base_url}/traces/{format(root.get_span_context().trace_id, '032x')}").json()
+
+        assert summary["root"] == "request"
+        assert summary["spans"] == 2
+        assert [(span["name"], span["depth"]) for span in tree] == [("request", 0), ("genai.prompt_build", 1)]
+
+    def test_traceparent_injected_into_outgoing_requests(self):
+        """Test that LLM backend requests carry the current trace context"""
+        tracer, _ = local_tracer()
+        request = httpx.Request("POST", "http://llm.local/v1/chat/completions")
+
+        with tracer.start_as_current_span("genai.llm_call") as span:
+            inject_trace_headers(request)
+
+        trace_id = format(span.get_span_context().trace_id, "032x")
+        assert request.headers["traceparent"].split("-")[1] == trace_id
+
+    def test_request_id_from_headers(self):
+        """Test that only plausible upstream request ids are reused"""
+        assert request_id_from({"x-request-id": "gateway-123"}) == "gateway-123"
+        assert request_id_from({"x-request-id": "bad id\nwith newline"}) is None
+        assert request_id_from({}) is None
+
+
+class TestRequestTracing:
+    """Test tracing of service requests"""
+
+    def test_request_spans_continue_upstream_trace(self, client, global_exporter):
+        """Test that a request continues the caller's trace with spans for the pipeline stages"""
+        with patch('main.llm_instance', create_llm()):
+            response = client.post(
+                "/genai/vector/suggest",
+                json={"query": "smoky vegan stew", "bypass_cache": True},
+                headers={"traceparent": traceparent(sampled=True), "X-Request-ID": "gateway-42"}
+            )
+        trace.get_tracer_provider().force_flush()
+
+        assert response.status_code == 200
+        assert response.headers["X-Request-ID"] == "gateway-42"
+        spans = global_exporter.get_finished_spans()
+        assert {format(span.context.trace_id, "032x") for span in spans} == {UPSTREAM_TRACE_ID}
+        names = {span.name for span in spans}
+        assert {"POST /genai/vector/suggest", "genai.embedding", "genai.weaviate_query", "genai.prompt_build", "genai.llm_call", "genai.parse"} <= names
+        server_span = next(span for span in spans if span.name == "POST /genai/vector/suggest")
+        assert server_span.attributes["genai.request_id"] == "gateway-42"
+        assert server_span.attributes["http.response.status_code"] == 200
+
+    def test_fast_unsampled_request_dropped(self, client, global_exporter):
+        """Test that fast requests are not exported unless sampled"""
+        client.get("/genai", headers={"traceparent": traceparent(sampled=False)})
+        trace.get_tracer_provider().force_flush()
+
+        assert global_exporter.get_finished_spans() == ()
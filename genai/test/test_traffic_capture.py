@@ -0,0 +1,131 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_capture import TrafficCapture, read_capture, scrub_pii
+from response_models import ChatResponse
+from main import app
+from load_test import LocalService
+from replay_traffic import replay, compare
+
+
+def make_capture(tmp_path, filename="capture.jsonl.zst", sample_rate="1.0"):
+    """Create an enabled traffic capture writing to a temporary file"""
+    with patch.dict(os.environ, {
+        "TRAFFIC_CAPTURE_ENABLED": "true",
+        "TRAFFIC_CAPTURE_PATH": str(tmp_path / filename),
+        "TRAFFIC_CAPTURE_SAMPLE_RATE": sample_rate
+    }):
+        return TrafficCapture()
+
+
+class TestScrubPII:
+    """Test PII scrubbing of captured bodies"""
+
+    def test_scrubs_free_text(self):
+        """Test that contact details are replaced in nested strings"""
+        body = {
+            "message": "Mail me at jane.doe@example.com or call +49 151 2345 6789",
+            "nested": ["from 192.168.0.12", "card 4111 1111 1111 1111"]
+        }
+
+        scrubbed = scrub_pii(body)
+
+        assert scrubbed["message"] == "Mail me at <email> or call <phone>"
+        assert scrubbed["nested"] == ["from <ip>", "card <card>"]
+
+    def test_keeps_recipe_content(self):
+        """Test that ordinary recipe text and numbers are kept"""
+        body = {"query": "pasta for 4 people with 200g tomatoes", "servingSize": 4}
+
+        assert scrub_pii(body) == body
+
+
+class TestTrafficCapture:
+    """Test capturing sampled requests"""
+
+    def test_captures_api_requests(self, tmp_path):
+        """Test that API requests are written with scrubbed body, status and timing"""
+        capture = make_capture(tmp_path)
+
+        with patch('main.traffic_capture', capture), patch('main.llm_instance') as mock_llm:
+            mock_llm.chat.return_value = ChatResponse(reply="ok")
+            client = TestClient(app)
+            client.post("/genai/chat", json={"message": "Recipe for bob@example.com"})
+            client.get("/health")
+        capture.close()
+
+        record, = list(read_capture(capture.path))
+        assert record["method"] == "POST"
+        assert record["path"] == "/genai/chat"
+        assert record["body"] == {"message": "Recipe for <email>"}
+        assert record["status"] == 200
+        assert record["duration_ms"] >= 0
+
+    def test_disabled_by_default(self):
+        """Test that nothing is captured without opting in"""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("TRAFFIC_CAPTURE_ENABLED", None)
+            capture = TrafficCapture()
+
+        assert not capture.should_capture("POST", "/genai/chat")
+
+    def test_sample_rate(self, tmp_path):
+        """Test that requests are sampled"""
+        capture = make_capture(tmp_path, sample_rate="0.2")
+
+        sampled = sum(capture.should_capture("POST", "/genai/chat") for _ in range(5000))
+
+        assert 800 < sampled < 1200
+
+    def test_plain_jsonl_and_size_limit(self, tmp_path):
+        """Test uncompressed captures and that records beyond the size limit are dropped"""
+        with patch.dict(os.environ, {"TRAFFIC_CAPTURE_MAX_MB": "0.001"}):
+            capture = make_capture(tmp_path, filename="capture.jsonl")
+
+        for i in range(50):
+            capture.record("POST", "/genai/vector/suggest", json.dumps({"query": f"soup {i}"}).encode(), 200, 12.5)
+        capture.close()
+
+        records = list(read_capture(capture.path))
+        assert 0 < len(records) < 50
+        assert capture.records_written == len(records)
+        assert capture.records_written + capture.records_dropped == 50
+
+
+class TestReplay:
+    """Test replaying captured traffic"""
+
+    def test_replay_against_local_service(self, tmp_path):
+        """Test that captured requests are re-issued and summarized per endpoint"""
+        capture = make_capture(tmp_path)
+        for i in range(4):
+            capture.record("POST", "/genai/vector/suggest", json.dumps({"query": "chickpea stew"}).encode(), 200, 900.0)
+            capture.record("POST", "/genai/chat", json.dumps({"message": "Any soups?"}).encode(), 200, 50.0)
+        capture.close()
+        records = list(read_capture(capture.path))
+
+        with LocalService(llm_profile="instant") as service:
+            result = asyncio.run(replay(service.url, records, speed=10.0, timeout=30))
+
+        assert result["overall"]["requests"] == 8
+        assert result["overall"]["error_rate"] == 0.0
+        assert set(result["endpoints"]) == {"POST /genai/vector/suggest", "POST /genai/chat"}
+
+    def test_compare_flags_p95_regression(self):
+        """Test that a slower p95 beyond the tolerance is reported"""
+        def result(p95):
+            summary = {"p50_ms": 100.0, "p95_ms": p95, "p99_ms": 300.0, "error_rate": 0.0}
+            return {"overall": summary, "endpoints": {"POST /genai/chat": summary}}
+
+        rows = compare(result(200.0), result(260.0), tolerance=0.1)
+
+        regressions = {(row["endpoint"], row["metric"]) for row in rows if row["regression"]}
+        assert regressions == {("POST /genai/chat", "p95_ms"), ("overall", "p95_ms")}
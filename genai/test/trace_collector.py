@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Minimal trace collector standing in for an OpenTelemetry collector during local runs.
+
+Receives the spans the service exports with TRACING_EXPORTER=http, keeps them in memory
+(and optionally appends them to a JSON lines file) and lists the collected traces, slowest
+first, with their span trees.
+
+Run standalone and point the service at it:
+    python trace_collector.py --port 4320 --output traces.jsonl
+    TRACING_ENABLED=true TRACING_EXPORTER=http TRACING_ENDPOINT=http://localhost:4320/v1/spans python ../main.py
+
+    curl http://localhost:4320/traces
+    curl http://localhost:4320/traces/<trace_id>
+
+Or start it in-process from a test:
+    with TraceCollector() as collector:
+        exporter = HttpJsonSpanExporter(collector.url)
+"""
+
+import argparse
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+from mock_llm_server import BackgroundServer
+
+
+def span_duration_ms(span: Dict[str, Any]) -> float:
+    """Duration of an exported span"""
+    start = datetime.fromisoformat(span["start_time"])
+    end = datetime.fromisoformat(span["end_time"])
+    return round((end - start).total_seconds() * 1000, 2)
+
+
+def span_tree(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Spans of a trace in depth-first order, with their depth and duration"""
+    span_ids = {span["context"]["span_id"] for span in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for span in sorted(spans, key=lambda span: span["start_time"]):
+        parent_id = span.get("parent_id") if span.get("parent_id") in span_ids else None
+        children[parent_id].append(span)
+
+    tree = []
+
+    def visit(parent_id: Optional[str], depth: int) -> None:
+        for span in children.get(parent_id, []):
+            tree.append({
+                "name": span["name"],
+                "depth": depth,
+                "duration_ms": span_duration_ms(span),
+                "status": span["status"]["status_code"],
+                "attributes": span.get("attributes", {})
+            })
+            visit(span["context"]["span_id"], depth + 1)
+
+    visit(None, 0)
+    return tree
+
+
+class CollectorState:
+    """Spans received by the collector, grouped by trace"""
+
+    def __init__(self, output: Optional[str] = None):
+        self.output = output
+        self.traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, spans: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for span in spans:
+                self.traces[span["context"]["trace_id"]].append(span)
+            if self.output:
+                with open(self.output, "a") as f:
+                    f.writelines(json.dumps(span, separators=(",", ":")) + "\n" for span in spans)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """One entry per trace with its root span, slowest first"""
+        with self._lock:
+            traces = {trace_id: list(spans) for trace_id, spans in self.traces.items()}
+
+        summaries = []
+        for trace_id, spans in traces.items():
+            roots = span_tree(spans)
+            root = roots[0] if roots else None
+            summaries.append({
+                "trace_id": trace_id,
+                "root": root["name"] if root else None,
+                "duration_ms": root["duration_ms"] if root else None,
+                "spans": len(spans)
+            })
+        return sorted(summaries, key=lambda summary: summary["duration_ms"] or 0, reverse=True)
+
+
+def create_app(state: CollectorState) -> FastAPI:
+    """Create the collector app"""
+    app = FastAPI(title="Trace Collector")
+
+    @app.post("/v1/spans")
+    async def receive(request: Request):
+        payload = await request.json()
+        state.add(payload.get("spans", []))
+        return {"received": len(payload.get("spans", []))}
+
+    @app.get("/traces")
+    async def list_traces():
+        return state.summaries()
+
+    @app.get("/traces/{trace_id}")
+    async def get_trace(trace_id: str):
+        if not trace_id.startswith("0x"):
+            trace_id = f"0x{trace_id}"
+        spans = state.traces.get(trace_id)
+        if not spans:
+            raise HTTPException(status_code=404, detail="Unknown trace")
+        return span_tree(spans)
+
+    return app
+
+
+class TraceCollector(BackgroundServer):
+    """
+    Trace collector running in a background thread.
+
+    Args:
+        output: JSON lines file the spans are appended to.
+        host: Interface to listen on.
+        port: Port to listen on, 0 for a free port.
+    """
+
+    def __init__(self, output: Optional[str] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = CollectorState(output)
+        super().__init__(create_app(self.state), host, port)
+
+    @property
+    def url(self) -> str:
+        """Span endpoint for TRACING_ENDPOINT"""
+        return f"{self.base_url}/v1/spans"
+
+    @property
+    def traces(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Collected spans by trace id"""
+        return self.state.traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect the spans exported by the GenAI service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=4320)
+    parser.add_argument("--output", help="Append the received spans to this JSON lines file")
+    args = parser.parse_args()
+
+    print(f"Trace collector on http://{args.host}:{args.port}/v1/spans")
+    uvicorn.run(create_app(CollectorState(args.output)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import httpx
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+
+from metrics import TRACES
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+tracer = trace.get_tracer(__name__)
+
+# Request ids accepted from upstream services, anything else is replaced by a new id
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def span_to_dict(span: ReadableSpan) -> Dict[str, Any]:
+    """JSON representation of a finished span"""
+    return json.loads(span.to_json(indent=None))
+
+
+class FileSpanExporter(SpanExporter):
+    """Write finished spans to a local file, one JSON line per span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(span_to_dict(span), separators=(",", ":")) + "\n" for span in spans)
+        try:
+            with self._lock, open(self.path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"Failed to write spans to {self.path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+
+class HttpJsonSpanExporter(SpanExporter):
+    """POST finished spans as JSON (`{"spans": [...]}`) to a collector, e.g. test/trace_collector.py"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        try:
+            response = self._client.post(self.endpoint, json={"spans": [span_to_dict(span) for span in spans]})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to export {len(spans)} spans to {self.endpoint}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Decide whether to keep a trace once its local root span has ended.
+
+    Spans are held back per trace until the root span of this service ends. The trace is
+    kept if the root took at least `slow_ms`, a span failed, the upstream caller sampled it,
+    or by chance with `sample_rate`; kept spans are passed on to `next_processor`. At most
+    `max_pending_traces` unfinished traces are held, the oldest are dropped beyond that.
+    """
+
+    def __init__(self, next_processor: SpanProcessor, slow_ms: float, sample_rate: float, max_pending_traces: int = 1000):
+        self.next_processor = next_processor
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_pending_traces = max_pending_traces
+        self._pending: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[otel_context.Context] = None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+
+        with self._lock:
+            spans = self._pending.setdefault(trace_id, [])
+            spans.append(span)
+            if is_local_root:
+                del self._pending[trace_id]
+            else:
+                while len(self._pending) > self.max_pending_traces:
+                    self._pending.popitem(last=False)
+                    TRACES.labels(decision="incomplete").inc()
+                return
+
+        decision = self._decide(span, spans)
+        TRACES.labels(decision=decision).inc()
+        if decision != "dropped":
+            for finished in spans:
+                self.next_processor.on_end(finished)
+
+    def _decide(self, root: ReadableSpan, spans: List[ReadableSpan]) -> str:
+        """Sampling decision for a finished trace: slow, error, upstream, random or dropped"""
+        if (root.end_time - root.start_time) / 1e6 >= self.slow_ms:
+            return "slow"
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            return "error"
+        if root.parent is not None and root.parent.trace_flags.sampled:
+            return "upstream"
+        if random.random() < self.sample_rate:
+            return "random"
+        return "dropped"
+
+    def shutdown(self) -> None:
+        self.next_processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.next_processor.force_flush(timeout_millis)
+
+
+def create_exporter(kind: str) -> SpanExporter:
+    """
+    Create the span exporter selected by TRACING_EXPORTER.
+
+    Args:
+        kind: file (JSON lines in TRACING_FILE_PATH), http (JSON to TRACING_ENDPOINT),
+            otlp (OTLP/HTTP to TRACING_ENDPOINT, needs opentelemetry-exporter-otlp-proto-http)
+            or console.
+    """
+    if kind == "file":
+        return FileSpanExporter(os.getenv("TRACING_FILE_PATH", "/tmp/genai-traces.jsonl"))
+    if kind == "http":
+        return HttpJsonSpanExporter(os.getenv("TRACING_ENDPOINT") or "http://localhost:4320/v1/spans")
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=os.getenv("TRACING_ENDPOINT") or "http://localhost:4318/v1/traces")
+    if kind == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {kind}")
+
+
+def configure_tracing(exporter: Optional[SpanExporter] = None) -> bool:
+    """
+    Install the tracer provider if TRACING_ENABLED is true.
+
+    Every request is traced, and the tail sampler decides per trace what is exported. When
+    tracing is disabled the OpenTelemetry API stays a no-op.
+
+    Args:
+        exporter: Exporter to use instead of the one selected by TRACING_EXPORTER.
+
+    Returns:
+        Whether tracing was enabled.
+    """
+    if os.getenv("TRACING_ENABLED", "false").lower() != "true":
+        return False
+
+    exporter_kind = os.getenv("TRACING_EXPORTER", "file")
+    slow_ms = float(os.getenv("TRACING_SLOW_MS", "2000"))
+    sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", "0.01"))
+
+    try:
+        exporter = exporter or create_exporter(exporter_kind)
+    except (ImportError, ValueError) as e:
+        logger.error(f"Tracing disabled, could not create the span exporter: {e}")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("TRACING_SERVICE_NAME", "genai-service")}))
+    provider.add_span_processor(TailSamplingProcessor(BatchSpanProcessor(exporter), slow_ms=slow_ms, sample_rate=sample_rate))
+    trace.set_tracer_provider(provider)
+
+    structured_logger.info(
+        "Tracing enabled",
+        extra={'extra_context': {
+            'component': 'tracing',
+            'exporter': exporter_kind,
+            'slow_ms': slow_ms,
+            'sample_rate': sample_rate
+        }}
+    )
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Export the remaining kept spans"""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def request_id_from(headers: Mapping[str, str]) -> Optional[str]:
+    """The X-Request-ID sent by the calling service, if it is a plausible id"""
+    request_id = headers.get("x-request-id")
+    return request_id if request_id and REQUEST_ID_PATTERN.match(request_id) else None
+
+
+def start_request_span(method: str, route: str, headers: Mapping[str, str], request_id: str) -> Tuple[Span, object]:
+    """
+    Start the server span of a request as a child of the caller's W3C traceparent.
+
+    Returns:
+        Tuple of (span, context token); pass both to `end_request_span`.
+    """
+    span = tracer.start_span(
+        f"{method} {route}",
+        context=propagate.extract(headers),
+        kind=SpanKind.SERVER,
+        attributes={"http.request.method": method, "http.route": route, "genai.request_id": request_id}
+    )
+    token = otel_context.attach(trace.set_span_in_context(span))
+    return span, token
+
+
+def end_request_span(span: Span, token: Optional[object], status_code: int, error: Optional[BaseException] = None) -> None:
+    """Record the response status on the server span and end it, detaching it first unless `token` is None"""
+    span.set_attribute("http.response.status_code", status_code)
+    if error is not None:
+        span.record_exception(error)
+    if error is not None or status_code >= 500:
+        span.set_status(Status(StatusCode.ERROR))
+    if token is not None:
+        detach_request_span(token)
+    span.end()
+
+
+def detach_request_span(token: object) -> None:
+    """
+    Stop the server span from being the current span, e.g. before a response body is streamed.
+
+    Work that already copied the context, like the endpoint streaming the body, keeps the span
+    as parent; end it later with `end_request_span(span, None, ...)`.
+    """
+    otel_context.detach(token)
+
+
+def trace_id_of(span: Span) -> Optional[str]:
+    """Hex trace id of a span, or None when tracing is disabled"""
+    span_context = span.get_span_context()
+    return format(span_context.trace_id, "032x") if span_context.is_valid else None
+
+
+def inject_trace_headers(request: httpx.Request) -> None:
+    """httpx request hook adding the current traceparent to outgoing requests"""
+    propagate.inject(request.headers)
+
+
+async def ainject_trace_headers(request: httpx.Request) -> None:
+    """Async variant of `inject_trace_headers`"""
+    propagate.inject(request.headers)
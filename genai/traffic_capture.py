@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, IO, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional, captures are written uncompressed without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+# Free-text patterns replaced before a request body is written, most specific first
+PII_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"), "<ip>"),
+    (re.compile(r"\b(?:\d{4}[ -]?){3}\d{4}\b|\b\d{13,19}\b"), "<card>"),
+    (re.compile(r"\+?\(?\d[\d ()/.-]{7,}\d"), "<phone>"),
+]
+
+
+def scrub_pii(value: Any) -> Any:
+    """Replace e-mail addresses, IP addresses, card and phone numbers in all strings of a JSON value"""
+    if isinstance(value, str):
+        for pattern, placeholder in PII_PATTERNS:
+            value = pattern.sub(placeholder, value)
+        return value
+    if isinstance(value, dict):
+        return {key: scrub_pii(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub_pii(item) for item in value]
+    return value
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the records of a capture file.
+
+    Args:
+        path: Capture file, zstd-compressed if it ends with .zst.
+
+    Returns:
+        Iterator over the captured requests in recording order.
+    """
+    with open(path, "rb") as raw:
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("Reading a .zst capture requires the zstandard package")
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        else:
+            stream = raw
+        buffer = b""
+        while True:
+            chunk = stream.read(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        if buffer.strip():
+            yield json.loads(buffer)
+
+
+class TrafficCapture:
+    """
+    Opt-in capture of sampled API requests for replay.
+
+    Sampled requests are written as one JSON line each with their scrubbed body, response
+    status, duration and offset from the start of the capture. Lines are written by a
+    background thread, so capturing never blocks request handling; records are dropped if
+    the writer falls behind or the file reached its size limit. Files ending in .zst are
+    zstd-compressed, with a frame per write batch so that a partial file stays readable.
+    """
+
+    def __init__(self):
+        """Initialize traffic capture from the environment"""
+        self.enabled = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() == "true"
+        self.path = os.getenv("TRAFFIC_CAPTURE_PATH", "/tmp/genai-traffic.jsonl.zst")
+        self.sample_rate = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "0.1"))
+        # Limit on the uncompressed size of the records written
+        self.max_bytes = int(float(os.getenv("TRAFFIC_CAPTURE_MAX_MB", "100")) * 1024 * 1024)
+        self.path_prefix = os.getenv("TRAFFIC_CAPTURE_PATH_PREFIX", "/genai/")
+
+        if self.enabled and self.path.endswith(".zst") and zstandard is None:
+            logger.warning("zstandard is not installed, writing the traffic capture uncompressed")
+            self.path = self.path[:-len(".zst")]
+
+        self.started_at = time.time()
+        self.records_written = 0
+        self.records_dropped = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=10000)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._bytes_written = 0
+
+    def should_capture(self, method: str, path: str) -> bool:
+        """Decide whether a request is sampled"""
+        return self.enabled and path.startswith(self.path_prefix) and random.random() < self.sample_rate
+
+    def record(self, method: str, path: str, body: bytes, status_code: int, duration_ms: float) -> None:
+        """Queue a sampled request for writing"""
+        try:
+            payload = scrub_pii(json.loads(body)) if body else None
+        except ValueError:
+            payload = scrub_pii(body.decode("utf-8", errors="replace"))
+
+        line = json.dumps({
+            "offset_s": round(time.time() - self.started_at, 3),
+            "method": method,
+            "path": path,
+            "body": payload,
+            "status": status_code,
+            "duration_ms": duration_ms
+        }, separators=(",", ":"))
+
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.records_dropped += 1
+
+    def close(self) -> None:
+        """Write the queued records and close the file"""
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None
+            structured_logger.info(
+                f"Traffic capture closed: {self.records_written} requests written to {self.path}",
+                extra={'extra_context': {
+                    'operation': 'traffic_capture',
+                    'path': self.path,
+                    'records_written': self.records_written,
+                    'records_dropped': self.records_dropped
+                }}
+            )
+
+    def _ensure_writer(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        """Write queued lines in batches until close() is called"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "ab") as raw:
+            writer: IO[bytes] = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False) if self.path.endswith(".zst") else raw
+            done = False
+            while not done:
+                batch = [self._queue.get()]
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                if None in batch:
+                    done = True
+                    batch = [line for line in batch if line is not None]
+
+                data = b""
+                for line in batch:
+                    encoded = f"{line}\n".encode()
+                    if self._bytes_written + len(data) + len(encoded) > self.max_bytes:
+                        self.records_dropped += 1
+                        continue
+                    data += encoded
+                    self.records_written += 1
+                if not data:
+                    continue
+                writer.write(data)
+                self._bytes_written += len(data)
+                if writer is raw:
+                    raw.flush()
+                else:
+                    writer.flush(zstandard.FLUSH_FRAME)
+            if writer is not raw:
+                writer.close()
@@ -0,0 +1,191 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+from metrics import WEAVIATE_RECONNECTS
+from resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+# Create structured logger for detailed logging
+structured_logger = logging.getLogger("structured")
+
+T = TypeVar("T")
+
+
+class WeaviateUnavailableError(Exception):
+    """Raised when Weaviate is unreachable and the next reconnect attempt is still backing off"""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class WeaviateConnection:
+    """
+    Weaviate connection with lazy, health-aware reconnects behind a circuit breaker.
+
+    A call that fails marks the connection as suspect. The next call first checks whether
+    Weaviate is ready and reconnects if it is not. Failed reconnects back off exponentially
+    from `backoff_initial` up to `backoff_max` seconds; calls made in between fail fast with
+    WeaviateUnavailableError instead of waiting for their timeouts. Every call goes through
+    `breaker`, which rejects calls with CircuitOpenError while Weaviate keeps failing and
+    lets a probe through once it is half-open.
+
+    Args:
+        connect: Opens a new client, including the vector store on top of it, and returns it.
+        breaker: Circuit breaker of the Weaviate calls.
+        backoff_initial: Seconds before the first reconnect attempt after a failed one.
+        backoff_max: Upper bound of the reconnect backoff in seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        breaker: CircuitBreaker,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0
+    ):
+        self._connect = connect
+        self.breaker = breaker
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.client = None
+        self._healthy = False
+        self._failed_attempts = 0
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the last call on the current client succeeded"""
+        return self._healthy
+
+    def connect(self) -> None:
+        """Open the initial connection, raising if Weaviate is unreachable"""
+        with self._lock:
+            self.client = self._connect()
+            self._healthy = True
+
+    def call(self, operation: str, func: Callable[[], T]) -> T:
+        """
+        Run a Weaviate operation, reconnecting first if the connection is suspect.
+
+        Args:
+            operation: Name of the operation for errors and logs.
+            func: The operation, using the current client.
+
+        Returns:
+            The result of the operation.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the call.
+            WeaviateUnavailableError: If Weaviate is down and the reconnect is backing off.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Weaviate circuit breaker is open, {operation} rejected")
+        try:
+            self._ensure_connected()
+            result = func()
+        except Exception:
+            self._healthy = False
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def close(self) -> None:
+        """Close the current client"""
+        with self._lock:
+            if self.client is not None:
+                self.client.close()
+            self._healthy = False
+
+    def _ensure_connected(self) -> None:
+        """Check a suspect connection and reconnect if Weaviate is not ready on it"""
+        if self._healthy:
+            return
+        with self._lock:
+            if self._healthy:
+                return
+            retry_in = self._next_attempt - time.monotonic()
+            if retry_in > 0:
+                raise WeaviateUnavailableError(
+                    f"Weaviate is unavailable, next reconnect attempt in {retry_in:.1f}s",
+                    retry_in=retry_in
+                )
+            if self._is_ready():
+                self._healthy = True
+                return
+            self._reconnect()
+
+    def _is_ready(self) -> bool:
+        """Whether Weaviate answers its readiness check on the current client (caller holds the lock)"""
+        if self.client is None:
+            return False
+        try:
+            return bool(self.client.is_ready())
+        except Exception:
+            return False
+
+    def _reconnect(self) -> None:
+        """Replace the current client, backing off after a failure (caller holds the lock)"""
+        start_time = time.time()
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception as e:
+                logger.debug(f"Closing the stale Weaviate client failed: {e}")
+
+        try:
+            self.client = self._connect()
+        except Exception as e:
+            self._failed_attempts += 1
+            delay = self._backoff(self._failed_attempts)
+            self._next_attempt = time.monotonic() + delay
+            WEAVIATE_RECONNECTS.labels(outcome="failure").inc()
+            duration_ms = round((time.time() - start_time) * 1000, 2)
+            logger.warning(f"Reconnecting to Weaviate failed, next attempt in {delay:.1f}s: {e}")
+            structured_logger.warning(
+                f"Weaviate reconnect failed: {str(e)}",
+                extra={
+                    'duration_ms': duration_ms,
+                    'extra_context': {
+                        'component': 'weaviate_client',
+                        'operation': 'reconnect',
+                        'status': 'failed',
+                        'failed_attempts': self._failed_attempts,
+                        'backoff_seconds': round(delay, 2),
+                        'error': str(e),
+                        'error_type': type(e).__name__
+                    }
+                }
+            )
+            raise
+
+        failed_attempts, self._failed_attempts, self._next_attempt = self._failed_attempts, 0, 0.0
+        self._healthy = True
+        WEAVIATE_RECONNECTS.labels(outcome="success").inc()
+        duration_ms = round((time.time() - start_time) * 1000, 2)
+        logger.info(f"Reconnected to Weaviate in {duration_ms}ms")
+        structured_logger.info(
+            "Weaviate reconnect succeeded",
+            extra={
+                'duration_ms': duration_ms,
+                'extra_context': {
+                    'component': 'weaviate_client',
+                    'operation': 'reconnect',
+                    'status': 'success',
+                    'failed_attempts': failed_attempts
+                }
+            }
+        )
+
+    def _backoff(self, failed_attempts: int) -> float:
+        """Delay before the next reconnect attempt, with jitter in its upper half"""
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** (failed_attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)